@@ -0,0 +1,502 @@
+import os
+import time
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from market_stream import CandleBuffer
+from candle_aggregator import AggregatedKlineStream, BASE_INTERVAL, MAX_BUCKET_CANDLES, is_aggregatable
+from market_cache import MarketDataCache, interval_to_seconds
+from exchange_info import ExchangeInfoRegistry
+from exchange_client import ExchangeClientPool, get_client_pool
+from trigger_engine import TriggerEngine
+from trade_journal import TradeJournal, get_trade_journal
+from state_store import StateStore, get_state_store
+
+logger = logging.getLogger(__name__)
+
+
+class SyncClientBridge:
+    """
+    Fachada síncrona sobre un AsyncClient compartido.
+
+    El código de decisión de los bots llama al cliente de forma síncrona
+    desde los hilos del runtime; cada llamada se ejecuta como corrutina en
+    el bucle de eventos, de modo que todo el proceso comparte una única
+    sesión HTTP no bloqueante
+    """
+
+    def __init__(self, client, loop: asyncio.AbstractEventLoop, timeout: float = 30.0):
+        """
+        Inicializa el puente
+
+        Args:
+            client: Cliente asíncrono de Binance
+            loop: Bucle de eventos en el que corre el cliente
+            timeout: Segundos máximos de espera por llamada
+        """
+        self._client = client
+        self._loop = loop
+        self.timeout = timeout
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._client, name)
+        if not asyncio.iscoroutinefunction(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            try:
+                running = asyncio.get_running_loop()
+            except RuntimeError:
+                running = None
+            if running is self._loop:
+                raise RuntimeError(f"{name} no puede llamarse de forma síncrona desde el bucle de eventos")
+            future = asyncio.run_coroutine_threadsafe(attr(*args, **kwargs), self._loop)
+            return future.result(self.timeout)
+
+        return call
+
+
+class AsyncKlineFeed(AggregatedKlineStream):
+    """
+    Buffers de velas alimentados por el runtime en lugar de por WebSocket.
+
+    Los bots se suscriben igual que a un KlineStream, pero la siembra por
+    REST la hace el runtime de forma asíncrona (una petición por par, no
+    por bot). Las temporalidades agregables se construyen en memoria a
+    partir de las velas 1m del símbolo
+    """
+
+    def subscribe(self, symbol: str, interval: str, client=None) -> CandleBuffer:
+        return super().subscribe(symbol, interval, client=None)
+
+    def base_limit(self, symbol: str) -> int:
+        """
+        Velas base necesarias para reconstruir todas las temporalidades de un símbolo
+
+        Args:
+            symbol: Par de trading
+
+        Returns:
+            Número de velas base
+        """
+        return min(self._base_limit(symbol.upper()), MAX_BUCKET_CANDLES)
+
+    def update(self, symbol: str, interval: str, klines: List[List], seed: bool = False):
+        """
+        Vuelca velas obtenidas por REST en el buffer del par
+
+        Args:
+            symbol: Par de trading
+            interval: Intervalo de las velas
+            klines: Velas en formato REST
+            seed: True para la carga inicial del histórico
+        """
+        symbol = symbol.upper()
+        buffer = self.subscribe(symbol, interval)
+        now_ms = time.time() * 1000
+        if seed:
+            buffer.seed(klines)
+            # La vela en curso de las temporalidades derivadas sale de las velas base
+            derived = self._aggregators[symbol].intervals if interval == self.base_interval else [interval]
+            for name in derived:
+                if self._is_derived(symbol, name) and (symbol, name) in self._buffers:
+                    self._rebuild(symbol, name)
+        elif interval == self.base_interval:
+            for row in klines:
+                self.ingest(symbol, list(row), closed=row[6] < now_ms)
+        else:
+            for row in klines:
+                buffer.upsert(list(row), closed=row[6] < now_ms)
+        if klines:
+            self._set_price(symbol, float(klines[-1][4]))
+
+
+class _PairGroup:
+    """Bots que comparten símbolo e intervalo (una sola descarga por cierre de vela)"""
+
+    __slots__ = ('symbol', 'interval', 'seconds', 'bots', 'seeded', 'cycles', 'last_cycle', 'last_lag')
+
+    def __init__(self, symbol: str, interval: str):
+        self.symbol = symbol
+        self.interval = interval
+        self.seconds = interval_to_seconds(interval)
+        self.bots = []
+        self.seeded = False
+        self.cycles = 0
+        self.last_cycle = None
+        self.last_lag = 0.0
+
+
+class _SymbolGroup:
+    """Pares agregables de un símbolo (una sola descarga 1m para todas sus temporalidades)"""
+
+    __slots__ = ('symbol', 'pairs', 'last_open', 'fetches')
+
+    def __init__(self, symbol: str):
+        self.symbol = symbol
+        self.pairs: List[_PairGroup] = []
+        self.last_open = None   # open_time de la última vela base descargada
+        self.fetches = 0
+
+
+class AsyncBotRuntime:
+    """
+    Runtime asyncio que aloja muchas estrategias sobre muchos símbolos en un
+    solo proceso.
+
+    Cada símbolo tiene una tarea que despierta al cierre de la vela más
+    próxima de sus intervalos, descarga con AsyncClient las velas 1m
+    nuevas (una sola petición para todas las temporalidades, que se
+    agregan en memoria) y ejecuta la estrategia de cada bot cuyo intervalo
+    acaba de cerrar. Los intervalos no agregables (1d, 1w...) tienen su
+    propia tarea y descarga. La concurrencia de descargas y de decisiones
+    está acotada por max_concurrency
+    """
+
+    def __init__(self, api_key: str = None, api_secret: str = None,
+                 max_concurrency: int = 16, close_delay: float = 1.0,
+                 history: int = 500, client_pool: Optional[ExchangeClientPool] = None,
+                 trade_journal: Optional[TradeJournal] = None,
+                 state_store: Optional[StateStore] = None):
+        """
+        Inicializa el runtime
+
+        Args:
+            api_key: API key de Binance
+            api_secret: API secret de Binance
+            max_concurrency: Peticiones/decisiones simultáneas como máximo
+            close_delay: Segundos de espera tras el cierre de vela antes de descargar
+            history: Velas cargadas en la siembra inicial de cada par
+            client_pool: Pool de clientes del exchange (default: pool compartido)
+            trade_journal: Diario de operaciones de los bots (default: diario compartido)
+            state_store: Estado de posiciones de los bots (default: almacén compartido)
+        """
+        self.api_key = api_key or os.getenv('BINANCE_API_KEY')
+        self.api_secret = api_secret or os.getenv('BINANCE_API_SECRET')
+        self.max_concurrency = max_concurrency
+        self.close_delay = close_delay
+        self.history = history
+        self.client_pool = client_pool or get_client_pool()
+
+        self.feed = AsyncKlineFeed(maxlen=history)
+        self.market_cache = MarketDataCache()
+        self.exchange_info = ExchangeInfoRegistry()
+        self.trigger_engine = TriggerEngine()
+        self.trade_journal = trade_journal or get_trade_journal()
+        self.state_store = state_store or get_state_store()
+
+        self.client = None
+        self.bridge: Optional[SyncClientBridge] = None
+        self._groups: Dict[Tuple[str, str], _PairGroup] = {}
+        self._symbols: Dict[str, _SymbolGroup] = {}
+        self._pending: List[Tuple[type, str, str, Dict]] = []
+        self._state_keys = set()
+        self._tasks: List[asyncio.Task] = []
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.is_running = False
+
+    def add_bot(self, bot_class, symbol: str, interval: Optional[str] = None, **params):
+        """
+        Registra una estrategia sobre un símbolo
+
+        Los bots se construyen al arrancar el runtime, con el cliente, el
+        feed, la caché y el registro de filtros compartidos.
+
+        Args:
+            bot_class: Clase del bot (RSIEMABot, MomentumBot, ScalpingBot)
+            symbol: Par de trading
+            interval: Intervalo de velas (default: el del bot)
+            **params: Atributos de estrategia a sobrescribir
+        """
+        self._pending.append((bot_class, symbol.upper(), interval, params))
+        if self.is_running:
+            self._build_bot(*self._pending.pop())
+
+    def _build_bot(self, bot_class, symbol: str, interval: Optional[str], params: Dict):
+        kwargs = {'interval': interval} if interval else {}
+        bot = bot_class(
+            symbol=symbol,
+            market_stream=self.feed,
+            market_cache=self.market_cache,
+            exchange_info=self.exchange_info,
+            trigger_engine=self.trigger_engine,
+            trade_journal=self.trade_journal,
+            state_store=self.state_store,
+            client=self.bridge,
+            **kwargs
+        )
+        for name, value in params.items():
+            setattr(bot, name, value)
+        bot.is_running = True
+
+        # Clave de estado única por bot: varias estrategias de la misma clase y
+        # símbolo comparten almacén (el orden de registro la hace estable entre reinicios)
+        state_key = base_key = f"{bot.state_key}:{bot.interval}"
+        n = 1
+        while state_key in self._state_keys:
+            n += 1
+            state_key = f"{base_key}:{n}"
+        self._state_keys.add(state_key)
+        bot.state_key = state_key
+        if self.is_running:
+            self._tasks.append(asyncio.create_task(self._restore(bot)))
+
+        key = (bot.symbol, bot.interval)
+        group = self._groups.get(key)
+        if group is None:
+            group = self._groups[key] = _PairGroup(*key)
+            self._add_group(group)
+        group.bots.append(bot)
+        logger.info(f"{bot_class.__name__} registrado en el runtime: {symbol} {bot.interval}")
+        return bot
+
+    async def _restore(self, bot):
+        # Historial y posición abierta tras un reinicio (llaman al cliente: en el pool de hilos)
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(self._executor, bot.restore_history)
+            await loop.run_in_executor(self._executor, bot.restore_positions)
+        except Exception as e:
+            logger.error(f"Error restaurando {type(bot).__name__} {bot.symbol} {bot.interval}: {e}")
+
+    @staticmethod
+    def _is_aggregated(interval: str) -> bool:
+        return interval == BASE_INTERVAL or is_aggregatable(interval)
+
+    def _add_group(self, group: _PairGroup):
+        # Los intervalos agregables se suman a la tarea del símbolo; el resto tiene tarea propia
+        if not self._is_aggregated(group.interval):
+            if self.is_running:
+                self._tasks.append(asyncio.create_task(self._run_group(group)))
+            return
+        symbol_group = self._symbols.get(group.symbol)
+        is_new = symbol_group is None
+        if is_new:
+            symbol_group = self._symbols[group.symbol] = _SymbolGroup(group.symbol)
+        symbol_group.pairs.append(group)
+        if is_new and self.is_running:
+            self._tasks.append(asyncio.create_task(self._run_symbol(symbol_group)))
+
+    async def _fetch_base(self, symbol_group: _SymbolGroup):
+        seed = symbol_group.last_open is None
+        if seed:
+            limit = max(self.history, self.feed.base_limit(symbol_group.symbol))
+        else:
+            # Todas las velas base desde la última descargada (puede haber varias entre cierres)
+            elapsed = time.time() * 1000 - symbol_group.last_open
+            limit = int(elapsed // (interval_to_seconds(BASE_INTERVAL) * 1000)) + 1
+        limit = min(max(limit, 2), MAX_BUCKET_CANDLES)
+        async with self._semaphore:
+            klines = await self.client.get_klines(symbol=symbol_group.symbol, interval=BASE_INTERVAL, limit=limit)
+        self.feed.update(symbol_group.symbol, BASE_INTERVAL, klines, seed=seed)
+        if klines:
+            symbol_group.last_open = int(klines[-1][0])
+        symbol_group.fetches += 1
+
+    async def _seed_symbol(self, symbol_group: _SymbolGroup):
+        # Histórico cerrado de cada temporalidad por REST; después las velas base
+        for group in list(symbol_group.pairs):
+            if not group.seeded and group.interval != BASE_INTERVAL:
+                await self._fetch(group)
+        if symbol_group.last_open is None:
+            await self._fetch_base(symbol_group)
+        for group in symbol_group.pairs:
+            group.seeded = True
+
+    async def _fetch(self, group: _PairGroup):
+        limit = 2 if group.seeded else self.history
+        async with self._semaphore:
+            klines = await self.client.get_klines(symbol=group.symbol, interval=group.interval, limit=limit)
+        self.feed.update(group.symbol, group.interval, klines, seed=not group.seeded)
+        group.seeded = True
+
+    async def _decide(self, bot):
+        async with self._semaphore:
+            await asyncio.get_running_loop().run_in_executor(self._executor, bot.execute_strategy)
+
+    async def _run_symbol(self, symbol_group: _SymbolGroup):
+        while self.is_running:
+            try:
+                await self._seed_symbol(symbol_group)
+
+                # Esperar al cierre más próximo entre los intervalos del símbolo
+                now = time.time()
+                next_close = min((now // group.seconds + 1) * group.seconds for group in symbol_group.pairs)
+                await asyncio.sleep(next_close + self.close_delay - now)
+
+                started = time.time()
+                await self._fetch_base(symbol_group)
+                closing = [group for group in symbol_group.pairs
+                           if group.seeded and int(next_close) % group.seconds == 0]
+                await asyncio.gather(*(self._decide(bot) for group in closing for bot in group.bots))
+
+                for group in closing:
+                    group.cycles += 1
+                    group.last_cycle = time.time()
+                    group.last_lag = started - next_close
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error en el ciclo de {symbol_group.symbol}: {e}")
+                await asyncio.sleep(5)
+
+    async def _run_group(self, group: _PairGroup):
+        while self.is_running:
+            try:
+                if not group.seeded:
+                    await self._fetch(group)
+
+                # Esperar al cierre de la siguiente vela
+                now = time.time()
+                next_close = (now // group.seconds + 1) * group.seconds
+                await asyncio.sleep(next_close + self.close_delay - now)
+
+                started = time.time()
+                await self._fetch(group)
+                await asyncio.gather(*(self._decide(bot) for bot in group.bots))
+
+                group.cycles += 1
+                group.last_cycle = time.time()
+                group.last_lag = started - next_close
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error en el ciclo de {group.symbol} {group.interval}: {e}")
+                await asyncio.sleep(min(group.seconds, 5))
+
+    async def start(self):
+        """
+        Crea el cliente asíncrono, construye los bots y lanza una tarea por par
+        """
+        logger.info("Iniciando runtime asíncrono...")
+        self.client = await self.client_pool.get_async_client(self.api_key, self.api_secret)
+        self.bridge = SyncClientBridge(self.client, asyncio.get_running_loop())
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix='bot')
+
+        try:
+            await asyncio.get_running_loop().run_in_executor(self._executor, self.exchange_info.load, self.bridge)
+        except Exception as e:
+            logger.error(f"Error cargando exchangeInfo: {e}")
+
+        while self._pending:
+            self._build_bot(*self._pending.pop(0))
+        bots = [bot for group in self._groups.values() for bot in group.bots]
+        await asyncio.gather(*(self._restore(bot) for bot in bots))
+
+        # Los cierres por disparo llaman al cliente de forma síncrona, así que
+        # se evalúan en el pool de hilos y no en el bucle de eventos
+        loop = asyncio.get_running_loop()
+        self.feed.add_price_listener(
+            lambda symbol, price: loop.run_in_executor(self._executor, self.trigger_engine.on_price, symbol, price)
+        )
+        self.trigger_engine.start()
+
+        self.is_running = True
+        self._tasks = [asyncio.create_task(self._run_symbol(symbol_group))
+                       for symbol_group in self._symbols.values()]
+        self._tasks += [asyncio.create_task(self._run_group(group)) for group in self._groups.values()
+                        if not self._is_aggregated(group.interval)]
+        logger.info(f"Runtime iniciado: {sum(len(g.bots) for g in self._groups.values())} bots "
+                    f"sobre {len(self._groups)} pares")
+
+    async def stop(self):
+        """
+        Detiene las tareas, cierra las posiciones abiertas y libera el cliente
+        """
+        logger.info("Deteniendo runtime asíncrono...")
+        self.is_running = False
+        self.trigger_engine.stop()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        loop = asyncio.get_running_loop()
+        bots = [bot for group in self._groups.values() for bot in group.bots]
+        await asyncio.gather(*(loop.run_in_executor(self._executor, bot.stop) for bot in bots),
+                             return_exceptions=True)
+
+        # Vaciar el spool del diario y compactar el log de estado
+        try:
+            await loop.run_in_executor(self._executor, self.trade_journal.stop)
+            await loop.run_in_executor(self._executor, self.state_store.close)
+        except Exception as e:
+            logger.error(f"Error cerrando el diario y el estado: {e}")
+
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        if self.client is not None:
+            await self.client_pool.close_async()
+
+    async def run(self):
+        """
+        Ejecuta el runtime hasta que se cancele
+        """
+        await self.start()
+        try:
+            await asyncio.gather(*self._tasks)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            await self.stop()
+
+    def get_statistics(self) -> Dict:
+        """
+        Obtiene estadísticas del runtime y de cada bot
+
+        Returns:
+            Dict con estadísticas
+        """
+        groups = list(self._groups.values())
+        return {
+            'pairs': len(groups),
+            'bots': sum(len(g.bots) for g in groups),
+            'cycles': sum(g.cycles for g in groups),
+            'base_fetches': sum(s.fetches for s in self._symbols.values()),
+            'max_lag': max((g.last_lag for g in groups), default=0.0),
+            'is_running': self.is_running,
+            'bot_statistics': [bot.get_statistics() for g in groups for bot in g.bots]
+        }
+
+
+def main():
+    """
+    Función principal para ejecutar varias estrategias en un solo proceso
+    """
+    from rsi_ema_bot import RSIEMABot
+    from momentum_bot import MomentumBot
+    from scalping_bot import ScalpingBot
+
+    load_dotenv()
+    try:
+        api_key = os.getenv('BINANCE_API_KEY')
+        api_secret = os.getenv('BINANCE_API_SECRET')
+
+        if not api_key or not api_secret:
+            logger.error("API_KEY y API_SECRET deben estar configurados")
+            return
+
+        symbols = os.getenv('BOT_SYMBOLS', 'BTCUSDT,ETHUSDT').split(',')
+
+        runtime = AsyncBotRuntime(api_key, api_secret)
+        for symbol in symbols:
+            runtime.add_bot(RSIEMABot, symbol.strip())
+            runtime.add_bot(MomentumBot, symbol.strip())
+            runtime.add_bot(ScalpingBot, symbol.strip())
+
+        asyncio.run(runtime.run())
+
+    except KeyboardInterrupt:
+        logger.info("Runtime detenido por el usuario")
+    except Exception as e:
+        logger.error(f"Error en main: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,662 @@
+import logging
+import itertools
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.signal import lfilter
+
+from market_cache import MarketDataCache, interval_to_seconds
+from exchange_info import ExchangeInfoRegistry
+from price_snapshot import PriceSnapshotService
+from trigger_engine import TriggerEngine
+from portfolio_risk import PortfolioRiskManager
+from user_data_stream import OrderLedger
+from trade_journal import MemorySink, TradeJournal
+from state_store import StateStore
+from indicator_graph import IndicatorGraph
+
+logger = logging.getLogger(__name__)
+
+OHLCV_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+# Parámetros por defecto de cada estrategia (los mismos que en el __init__ de cada bot)
+STRATEGY_DEFAULTS = {
+    'rsi_ema': {
+        'rsi_period': 14, 'ema_period': 20, 'rsi_oversold': 30, 'rsi_overbought': 70,
+        'volume_threshold': 1.2, 'max_position_time': 7200,
+        'take_profit': 0.04, 'stop_loss': 0.025
+    },
+    'momentum': {
+        'momentum_period': 14, 'trend_period': 20, 'volume_threshold': 1.5,
+        'min_trend_strength': 0.02, 'max_position_time': 3600,
+        'take_profit': 0.05, 'stop_loss': 0.03
+    },
+    'scalping': {
+        'spread_threshold': 0.0005, 'max_position_time': 300,
+        'min_profit_threshold': 0.0003, 'max_loss_threshold': 0.001
+    }
+}
+
+
+def load_ohlcv(path: str) -> pd.DataFrame:
+    """
+    Carga velas históricas desde un fichero CSV o Parquet local
+
+    Acepta la columna temporal como 'timestamp', 'open_time' o 'time'
+    (en milisegundos o como fecha).
+
+    Args:
+        path: Ruta del fichero (.csv o .parquet)
+
+    Returns:
+        DataFrame con columnas ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+    """
+    if path.endswith('.parquet'):
+        data = pd.read_parquet(path)
+    else:
+        data = pd.read_csv(path)
+
+    data.columns = [str(c).lower() for c in data.columns]
+    for candidate in ('timestamp', 'open_time', 'time', 'date'):
+        if candidate in data.columns:
+            data = data.rename(columns={candidate: 'timestamp'})
+            break
+    else:
+        raise ValueError(f"No se encontró columna temporal en {path}")
+
+    if pd.api.types.is_numeric_dtype(data['timestamp']):
+        data['timestamp'] = pd.to_datetime(data['timestamp'], unit='ms')
+    else:
+        data['timestamp'] = pd.to_datetime(data['timestamp'])
+
+    for col in OHLCV_COLUMNS:
+        data[col] = pd.to_numeric(data[col], errors='coerce')
+
+    data = data[['timestamp'] + OHLCV_COLUMNS].sort_values('timestamp')
+    return data.drop_duplicates('timestamp').reset_index(drop=True)
+
+
+def _timestamps_ms(data: pd.DataFrame) -> np.ndarray:
+    return data['timestamp'].to_numpy().astype('datetime64[ms]').astype(np.int64)
+
+
+class SimulatedClock:
+    """
+    Reloj simulado que sustituye a datetime.now() en los bots
+    """
+
+    def __init__(self, now: Optional[datetime] = None):
+        self.now = now or datetime(1970, 1, 1)
+
+    def __call__(self) -> datetime:
+        return self.now
+
+
+class SimulatedClient:
+    """
+    Cliente simulado con la misma interfaz que binance.client.Client para
+    los métodos que usan los bots. Las órdenes de mercado se ejecutan al
+    cierre de la vela actual con comisión y deslizamiento
+    """
+
+    def __init__(self, data: pd.DataFrame, symbol: str, interval: str,
+                 initial_balance: float = 1000.0, commission: float = 0.001,
+                 slippage: float = 0.0, symbol_info: Optional[Dict] = None):
+        """
+        Inicializa el cliente simulado
+
+        Args:
+            data: DataFrame con velas históricas
+            symbol: Par de trading
+            interval: Intervalo de las velas
+            initial_balance: Balance inicial en la moneda de cotización
+            commission: Comisión por operación (fracción)
+            slippage: Deslizamiento aplicado al precio de ejecución (fracción)
+            symbol_info: Entrada de exchangeInfo del símbolo (opcional)
+        """
+        self.symbol = symbol
+        self.interval = interval
+        self.commission = commission
+        self.slippage = slippage
+        self.index = 0
+
+        self._open_time = _timestamps_ms(data)
+        self._close_time = self._open_time + interval_to_seconds(interval) * 1000 - 1
+        self._ohlcv = data[OHLCV_COLUMNS].to_numpy(dtype=float)
+
+        self.base_asset, self.quote_asset = self._split_symbol(symbol)
+        self.balances = {self.quote_asset: float(initial_balance), self.base_asset: 0.0}
+        self.symbol_info = symbol_info or {
+            'symbol': symbol, 'status': 'TRADING',
+            'baseAsset': self.base_asset, 'quoteAsset': self.quote_asset,
+            'filters': [{'filterType': 'LOT_SIZE', 'stepSize': '0.00000100',
+                         'minQty': '0.00000100', 'maxQty': '9000000'}]
+        }
+        self.orders: List[Dict] = []
+
+    @staticmethod
+    def _split_symbol(symbol: str) -> Tuple[str, str]:
+        for quote in ('USDT', 'BUSD', 'USDC', 'BTC', 'ETH', 'BNB'):
+            if symbol.endswith(quote) and len(symbol) > len(quote):
+                return symbol[:-len(quote)], quote
+        return symbol, 'USDT'
+
+    @property
+    def current_price(self) -> float:
+        return float(self._ohlcv[self.index, 3])
+
+    def get_klines(self, symbol: str = None, interval: str = None, limit: int = 500, **kwargs) -> List[List]:
+        start = max(0, self.index - limit + 1)
+        rows = []
+        for i in range(start, self.index + 1):
+            o, h, l, c, v = self._ohlcv[i]
+            rows.append([int(self._open_time[i]), o, h, l, c, v,
+                         int(self._close_time[i]), 0.0, 0, 0.0, 0.0, '0'])
+        return rows
+
+    def get_symbol_ticker(self, symbol: str = None, **kwargs) -> Dict:
+        return {'symbol': self.symbol, 'price': str(self.current_price)}
+
+    def get_all_tickers(self, **kwargs) -> List[Dict]:
+        return [self.get_symbol_ticker()]
+
+    def get_account(self, **kwargs) -> Dict:
+        return {'balances': [
+            {'asset': asset, 'free': str(amount), 'locked': '0'}
+            for asset, amount in self.balances.items()
+        ]}
+
+    def get_symbol_info(self, symbol: str) -> Dict:
+        return self.symbol_info
+
+    def get_exchange_info(self) -> Dict:
+        return {'symbols': [self.symbol_info]}
+
+    def _fill(self, side: str, quantity: float) -> Dict:
+        quantity = float(quantity)
+        price = self.current_price * (1 + self.slippage if side == 'BUY' else 1 - self.slippage)
+        quote_qty = quantity * price
+        fee = quote_qty * self.commission
+
+        if side == 'BUY':
+            if quote_qty + fee > self.balances[self.quote_asset]:
+                raise ValueError(f"Balance insuficiente de {self.quote_asset} en simulación")
+            self.balances[self.quote_asset] -= quote_qty + fee
+            self.balances[self.base_asset] += quantity
+        else:
+            # Se permite saldo negativo del activo base para simular cortos
+            self.balances[self.quote_asset] += quote_qty - fee
+            self.balances[self.base_asset] -= quantity
+
+        order = {
+            'symbol': self.symbol,
+            'orderId': len(self.orders) + 1,
+            'side': side,
+            'type': 'MARKET',
+            'status': 'FILLED',
+            'executedQty': str(quantity),
+            'cummulativeQuoteQty': str(quote_qty),
+            'transactTime': int(self._close_time[self.index]),
+            'fills': [{'price': str(price), 'qty': str(quantity),
+                       'commission': str(fee), 'commissionAsset': self.quote_asset}]
+        }
+        self.orders.append(order)
+        return order
+
+    def order_market_buy(self, symbol: str = None, quantity: float = 0, **kwargs) -> Dict:
+        return self._fill('BUY', quantity)
+
+    def order_market_sell(self, symbol: str = None, quantity: float = 0, **kwargs) -> Dict:
+        return self._fill('SELL', quantity)
+
+    def equity(self) -> float:
+        """
+        Valor total de la cuenta a precio actual
+
+        Returns:
+            Equity en la moneda de cotización
+        """
+        return self.balances[self.quote_asset] + self.balances[self.base_asset] * self.current_price
+
+
+class Backtester:
+    """
+    Backtester que reproduce velas históricas a través del mismo código de
+    decisión de los bots (should_open_position / should_close_position),
+    sustituyendo el cliente de Binance y el reloj por versiones simuladas
+    """
+
+    def __init__(self, data: pd.DataFrame, symbol: str = 'BTCUSDT', interval: str = '15m',
+                 initial_balance: float = 1000.0, commission: float = 0.001,
+                 slippage: float = 0.0, symbol_info: Optional[Dict] = None):
+        """
+        Inicializa el backtester
+
+        Args:
+            data: DataFrame con velas históricas (ver load_ohlcv)
+            symbol: Par de trading
+            interval: Intervalo de las velas
+            initial_balance: Balance inicial en la moneda de cotización
+            commission: Comisión por operación (fracción)
+            slippage: Deslizamiento por operación (fracción)
+            symbol_info: Entrada de exchangeInfo del símbolo (opcional)
+        """
+        self.data = data.reset_index(drop=True)
+        self.symbol = symbol
+        self.interval = interval
+        self.initial_balance = initial_balance
+        self.commission = commission
+        self.slippage = slippage
+        self.symbol_info = symbol_info
+
+    def run(self, bot_class, warmup: int = 100, **params) -> Dict:
+        """
+        Ejecuta un bot sobre las velas históricas
+
+        Args:
+            bot_class: Clase del bot (RSIEMABot, MomentumBot, ScalpingBot)
+            warmup: Velas iniciales usadas solo como histórico
+            **params: Atributos de estrategia a sobrescribir (p. ej. rsi_period=10)
+
+        Returns:
+            Dict con estadísticas, historial de trades y equity final
+        """
+        client = SimulatedClient(
+            self.data, self.symbol, self.interval, self.initial_balance,
+            self.commission, self.slippage, self.symbol_info
+        )
+        clock = SimulatedClock()
+        exchange_info = ExchangeInfoRegistry()
+
+        bot = bot_class(
+            api_key='backtest', api_secret='backtest',
+            symbol=self.symbol, interval=self.interval,
+            market_cache=MarketDataCache(max_entries=1, max_age=0, price_ttl=0),
+            exchange_info=exchange_info,
+            client=client,
+            price_snapshot=PriceSnapshotService(ttl=0),
+            # Motor propio sin fuente de precios: las salidas se evalúan vela a vela
+            trigger_engine=TriggerEngine(),
+            # Balances releídos de la cuenta simulada en cada decisión
+            portfolio_risk=PortfolioRiskManager(resync_interval=0, exchange_info=exchange_info),
+            # Ejecuciones de esta simulación (precio con deslizamiento y comisión)
+            order_ledger=OrderLedger(),
+            # Diario en memoria y síncrono: no escribe en el diario del proceso
+            trade_journal=TradeJournal(MemorySink(), durable=False, background=False),
+            state_store=StateStore(durable=False),
+            # Grafo propio: los indicadores de la simulación no se mezclan con los del proceso
+            indicator_graph=IndicatorGraph()
+        )
+        bot.clock = clock
+        for name, value in params.items():
+            if not hasattr(bot, name):
+                raise ValueError(f"Parámetro desconocido para {bot_class.__name__}: {name}")
+            setattr(bot, name, value)
+
+        close_times = client._close_time
+        equity_curve = np.full(len(self.data), np.nan)
+        for i in range(min(warmup, len(self.data)), len(self.data)):
+            client.index = i
+            clock.now = pd.Timestamp(int(close_times[i]) + 1, unit='ms').to_pydatetime()
+            bot.execute_strategy()
+            equity_curve[i] = client.equity()
+
+        # Cerrar posiciones abiertas al final del histórico
+        for position in list(bot.active_positions.values()):
+            bot.close_position(position, client.current_price)
+
+        equity = equity_curve[~np.isnan(equity_curve)]
+        return {
+            'statistics': bot.get_statistics(),
+            'trades': bot.trade_history,
+            'orders': client.orders,
+            'final_equity': client.equity(),
+            'max_drawdown': _max_drawdown(equity),
+        }
+
+
+def _max_drawdown(equity: np.ndarray) -> float:
+    if len(equity) == 0:
+        return 0.0
+    peak = np.maximum.accumulate(equity)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        drawdown = np.where(peak > 0, (peak - equity) / peak, 0.0)
+    return float(np.nanmax(drawdown))
+
+
+def ema_array(values: np.ndarray, period: int) -> np.ndarray:
+    """
+    EMA vectorizada equivalente a ewm(span=period).mean() (adjust=True)
+
+    Args:
+        values: Array de precios
+        period: Período de la EMA
+
+    Returns:
+        Array con la EMA
+    """
+    decay = 1.0 - 2.0 / (period + 1.0)
+    numerator = lfilter([1.0], [1.0, -decay], values)
+    denominator = lfilter([1.0], [1.0, -decay], np.ones_like(values))
+    return numerator / denominator
+
+
+def rolling_mean_array(values: np.ndarray, window: int) -> np.ndarray:
+    """
+    Media móvil vectorizada (NaN hasta completar la ventana)
+
+    Args:
+        values: Array de valores
+        window: Tamaño de la ventana
+
+    Returns:
+        Array con la media móvil
+    """
+    out = np.full(len(values), np.nan)
+    if len(values) >= window:
+        out[window - 1:] = sliding_window_view(values, window).mean(axis=1)
+    return out
+
+
+def rsi_array(values: np.ndarray, period: int) -> np.ndarray:
+    """
+    RSI vectorizado equivalente a TradingIndicators.compute_rsi
+
+    Args:
+        values: Array de precios
+        period: Período del RSI
+
+    Returns:
+        Array con el RSI
+    """
+    deltas = np.empty(len(values))
+    deltas[0] = np.nan
+    deltas[1:] = np.diff(values)
+    gain = rolling_mean_array(np.where(deltas > 0, deltas, np.where(np.isnan(deltas), np.nan, 0.0)), period)
+    loss = rolling_mean_array(np.where(deltas < 0, -deltas, np.where(np.isnan(deltas), np.nan, 0.0)), period)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return 100 - (100 / (1 + gain / loss))
+
+
+def simulate_trades(close: np.ndarray, times: np.ndarray,
+                    long_entry: np.ndarray, short_entry: np.ndarray,
+                    long_exit: np.ndarray, short_exit: np.ndarray,
+                    take_profit: float, stop_loss: float, max_position_time: float,
+                    commission: float = 0.0, start: int = 0) -> Dict[str, np.ndarray]:
+    """
+    Simula una posición a la vez sobre señales precalculadas
+
+    Reproduce el flujo de execute_strategy: mientras hay posición solo se
+    evalúa el cierre (tiempo máximo, take profit, stop loss y señal de
+    salida); tras cerrar, la siguiente apertura se evalúa en la vela
+    siguiente. El bucle es por operación, no por vela: la salida se
+    localiza con búsquedas vectorizadas sobre el tramo de la posición.
+
+    Args:
+        close: Precios de cierre
+        times: Marca temporal de cada vela en segundos
+        long_entry/short_entry: Señales de apertura
+        long_exit/short_exit: Señales de cierre por indicadores
+        take_profit: Take profit (fracción)
+        stop_loss: Stop loss (fracción)
+        max_position_time: Tiempo máximo de posición en segundos
+        commission: Comisión por lado (fracción)
+        start: Primera vela evaluable
+
+    Returns:
+        Dict de arrays: entry_index, exit_index, side, pnl
+    """
+    n = len(close)
+    entries = np.flatnonzero(long_entry | short_entry)
+    entry_idx, exit_idx, sides, pnls = [], [], [], []
+
+    next_allowed = start
+    while True:
+        k = np.searchsorted(entries, next_allowed)
+        if k >= len(entries):
+            break
+        i = int(entries[k])
+        side = 1 if long_entry[i] else -1
+        entry_price = close[i]
+
+        # Primera vela en la que se supera el tiempo máximo
+        time_exit = int(np.searchsorted(times, times[i] + max_position_time, side='right'))
+        end = min(time_exit, n - 1)
+        if end <= i:
+            break
+
+        segment = close[i + 1:end + 1]
+        pnl_segment = side * (segment - entry_price) / entry_price
+        signal_exit = (long_exit if side > 0 else short_exit)[i + 1:end + 1]
+        hit = (pnl_segment >= take_profit) | (pnl_segment <= -stop_loss) | signal_exit
+        if time_exit <= n - 1:
+            hit[-1] = True
+
+        if hit.any():
+            j = i + 1 + int(np.argmax(hit))
+        else:
+            # Posición abierta al final del histórico: se cierra en la última vela
+            j = n - 1
+
+        entry_idx.append(i)
+        exit_idx.append(j)
+        sides.append(side)
+        pnls.append(side * (close[j] - entry_price) / entry_price - 2 * commission)
+        next_allowed = j + 1
+
+    return {
+        'entry_index': np.asarray(entry_idx, dtype=np.int64),
+        'exit_index': np.asarray(exit_idx, dtype=np.int64),
+        'side': np.asarray(sides, dtype=np.int8),
+        'pnl': np.asarray(pnls, dtype=float)
+    }
+
+
+def summarize_trades(pnl: np.ndarray) -> Dict[str, float]:
+    """
+    Calcula métricas de rendimiento a partir de los retornos por operación
+
+    Args:
+        pnl: Retorno de cada operación (fracción)
+
+    Returns:
+        Dict con total_return, win_rate, max_drawdown y total_trades
+    """
+    if len(pnl) == 0:
+        return {'total_return': 0.0, 'win_rate': 0.0, 'max_drawdown': 0.0,
+                'avg_return': 0.0, 'total_trades': 0}
+    equity = np.cumprod(1 + pnl)
+    return {
+        'total_return': float(equity[-1] - 1),
+        'win_rate': float((pnl > 0).mean() * 100),
+        'max_drawdown': _max_drawdown(np.concatenate(([1.0], equity))),
+        'avg_return': float(pnl.mean()),
+        'total_trades': int(len(pnl))
+    }
+
+
+class VectorizedBacktester:
+    """
+    Ruta rápida totalmente vectorizada con NumPy para barridos de parámetros.
+    Replica las reglas de apertura y cierre de cada bot sobre arrays y
+    cachea los indicadores por período entre combinaciones
+    """
+
+    def __init__(self, data: pd.DataFrame, commission: float = 0.001, warmup: int = 0):
+        """
+        Inicializa el backtester vectorizado
+
+        Args:
+            data: DataFrame con velas históricas (ver load_ohlcv)
+            commission: Comisión por lado (fracción)
+            warmup: Velas iniciales en las que no se abren posiciones
+        """
+        self.commission = commission
+        self.warmup = warmup
+        self.times = _timestamps_ms(data) / 1000.0
+        self.open = data['open'].to_numpy(dtype=float)
+        self.high = data['high'].to_numpy(dtype=float)
+        self.low = data['low'].to_numpy(dtype=float)
+        self.close = data['close'].to_numpy(dtype=float)
+        self.volume = data['volume'].to_numpy(dtype=float)
+        self._cache: Dict[Tuple, np.ndarray] = {}
+
+    @classmethod
+    def from_arrays(cls, times: np.ndarray, open_: np.ndarray, high: np.ndarray, low: np.ndarray,
+                    close: np.ndarray, volume: np.ndarray, commission: float = 0.001,
+                    warmup: int = 0) -> 'VectorizedBacktester':
+        """
+        Construye el backtester directamente desde arrays (sin DataFrame)
+
+        Args:
+            times: Marca temporal de cada vela en segundos
+            open_, high, low, close, volume: Arrays OHLCV
+
+        Returns:
+            Instancia de VectorizedBacktester
+        """
+        self = cls.__new__(cls)
+        self.commission = commission
+        self.warmup = warmup
+        self.times, self.open, self.high, self.low = times, open_, high, low
+        self.close, self.volume = close, volume
+        self._cache = {}
+        return self
+
+    def _indicator(self, name: str, period: int) -> np.ndarray:
+        key = (name, period)
+        if key not in self._cache:
+            if name == 'ema':
+                self._cache[key] = ema_array(self.close, period)
+            elif name == 'rsi':
+                self._cache[key] = rsi_array(self.close, period)
+            elif name == 'volume_sma':
+                self._cache[key] = rolling_mean_array(self.volume, period)
+            else:
+                raise ValueError(f"Indicador desconocido: {name}")
+        return self._cache[key]
+
+    def _volume_ratio(self) -> np.ndarray:
+        if ('volume_ratio', 20) not in self._cache:
+            avg = self._indicator('volume_sma', 20)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                ratio = np.where(avg > 0, self.volume / avg, 1.0)
+            # Con menos de 20 velas el bot usa ratio 1.0
+            ratio[np.isnan(avg)] = 1.0
+            self._cache[('volume_ratio', 20)] = ratio
+        return self._cache[('volume_ratio', 20)]
+
+    def signals(self, strategy: str, params: Dict) -> Tuple[np.ndarray, ...]:
+        """
+        Calcula las señales de apertura y cierre de una estrategia
+
+        Args:
+            strategy: 'rsi_ema', 'momentum' o 'scalping'
+            params: Parámetros completos de la estrategia
+
+        Returns:
+            Tuple (long_entry, short_entry, long_exit, short_exit)
+        """
+        close = self.close
+        n = len(close)
+        index = np.arange(n)
+
+        if strategy == 'rsi_ema':
+            rsi = self._indicator('rsi', params['rsi_period'])
+            ema = self._indicator('ema', params['ema_period'])
+            volume_ok = self._volume_ratio() > params['volume_threshold']
+            ready = index >= max(params['rsi_period'], params['ema_period']) - 1
+            long_entry = ready & (close > ema) & (rsi < params['rsi_oversold']) & volume_ok
+            short_entry = ready & (close < ema) & (rsi > params['rsi_overbought']) & volume_ok
+            long_exit = (close < ema) | (rsi > 50)
+            short_exit = (close > ema) | (rsi < 50)
+
+        elif strategy == 'momentum':
+            period = params['momentum_period']
+            momentum = np.zeros(n)
+            momentum[period:] = close[period:] - close[:-period]
+            ema_short = self._indicator('ema', 10)
+            ema_long = self._indicator('ema', params['trend_period'])
+            trend_strength = np.abs(ema_short - ema_long) / ema_long
+            trend_strength[index < params['trend_period'] - 1] = 0.0
+            trend_ok = trend_strength > params['min_trend_strength']
+            volume_ok = self._volume_ratio() > params['volume_threshold']
+            long_entry = (momentum > 0) & trend_ok & volume_ok
+            short_entry = (momentum < 0) & trend_ok & volume_ok
+            long_exit = momentum < 0
+            short_exit = momentum > 0
+
+        elif strategy == 'scalping':
+            threshold = params['spread_threshold']
+            prev = np.concatenate(([np.nan], close[:-1]))
+            with np.errstate(invalid='ignore'):
+                spread = np.abs(close - prev) / prev
+                avg_volume = self._indicator('volume_sma', 20)
+                volume_ok = ~(self.volume < avg_volume * 0.5)
+                volatility_ok = (self.high - self.low) / close >= 0.0002
+                opens = (spread > threshold) & volume_ok & volatility_ok
+            # Scalping contrario: compra tras caída y vende tras subida
+            long_entry = opens & (close < prev)
+            short_entry = opens & (close > prev)
+            long_exit = short_exit = np.zeros(n, dtype=bool)
+
+        else:
+            raise ValueError(f"Estrategia desconocida: {strategy}")
+
+        return long_entry, short_entry, long_exit, short_exit
+
+    def run(self, strategy: str = 'rsi_ema', **params) -> Dict:
+        """
+        Ejecuta la estrategia sobre todo el histórico
+
+        Args:
+            strategy: 'rsi_ema', 'momentum' o 'scalping'
+            **params: Parámetros a sobrescribir sobre STRATEGY_DEFAULTS
+
+        Returns:
+            Dict con métricas y arrays de operaciones
+        """
+        if strategy not in STRATEGY_DEFAULTS:
+            raise ValueError(f"Estrategia desconocida: {strategy}")
+        full_params = {**STRATEGY_DEFAULTS[strategy], **params}
+
+        long_entry, short_entry, long_exit, short_exit = self.signals(strategy, full_params)
+
+        if strategy == 'scalping':
+            take_profit = full_params['min_profit_threshold']
+            stop_loss = full_params['max_loss_threshold']
+        else:
+            take_profit = full_params['take_profit']
+            stop_loss = full_params['stop_loss']
+
+        trades = simulate_trades(
+            self.close, self.times, long_entry, short_entry, long_exit, short_exit,
+            take_profit, stop_loss, full_params['max_position_time'],
+            commission=self.commission, start=self.warmup
+        )
+        return {**summarize_trades(trades['pnl']), 'params': full_params, 'trades': trades}
+
+    def sweep(self, strategy: str, grid: Dict[str, Iterable]) -> pd.DataFrame:
+        """
+        Evalúa todas las combinaciones de una rejilla de parámetros
+
+        Args:
+            strategy: 'rsi_ema', 'momentum' o 'scalping'
+            grid: Dict parámetro -> valores a probar
+
+        Returns:
+            DataFrame con una fila por combinación, ordenado por total_return
+        """
+        names = list(grid)
+        rows = []
+        for values in itertools.product(*(list(grid[name]) for name in names)):
+            params = dict(zip(names, values))
+            result = self.run(strategy, **params)
+            rows.append({**params, **{k: v for k, v in result.items() if k not in ('params', 'trades')}})
+        results = pd.DataFrame(rows)
+        if results.empty:
+            return results
+        return results.sort_values('total_return', ascending=False).reset_index(drop=True)
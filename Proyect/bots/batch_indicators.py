@@ -0,0 +1,209 @@
+import logging
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy.signal import lfilter
+
+logger = logging.getLogger(__name__)
+
+
+def stack_series(series: Dict[str, Sequence[float]], length: Optional[int] = None) -> Tuple[List[str], np.ndarray]:
+    """
+    Construye la matriz símbolos × velas a partir de series de cierres
+
+    Las series se alinean por la derecha (la última vela en la última
+    columna); los símbolos con menos historia se rellenan con NaN por la
+    izquierda, de modo que su calentamiento se respeta en cada indicador.
+
+    Args:
+        series: Cierres por símbolo (de la vela más antigua a la más reciente)
+        length: Número de velas de la matriz (default: la serie más larga)
+
+    Returns:
+        Tuple con (símbolos, matriz float64 de forma (símbolos, velas))
+    """
+    symbols = list(series)
+    if length is None:
+        length = max((len(values) for values in series.values()), default=0)
+    matrix = np.full((len(symbols), length), np.nan)
+    for row, symbol in enumerate(symbols):
+        values = np.asarray(series[symbol], dtype=np.float64)[-length:] if length else ()
+        if len(values):
+            matrix[row, length - len(values):] = values
+    return symbols, matrix
+
+
+def _as_matrix(prices) -> np.ndarray:
+    return np.atleast_2d(np.asarray(prices, dtype=np.float64))
+
+
+def _window_sum(values: np.ndarray, period: int) -> np.ndarray:
+    """Suma de cada ventana completa: period sumas de cortes contiguos (period es pequeño)"""
+    length = values.shape[1] - period + 1
+    total = values[:, :length].copy()
+    for offset in range(1, period):
+        total += values[:, offset:offset + length]
+    return total
+
+
+def _rolling_mean(values: np.ndarray, period: int) -> np.ndarray:
+    """Media móvil por filas; NaN si la ventana no está completa o contiene NaN"""
+    result = np.full(values.shape, np.nan)
+    if 0 < period <= values.shape[1]:
+        result[:, period - 1:] = _window_sum(values, period) / period
+    return result
+
+
+def _rolling_std(values: np.ndarray, period: int, mean: Optional[np.ndarray] = None) -> np.ndarray:
+    """Desviación típica muestral (ddof=1) móvil por filas, en dos pasadas"""
+    result = np.full(values.shape, np.nan)
+    if 1 < period <= values.shape[1]:
+        mean = (_rolling_mean(values, period) if mean is None else mean)[:, period - 1:]
+        length = mean.shape[1]
+        squares = np.zeros_like(mean)
+        for offset in range(period):
+            deviation = values[:, offset:offset + length] - mean
+            squares += deviation * deviation
+        result[:, period - 1:] = np.sqrt(squares / (period - 1))
+    return result
+
+
+def _ewm_mean(values: np.ndarray, period: int) -> np.ndarray:
+    """
+    EMA por filas que reproduce ``ewm(span=period).mean()`` (adjust=True)
+    de pandas.
+
+    La media ajustada es el cociente de dos recurrencias lineales (suma
+    ponderada de precios y suma de pesos) que lfilter resuelve en C para
+    todas las filas. Los NaN aportan peso cero: antes de la primera
+    observación el resultado es NaN y en los huecos se mantiene el último
+    valor mientras los pesos decaen, igual que pandas con ignore_na=False
+    """
+    decay = 1.0 - 2.0 / (period + 1.0)
+    observed = values == values
+    weighted = lfilter([1.0], [1.0, -decay], np.where(observed, values, 0.0), axis=1)
+    weights = lfilter([1.0], [1.0, -decay], observed.astype(np.float64), axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return weighted / weights
+
+
+class BatchIndicators:
+    """
+    Indicadores técnicos calculados para muchos símbolos a la vez.
+
+    Reciben una matriz símbolos × velas (una fila por símbolo, la vela más
+    reciente en la última columna) y calculan todas las filas en una sola
+    pasada vectorizada. Cada fila coincide con el resultado de
+    TradingIndicators sobre la serie del símbolo, incluido el calentamiento
+    de las filas que empiezan con NaN
+    """
+
+    @staticmethod
+    def compute_rsi(prices: np.ndarray, period: int = 14) -> np.ndarray:
+        """
+        Calcula el RSI de todos los símbolos
+
+        Args:
+            prices: Matriz de precios (símbolos × velas)
+            period: Período para el cálculo (default: 14)
+
+        Returns:
+            Matriz con valores RSI
+        """
+        try:
+            prices = _as_matrix(prices)
+            deltas = np.full(prices.shape, np.nan)
+            deltas[:, 1:] = np.diff(prices, axis=1)
+            gain = _rolling_mean(np.clip(deltas, 0, None), period)
+            loss = _rolling_mean(np.clip(-deltas, 0, None), period)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                rs = gain / loss
+                return 100 - (100 / (1 + rs))
+        except Exception as e:
+            logger.error(f"Error calculando RSI en bloque: {e}")
+            return np.full(np.shape(np.atleast_2d(prices)), np.nan)
+
+    @staticmethod
+    def compute_ema(prices: np.ndarray, period: int = 20) -> np.ndarray:
+        """
+        Calcula la EMA de todos los símbolos
+
+        Args:
+            prices: Matriz de precios (símbolos × velas)
+            period: Período para el cálculo (default: 20)
+
+        Returns:
+            Matriz con valores EMA
+        """
+        try:
+            return _ewm_mean(_as_matrix(prices), period)
+        except Exception as e:
+            logger.error(f"Error calculando EMA en bloque: {e}")
+            return np.full(np.shape(np.atleast_2d(prices)), np.nan)
+
+    @staticmethod
+    def compute_sma(prices: np.ndarray, period: int = 20) -> np.ndarray:
+        """
+        Calcula la SMA de todos los símbolos
+
+        Args:
+            prices: Matriz de precios (símbolos × velas)
+            period: Período para el cálculo (default: 20)
+
+        Returns:
+            Matriz con valores SMA
+        """
+        try:
+            return _rolling_mean(_as_matrix(prices), period)
+        except Exception as e:
+            logger.error(f"Error calculando SMA en bloque: {e}")
+            return np.full(np.shape(np.atleast_2d(prices)), np.nan)
+
+    @staticmethod
+    def compute_bollinger_bands(prices: np.ndarray, period: int = 20,
+                                std_dev: int = 2) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Calcula las Bandas de Bollinger de todos los símbolos
+
+        Args:
+            prices: Matriz de precios (símbolos × velas)
+            period: Período para el cálculo (default: 20)
+            std_dev: Desviación estándar (default: 2)
+
+        Returns:
+            Tuple con (banda_superior, banda_media, banda_inferior)
+        """
+        try:
+            prices = _as_matrix(prices)
+            sma = _rolling_mean(prices, period)
+            std = _rolling_std(prices, period, sma)
+            return sma + (std * std_dev), sma, sma - (std * std_dev)
+        except Exception as e:
+            logger.error(f"Error calculando Bollinger Bands en bloque: {e}")
+            empty = np.full(np.shape(np.atleast_2d(prices)), np.nan)
+            return empty, empty.copy(), empty.copy()
+
+    @staticmethod
+    def compute_macd(prices: np.ndarray, fast: int = 12, slow: int = 26,
+                     signal: int = 9) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Calcula el MACD de todos los símbolos
+
+        Args:
+            prices: Matriz de precios (símbolos × velas)
+            fast: EMA rápida (default: 12)
+            slow: EMA lenta (default: 26)
+            signal: EMA de señal (default: 9)
+
+        Returns:
+            Tuple con (macd_line, signal_line, histogram)
+        """
+        try:
+            prices = _as_matrix(prices)
+            macd_line = _ewm_mean(prices, fast) - _ewm_mean(prices, slow)
+            signal_line = _ewm_mean(macd_line, signal)
+            return macd_line, signal_line, macd_line - signal_line
+        except Exception as e:
+            logger.error(f"Error calculando MACD en bloque: {e}")
+            empty = np.full(np.shape(np.atleast_2d(prices)), np.nan)
+            return empty, empty.copy(), empty.copy()
@@ -0,0 +1,349 @@
+import time
+import logging
+from typing import Callable, Dict, List, Optional, Tuple
+
+from market_stream import BINANCE_STREAM_URL, CandleBuffer, KlineStream, kline_event_to_row
+from market_cache import interval_to_seconds
+
+logger = logging.getLogger(__name__)
+
+BASE_INTERVAL = '1m'
+
+# Velas 1m por petición REST: limita el tamaño del bucket reconstruible al sembrar
+MAX_BUCKET_CANDLES = 1000
+
+
+def is_aggregatable(interval: str, base_interval: str = BASE_INTERVAL) -> bool:
+    """
+    Indica si un intervalo se puede construir a partir del intervalo base
+
+    Solo se agregan intervalos alineados con la época (Binance alinea así
+    minutos, horas y días; no semanas ni meses) cuyo bucket cabe en una
+    descarga de velas base.
+
+    Args:
+        interval: Intervalo destino
+        base_interval: Intervalo base
+
+    Returns:
+        True si se puede agregar
+    """
+    try:
+        seconds = interval_to_seconds(interval)
+        base = interval_to_seconds(base_interval)
+    except ValueError:
+        return False
+    return (seconds > base and seconds % base == 0 and 86400 % seconds == 0
+            and seconds // base <= MAX_BUCKET_CANDLES)
+
+
+class _Bucket:
+    """Vela en construcción de una temporalidad superior"""
+
+    __slots__ = ('interval_ms', 'start', 'closed', 'pending', 'last_closed')
+
+    def __init__(self, interval_ms: int):
+        self.interval_ms = interval_ms
+        self.start = None
+        self.closed = None      # Agregado de las velas base ya cerradas
+        self.pending = None     # Vela base en curso
+        self.last_closed = None
+
+    @staticmethod
+    def _values(row: List) -> Tuple:
+        return (float(row[1]), float(row[2]), float(row[3]), float(row[4]), float(row[5]),
+                float(row[7]), int(row[8]), float(row[9]), float(row[10]))
+
+    @staticmethod
+    def _merge(a: Optional[Tuple], b: Optional[Tuple]) -> Optional[Tuple]:
+        if a is None:
+            return b
+        if b is None:
+            return a
+        return (a[0], max(a[1], b[1]), min(a[2], b[2]), b[3], a[4] + b[4],
+                a[5] + b[5], a[6] + b[6], a[7] + b[7], a[8] + b[8])
+
+    def update(self, row: List, closed: bool, base_ms: int) -> Tuple[Optional[List], bool]:
+        open_time = int(row[0])
+        start = open_time - open_time % self.interval_ms
+        if self.start is None or start > self.start:
+            self.start = start
+            self.closed = None
+            self.pending = None
+        elif start < self.start:
+            # Vela base de un bucket ya cerrado
+            return None, False
+
+        if closed:
+            if self.last_closed is not None and open_time <= self.last_closed:
+                return None, False
+            self.closed = self._merge(self.closed, self._values(row))
+            self.pending = None
+            self.last_closed = open_time
+        else:
+            self.pending = self._values(row)
+
+        values = self._merge(self.closed, self.pending)
+        derived = [start, values[0], values[1], values[2], values[3], values[4],
+                   start + self.interval_ms - 1, values[5], values[6], values[7], values[8], '0']
+        return derived, closed and open_time + base_ms == start + self.interval_ms
+
+
+class TimeframeAggregator:
+    """
+    Agregación incremental de velas base (1m) de un símbolo a temporalidades
+    superiores (3m, 5m, 15m, 1h, 4h...)
+
+    Cada vela base (abierta o cerrada) actualiza la vela en curso de cada
+    temporalidad; la vela agregada se cierra con la última vela base de su
+    bucket
+    """
+
+    def __init__(self, base_interval: str = BASE_INTERVAL):
+        """
+        Inicializa el agregador
+
+        Args:
+            base_interval: Intervalo de las velas de entrada
+        """
+        self.base_interval = base_interval
+        self.base_ms = interval_to_seconds(base_interval) * 1000
+        self._buckets: Dict[str, _Bucket] = {}
+
+    @property
+    def intervals(self) -> List[str]:
+        return list(self._buckets)
+
+    def add_interval(self, interval: str):
+        """
+        Añade una temporalidad destino
+
+        Args:
+            interval: Intervalo a construir
+        """
+        if not is_aggregatable(interval, self.base_interval):
+            raise ValueError(f"Intervalo no agregable desde {self.base_interval}: {interval}")
+        if interval not in self._buckets:
+            self._buckets[interval] = _Bucket(interval_to_seconds(interval) * 1000)
+
+    def update(self, row: List, closed: bool) -> List[Tuple[str, List, bool]]:
+        """
+        Incorpora una vela base
+
+        Args:
+            row: Vela base en formato REST
+            closed: True si la vela base está cerrada
+
+        Returns:
+            Lista de (intervalo, vela agregada, cerrada) actualizadas
+        """
+        updates = []
+        for interval, bucket in self._buckets.items():
+            derived, done = bucket.update(row, closed, self.base_ms)
+            if derived is not None:
+                updates.append((interval, derived, done))
+        return updates
+
+    def rebuild(self, interval: str, base_rows: List[List], now_ms: float) -> Optional[List]:
+        """
+        Reconstruye la vela en curso de una temporalidad desde velas base
+
+        Args:
+            interval: Intervalo a reconstruir
+            base_rows: Velas base recientes (ordenadas)
+            now_ms: Instante actual en ms (para distinguir velas cerradas)
+
+        Returns:
+            Vela agregada en curso o None si no hay velas base
+        """
+        bucket = self._buckets[interval] = _Bucket(self._buckets[interval].interval_ms)
+        if not base_rows:
+            return None
+        last = int(base_rows[-1][0])
+        start = last - last % bucket.interval_ms
+        derived = None
+        for row in base_rows:
+            if int(row[0]) >= start:
+                derived, _ = bucket.update(row, int(row[6]) < now_ms, self.base_ms)
+        return derived
+
+
+class AggregatedKlineStream(KlineStream):
+    """
+    KlineStream que recibe un único stream 1m por símbolo y construye en
+    memoria el resto de temporalidades.
+
+    Los bots se suscriben a su intervalo igual que a un KlineStream; los
+    intervalos agregables no abren stream propio, de modo que N
+    temporalidades sobre un símbolo cuestan una sola suscripción. Los
+    intervalos no agregables (1w, 1M...) se suscriben de forma nativa
+    """
+
+    def __init__(self, url: str = BINANCE_STREAM_URL, maxlen: int = 500,
+                 stale_after: float = 90.0, include_ticker: bool = True,
+                 candle_store=None, base_interval: str = BASE_INTERVAL,
+                 include_trades: bool = False, include_book_ticker: bool = False):
+        """
+        Inicializa el stream agregado
+
+        Args:
+            url: URL base del stream combinado
+            maxlen: Velas retenidas por símbolo/intervalo
+            stale_after: Segundos sin datos tras los que el buffer se considera obsoleto
+            include_ticker: Suscribirse también a <symbol>@miniTicker
+            candle_store: CandleStore desde el que sembrar los buffers (opcional)
+            base_interval: Intervalo del stream base
+            include_trades: Suscribirse también a <symbol>@aggTrade (precio en cada operación)
+            include_book_ticker: Suscribirse también a <symbol>@bookTicker (mid en cada cambio del mejor nivel)
+        """
+        super().__init__(url, maxlen, stale_after, include_ticker, candle_store,
+                         include_trades, include_book_ticker)
+        self.base_interval = base_interval
+        self._aggregators: Dict[str, TimeframeAggregator] = {}
+        self._candle_listeners: List[Callable[[str, str, List], None]] = []
+
+    def add_candle_listener(self, callback: Callable[[str, str, List], None]):
+        """
+        Registra una función llamada con (símbolo, intervalo, vela) al cerrar
+        una vela de cualquier temporalidad
+
+        Args:
+            callback: Función a llamar
+        """
+        self._candle_listeners.append(callback)
+
+    def _is_derived(self, symbol: str, interval: str) -> bool:
+        aggregator = self._aggregators.get(symbol)
+        return aggregator is not None and interval in aggregator.intervals
+
+    def _symbol_streams(self, symbol: str, interval: str) -> List[str]:
+        streams = super()._symbol_streams(symbol, interval)
+        if self._is_derived(symbol, interval):
+            # Las temporalidades derivadas no abren stream de velas propio
+            streams = [s for s in streams if not s.endswith(f"@kline_{interval}")]
+        return streams
+
+    def _new_buffer(self, key: Tuple[str, str]) -> CandleBuffer:
+        if key[1] == self.base_interval:
+            # El buffer base retiene al menos un bucket completo de cualquier temporalidad
+            return CandleBuffer(max(self.maxlen, MAX_BUCKET_CANDLES))
+        return super()._new_buffer(key)
+
+    def _base_limit(self, symbol: str) -> int:
+        aggregator = self._aggregators.get(symbol)
+        if aggregator is None:
+            return self.maxlen
+        candles = [interval_to_seconds(i) * 1000 // aggregator.base_ms for i in aggregator.intervals]
+        return max([self.maxlen] + candles)
+
+    def subscribe(self, symbol: str, interval: str, client=None) -> CandleBuffer:
+        """
+        Se suscribe a las velas de un símbolo/intervalo
+
+        Los intervalos agregables se construyen desde el stream base del
+        símbolo; el cliente solo se usa para sembrar el histórico.
+
+        Args:
+            symbol: Par de trading
+            interval: Intervalo de las velas
+            client: Cliente REST para sembrar el histórico inicial (opcional)
+
+        Returns:
+            Buffer asociado
+        """
+        symbol = symbol.upper()
+        if interval == self.base_interval:
+            with self._lock:
+                self._aggregators.setdefault(symbol, TimeframeAggregator(self.base_interval))
+            return super().subscribe(symbol, interval, client)
+
+        if not is_aggregatable(interval, self.base_interval):
+            return super().subscribe(symbol, interval, client)
+
+        key = (symbol, interval)
+        base_key = (symbol, self.base_interval)
+        with self._lock:
+            aggregator = self._aggregators.setdefault(symbol, TimeframeAggregator(self.base_interval))
+            aggregator.add_interval(interval)
+            buffer = self._buffers.get(key)
+        if base_key not in self._buffers or (client is not None and base_key not in self._clients):
+            # El stream base se siembra (y suscribe) una sola vez por símbolo
+            self.subscribe(symbol, self.base_interval, client)
+        elif len(self._buffers[base_key].get_klines(self._base_limit(symbol))) < self._base_limit(symbol):
+            self._seed(base_key)
+
+        with self._lock:
+            if buffer is None:
+                buffer = self._buffers[key] = self._new_buffer(key)
+            if client is not None:
+                self._clients[key] = client
+
+        if client is not None:
+            self._seed(key)
+        return buffer
+
+    def _seed(self, key: Tuple[str, str], limit: Optional[int] = None):
+        symbol, interval = key
+        if interval == self.base_interval:
+            super()._seed(key, limit or self._base_limit(symbol))
+            aggregator = self._aggregators.get(symbol)
+            for derived in (aggregator.intervals if aggregator else []):
+                if (symbol, derived) in self._buffers:
+                    self._rebuild(symbol, derived)
+            return
+
+        # Histórico cerrado del intervalo por REST; la vela en curso, desde las velas base
+        super()._seed(key, limit)
+        if self._is_derived(symbol, interval):
+            self._rebuild(symbol, interval)
+
+    def _rebuild(self, symbol: str, interval: str):
+        base = self._buffers.get((symbol, self.base_interval))
+        if base is None:
+            return
+        derived = self._aggregators[symbol].rebuild(interval, base.get_klines(self._base_limit(symbol)),
+                                                    time.time() * 1000)
+        if derived is not None:
+            self._buffers[(symbol, interval)].upsert(derived, closed=False)
+
+    def _handle_kline(self, kline: Dict):
+        if kline['i'] == self.base_interval and kline['s'] in self._aggregators:
+            self.ingest(kline['s'], kline_event_to_row(kline), kline.get('x', False))
+        else:
+            super()._handle_kline(kline)
+
+    def ingest(self, symbol: str, row: List, closed: bool):
+        """
+        Incorpora una vela base y actualiza todas las temporalidades del símbolo
+
+        Args:
+            symbol: Par de trading
+            row: Vela base en formato REST
+            closed: True si la vela base está cerrada
+        """
+        symbol = symbol.upper()
+        closed_candles = []
+
+        base = self._buffers.get((symbol, self.base_interval))
+        if base is not None:
+            base.upsert(row, closed=closed)
+            if closed:
+                closed_candles.append((self.base_interval, row))
+
+        aggregator = self._aggregators.get(symbol)
+        if aggregator is not None:
+            for interval, derived, done in aggregator.update(row, closed):
+                buffer = self._buffers.get((symbol, interval))
+                if buffer is not None:
+                    buffer.upsert(derived, closed=done)
+                if done:
+                    closed_candles.append((interval, derived))
+
+        self._set_price(symbol, float(row[4]))
+
+        for interval, candle in closed_candles:
+            for callback in self._candle_listeners:
+                try:
+                    callback(symbol, interval, candle)
+                except Exception as e:
+                    logger.error(f"Error en listener de velas: {e}")
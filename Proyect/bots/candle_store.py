@@ -0,0 +1,416 @@
+import os
+import time
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from market_cache import interval_to_seconds
+
+logger = logging.getLogger(__name__)
+
+# Columnas persistidas (un fichero de ancho fijo por columna)
+STORE_COLUMNS = {
+    'open_time': np.int64,
+    'open': np.float64,
+    'high': np.float64,
+    'low': np.float64,
+    'close': np.float64,
+    'volume': np.float64
+}
+
+# Velas por petición REST (máximo permitido por Binance)
+PAGE_SIZE = 1000
+
+
+class CandleSeries:
+    """
+    Histórico de velas cerradas de un par (símbolo, intervalo) en ficheros
+    columnares de solo anexado, leídos con np.memmap sin copias
+    """
+
+    def __init__(self, path: str, symbol: str, interval: str, refresh_after: float = 1.0):
+        """
+        Inicializa la serie
+
+        Args:
+            path: Directorio de la serie
+            symbol: Par de trading
+            interval: Intervalo de las velas
+            refresh_after: Segundos durante los que se reutiliza la última sincronización
+        """
+        self.path = path
+        self.symbol = symbol
+        self.interval = interval
+        self.interval_ms = interval_to_seconds(interval) * 1000
+        self.refresh_after = refresh_after
+
+        self._lock = threading.RLock()
+        self._maps: Dict[str, np.memmap] = {}
+        self._map_rows = 0
+        self._open_rows: List[List] = []
+        self.last_sync = 0.0
+
+        os.makedirs(path, exist_ok=True)
+        self._length = self._recover()
+
+    def _file(self, column: str) -> str:
+        return os.path.join(self.path, f"{column}.bin")
+
+    def _recover(self) -> int:
+        # Tras una escritura interrumpida, todas las columnas se recortan a la más corta
+        sizes = []
+        for column, dtype in STORE_COLUMNS.items():
+            path = self._file(column)
+            if not os.path.exists(path):
+                open(path, 'wb').close()
+            sizes.append(os.path.getsize(path) // np.dtype(dtype).itemsize)
+        rows = min(sizes)
+        for column, dtype in STORE_COLUMNS.items():
+            if os.path.getsize(self._file(column)) != rows * np.dtype(dtype).itemsize:
+                with open(self._file(column), 'r+b') as f:
+                    f.truncate(rows * np.dtype(dtype).itemsize)
+        return rows
+
+    def __len__(self) -> int:
+        return self._length
+
+    @property
+    def last_open_time(self) -> Optional[int]:
+        """
+        Marca temporal (ms) de la última vela almacenada
+        """
+        if self._length == 0:
+            return None
+        return int(self.arrays()['open_time'][-1])
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        """
+        Obtiene las columnas mapeadas en memoria (solo lectura, sin copia)
+
+        Returns:
+            Dict columna -> array
+        """
+        with self._lock:
+            if self._map_rows != self._length:
+                self._maps = {}
+                if self._length > 0:
+                    for column, dtype in STORE_COLUMNS.items():
+                        self._maps[column] = np.memmap(self._file(column), dtype=dtype, mode='r',
+                                                       shape=(self._length,))
+                else:
+                    self._maps = {column: np.empty(0, dtype=dtype) for column, dtype in STORE_COLUMNS.items()}
+                self._map_rows = self._length
+            return self._maps
+
+    @staticmethod
+    def _rows_to_columns(rows: List[List]) -> Dict[str, np.ndarray]:
+        return {
+            'open_time': np.array([int(r[0]) for r in rows], dtype=np.int64),
+            'open': np.array([float(r[1]) for r in rows]),
+            'high': np.array([float(r[2]) for r in rows]),
+            'low': np.array([float(r[3]) for r in rows]),
+            'close': np.array([float(r[4]) for r in rows]),
+            'volume': np.array([float(r[5]) for r in rows])
+        }
+
+    def append(self, rows: List[List]) -> int:
+        """
+        Añade velas cerradas posteriores a la última almacenada
+
+        Args:
+            rows: Velas en formato REST, ordenadas
+
+        Returns:
+            Número de velas añadidas
+        """
+        with self._lock:
+            last = self.last_open_time
+            rows = [r for r in rows if last is None or int(r[0]) > last]
+            if not rows:
+                return 0
+            columns = self._rows_to_columns(rows)
+            for column, values in columns.items():
+                with open(self._file(column), 'ab') as f:
+                    f.write(values.astype(STORE_COLUMNS[column]).tobytes())
+            self._length += len(rows)
+            return len(rows)
+
+    def _rewrite(self, columns: Dict[str, np.ndarray]):
+        # Reescritura completa (solo para rellenar huecos o anteponer histórico)
+        self._maps = {}
+        self._map_rows = -1
+        for column, values in columns.items():
+            tmp = self._file(column) + '.tmp'
+            with open(tmp, 'wb') as f:
+                f.write(values.astype(STORE_COLUMNS[column]).tobytes())
+            os.replace(tmp, self._file(column))
+        self._length = len(columns['open_time'])
+
+    def merge(self, rows: List[List]) -> int:
+        """
+        Inserta velas cerradas en cualquier posición (huecos o histórico anterior)
+
+        Args:
+            rows: Velas en formato REST
+
+        Returns:
+            Número de velas nuevas
+        """
+        with self._lock:
+            if not rows:
+                return 0
+            current = {k: np.array(v) for k, v in self.arrays().items()}
+            incoming = self._rows_to_columns(rows)
+            known = np.isin(incoming['open_time'], current['open_time'])
+            if known.all():
+                return 0
+            merged = {k: np.concatenate((current[k], incoming[k][~known])) for k in STORE_COLUMNS}
+            order = np.argsort(merged['open_time'], kind='stable')
+            self._rewrite({k: v[order] for k, v in merged.items()})
+            return int((~known).sum())
+
+    def find_gaps(self) -> List[Tuple[int, int]]:
+        """
+        Detecta huecos en el histórico
+
+        Returns:
+            Lista de (open_time inicial, open_time final) de las velas que faltan, en ms
+        """
+        times = self.arrays()['open_time']
+        if len(times) < 2:
+            return []
+        deltas = np.diff(times)
+        idx = np.nonzero(deltas > self.interval_ms)[0]
+        return [(int(times[i]) + self.interval_ms, int(times[i + 1]) - self.interval_ms) for i in idx]
+
+    def tail_rows(self, limit: int) -> List[List]:
+        """
+        Obtiene las últimas velas cerradas en formato REST
+
+        Args:
+            limit: Número de velas
+
+        Returns:
+            Lista de velas (12 campos cada una)
+        """
+        if limit <= 0:
+            return []
+        arrays = self.arrays()
+        start = max(0, self._length - limit)
+        times = arrays['open_time'][start:].tolist()
+        opens = arrays['open'][start:].tolist()
+        highs = arrays['high'][start:].tolist()
+        lows = arrays['low'][start:].tolist()
+        closes = arrays['close'][start:].tolist()
+        volumes = arrays['volume'][start:].tolist()
+        return [
+            [t, o, h, l, c, v, t + self.interval_ms - 1, 0, 0, 0, 0, 0]
+            for t, o, h, l, c, v in zip(times, opens, highs, lows, closes, volumes)
+        ]
+
+    def sync(self, client, min_candles: int = 500) -> List[List]:
+        """
+        Descarga solo las velas que faltan desde la última almacenada
+
+        Args:
+            client: Cliente de Binance
+            min_candles: Velas a cargar si la serie está vacía
+
+        Returns:
+            Velas aún abiertas de la última respuesta (normalmente una)
+        """
+        with self._lock:
+            if time.time() - self.last_sync < self.refresh_after:
+                return self._open_rows
+
+            now_ms = int(time.time() * 1000)
+            last = self.last_open_time
+            if last is None:
+                rows = client.get_klines(symbol=self.symbol, interval=self.interval,
+                                         limit=min(max(min_candles, 1) + 1, PAGE_SIZE))
+            else:
+                rows = []
+                start = last + self.interval_ms
+                while True:
+                    page = client.get_klines(symbol=self.symbol, interval=self.interval,
+                                             startTime=start, limit=PAGE_SIZE)
+                    rows.extend(page)
+                    if len(page) < PAGE_SIZE:
+                        break
+                    start = int(page[-1][0]) + self.interval_ms
+
+            closed = [r for r in rows if int(r[6]) < now_ms]
+            added = self.append(closed)
+            if added:
+                logger.debug(f"{self.symbol} {self.interval}: {added} velas añadidas al almacén")
+
+            self._open_rows = [list(r) for r in rows if int(r[6]) >= now_ms]
+            self.last_sync = time.time()
+            return self._open_rows
+
+    def extend_history(self, client, count: int) -> int:
+        """
+        Antepone velas anteriores a la primera almacenada hasta tener al menos count
+
+        Args:
+            client: Cliente de Binance
+            count: Número mínimo de velas cerradas deseado
+
+        Returns:
+            Número de velas añadidas
+        """
+        added = 0
+        while self._length and self._length < count:
+            first = int(self.arrays()['open_time'][0])
+            page = client.get_klines(symbol=self.symbol, interval=self.interval, endTime=first - 1,
+                                     limit=min(count - self._length, PAGE_SIZE))
+            new = self.merge(page)
+            added += new
+            if not new:
+                # No hay más histórico (inicio del listado)
+                break
+        if added:
+            logger.debug(f"{self.symbol} {self.interval}: {added} velas anteriores añadidas al almacén")
+        return added
+
+    def backfill(self, client, start_ms: Optional[int] = None) -> int:
+        """
+        Rellena los huecos detectados (y opcionalmente el histórico anterior a start_ms)
+
+        Args:
+            client: Cliente de Binance
+            start_ms: Inicio deseado del histórico (opcional)
+
+        Returns:
+            Número de velas añadidas
+        """
+        ranges = self.find_gaps()
+        first = self.arrays()['open_time'][0] if self._length else None
+        if start_ms is not None and (first is None or start_ms < first):
+            end = int(first) - self.interval_ms if first is not None else int(time.time() * 1000)
+            ranges.insert(0, (int(start_ms), end))
+
+        added = 0
+        for start, end in ranges:
+            rows = client.get_historical_klines(self.symbol, self.interval, start_str=start, end_str=end)
+            now_ms = int(time.time() * 1000)
+            added += self.merge([r for r in rows if int(r[6]) < now_ms])
+        if added:
+            logger.info(f"{self.symbol} {self.interval}: {added} velas rellenadas en {len(ranges)} huecos")
+        return added
+
+    def to_dataframe(self, start_ms: Optional[int] = None, end_ms: Optional[int] = None) -> pd.DataFrame:
+        """
+        Obtiene el histórico como DataFrame (formato de load_ohlcv)
+
+        Args:
+            start_ms: Inicio del rango (opcional)
+            end_ms: Fin del rango (opcional)
+
+        Returns:
+            DataFrame con timestamp y OHLCV
+        """
+        arrays = self.arrays()
+        times = arrays['open_time']
+        lo = int(np.searchsorted(times, start_ms)) if start_ms is not None else 0
+        hi = int(np.searchsorted(times, end_ms, side='right')) if end_ms is not None else len(times)
+        data = pd.DataFrame({k: np.asarray(v[lo:hi]) for k, v in arrays.items() if k != 'open_time'})
+        data.insert(0, 'timestamp', pd.to_datetime(np.asarray(times[lo:hi]), unit='ms'))
+        return data
+
+
+class CandleStore:
+    """
+    Almacén local de velas por (símbolo, intervalo).
+
+    Sirve arranques en caliente desde disco: en cada petición solo se
+    descarga la cola de velas que falta desde la última almacenada
+    """
+
+    def __init__(self, root: Optional[str] = None, refresh_after: float = 1.0):
+        """
+        Inicializa el almacén
+
+        Args:
+            root: Directorio raíz (default: CANDLE_STORE_DIR o data/candles)
+            refresh_after: Segundos durante los que se reutiliza la última sincronización
+        """
+        self.root = root or os.getenv('CANDLE_STORE_DIR', os.path.join('data', 'candles'))
+        self.refresh_after = refresh_after
+        self._series: Dict[Tuple[str, str], CandleSeries] = {}
+        self._lock = threading.Lock()
+
+    def series(self, symbol: str, interval: str) -> CandleSeries:
+        """
+        Obtiene (o crea) la serie de un par
+
+        Args:
+            symbol: Par de trading
+            interval: Intervalo de las velas
+
+        Returns:
+            Serie del par
+        """
+        key = (symbol.upper(), interval)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                path = os.path.join(self.root, key[0], interval)
+                series = self._series[key] = CandleSeries(path, key[0], interval, self.refresh_after)
+            return series
+
+    def get_klines(self, client, symbol: str, interval: str, limit: int) -> List[List]:
+        """
+        Obtiene las últimas velas (cerradas desde disco más la vela en curso)
+
+        Args:
+            client: Cliente de Binance para descargar la cola que falta
+            symbol: Par de trading
+            interval: Intervalo de las velas
+            limit: Número de velas
+
+        Returns:
+            Lista de velas en formato REST
+        """
+        series = self.series(symbol, interval)
+        open_rows = series.sync(client, min_candles=limit)
+        wanted = limit - len(open_rows)
+        if len(series) < wanted:
+            # La serie se creó con un límite menor: se completa el histórico anterior
+            series.extend_history(client, wanted)
+        closed = series.tail_rows(wanted)
+        return closed + open_rows[-limit:]
+
+    def backfill(self, client, symbol: str, interval: str, start_ms: Optional[int] = None) -> int:
+        """
+        Rellena los huecos de un par
+
+        Args:
+            client: Cliente de Binance
+            symbol: Par de trading
+            interval: Intervalo de las velas
+            start_ms: Inicio deseado del histórico (opcional)
+
+        Returns:
+            Número de velas añadidas
+        """
+        return self.series(symbol, interval).backfill(client, start_ms)
+
+    def load(self, symbol: str, interval: str, start_ms: Optional[int] = None,
+             end_ms: Optional[int] = None) -> pd.DataFrame:
+        """
+        Carga el histórico almacenado (p. ej. para Backtester)
+
+        Args:
+            symbol: Par de trading
+            interval: Intervalo de las velas
+            start_ms: Inicio del rango (opcional)
+            end_ms: Fin del rango (opcional)
+
+        Returns:
+            DataFrame con timestamp y OHLCV
+        """
+        return self.series(symbol, interval).to_dataframe(start_ms, end_ms)
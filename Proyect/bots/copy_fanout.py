@@ -0,0 +1,444 @@
+import time
+import logging
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import date
+from typing import Dict, List, Optional
+
+from binance.exceptions import BinanceAPIException
+
+from exchange_client import ExchangeClientPool, get_client_pool
+from exchange_info import ExchangeInfoRegistry, get_exchange_info_registry
+from user_data_stream import OrderLedger
+from state_store import new_client_order_id
+
+logger = logging.getLogger(__name__)
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class OrderRateLimiter:
+    """
+    Límite de órdenes de una cuenta (token bucket).
+
+    Binance limita las órdenes por cuenta (p. ej. 50 cada 10 segundos),
+    independientemente del peso por IP que gestiona WeightLimiter
+    """
+
+    def __init__(self, rate: float = 5.0, burst: int = 50):
+        """
+        Inicializa el limitador
+
+        Args:
+            rate: Órdenes por segundo sostenidas
+            burst: Órdenes permitidas en ráfaga
+        """
+        self.rate = rate
+        self.capacity = float(burst)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> bool:
+        """
+        Consume una orden si hay cupo, sin bloquear
+
+        Returns:
+            True si la orden puede enviarse
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class _FollowerState:
+    """Cliente, límites y resultados acumulados de un seguidor"""
+
+    __slots__ = ('client', 'limiter', 'lock', 'day', 'daily_copies', 'orders', 'filled',
+                 'failed', 'rate_limited', 'notional', 'commission', 'last_error')
+
+    def __init__(self, client, limiter: OrderRateLimiter):
+        self.client = client
+        self.limiter = limiter
+        self.lock = threading.Lock()      # Una orden en vuelo por cliente y contadores consistentes
+        self.day = date.today()
+        self.daily_copies = 0
+        self.orders = 0
+        self.filled = 0
+        self.failed = 0
+        self.rate_limited = 0
+        self.notional = 0.0
+        self.commission = 0.0
+        self.last_error = None
+
+
+class CopyFanout:
+    """
+    Ejecución en paralelo de una operación del líder en las cuentas de
+    todos los seguidores.
+
+    El tamaño de cada copia se calcula y valida antes de enviar nada, de
+    modo que el pool de hilos solo realiza las peticiones al exchange. Cada
+    seguidor usa su propio cliente del pool (sesión HTTP persistente) y su
+    propio límite de órdenes; el paralelismo está acotado por max_workers.
+    Los resultados se agregan por seguidor
+    """
+
+    def __init__(self, client_pool: Optional[ExchangeClientPool] = None,
+                 exchange_info: Optional[ExchangeInfoRegistry] = None,
+                 order_ledger: Optional[OrderLedger] = None,
+                 max_workers: int = 64, order_rate: float = 5.0, order_burst: int = 50,
+                 timeout: float = 30.0, trade_journal=None, history: int = 1000):
+        """
+        Inicializa el motor
+
+        Args:
+            client_pool: Pool de clientes para las credenciales de los seguidores
+            exchange_info: Registro de filtros del exchange (default: registro compartido)
+            order_ledger: Registro de ejecuciones de las copias (default: registro propio)
+            max_workers: Órdenes enviadas en paralelo como máximo
+            order_rate: Órdenes por segundo permitidas a cada seguidor
+            order_burst: Ráfaga de órdenes permitida a cada seguidor
+            timeout: Segundos máximos de espera de un reparto
+            trade_journal: Diario donde registrar las ejecuciones (opcional)
+            history: Repartos recientes usados para las estadísticas de latencia
+        """
+        self.client_pool = client_pool or get_client_pool()
+        self.exchange_info = exchange_info or get_exchange_info_registry()
+        self.order_ledger = order_ledger or OrderLedger()
+        self.max_workers = max_workers
+        self.order_rate = order_rate
+        self.order_burst = order_burst
+        self.timeout = timeout
+        self.trade_journal = trade_journal
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='copy-fanout')
+        self._followers: Dict[str, _FollowerState] = {}
+        self._lock = threading.Lock()
+        self._spreads = deque(maxlen=history)
+        self._latencies = deque(maxlen=history * 10)
+        self._late: Dict[str, Dict] = OrderedDict()     # clientOrderId -> resultado de copias tardías
+        self._history = history
+
+        # Estadísticas
+        self.dispatches = 0
+        self.orders = 0
+        self.fills = 0
+        self.failures = 0
+        self.reconciled = 0
+
+    def _state(self, follower: Dict) -> _FollowerState:
+        state = self._followers.get(follower['id'])
+        if state is None:
+            with self._lock:
+                state = self._followers.get(follower['id'])
+                if state is None:
+                    client = self.client_pool.get_client(follower['api_key'], follower['api_secret'])
+                    state = _FollowerState(client, OrderRateLimiter(self.order_rate, self.order_burst))
+                    self._followers[follower['id']] = state
+        return state
+
+    def prepare(self, followers: List[Dict]):
+        """
+        Crea por adelantado los clientes de los seguidores para que el
+        primer reparto no pague su construcción
+
+        Args:
+            followers: Seguidores con api_key y api_secret
+        """
+        for follower in followers:
+            if follower.get('api_key') and follower.get('api_secret'):
+                self._state(follower)
+
+    def _size(self, trade: Dict, follower: Dict, state: _FollowerState) -> Dict:
+        """
+        Calcula la orden de un seguidor o el motivo por el que no se copia.
+        Si la orden es válida reserva su copia del día bajo el lock del
+        seguidor, de modo que repartos concurrentes no superan el límite
+        """
+        quantity = trade['quantity'] * follower.get('copy_ratio', 0.0)
+        quantity = self.exchange_info.round_quantity(trade['symbol'], quantity, state.client)
+        if quantity <= 0:
+            return {'status': 'skipped', 'reason': 'cantidad demasiado pequeña'}
+        is_valid, reason = self.exchange_info.check_order(trade['symbol'], quantity, trade['price'], state.client)
+        if not is_valid:
+            return {'status': 'skipped', 'reason': reason}
+
+        max_daily = follower.get('max_daily_copies')
+        with state.lock:
+            today = date.today()
+            if state.day != today:
+                state.day, state.daily_copies = today, 0
+            if max_daily is not None and state.daily_copies >= max_daily:
+                return {'status': 'skipped', 'reason': 'límite diario de copias'}
+            state.daily_copies += 1
+        return {'status': 'ready', 'quantity': quantity}
+
+    @staticmethod
+    def _release(state: _FollowerState):
+        """Devuelve la copia reservada de una orden que no llegó a ejecutarse"""
+        with state.lock:
+            if state.daily_copies > 0:
+                state.daily_copies -= 1
+
+    def _lookup(self, state: _FollowerState, symbol: str, client_order_id: str) -> Optional[Dict]:
+        """
+        Busca en el exchange una orden por su clientOrderId
+
+        Returns:
+            La orden, {} si el exchange no la conoce o None si no pudo consultarse
+        """
+        try:
+            return state.client.get_order(symbol=symbol, origClientOrderId=client_order_id)
+        except BinanceAPIException as e:
+            if e.code == -2013:
+                return {}
+            logger.error(f"Error consultando la orden {client_order_id}: {e}")
+        except Exception as e:
+            logger.error(f"Error consultando la orden {client_order_id}: {e}")
+        return None
+
+    def _record_fill(self, follower_id: str, state: _FollowerState, trade: Dict, order: Dict,
+                     quantity: float, client_order_id: str, latency: float) -> Dict:
+        """Registra la ejecución de una copia; se llama con state.lock tomado"""
+        fill = self.order_ledger.record_order(order)
+        price = fill['avg_price'] or trade['price']
+        executed = fill['executed_qty'] if fill['avg_price'] else quantity
+
+        state.filled += 1
+        state.notional += executed * price
+        state.commission += fill['commission_quote']
+
+        if self.trade_journal is not None:
+            self.trade_journal.record('fill', {
+                'follower_id': follower_id, 'symbol': trade['symbol'], 'side': trade['side'].lower(),
+                'quantity': executed, 'price': price, 'order_id': order['orderId'],
+                'commission': fill['commission_quote']
+            }, source='copy_fanout')
+        return {'status': 'filled', 'quantity': executed, 'price': price, 'order_id': order['orderId'],
+                'client_order_id': client_order_id, 'commission': fill['commission_quote'],
+                'latency': latency}
+
+    def _execute(self, follower_id: str, state: _FollowerState, trade: Dict, quantity: float,
+                 client_order_id: str, started: float) -> Dict:
+        """Envía la orden de un seguidor y resume su ejecución"""
+        result = {'status': 'error', 'quantity': quantity, 'client_order_id': client_order_id}
+        if not state.limiter.try_acquire():
+            state.rate_limited += 1
+            self._release(state)
+            result.update(status='rate_limited', reason='límite de órdenes de la cuenta')
+            return result
+
+        with state.lock:
+            state.orders += 1
+            try:
+                if trade['side'] == 'BUY':
+                    order = state.client.order_market_buy(symbol=trade['symbol'], quantity=quantity,
+                                                          newClientOrderId=client_order_id)
+                else:
+                    order = state.client.order_market_sell(symbol=trade['symbol'], quantity=quantity,
+                                                           newClientOrderId=client_order_id)
+                return self._record_fill(follower_id, state, trade, order, quantity, client_order_id,
+                                         time.perf_counter() - started)
+            except BinanceAPIException as e:
+                state.failed += 1
+                state.last_error = str(e)
+                result.update(status='rejected', reason=str(e))
+            except Exception as e:
+                # Sin respuesta (p. ej. timeout HTTP): la orden pudo llegar al exchange
+                order = self._lookup(state, trade['symbol'], client_order_id)
+                if order and order.get('status') in ('FILLED', 'PARTIALLY_FILLED'):
+                    logger.warning(f"Orden {client_order_id} de {follower_id} ejecutada pese al error: {e}")
+                    return self._record_fill(follower_id, state, trade, order, quantity, client_order_id,
+                                             time.perf_counter() - started)
+                state.failed += 1
+                state.last_error = str(e)
+                result.update(reason=str(e))
+                if order is None:
+                    # Estado desconocido: la copia sigue reservada
+                    return result
+
+        self._release(state)
+        return result
+
+    def _reconcile(self, follower_id: str, trade: Dict, future):
+        """
+        Incorpora el resultado de una copia que superó el plazo del reparto.
+        _execute consulta la orden por su clientOrderId si la petición falla,
+        de modo que el resultado tardío refleja el estado real en el exchange
+        """
+        try:
+            result = future.result()
+        except Exception as e:
+            result = {'status': 'error', 'reason': str(e)}
+        filled = result['status'] == 'filled'
+        with self._lock:
+            self.reconciled += 1
+            if filled:
+                # Contada como fallida al cerrar el reparto
+                self.fills += 1
+                self.failures -= 1
+        with self._lock:
+            self._late[result.get('client_order_id') or follower_id] = dict(result, follower_id=follower_id,
+                                                                            symbol=trade['symbol'])
+            while len(self._late) > self._history:
+                self._late.popitem(last=False)
+        logger.info(f"Copia tardía de {follower_id} en {trade['symbol']}: {result['status']}")
+
+    def get_late_result(self, client_order_id: str) -> Optional[Dict]:
+        """
+        Obtiene el resultado final de una copia que superó el plazo del reparto
+
+        Args:
+            client_order_id: clientOrderId devuelto en el resultado 'timeout'
+
+        Returns:
+            Dict con el resultado o None si aún no ha terminado
+        """
+        return self._late.get(client_order_id)
+
+    def dispatch(self, leader: Dict, trade: Dict, followers: List[Dict]) -> Dict:
+        """
+        Replica una operación del líder en todos los seguidores elegibles
+
+        Args:
+            leader: Información del líder
+            trade: Operación del líder (symbol, side, quantity, price, order_id)
+            followers: Seguidores (id, api_key, api_secret, copy_ratio, max_daily_copies)
+
+        Returns:
+            Dict con el resultado por seguidor y el resumen del reparto
+        """
+        started = time.perf_counter()
+        results: Dict[str, Dict] = {}
+        futures = {}
+
+        # Tamaños calculados antes de enviar: la primera y la última orden salen juntas
+        ready = []
+        for follower in followers:
+            if not follower.get('api_key') or not follower.get('api_secret'):
+                results[follower['id']] = {'status': 'skipped', 'reason': 'sin credenciales'}
+                continue
+            try:
+                state = self._state(follower)
+                sized = self._size(trade, follower, state)
+            except Exception as e:
+                sized = {'status': 'error', 'reason': str(e)}
+            if sized['status'] == 'ready':
+                ready.append((follower['id'], state, sized['quantity']))
+            else:
+                results[follower['id']] = sized
+
+        for follower_id, state, quantity in ready:
+            client_order_id = new_client_order_id('copy_fanout')
+            future = self._executor.submit(self._execute, follower_id, state, trade, quantity,
+                                           client_order_id, started)
+            futures[future] = (follower_id, state, client_order_id)
+
+        done, pending = wait(futures, timeout=self.timeout)
+        for future, (follower_id, _, client_order_id) in futures.items():
+            if future in done:
+                results[follower_id] = future.result()
+            else:
+                # La orden puede ejecutarse después: se concilia cuando termine
+                results[follower_id] = {'status': 'timeout', 'client_order_id': client_order_id,
+                                        'reason': 'sin respuesta en el plazo del reparto'}
+                future.add_done_callback(lambda f, fid=follower_id: self._reconcile(fid, trade, f))
+
+        latencies = [r['latency'] for r in results.values() if r['status'] == 'filled']
+        filled = len(latencies)
+        failed = sum(1 for r in results.values() if r['status'] in ('error', 'rejected', 'timeout'))
+        spread = max(latencies) - min(latencies) if latencies else 0.0
+
+        with self._lock:
+            self.dispatches += 1
+            self.orders += len(futures)
+            self.fills += filled
+            self.failures += failed
+            if latencies:
+                self._spreads.append(spread)
+                self._latencies.extend(latencies)
+
+        summary = {
+            'leader_id': leader['id'],
+            'order_id': trade.get('order_id'),
+            'symbol': trade['symbol'],
+            'side': trade['side'],
+            'followers': len(followers),
+            'sent': len(futures),
+            'filled': filled,
+            'failed': failed,
+            'skipped': len(results) - filled - failed,
+            'first_fill': min(latencies) if latencies else None,
+            'last_fill': max(latencies) if latencies else None,
+            'spread': spread,
+            'duration': time.perf_counter() - started,
+            'results': results
+        }
+        logger.info(f"Copia de {leader.get('name', leader['id'])} repartida: {filled}/{len(followers)} seguidores "
+                    f"{trade['side']} {trade['symbol']} (dispersión {spread * 1000:.1f} ms)")
+        return summary
+
+    def get_follower_statistics(self, follower_id: str) -> Optional[Dict]:
+        """
+        Obtiene los resultados acumulados de un seguidor
+
+        Args:
+            follower_id: ID del seguidor
+
+        Returns:
+            Dict con estadísticas o None si no ha recibido copias
+        """
+        state = self._followers.get(follower_id)
+        if state is None:
+            return None
+        return {
+            'orders': state.orders,
+            'filled': state.filled,
+            'failed': state.failed,
+            'rate_limited': state.rate_limited,
+            'daily_copies': state.daily_copies,
+            'notional': state.notional,
+            'commission': state.commission,
+            'last_error': state.last_error
+        }
+
+    def stop(self):
+        """
+        Espera a las órdenes en vuelo y libera los hilos
+        """
+        self._executor.shutdown(wait=True)
+
+    def get_statistics(self) -> Dict:
+        """
+        Obtiene estadísticas del motor
+
+        Returns:
+            Dict con estadísticas (dispersión entre primera y última ejecución en segundos)
+        """
+        with self._lock:
+            spreads = list(self._spreads)
+            latencies = list(self._latencies)
+        return {
+            'followers': len(self._followers),
+            'dispatches': self.dispatches,
+            'orders': self.orders,
+            'fills': self.fills,
+            'failures': self.failures,
+            'reconciled': self.reconciled,
+            'spread_p50': _percentile(spreads, 0.50),
+            'spread_p99': _percentile(spreads, 0.99),
+            'latency_p50': _percentile(latencies, 0.50),
+            'latency_p99': _percentile(latencies, 0.99)
+        }
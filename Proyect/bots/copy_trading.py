@@ -2,8 +2,9 @@ import os
 import time
 import schedule
 import logging
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
+import threading
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
 import pandas as pd
 import numpy as np
 from binance.client import Client
@@ -13,6 +14,18 @@ import requests
 import json
 
 from utils import RiskManager, TradeLogger
+from market_cache import MarketDataCache, get_shared_cache
+from exchange_info import ExchangeInfoRegistry, get_exchange_info_registry
+from exchange_client import get_client_pool
+from price_snapshot import PriceSnapshotService, get_price_snapshot
+from trigger_engine import TriggerEngine, get_trigger_engine
+from portfolio_risk import PortfolioRiskManager, get_portfolio_risk
+from user_data_stream import OrderLedger, UserDataStream, get_order_ledger
+from trade_journal import TradeJournal, get_trade_journal
+from state_store import StateStore, get_state_store, new_client_order_id, reconcile_position
+from leader_feed import LeaderFeed
+from leader_analytics import LeaderAnalytics
+from copy_fanout import CopyFanout
 
 # Cargar variables de entorno
 load_dotenv()
@@ -34,31 +47,104 @@ class CopyTradingBot:
     Monitorea las operaciones de líderes y las replica proporcionalmente
     """
     
-    def __init__(self, api_key: str = None, api_secret: str = None):
+    def __init__(self, api_key: str = None, api_secret: str = None,
+                 market_cache: Optional[MarketDataCache] = None,
+                 exchange_info: Optional[ExchangeInfoRegistry] = None,
+                 client: Optional[Client] = None,
+                 price_snapshot: Optional[PriceSnapshotService] = None,
+                 trigger_engine: Optional[TriggerEngine] = None,
+                 portfolio_risk: Optional[PortfolioRiskManager] = None,
+                 order_ledger: Optional[OrderLedger] = None,
+                 trade_journal: Optional[TradeJournal] = None,
+                 state_store: Optional[StateStore] = None,
+                 leader_feed: Optional[LeaderFeed] = None,
+                 leader_analytics: Optional[LeaderAnalytics] = None,
+                 copy_fanout: Optional[CopyFanout] = None):
         """
         Inicializa el bot de copy-trading
         
         Args:
             api_key: API key de Binance
             api_secret: API secret de Binance
+            market_cache: Caché de datos de mercado (default: caché compartida del proceso)
+            exchange_info: Registro de filtros del exchange (default: registro compartido)
+            client: Cliente ya construido (opcional, p. ej. simulado en backtests)
+            price_snapshot: Servicio de precios de todo el mercado (default: servicio compartido)
+            trigger_engine: Motor de SL/TP por eventos (default: motor compartido)
+            portfolio_risk: Gestor de riesgo de cartera (default: gestor compartido)
+            order_ledger: Registro de ejecuciones reales (default: registro compartido)
+            trade_journal: Diario persistente de operaciones (default: diario compartido)
+            state_store: Estado de copias a prueba de caídas (default: almacén compartido)
+            leader_feed: Feed incremental de operaciones de líderes (default: feed propio)
+            leader_analytics: Estadísticas móviles de los líderes (default: estadísticas propias)
+            copy_fanout: Motor de copias en paralelo para las cuentas de los seguidores (default: motor propio)
         """
         self.api_key = api_key or os.getenv('BINANCE_API_KEY')
         self.api_secret = api_secret or os.getenv('BINANCE_API_SECRET')
         
+        # Pool de clientes: un cliente persistente por juego de credenciales
+        self.client_pool = get_client_pool()
+        
         # Configurar cliente de Binance
         try:
-            self.client = Client(self.api_key, self.api_secret)
+            self.client = client or self.client_pool.get_client(self.api_key, self.api_secret)
             logger.info("Bot de copy-trading inicializado")
         except Exception as e:
             logger.error(f"Error inicializando cliente Binance: {e}")
             raise
         
+        # Reloj inyectable (un backtest lo sustituye por un reloj simulado)
+        self.clock: Callable[[], datetime] = datetime.now
+        
+        # Caché compartida de precios
+        self.market_cache = market_cache or get_shared_cache()
+        
+        # Filtros de símbolos cargados en bloque una sola vez
+        self.exchange_info = exchange_info or get_exchange_info_registry()
+        
+        # Precios de todo el mercado en una sola petición
+        self.price_snapshot = price_snapshot or get_price_snapshot()
+        
+        # Niveles de salida evaluados en cada precio recibido
+        self.trigger_engine = trigger_engine or get_trigger_engine()
+        self.copies_lock = threading.RLock()
+        
+        # Las copias comparten límites de capital y exposición con los bots
+        self.portfolio_risk = portfolio_risk or get_portfolio_risk()
+        
+        # Precios de ejecución y comisiones reales (respuesta REST o stream de usuario)
+        self.order_ledger = order_ledger or get_order_ledger()
+        
+        # Ejecuciones y copias cerradas persistidas sin bloquear el ciclo
+        self.trade_journal = trade_journal or get_trade_journal()
+        
+        # Copias abiertas persistidas (instantánea + write-ahead log)
+        self.state_store = state_store or get_state_store()
+        self.state_prefix = 'copy_trading:'
+        
         # Configuración de copy-trading
         self.leaders = self.load_leaders()
         self.followers = self.load_followers()
+        
+        # Operaciones nuevas de líderes por cursores de orderId (cursores persistidos)
+        self.leader_feed = leader_feed or LeaderFeed(self.client_pool, state_store=self.state_store)
+        for leader in self.leaders:
+            self.leader_feed.add_leader(leader)
+        
+        # Rendimiento de líderes actualizado con cada operación detectada
+        self.leader_analytics = leader_analytics or LeaderAnalytics(self.client_pool)
+        
+        # Los seguidores con cuenta independiente reciben cada operación en paralelo
+        self.copy_fanout = copy_fanout or CopyFanout(self.client_pool, self.exchange_info,
+                                                     trade_journal=self.trade_journal)
+        self.copy_fanout.prepare(self.get_fanout_followers())
+        
         self.copy_ratio = 0.1  # 10% del tamaño de operación del líder
         self.max_leaders = 5  # Máximo número de líderes a seguir
         self.min_leader_balance = 1000  # Balance mínimo del líder en USDT
+        self.copy_take_profit = 0.03  # 3% take profit por copia
+        self.copy_stop_loss = 0.02  # 2% stop loss por copia
+        self.copy_max_time = 7200  # 2 horas máximo por copia
         
         # Estado del bot
         self.active_copies = {}
@@ -121,47 +207,27 @@ class CopyTradingBot:
             }
         ]
     
-    def get_leader_trades(self, leader: Dict, hours_back: int = 24) -> List[Dict]:
+    def is_own_account(self, follower: Dict) -> bool:
         """
-        Obtiene las operaciones recientes de un líder
+        Indica si un seguidor opera con la cuenta del propio bot
         
         Args:
-            leader: Información del líder
-            hours_back: Horas hacia atrás para buscar operaciones
+            follower: Información del seguidor
             
         Returns:
-            Lista de operaciones del líder
+            True si sus copias se gestionan con el ciclo de vida del bot (SL/TP, estado)
         """
-        try:
-            # En un sistema real, esto se haría a través de la API del líder
-            # Por ahora simulamos obteniendo datos de Binance
-            leader_client = Client(leader['api_key'], leader['api_secret'])
-            
-            # Obtener órdenes recientes
-            orders = leader_client.get_all_orders(limit=50)
-            
-            trades = []
-            cutoff_time = datetime.now() - timedelta(hours=hours_back)
-            
-            for order in orders:
-                if order['status'] == 'FILLED':
-                    order_time = datetime.fromtimestamp(order['time'] / 1000)
-                    if order_time > cutoff_time:
-                        trade = {
-                            'symbol': order['symbol'],
-                            'side': order['side'],
-                            'quantity': float(order['executedQty']),
-                            'price': float(order['price']),
-                            'time': order_time,
-                            'order_id': order['orderId']
-                        }
-                        trades.append(trade)
-            
-            return trades
-            
-        except Exception as e:
-            logger.error(f"Error obteniendo trades del líder {leader['name']}: {e}")
-            return []
+        return not follower.get('api_key') or follower.get('api_key') == self.api_key
+    
+    def get_fanout_followers(self) -> List[Dict]:
+        """
+        Obtiene los seguidores con cuenta independiente, que replican las
+        ejecuciones del líder a través del motor en paralelo
+        
+        Returns:
+            Lista de seguidores
+        """
+        return [follower for follower in self.followers if not self.is_own_account(follower)]
     
     def calculate_leader_performance(self, leader: Dict) -> float:
         """
@@ -174,54 +240,24 @@ class CopyTradingBot:
             Score de rendimiento (0-1)
         """
         try:
-            # Obtener trades recientes
-            trades = self.get_leader_trades(leader, hours_back=168)  # 1 semana
-            
-            if not trades:
-                return 0.0
-            
-            # Calcular métricas
-            total_trades = len(trades)
-            winning_trades = 0
-            total_pnl = 0.0
-            
-            for i in range(1, len(trades)):
-                prev_trade = trades[i-1]
-                current_trade = trades[i]
-                
-                if prev_trade['symbol'] == current_trade['symbol']:
-                    # Calcular P&L
-                    if prev_trade['side'] == 'BUY' and current_trade['side'] == 'SELL':
-                        pnl = (current_trade['price'] - prev_trade['price']) * prev_trade['quantity']
-                        total_pnl += pnl
-                        if pnl > 0:
-                            winning_trades += 1
-            
-            if total_trades == 0:
-                return 0.0
-            
-            win_rate = winning_trades / total_trades
-            avg_pnl = total_pnl / total_trades if total_trades > 0 else 0
-            
-            # Score basado en win rate y P&L promedio
-            performance_score = (win_rate * 0.7) + (min(avg_pnl / 100, 1.0) * 0.3)
-            
-            return max(0.0, min(1.0, performance_score))
+            # Consulta a las estadísticas móviles (el histórico se descarga una sola vez)
+            return self.leader_analytics.get_score(leader)
             
         except Exception as e:
             logger.error(f"Error calculando rendimiento del líder: {e}")
             return 0.0
     
-    def should_copy_trade(self, trade: Dict, leader: Dict) -> bool:
+    def is_copyable_trade(self, trade: Dict, leader: Dict) -> bool:
         """
-        Determina si se debe copiar una operación
+        Determina si una operación del líder es copiable (tamaño y
+        rendimiento del líder), independientemente de la cuenta que la copie
         
         Args:
             trade: Operación del líder
             leader: Información del líder
             
         Returns:
-            True si se debe copiar la operación
+            True si la operación es copiable
         """
         try:
             # Verificar tamaño mínimo de operación
@@ -233,18 +269,36 @@ class CopyTradingBot:
             if trade_value > leader['max_trade_size']:
                 return False
             
+            # Verificar rendimiento del líder
+            performance = self.calculate_leader_performance(leader)
+            return performance >= 0.6  # Mínimo 60% de rendimiento
+            
+        except Exception as e:
+            logger.error(f"Error evaluando copia de trade: {e}")
+            return False
+    
+    def should_copy_trade(self, trade: Dict, leader: Dict) -> bool:
+        """
+        Determina si se debe copiar una operación en la cuenta del bot
+        
+        Args:
+            trade: Operación del líder
+            leader: Información del líder
+            
+        Returns:
+            True si se debe copiar la operación
+        """
+        try:
+            if not self.is_copyable_trade(trade, leader):
+                return False
+            
             # Verificar si ya copiamos esta operación
             trade_id = f"{leader['id']}_{trade['order_id']}"
             if trade_id in self.active_copies:
                 return False
             
-            # Verificar rendimiento del líder
-            performance = self.calculate_leader_performance(leader)
-            if performance < 0.6:  # Mínimo 60% de rendimiento
-                return False
-            
             # Verificar límite diario de copias
-            today = datetime.now().date()
+            today = self.clock().date()
             today_copies = sum(1 for copy in self.active_copies.values() 
                              if copy['date'].date() == today)
             
@@ -269,10 +323,15 @@ class CopyTradingBot:
         Returns:
             True si la copia fue exitosa
         """
+        copy_id = f"{leader['id']}_{trade['order_id']}"
+        order_sent = False
         try:
             # Calcular cantidad a copiar
             original_value = trade['quantity'] * trade['price']
             copy_value = original_value * follower['copy_ratio']
+            
+            # Reserva atómica contra los límites de cartera (puede recortar la copia)
+            copy_value = self.portfolio_risk.reserve(copy_id, trade['symbol'], copy_value, client=self.client)
             copy_quantity = copy_value / trade['price']
             
             # Redondear cantidad según reglas del exchange
@@ -280,22 +339,44 @@ class CopyTradingBot:
             
             if copy_quantity <= 0:
                 logger.warning(f"Cantidad de copia demasiado pequeña: {copy_quantity}")
+                self.portfolio_risk.release(copy_id)
+                return False
+            
+            if not self.validate_order(copy_quantity, trade['price'], trade['symbol']):
+                self.portfolio_risk.release(copy_id)
                 return False
             
+            # Intención registrada antes de enviar la orden: tras una caída se concilia con el exchange
+            client_order_id = new_client_order_id('copy_trading')
+            self.state_store.put(self.state_prefix + copy_id, {
+                'status': 'pending', 'copy_id': copy_id, 'leader_id': leader['id'],
+                'leader_name': leader['name'], 'symbol': trade['symbol'], 'side': trade['side'],
+                'quantity': copy_quantity, 'price': trade['price'], 'client_order_id': client_order_id,
+                'date': self.clock()
+            })
+            
             # Ejecutar orden de copia
+            order_sent = True
             if trade['side'] == 'BUY':
                 order = self.client.order_market_buy(
                     symbol=trade['symbol'],
-                    quantity=copy_quantity
+                    quantity=copy_quantity,
+                    newClientOrderId=client_order_id
                 )
             else:
                 order = self.client.order_market_sell(
                     symbol=trade['symbol'],
-                    quantity=copy_quantity
+                    quantity=copy_quantity,
+                    newClientOrderId=client_order_id
                 )
             
+            # Precio medio y cantidad realmente ejecutados
+            fill = self.order_ledger.resolve_fill(order)
+            entry_price = fill['avg_price'] or trade['price']
+            if fill['avg_price']:
+                copy_quantity = fill['executed_qty']
+            
             # Registrar copia
-            copy_id = f"{leader['id']}_{trade['order_id']}"
             copy_info = {
                 'copy_id': copy_id,
                 'leader_id': leader['id'],
@@ -303,32 +384,59 @@ class CopyTradingBot:
                 'symbol': trade['symbol'],
                 'side': trade['side'],
                 'quantity': copy_quantity,
-                'price': trade['price'],
+                'price': entry_price,
+                'entry_commission': fill['commission_quote'],
                 'original_trade': trade,
-                'date': datetime.now(),
+                'date': self.clock(),
                 'status': 'open'
             }
             
             self.active_copies[copy_id] = copy_info
+            self.state_store.put(self.state_prefix + copy_id, copy_info)
+            self.portfolio_risk.confirm(copy_id, trade['symbol'], trade['side'], copy_quantity * entry_price)
+            
+            # Registrar niveles de salida en el motor de disparos
+            self.trigger_engine.add_position(
+                copy_id, trade['symbol'], trade['side'], entry_price,
+                stop_loss_percentage=self.copy_stop_loss,
+                take_profit_percentage=self.copy_take_profit,
+                max_duration=self.copy_max_time,
+                callback=self.on_trigger
+            )
             
             # Log de la operación
             TradeLogger.log_trade(
                 symbol=trade['symbol'],
                 side=trade['side'].lower(),
                 quantity=copy_quantity,
-                price=trade['price'],
-                strategy=f"copy_trading_{leader['name']}"
+                price=entry_price,
+                strategy=f"copy_trading_{leader['name']}",
+                journal=self.trade_journal,
+                source='copy_trading'
             )
             
-            logger.info(f"Trade copiado: {trade['side']} {copy_quantity} {trade['symbol']} @ {trade['price']} (Líder: {leader['name']})")
+            logger.info(f"Trade copiado: {trade['side']} {copy_quantity} {trade['symbol']} @ {entry_price} (Líder: {leader['name']})")
             
             return True
             
         except BinanceAPIException as e:
+            # Orden rechazada por el exchange: no hay copia que conservar
             logger.error(f"Error de API al copiar trade: {e}")
+            self.portfolio_risk.release(copy_id)
+            self.state_store.delete(self.state_prefix + copy_id)
             return False
         except Exception as e:
             logger.error(f"Error inesperado al copiar trade: {e}")
+            if order_sent and copy_id not in self.active_copies:
+                # La orden pudo llegar al exchange: se concilia ya por su client_order_id
+                stored_copy = self.state_store.get(self.state_prefix + copy_id)
+                if stored_copy is not None:
+                    self._restore_copy(copy_id, stored_copy)
+            elif not order_sent:
+                self.state_store.delete(self.state_prefix + copy_id)
+            if copy_id in self.active_copies:
+                return True
+            self.portfolio_risk.release(copy_id)
             return False
     
     def close_copied_trade(self, copy_info: Dict, current_price: float) -> bool:
@@ -359,12 +467,15 @@ class CopyTradingBot:
                     quantity=quantity
                 )
             
-            # Calcular P&L
+            # Calcular P&L con la ejecución real y las comisiones de entrada y salida
+            fill = self.order_ledger.resolve_fill(order)
+            exit_price = fill['avg_price'] or current_price
+            commission = copy_info.get('entry_commission', 0.0) + fill['commission_quote']
             entry_price = copy_info['price']
             if copy_info['side'] == 'BUY':
-                pnl = (current_price - entry_price) * quantity
+                pnl = (exit_price - entry_price) * quantity - commission
             else:
-                pnl = (entry_price - current_price) * quantity
+                pnl = (entry_price - exit_price) * quantity - commission
             
             # Actualizar estadísticas
             self.total_copies += 1
@@ -380,28 +491,35 @@ class CopyTradingBot:
                 'side': copy_info['side'],
                 'quantity': quantity,
                 'entry_price': entry_price,
-                'exit_price': current_price,
+                'exit_price': exit_price,
+                'commission': commission,
                 'pnl': pnl,
                 'entry_time': copy_info['date'],
-                'exit_time': datetime.now(),
+                'exit_time': self.clock(),
                 'strategy': f"copy_trading_{copy_info['leader_name']}"
             }
             self.trade_history.append(trade_record)
+            self.trade_journal.record('trade', trade_record, source='copy_trading')
             
             # Log de la operación
             TradeLogger.log_trade(
                 symbol=symbol,
                 side=side.lower(),
                 quantity=quantity,
-                price=current_price,
-                strategy=f"copy_trading_{copy_info['leader_name']}"
+                price=exit_price,
+                strategy=f"copy_trading_{copy_info['leader_name']}",
+                journal=self.trade_journal,
+                source='copy_trading'
             )
             
-            logger.info(f"Trade copiado cerrado: {side} {quantity} {symbol} @ {current_price}, P&L: {pnl:.8f}")
+            logger.info(f"Trade copiado cerrado: {side} {quantity} {symbol} @ {exit_price}, P&L: {pnl:.8f}")
             
             # Eliminar de copias activas
+            self.trigger_engine.remove_position(copy_info['copy_id'])
+            self.portfolio_risk.close(copy_info['copy_id'], quantity * exit_price)
             if copy_info['copy_id'] in self.active_copies:
                 del self.active_copies[copy_info['copy_id']]
+            self.state_store.delete(self.state_prefix + copy_info['copy_id'])
             
             return True
             
@@ -433,19 +551,19 @@ class CopyTradingBot:
             else:
                 pnl_percentage = (entry_price - current_price) / entry_price
             
-            # Verificar tiempo máximo (2 horas)
-            time_in_position = (datetime.now() - entry_time).total_seconds()
-            if time_in_position > 7200:  # 2 horas
+            # Verificar tiempo máximo
+            time_in_position = (self.clock() - entry_time).total_seconds()
+            if time_in_position > self.copy_max_time:
                 logger.info(f"Cerrando trade copiado por tiempo máximo: {copy_info['symbol']}")
                 return True
             
-            # Verificar take profit (3%)
-            if pnl_percentage >= 0.03:
+            # Verificar take profit
+            if pnl_percentage >= self.copy_take_profit:
                 logger.info(f"Cerrando trade copiado por take profit: {copy_info['symbol']}")
                 return True
             
-            # Verificar stop loss (2%)
-            if pnl_percentage <= -0.02:
+            # Verificar stop loss
+            if pnl_percentage <= -self.copy_stop_loss:
                 logger.info(f"Cerrando trade copiado por stop loss: {copy_info['symbol']}")
                 return True
             
@@ -467,55 +585,123 @@ class CopyTradingBot:
             Cantidad redondeada
         """
         try:
-            # Obtener información del símbolo
-            symbol_info = self.client.get_symbol_info(symbol)
-            step_size = None
-            
-            for filter in symbol_info['filters']:
-                if filter['filterType'] == 'LOT_SIZE':
-                    step_size = float(filter['stepSize'])
-                    break
-            
-            if step_size:
-                # Redondear al step size más cercano
-                precision = len(str(step_size).split('.')[-1].rstrip('0'))
-                return round(quantity, precision)
-            
-            return quantity
+            # Filtros desde el registro local de exchangeInfo (sin llamada REST)
+            return self.exchange_info.round_quantity(symbol, quantity, client=self.client)
             
         except Exception as e:
             logger.error(f"Error redondeando cantidad: {e}")
             return quantity
     
+    def validate_order(self, quantity: float, price: float, symbol: str) -> bool:
+        """
+        Valida la orden localmente contra los filtros del exchange
+        (minQty, maxQty, minNotional) antes de enviarla
+        
+        Args:
+            quantity: Cantidad redondeada
+            price: Precio de referencia
+            symbol: Símbolo del trading
+            
+        Returns:
+            True si la orden cumple los filtros
+        """
+        valid, reason = self.exchange_info.check_order(symbol, quantity, price, client=self.client)
+        if not valid:
+            logger.warning(f"Orden descartada por filtros del exchange: {reason}")
+        return valid
+    
     def execute_copy_trading(self):
         """
         Ejecuta la estrategia de copy-trading
         """
         try:
-            # Verificar copias activas
+            # Verificar copias activas con una sola foto de precios
+            snapshot = self.price_snapshot.get_snapshot(self.client) if self.active_copies else None
             for copy_id, copy_info in list(self.active_copies.items()):
-                current_price = self.get_current_price(copy_info['symbol'])
-                if current_price and self.should_close_copied_trade(copy_info, current_price):
-                    self.close_copied_trade(copy_info, current_price)
-            
-            # Buscar nuevas operaciones de líderes
-            for leader in self.leaders:
-                if len(self.active_copies) >= self.max_leaders:
-                    break
-                
-                # Obtener trades recientes del líder
-                recent_trades = self.get_leader_trades(leader, hours_back=1)
-                
-                for trade in recent_trades:
-                    if self.should_copy_trade(trade, leader):
-                        # Copiar trade para cada seguidor
-                        for follower in self.followers:
-                            if self.copy_trade(trade, leader, follower):
-                                break  # Solo copiar una vez por trade
+                current_price = snapshot.get(copy_info['symbol']) or self.get_current_price(copy_info['symbol'])
+                with self.copies_lock:
+                    if copy_id not in self.active_copies:
+                        continue
+                    if current_price and self.should_close_copied_trade(copy_info, current_price):
+                        self.close_copied_trade(copy_info, current_price)
+            
+            # Nuevas operaciones de líderes (si el feed no corre en segundo plano se consulta aquí)
+            if not self.leader_feed.is_running:
+                self.leader_feed.poll()
+            for leader, trade in self.leader_feed.drain():
+                self.handle_leader_trade(leader, trade)
             
         except Exception as e:
             logger.error(f"Error ejecutando copy-trading: {e}")
     
+    def handle_leader_trade(self, leader: Dict, trade: Dict) -> bool:
+        """
+        Evalúa y copia una operación nueva de un líder
+        
+        Args:
+            leader: Información del líder
+            trade: Operación del líder
+            
+        Returns:
+            True si la operación se copió
+        """
+        # Toda operación detectada actualiza las estadísticas del líder (tras su histórico)
+        self.leader_analytics.ensure_loaded(leader)
+        self.leader_analytics.add_trade(leader['id'], trade)
+        
+        if not self.is_copyable_trade(trade, leader):
+            return False
+        
+        # Seguidores con cuenta independiente: cada ejecución del líder se replica en todos a la vez
+        copied = False
+        fanout_followers = self.get_fanout_followers()
+        if fanout_followers:
+            result = self.copy_fanout.dispatch(leader, trade, fanout_followers)
+            copied = result['filled'] > 0
+        
+        with self.copies_lock:
+            if len(self.active_copies) >= self.max_leaders:
+                return copied
+            if not self.should_copy_trade(trade, leader):
+                return copied
+            
+            # Copiar trade en la cuenta del bot
+            for follower in self.followers:
+                if self.is_own_account(follower) and self.copy_trade(trade, leader, follower):
+                    return True  # Solo copiar una vez por trade
+        return copied
+    
+    def _copy_loop(self):
+        while self.is_running:
+            item = self.leader_feed.get(timeout=1.0)
+            if item is not None:
+                try:
+                    self.handle_leader_trade(*item)
+                except Exception as e:
+                    logger.error(f"Error copiando operación de líder: {e}")
+    
+    def on_trigger(self, event: Dict) -> Optional[bool]:
+        """
+        Cierra una copia cuando el motor de disparos detecta que el precio
+        ha cruzado el stop loss, el take profit o el tiempo máximo
+        
+        Args:
+            event: Evento del motor de disparos
+            
+        Returns:
+            False si el cierre falló (el motor rearma los niveles)
+        """
+        with self.copies_lock:
+            copy_info = self.active_copies.get(event['position_id'])
+            if copy_info is None:
+                return
+            
+            current_price = event['price'] or self.get_current_price(copy_info['symbol'])
+            if current_price:
+                logger.info(f"Cerrando trade copiado por {event['reason']} (disparo): {copy_info['symbol']} @ {current_price}")
+                return self.close_copied_trade(copy_info, current_price)
+            return False
+    
     def get_current_price(self, symbol: str) -> Optional[float]:
         """
         Obtiene el precio actual de un símbolo
@@ -527,12 +713,85 @@ class CopyTradingBot:
             Precio actual o None si hay error
         """
         try:
-            ticker = self.client.get_symbol_ticker(symbol=symbol)
-            return float(ticker['price'])
+            return self.price_snapshot.get_price(self.client, symbol)
         except Exception as e:
             logger.error(f"Error obteniendo precio actual: {e}")
             return None
     
+    def restore_history(self):
+        """
+        Recupera el historial y las estadísticas desde el diario de operaciones
+        """
+        self.trade_history = self.trade_journal.load_trades(source='copy_trading')
+        self.total_copies = len(self.trade_history)
+        self.successful_copies = sum(1 for trade in self.trade_history if trade['pnl'] > 0)
+        self.total_profit = sum(trade['pnl'] for trade in self.trade_history)
+        if self.trade_history:
+            logger.info(f"Historial recuperado: {self.total_copies} copias, P&L: {self.total_profit:.8f}")
+    
+    def restore_copies(self):
+        """
+        Recupera las copias abiertas tras un reinicio y las concilia con el exchange
+        """
+        stored = self.state_store.items(self.state_prefix)
+        if not stored:
+            return
+        
+        # Un solo get_account para todos los activos (caché del gestor de cartera)
+        balances = self.portfolio_risk.get_balances(client=self.client)
+        restored = sum(1 for copy_id, stored_copy in stored.items()
+                       if self._restore_copy(copy_id, stored_copy, balances))
+        
+        logger.info(f"Copias restauradas: {restored} de {len(stored)}")
+    
+    def _restore_copy(self, copy_id: str, stored_copy: Dict, balances: Optional[Dict] = None) -> bool:
+        """
+        Concilia una copia guardada con el exchange y la reactiva
+        
+        Args:
+            copy_id: ID de la copia
+            stored_copy: Estado guardado
+            balances: Saldos de la cuenta (None = no validar contra el saldo, p. ej. una
+                orden recién enviada que aún no figura en el saldo en caché)
+            
+        Returns:
+            True si la copia sigue abierta
+        """
+        symbol = stored_copy['symbol']
+        try:
+            base_balance = None
+            if balances is not None:
+                filters = self.exchange_info.get(symbol, client=self.client)
+                if filters is not None and filters.base_asset:
+                    base_balance = balances.get(filters.base_asset, 0.0)
+            
+            copy_info = reconcile_position(self.client, symbol, stored_copy, base_balance, price_field='price')
+        except Exception as e:
+            # Estado desconocido: el registro se conserva para el próximo intento
+            logger.error(f"No se pudo conciliar la copia guardada {copy_id}: {e}")
+            return False
+        if copy_info is None:
+            logger.warning(f"Copia guardada {copy_id} descartada tras conciliar con el exchange")
+            self.state_store.delete(self.state_prefix + copy_id)
+            return False
+        
+        with self.copies_lock:
+            self.active_copies[copy_id] = copy_info
+            self.state_store.put(self.state_prefix + copy_id, copy_info)
+            self.portfolio_risk.confirm(copy_id, symbol, copy_info['side'],
+                                        copy_info['quantity'] * copy_info['price'], adjust_balance=False)
+            
+            # El tiempo máximo se cuenta desde la copia original
+            elapsed = (self.clock() - copy_info['date']).total_seconds()
+            self.trigger_engine.add_position(
+                copy_id, symbol, copy_info['side'], copy_info['price'],
+                stop_loss_percentage=self.copy_stop_loss,
+                take_profit_percentage=self.copy_take_profit,
+                max_duration=max(0.0, self.copy_max_time - elapsed),
+                callback=self.on_trigger
+            )
+        return True
+    
     def get_statistics(self) -> Dict:
         """
         Obtiene estadísticas del bot de copy-trading
@@ -550,6 +809,7 @@ class CopyTradingBot:
             'active_copies': len(self.active_copies),
             'leaders_count': len(self.leaders),
             'followers_count': len(self.followers),
+            'fanout': self.copy_fanout.get_statistics(),
             'is_running': self.is_running
         }
     
@@ -559,6 +819,12 @@ class CopyTradingBot:
         """
         logger.info("Iniciando bot de copy-trading...")
         self.is_running = True
+        self.restore_history()
+        self.restore_copies()
+        
+        # Las operaciones de los líderes se copian en cuanto el feed las detecta
+        self.leader_feed.start()
+        threading.Thread(target=self._copy_loop, name='copy-engine', daemon=True).start()
         
         # Programar ejecución cada 2 minutos
         schedule.every(2).minutes.do(self.execute_copy_trading)
@@ -580,6 +846,7 @@ class CopyTradingBot:
         """
         logger.info("Deteniendo bot de copy-trading...")
         self.is_running = False
+        self.leader_feed.stop()
         
         # Cerrar copias activas
         for copy_id, copy_info in self.active_copies.items():
@@ -601,8 +868,27 @@ def main():
             return
         
         # Crear y ejecutar bot
-        bot = CopyTradingBot()
-        bot.start()
+        # Ficheros de estado propios: cada bot corre en su propio proceso
+        bot = CopyTradingBot(state_store=StateStore(name='copy_trading'))
+        bot.exchange_info.start_background_refresh(bot.client)
+        
+        # Precios de todo el mercado en streaming para disparar los cierres
+        bot.trigger_engine.attach(bot.price_snapshot)
+        bot.trigger_engine.start()
+        bot.price_snapshot.start_stream()
+        
+        # Ejecuciones y saldos por el stream de usuario (sin sondear get_account)
+        user_stream = UserDataStream(bot.client, bot.order_ledger)
+        user_stream.add_listener(bot.portfolio_risk.handle_event)
+        user_stream.start()
+        try:
+            bot.start()
+        finally:
+            user_stream.stop()
+            bot.price_snapshot.stop_stream()
+            bot.copy_fanout.stop()
+            bot.trade_journal.stop()
+            bot.state_store.close()
         
     except Exception as e:
         logger.error(f"Error en main: {e}")
@@ -0,0 +1,631 @@
+import json
+import time
+import asyncio
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlparse, parse_qs
+
+import aiohttp
+from binance import AsyncClient
+from binance.client import Client
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Peso por endpoint de la API spot (el resto pesa 1)
+ENDPOINT_WEIGHTS = {
+    'exchangeInfo': 20,
+    'klines': 2,
+    'ticker/price': 2,
+    'ticker/24hr': 2,
+    'depth': 5,
+    'account': 20,
+    'allOrders': 20,
+    'myTrades': 20,
+    'openOrders': 6,
+    'userDataStream': 2
+}
+
+# Peso de los endpoints de mercado consultados sin symbol (todos los pares)
+BULK_ENDPOINT_WEIGHTS = {
+    'ticker/price': 4,
+    'ticker/24hr': 80
+}
+
+# Peso de la instantánea del libro según los niveles pedidos (limit máximo, peso)
+DEPTH_WEIGHTS = ((100, 5), (500, 25), (1000, 50), (5000, 250))
+
+
+def endpoint_weight(uri: str, params: Optional[Dict] = None) -> int:
+    """
+    Estima el peso de una petición a partir de su URI
+
+    Args:
+        uri: URI completa de la petición
+        params: Parámetros de la petición (para distinguir las consultas de todos los pares)
+
+    Returns:
+        Peso estimado
+    """
+    path = urlparse(uri).path
+    if params is not None and path.endswith('/depth'):
+        limit = int(params.get('limit', 100))
+        return next((weight for bound, weight in DEPTH_WEIGHTS if limit <= bound), DEPTH_WEIGHTS[-1][1])
+    if params is not None and not params.get('symbol'):
+        for endpoint, weight in BULK_ENDPOINT_WEIGHTS.items():
+            if path.endswith('/' + endpoint):
+                return weight
+    for endpoint, weight in ENDPOINT_WEIGHTS.items():
+        if path.endswith('/' + endpoint):
+            return weight
+    return 1
+
+
+class WeightLimiter:
+    """
+    Limitador de peso de peticiones (token bucket) compartido por todos los
+    clientes del proceso, ya que Binance limita el peso por IP.
+
+    El cubo suaviza las ráfagas y, como el exchange cuenta el peso en
+    ventanas fijas de un minuto, además se lleva el peso consumido en la
+    ventana actual sincronizado con la cabecera x-mbx-used-weight-1m. Así
+    se frena antes de llegar al límite en lugar de después de un 429/418
+    """
+
+    def __init__(self, weight_limit: int = 6000, safety_margin: float = 0.8):
+        """
+        Inicializa el limitador
+
+        Args:
+            weight_limit: Peso máximo por minuto que permite el exchange
+            safety_margin: Fracción del límite que se permite consumir
+        """
+        self.weight_limit = weight_limit
+        self.capacity = weight_limit * safety_margin
+        self.rate = self.capacity / 60.0
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._window = 0
+        self._window_used = 0
+        self._lock = threading.Lock()
+
+        # Estadísticas
+        self.requests = 0
+        self.throttled = 0
+        self.bans = 0
+        self.used_weight = 0
+
+    def _roll_window(self):
+        window = int(time.time() // 60)
+        if window != self._window:
+            self._window, self._window_used = window, 0
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, weight: int) -> float:
+        """
+        Intenta reservar peso sin bloquear
+
+        Args:
+            weight: Peso de la petición
+
+        Returns:
+            0 si se reservó, o segundos a esperar antes de reintentar
+        """
+        weight = min(weight, self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            if now < self._blocked_until:
+                return self._blocked_until - now
+            self._roll_window()
+            if self._window_used + weight > self.capacity:
+                # Presupuesto de la ventana agotado: esperar al siguiente minuto
+                return 60.0 - time.time() % 60 + 0.05
+            self._refill(now)
+            if self._tokens >= weight:
+                self._tokens -= weight
+                self._window_used += weight
+                self.requests += 1
+                return 0.0
+            return (weight - self._tokens) / self.rate
+
+    def acquire(self, weight: int = 1):
+        """
+        Reserva peso esperando lo necesario (clientes síncronos)
+
+        Args:
+            weight: Peso de la petición
+        """
+        delay = self.reserve(weight)
+        if delay > 0:
+            self.throttled += 1
+        while delay > 0:
+            time.sleep(delay)
+            delay = self.reserve(weight)
+
+    async def acquire_async(self, weight: int = 1):
+        """
+        Reserva peso esperando lo necesario sin bloquear el bucle de eventos
+
+        Args:
+            weight: Peso de la petición
+        """
+        delay = self.reserve(weight)
+        if delay > 0:
+            self.throttled += 1
+        while delay > 0:
+            await asyncio.sleep(delay)
+            delay = self.reserve(weight)
+
+    def update(self, status: int, headers):
+        """
+        Ajusta el cubo con la respuesta del exchange
+
+        Args:
+            status: Código HTTP de la respuesta
+            headers: Cabeceras de la respuesta
+        """
+        used = None
+        for name in ('x-mbx-used-weight-1m', 'X-MBX-USED-WEIGHT-1M', 'x-mbx-used-weight'):
+            if headers.get(name) is not None:
+                used = int(headers.get(name))
+                break
+
+        with self._lock:
+            now = time.monotonic()
+            if used is not None:
+                # El contador del exchange manda sobre la estimación local
+                self.used_weight = used
+                self._roll_window()
+                self._window_used = max(self._window_used, used)
+
+            if status in (429, 418):
+                retry_after = headers.get('Retry-After') or headers.get('retry-after')
+                wait = float(retry_after) if retry_after else 60.0
+                self._blocked_until = max(self._blocked_until, now + wait)
+                self.bans += 1
+                logger.warning(f"Límite de peticiones alcanzado ({status}), pausa de {wait:.0f}s")
+
+    def get_statistics(self) -> Dict:
+        """
+        Obtiene estadísticas del limitador
+
+        Returns:
+            Dict con estadísticas
+        """
+        return {
+            'requests': self.requests,
+            'throttled': self.throttled,
+            'bans': self.bans,
+            'used_weight': self.used_weight,
+            'weight_limit': self.weight_limit
+        }
+
+
+class RateLimitedClient(Client):
+    """
+    Cliente síncrono de Binance con conexiones persistentes agrupadas y
+    limitación por peso de peticiones
+    """
+
+    def __init__(self, api_key: str = None, api_secret: str = None,
+                 limiter: Optional[WeightLimiter] = None, pool_size: int = 10, **kwargs):
+        """
+        Inicializa el cliente
+
+        Args:
+            api_key: API key de Binance
+            api_secret: API secret de Binance
+            limiter: Limitador de peso compartido
+            pool_size: Conexiones HTTP persistentes por host
+            **kwargs: Argumentos de binance.client.Client
+        """
+        self.limiter = limiter or WeightLimiter()
+        kwargs.setdefault('ping', False)
+        super().__init__(api_key, api_secret, **kwargs)
+
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def _request(self, method, uri: str, signed: bool, force_params: bool = False, **kwargs):
+        self.limiter.acquire(endpoint_weight(uri, kwargs.get('data') or kwargs.get('params') or {}))
+        self.response = None
+        try:
+            return super()._request(method, uri, signed, force_params, **kwargs)
+        finally:
+            if self.response is not None:
+                self.limiter.update(self.response.status_code, self.response.headers)
+
+
+class RateLimitedAsyncClient(AsyncClient):
+    """
+    Cliente asíncrono de Binance con limitación por peso de peticiones
+    """
+
+    limiter: WeightLimiter = None
+
+    async def _request(self, method, uri: str, signed: bool, force_params: bool = False, **kwargs):
+        await self.limiter.acquire_async(endpoint_weight(uri, kwargs.get('data') or kwargs.get('params') or {}))
+        self.response = None
+        try:
+            return await super()._request(method, uri, signed, force_params, **kwargs)
+        finally:
+            if self.response is not None:
+                self.limiter.update(self.response.status, self.response.headers)
+
+
+class ExchangeClientPool:
+    """
+    Capa de clientes del exchange compartida por el proceso.
+
+    Mantiene un cliente en caché por juego de credenciales (una sola sesión
+    HTTP y un solo handshake TLS por cuenta) y un único limitador de peso
+    para todos ellos
+    """
+
+    def __init__(self, weight_limit: int = 6000, safety_margin: float = 0.8,
+                 base_url: Optional[str] = None, pool_size: int = 10):
+        """
+        Inicializa el pool
+
+        Args:
+            weight_limit: Peso máximo por minuto que permite el exchange
+            safety_margin: Fracción del límite que se permite consumir
+            base_url: URL base alternativa (p. ej. MockExchangeServer.url)
+            pool_size: Conexiones HTTP persistentes por cliente
+        """
+        self.limiter = WeightLimiter(weight_limit, safety_margin)
+        self.base_url = base_url
+        self.pool_size = pool_size
+        self._clients: Dict[Tuple[str, str], RateLimitedClient] = {}
+        self._async_clients: Dict[Tuple[str, str], RateLimitedAsyncClient] = {}
+        self._lock = threading.Lock()
+
+    def get_client(self, api_key: Optional[str], api_secret: Optional[str]) -> RateLimitedClient:
+        """
+        Obtiene el cliente síncrono de unas credenciales, creándolo si no existe
+
+        Args:
+            api_key: API key de Binance
+            api_secret: API secret de Binance
+
+        Returns:
+            Cliente compartido
+        """
+        key = (api_key or '', api_secret or '')
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = RateLimitedClient(api_key, api_secret, limiter=self.limiter, pool_size=self.pool_size)
+                if self.base_url:
+                    client.API_URL = f"{self.base_url}/api"
+                self._clients[key] = client
+            return client
+
+    async def get_async_client(self, api_key: Optional[str], api_secret: Optional[str]) -> RateLimitedAsyncClient:
+        """
+        Obtiene el cliente asíncrono de unas credenciales, creándolo si no existe
+
+        Args:
+            api_key: API key de Binance
+            api_secret: API secret de Binance
+
+        Returns:
+            Cliente compartido
+        """
+        key = (api_key or '', api_secret or '')
+        client = self._async_clients.get(key)
+        if client is None:
+            client = RateLimitedAsyncClient(api_key, api_secret, session_params={
+                'connector': aiohttp.TCPConnector(limit_per_host=self.pool_size, keepalive_timeout=60)
+            })
+            client.limiter = self.limiter
+            if self.base_url:
+                client.API_URL = f"{self.base_url}/api"
+            server_time = await client.get_server_time()
+            client.timestamp_offset = server_time['serverTime'] - int(time.time() * 1000)
+            self._async_clients[key] = client
+        return client
+
+    def close(self):
+        """
+        Cierra las sesiones de los clientes síncronos
+        """
+        with self._lock:
+            for client in self._clients.values():
+                client.close_connection()
+            self._clients.clear()
+
+    async def close_async(self):
+        """
+        Cierra las sesiones de los clientes asíncronos
+        """
+        for client in self._async_clients.values():
+            await client.close_connection()
+        self._async_clients.clear()
+
+    def get_statistics(self) -> Dict:
+        """
+        Obtiene estadísticas del pool
+
+        Returns:
+            Dict con estadísticas
+        """
+        return {
+            'clients': len(self._clients),
+            'async_clients': len(self._async_clients),
+            **self.limiter.get_statistics()
+        }
+
+
+_shared_pool = ExchangeClientPool()
+
+
+def get_client_pool() -> ExchangeClientPool:
+    """
+    Obtiene el pool de clientes compartido por el proceso
+
+    Returns:
+        Instancia compartida de ExchangeClientPool
+    """
+    return _shared_pool
+
+
+class _MockHandler(BaseHTTPRequestHandler):
+    """Sirve un subconjunto de la API REST spot de Binance"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status: int, body, weight_used: int, retry_after: Optional[int] = None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.send_header('x-mbx-used-weight', str(weight_used))
+        self.send_header('x-mbx-used-weight-1m', str(weight_used))
+        if retry_after is not None:
+            self.send_header('Retry-After', str(retry_after))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _handle(self, method: str):
+        parsed = urlparse(self.path)
+        params = {k: v[-1] for k, v in parse_qs(parsed.query).items()}
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            params.update({k: v[-1] for k, v in parse_qs(self.rfile.read(length).decode()).items()})
+
+        status, body, used, retry_after = self.server.exchange.dispatch(method, parsed.path, params)
+        self._reply(status, body, used, retry_after)
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_PUT(self):
+        self._handle('PUT')
+
+    def do_DELETE(self):
+        self._handle('DELETE')
+
+
+class _MockHTTPServer(ThreadingHTTPServer):
+    # Cola de conexiones amplia: muchos clientes conectan a la vez (copias en paralelo)
+    request_queue_size = 1024
+
+
+class MockExchangeServer:
+    """
+    Servidor HTTP local que imita la API REST de Binance (pesos, cabeceras
+    x-mbx-used-weight-1m, 429 con Retry-After) para probar clientes y bots
+    sin conexión al exchange
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, weight_limit: int = 6000,
+                 prices: Optional[Dict[str, float]] = None, commission_rate: float = 0.001,
+                 user_stream=None, volumes: Optional[Dict[str, float]] = None):
+        """
+        Inicializa el servidor
+
+        Args:
+            host: Interfaz de escucha
+            port: Puerto (0 = puerto libre)
+            weight_limit: Peso por minuto a partir del cual se responde 429
+            prices: Precio por símbolo (default: BTCUSDT y ETHUSDT)
+            commission_rate: Comisión por ejecución (en el activo recibido)
+            user_stream: FakeUserDataServer al que enviar los executionReport (opcional)
+            volumes: Volumen 24h (activo base) por símbolo (default: 1000)
+        """
+        self.weight_limit = weight_limit
+        self.prices = dict(prices or {'BTCUSDT': 50000.0, 'ETHUSDT': 3000.0})
+        self.commission_rate = commission_rate
+        self.balances: Dict[str, float] = {'USDT': 10000.0}
+        self.volumes = dict(volumes or {})
+        self.user_stream = user_stream
+        self.orders: List[Dict] = []
+        self.requests = 0
+        self._window = 0
+        self._used = 0
+        self._lock = threading.Lock()
+
+        self._server = _MockHTTPServer((host, port), _MockHandler)
+        self._server.daemon_threads = True
+        self._server.exchange = self
+        self._server.lock = self._lock
+        self._server.connections = 0
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def connections(self) -> int:
+        return self._server.connections
+
+    def dispatch(self, method: str, path: str, params: Dict) -> Tuple[int, object, int, Optional[int]]:
+        """
+        Atiende una petición y devuelve (status, cuerpo, peso usado, retry_after)
+        """
+        weight = endpoint_weight(path, params)
+        with self._lock:
+            self.requests += 1
+            window = int(time.time() // 60)
+            if window != self._window:
+                self._window, self._used = window, 0
+            self._used += weight
+            used = self._used
+            if used > self.weight_limit:
+                retry_after = 60 - int(time.time() % 60)
+                return 429, {'code': -1003, 'msg': 'Too many requests'}, used, retry_after
+
+        endpoint = path.split('/api/v3/', 1)[-1]
+        symbol = params.get('symbol')
+        now_ms = int(time.time() * 1000)
+
+        if endpoint == 'userDataStream' and method == 'POST':
+            return 200, {'listenKey': f"mock-{now_ms}"}, used, None
+        if endpoint in ('ping', 'userDataStream'):
+            return 200, {}, used, None
+        if endpoint == 'time':
+            return 200, {'serverTime': now_ms}, used, None
+        if endpoint == 'exchangeInfo':
+            return 200, {'symbols': [self._symbol_info(s) for s in self.prices]}, used, None
+        if endpoint == 'ticker/price':
+            if symbol:
+                return 200, {'symbol': symbol, 'price': str(self.prices.get(symbol, 0.0))}, used, None
+            return 200, [{'symbol': s, 'price': str(p)} for s, p in self.prices.items()], used, None
+        if endpoint == 'ticker/24hr':
+            tickers = [self._ticker(s) for s in ([symbol] if symbol else self.prices)]
+            return 200, tickers[0] if symbol else tickers, used, None
+        if endpoint == 'depth':
+            return 200, self._depth(symbol, int(params.get('limit', 100))), used, None
+        if endpoint == 'klines':
+            return 200, self._klines(symbol, int(params.get('limit', 500)), now_ms), used, None
+        if endpoint == 'account':
+            balances = [{'asset': a, 'free': str(v), 'locked': '0'} for a, v in self.balances.items()]
+            return 200, {'balances': balances}, used, None
+        if endpoint == 'allOrders':
+            orders = [o for o in self.orders if o['symbol'] == symbol]
+            limit = int(params.get('limit', 500))
+            # Como en Binance: con orderId/startTime, las primeras desde ahí; sin ellos, las más recientes
+            if 'orderId' in params:
+                orders = [o for o in orders if o['orderId'] >= int(params['orderId'])][:limit]
+            elif 'startTime' in params:
+                orders = [o for o in orders if o['time'] >= int(params['startTime'])][:limit]
+            else:
+                orders = orders[-limit:]
+            return 200, orders, used, None
+        if endpoint == 'order' and method == 'POST':
+            return 200, self._fill_order(params, now_ms), used, None
+        if endpoint == 'order' and method == 'GET':
+            for order in self.orders:
+                if order['symbol'] == symbol and (str(order['orderId']) == params.get('orderId')
+                                                  or order['clientOrderId'] == params.get('origClientOrderId')):
+                    return 200, order, used, None
+            return 400, {'code': -2013, 'msg': 'Order does not exist.'}, used, None
+        return 404, {'code': -1100, 'msg': f'Endpoint no soportado: {endpoint}'}, used, None
+
+    def _fill_order(self, params: Dict, now_ms: int) -> Dict:
+        symbol, side = params.get('symbol'), params.get('side')
+        price = self.prices.get(symbol, 0.0)
+        quantity = float(params.get('quantity', 0.0))
+        # Como en Binance, la comisión se cobra en el activo recibido
+        if side == 'BUY':
+            commission, commission_asset = quantity * self.commission_rate, symbol[:-4]
+        else:
+            commission, commission_asset = quantity * price * self.commission_rate, symbol[-4:]
+
+        with self._lock:
+            order_id = len(self.orders) + 1
+            order = {
+                'symbol': symbol, 'orderId': order_id, 'side': side,
+                'clientOrderId': params.get('newClientOrderId') or f"mock-{order_id}",
+                'type': params.get('type'), 'status': 'FILLED', 'origQty': params.get('quantity'),
+                'executedQty': params.get('quantity'), 'cummulativeQuoteQty': str(quantity * price),
+                'price': str(price), 'time': now_ms, 'updateTime': now_ms,
+                'fills': [{'price': str(price), 'qty': params.get('quantity'), 'commission': str(commission),
+                           'commissionAsset': commission_asset, 'tradeId': order_id}]
+            }
+            self.orders.append(order)
+            base, quote = symbol[:-4], symbol[-4:]
+            sign = 1 if side == 'BUY' else -1
+            self.balances[base] = self.balances.get(base, 0.0) + sign * quantity
+            self.balances[quote] = self.balances.get(quote, 0.0) - sign * quantity * price
+            self.balances[commission_asset] -= commission
+
+        if self.user_stream is not None:
+            self.user_stream.push(self.user_stream.execution_report(
+                order_id, symbol, side, quantity, price, commission, commission_asset, trade_id=order_id
+            ))
+        return order
+
+    @staticmethod
+    def _symbol_info(symbol: str) -> Dict:
+        return {
+            'symbol': symbol, 'status': 'TRADING', 'baseAsset': symbol[:-4], 'quoteAsset': symbol[-4:],
+            'filters': [
+                {'filterType': 'PRICE_FILTER', 'minPrice': '0.01', 'maxPrice': '1000000', 'tickSize': '0.01'},
+                {'filterType': 'LOT_SIZE', 'minQty': '0.00001', 'maxQty': '9000', 'stepSize': '0.00001'},
+                {'filterType': 'NOTIONAL', 'minNotional': '5', 'applyMinToMarket': True}
+            ]
+        }
+
+    def _ticker(self, symbol: str) -> Dict:
+        price = self.prices.get(symbol, 0.0)
+        volume = self.volumes.get(symbol, 1000.0)
+        return {
+            'symbol': symbol, 'lastPrice': str(price), 'openPrice': str(price), 'highPrice': str(price),
+            'lowPrice': str(price), 'priceChangePercent': '0', 'volume': str(volume),
+            'quoteVolume': str(volume * price), 'count': 1000
+        }
+
+    def _depth(self, symbol: str, limit: int) -> Dict:
+        # Libro simétrico alrededor del precio, con un nivel cada 0.01%
+        price = self.prices.get(symbol, 100.0)
+        return {
+            'lastUpdateId': self.requests,
+            'bids': [[f"{price * (1 - 0.0001 * i):.2f}", '1.0'] for i in range(1, limit + 1)],
+            'asks': [[f"{price * (1 + 0.0001 * i):.2f}", '1.0'] for i in range(1, limit + 1)]
+        }
+
+    def _klines(self, symbol: str, limit: int, now_ms: int) -> List[List]:
+        price = self.prices.get(symbol, 100.0)
+        start = (now_ms // 60000 - limit + 1) * 60000
+        return [
+            [t, str(price), str(price * 1.001), str(price * 0.999), str(price), '1.0',
+             t + 59999, str(price), 10, '0.5', str(price * 0.5), '0']
+            for t in range(start, start + limit * 60000, 60000)
+        ]
+
+    def start(self) -> 'MockExchangeServer':
+        """
+        Arranca el servidor en un hilo en segundo plano
+        """
+        self._thread = threading.Thread(target=self._server.serve_forever, name='mock-exchange', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Detiene el servidor
+        """
+        self._server.shutdown()
+        self._server.server_close()
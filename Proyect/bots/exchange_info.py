@@ -0,0 +1,291 @@
+import time
+import logging
+import threading
+from decimal import Decimal, ROUND_DOWN, ROUND_HALF_UP
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def _to_decimal(value, default: str = '0') -> Decimal:
+    return Decimal(str(value)) if value not in (None, '') else Decimal(default)
+
+
+class SymbolFilters:
+    """
+    Filtros de trading de un símbolo (LOT_SIZE, PRICE_FILTER, MIN_NOTIONAL)
+    en formato compacto, con redondeo exacto basado en Decimal
+    """
+
+    __slots__ = ('symbol', 'status', 'base_asset', 'quote_asset',
+                 'step_size', 'min_qty', 'max_qty',
+                 'tick_size', 'min_price', 'max_price',
+                 'min_notional', 'max_notional')
+
+    def __init__(self, symbol_info: Dict):
+        """
+        Construye los filtros a partir de una entrada de exchangeInfo
+
+        Args:
+            symbol_info: Dict del símbolo tal como lo devuelve Binance
+        """
+        self.symbol = symbol_info['symbol']
+        self.status = symbol_info.get('status', 'TRADING')
+        self.base_asset = symbol_info.get('baseAsset')
+        self.quote_asset = symbol_info.get('quoteAsset')
+
+        self.step_size = self.min_qty = self.max_qty = Decimal('0')
+        self.tick_size = self.min_price = self.max_price = Decimal('0')
+        self.min_notional = self.max_notional = Decimal('0')
+
+        for f in symbol_info.get('filters', []):
+            filter_type = f.get('filterType')
+            if filter_type == 'LOT_SIZE':
+                self.step_size = _to_decimal(f.get('stepSize'))
+                self.min_qty = _to_decimal(f.get('minQty'))
+                self.max_qty = _to_decimal(f.get('maxQty'))
+            elif filter_type == 'PRICE_FILTER':
+                self.tick_size = _to_decimal(f.get('tickSize'))
+                self.min_price = _to_decimal(f.get('minPrice'))
+                self.max_price = _to_decimal(f.get('maxPrice'))
+            elif filter_type == 'MIN_NOTIONAL':
+                if f.get('applyToMarket', True):
+                    self.min_notional = _to_decimal(f.get('minNotional'))
+            elif filter_type == 'NOTIONAL':
+                if f.get('applyMinToMarket', True):
+                    self.min_notional = _to_decimal(f.get('minNotional'))
+                if f.get('applyMaxToMarket', False):
+                    self.max_notional = _to_decimal(f.get('maxNotional'))
+
+    def round_quantity(self, quantity: float) -> float:
+        """
+        Redondea una cantidad hacia abajo al múltiplo de stepSize
+
+        Args:
+            quantity: Cantidad original
+
+        Returns:
+            Cantidad redondeada
+        """
+        if self.step_size <= 0:
+            return quantity
+        steps = (_to_decimal(quantity) / self.step_size).to_integral_value(rounding=ROUND_DOWN)
+        return float(steps * self.step_size)
+
+    def round_price(self, price: float) -> float:
+        """
+        Redondea un precio al múltiplo de tickSize más cercano
+
+        Args:
+            price: Precio original
+
+        Returns:
+            Precio redondeado
+        """
+        if self.tick_size <= 0:
+            return price
+        ticks = (_to_decimal(price) / self.tick_size).to_integral_value(rounding=ROUND_HALF_UP)
+        return float(ticks * self.tick_size)
+
+    def check_order(self, quantity: float, price: float) -> Tuple[bool, str]:
+        """
+        Valida una orden de mercado contra los filtros del símbolo
+
+        Args:
+            quantity: Cantidad (ya redondeada)
+            price: Precio de referencia
+
+        Returns:
+            Tuple (es_válida, motivo)
+        """
+        qty = _to_decimal(quantity)
+        if self.status != 'TRADING':
+            return False, f"{self.symbol} no está en estado TRADING ({self.status})"
+        if qty <= 0:
+            return False, "cantidad no positiva"
+        if self.min_qty > 0 and qty < self.min_qty:
+            return False, f"cantidad {qty} menor que minQty {self.min_qty}"
+        if self.max_qty > 0 and qty > self.max_qty:
+            return False, f"cantidad {qty} mayor que maxQty {self.max_qty}"
+
+        notional = qty * _to_decimal(price)
+        if self.min_notional > 0 and notional < self.min_notional:
+            return False, f"nocional {notional:.8f} menor que minNotional {self.min_notional}"
+        if self.max_notional > 0 and notional > self.max_notional:
+            return False, f"nocional {notional:.8f} mayor que maxNotional {self.max_notional}"
+
+        return True, ''
+
+
+class ExchangeInfoRegistry:
+    """
+    Registro de metadatos del exchange cargado en bloque (exchangeInfo) y
+    refrescado en segundo plano. Evita una llamada REST por orden
+    """
+
+    def __init__(self, refresh_interval: float = 3600.0):
+        """
+        Inicializa el registro
+
+        Args:
+            refresh_interval: Segundos entre refrescos en segundo plano
+        """
+        self.refresh_interval = refresh_interval
+        self._filters: Dict[str, SymbolFilters] = {}
+        self._client = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.last_refresh = 0.0
+
+    def load(self, client) -> int:
+        """
+        Carga exchangeInfo completo en una sola petición
+
+        Args:
+            client: Cliente de Binance
+
+        Returns:
+            Número de símbolos indexados
+        """
+        info = client.get_exchange_info()
+        filters = {s['symbol']: SymbolFilters(s) for s in info.get('symbols', [])}
+        with self._lock:
+            self._filters = filters
+            self._client = client
+            self.last_refresh = time.time()
+        logger.info(f"exchangeInfo cargado: {len(filters)} símbolos")
+        return len(filters)
+
+    def _refresh_loop(self):
+        while not self._stop.wait(self.refresh_interval):
+            try:
+                self.load(self._client)
+            except Exception as e:
+                logger.error(f"Error refrescando exchangeInfo: {e}")
+
+    def start_background_refresh(self, client=None):
+        """
+        Inicia el refresco periódico en un hilo en segundo plano
+
+        Args:
+            client: Cliente de Binance (opcional si ya se hizo load)
+        """
+        if client is not None and not self._filters:
+            self.load(client)
+        elif client is not None:
+            self._client = client
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._refresh_loop, name='exchange-info', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """
+        Detiene el refresco en segundo plano
+        """
+        self._stop.set()
+
+    def symbols(self, quote_asset: Optional[str] = None, client=None) -> List[str]:
+        """
+        Obtiene los pares en estado TRADING
+
+        Args:
+            quote_asset: Activo de cotización por el que filtrar (p. ej. 'USDT')
+            client: Cliente de Binance para cargar exchangeInfo si aún no se hizo (opcional)
+
+        Returns:
+            Lista de símbolos
+        """
+        if not self._filters and (client or self._client) is not None:
+            try:
+                self.load(client or self._client)
+            except Exception as e:
+                logger.error(f"Error cargando exchangeInfo: {e}")
+        return [symbol for symbol, f in self._filters.items()
+                if f.status == 'TRADING' and (quote_asset is None or f.quote_asset == quote_asset)]
+
+    def get(self, symbol: str, client=None) -> Optional[SymbolFilters]:
+        """
+        Obtiene los filtros de un símbolo
+
+        Carga exchangeInfo la primera vez que se usa, y recurre a
+        get_symbol_info para símbolos listados después de la última carga.
+
+        Args:
+            symbol: Par de trading
+            client: Cliente de Binance para cargas bajo demanda (opcional)
+
+        Returns:
+            Filtros del símbolo o None si no existe
+        """
+        filters = self._filters.get(symbol)
+        if filters is not None:
+            return filters
+
+        client = client or self._client
+        if client is None:
+            return None
+
+        try:
+            if not self._filters:
+                self.load(client)
+                return self._filters.get(symbol)
+
+            symbol_info = client.get_symbol_info(symbol)
+            if not symbol_info:
+                return None
+            filters = SymbolFilters(symbol_info)
+            with self._lock:
+                self._filters[symbol] = filters
+            return filters
+        except Exception as e:
+            logger.error(f"Error obteniendo filtros de {symbol}: {e}")
+            return None
+
+    def round_quantity(self, symbol: str, quantity: float, client=None) -> float:
+        """
+        Redondea una cantidad según el LOT_SIZE del símbolo
+
+        Args:
+            symbol: Par de trading
+            quantity: Cantidad original
+            client: Cliente de Binance (opcional)
+
+        Returns:
+            Cantidad redondeada
+        """
+        filters = self.get(symbol, client)
+        return filters.round_quantity(quantity) if filters else quantity
+
+    def check_order(self, symbol: str, quantity: float, price: float, client=None) -> Tuple[bool, str]:
+        """
+        Valida localmente una orden antes de enviarla al exchange
+
+        Args:
+            symbol: Par de trading
+            quantity: Cantidad
+            price: Precio de referencia
+            client: Cliente de Binance (opcional)
+
+        Returns:
+            Tuple (es_válida, motivo)
+        """
+        filters = self.get(symbol, client)
+        if filters is None:
+            # Sin metadatos se delega la validación al exchange
+            return True, ''
+        return filters.check_order(quantity, price)
+
+
+_shared_registry = ExchangeInfoRegistry()
+
+
+def get_exchange_info_registry() -> ExchangeInfoRegistry:
+    """
+    Obtiene el registro de metadatos compartido por el proceso
+
+    Returns:
+        Instancia compartida de ExchangeInfoRegistry
+    """
+    return _shared_registry
@@ -0,0 +1,615 @@
+import math
+import logging
+from collections import deque
+from typing import Dict, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+IndicatorValue = Union[float, Tuple[float, ...]]
+
+
+class IncrementalEMA:
+    """
+    EMA incremental con actualización O(1) por vela.
+    Reproduce ``prices.ewm(span=period).mean()`` (adjust=True) de pandas
+    """
+
+    __slots__ = ('period', 'alpha', '_old_wt_factor', '_weighted', '_old_wt', '_nobs')
+
+    def __init__(self, period: int = 20):
+        """
+        Inicializa la EMA incremental
+
+        Args:
+            period: Período (span) de la EMA (default: 20)
+        """
+        self.period = period
+        self.alpha = 2.0 / (period + 1.0)
+        self._old_wt_factor = 1.0 - self.alpha
+        self.reset()
+
+    def reset(self):
+        """Reinicia el estado interno"""
+        self._weighted = math.nan
+        self._old_wt = 1.0
+        self._nobs = 0
+
+    def _step(self, price: float) -> Tuple[float, float, int]:
+        weighted, old_wt, nobs = self._weighted, self._old_wt, self._nobs
+        is_observation = price == price
+
+        if nobs == 0 and weighted != weighted:
+            # Primera observación (o serie que empieza con NaN)
+            if is_observation:
+                return price, 1.0, 1
+            return weighted, old_wt, nobs
+
+        nobs += is_observation
+        if weighted == weighted:
+            old_wt *= self._old_wt_factor
+            if is_observation:
+                if weighted != price:
+                    weighted = ((old_wt * weighted) + price) / (old_wt + 1.0)
+                old_wt += 1.0
+        elif is_observation:
+            weighted = price
+
+        return weighted, old_wt, nobs
+
+    def update(self, price: float) -> float:
+        """
+        Incorpora una vela cerrada
+
+        Args:
+            price: Precio de cierre
+
+        Returns:
+            Valor actual de la EMA
+        """
+        self._weighted, self._old_wt, self._nobs = self._step(price)
+        return self.value
+
+    def peek(self, price: float) -> float:
+        """
+        Calcula la EMA incluyendo un precio provisional sin modificar el estado
+
+        Args:
+            price: Precio de la vela en curso
+
+        Returns:
+            Valor de la EMA si la vela cerrara en ese precio
+        """
+        weighted, _, nobs = self._step(price)
+        return weighted if nobs > 0 else math.nan
+
+    @property
+    def value(self) -> float:
+        return self._weighted if self._nobs > 0 else math.nan
+
+
+class _RollingMean:
+    """
+    Media móvil con buffer circular y suma compensada (Kahan).
+    Reproduce ``Series.rolling(window).mean()`` de pandas
+    """
+
+    __slots__ = ('window', '_values', '_nobs', '_sum', '_compensation_add',
+                 '_compensation_remove', '_neg_ct', '_consecutive', '_prev_value')
+
+    def __init__(self, window: int):
+        self.window = window
+        self.reset()
+
+    def reset(self):
+        self._values = deque()
+        self._nobs = 0
+        self._sum = 0.0
+        self._compensation_add = 0.0
+        self._compensation_remove = 0.0
+        self._neg_ct = 0
+        self._consecutive = 0
+        self._prev_value = math.nan
+
+    def _step(self, value: float) -> Tuple:
+        nobs, sum_x = self._nobs, self._sum
+        compensation_add, compensation_remove = self._compensation_add, self._compensation_remove
+        neg_ct, consecutive, prev_value = self._neg_ct, self._consecutive, self._prev_value
+
+        # Eliminar el valor que sale de la ventana (pandas compensa altas y bajas por separado)
+        if len(self._values) == self.window:
+            old = self._values[0]
+            if old == old:
+                nobs -= 1
+                y = -old - compensation_remove
+                t = sum_x + y
+                compensation_remove = t - sum_x - y
+                sum_x = t
+                if math.copysign(1.0, old) < 0:
+                    neg_ct -= 1
+
+        # Añadir el nuevo valor
+        if value == value:
+            nobs += 1
+            y = value - compensation_add
+            t = sum_x + y
+            compensation_add = t - sum_x - y
+            sum_x = t
+            if math.copysign(1.0, value) < 0:
+                neg_ct += 1
+            consecutive = consecutive + 1 if value == prev_value else 1
+            prev_value = value
+
+        if nobs >= self.window and nobs > 0:
+            result = sum_x / nobs
+            if consecutive >= nobs:
+                result = prev_value
+            elif neg_ct == 0 and result < 0:
+                result = 0.0
+            elif neg_ct == nobs and result > 0:
+                result = 0.0
+        else:
+            result = math.nan
+
+        return result, (nobs, sum_x, compensation_add, compensation_remove,
+                        neg_ct, consecutive, prev_value)
+
+    def update(self, value: float) -> float:
+        result, state = self._step(value)
+        (self._nobs, self._sum, self._compensation_add, self._compensation_remove,
+         self._neg_ct, self._consecutive, self._prev_value) = state
+        if len(self._values) == self.window:
+            self._values.popleft()
+        self._values.append(value)
+        return result
+
+    def peek(self, value: float) -> float:
+        return self._step(value)[0]
+
+
+class _RollingVariance:
+    """
+    Varianza móvil (ddof=1) con el algoritmo de Welford compensado.
+    Reproduce ``Series.rolling(window).std() ** 2`` de pandas
+    """
+
+    __slots__ = ('window', '_values', '_nobs', '_mean', '_ssqdm', '_compensation_add',
+                 '_compensation_remove', '_consecutive', '_prev_value')
+
+    def __init__(self, window: int):
+        self.window = window
+        self.reset()
+
+    def reset(self):
+        self._values = deque()
+        self._nobs = 0
+        self._mean = 0.0
+        self._ssqdm = 0.0
+        self._compensation_add = 0.0
+        self._compensation_remove = 0.0
+        self._consecutive = 0
+        self._prev_value = math.nan
+
+    def _step(self, value: float) -> Tuple:
+        nobs, mean_x, ssqdm_x = self._nobs, self._mean, self._ssqdm
+        compensation_add, compensation_remove = self._compensation_add, self._compensation_remove
+        consecutive, prev_value = self._consecutive, self._prev_value
+
+        # Eliminar el valor que sale de la ventana
+        if len(self._values) == self.window:
+            old = self._values[0]
+            if old == old:
+                nobs -= 1
+                if nobs:
+                    prev_mean = mean_x - compensation_remove
+                    y = old - compensation_remove
+                    t = y - mean_x
+                    compensation_remove = t + mean_x - y
+                    mean_x -= t / nobs
+                    ssqdm_x -= (old - prev_mean) * (old - mean_x)
+                else:
+                    mean_x = 0.0
+                    ssqdm_x = 0.0
+
+        # Añadir el nuevo valor
+        if value == value:
+            consecutive = consecutive + 1 if value == prev_value else 1
+            prev_value = value
+            nobs += 1
+            prev_mean = mean_x - compensation_add
+            y = value - compensation_add
+            t = y - mean_x
+            compensation_add = t + mean_x - y
+            mean_x += t / nobs
+            ssqdm_x += (value - prev_mean) * (value - mean_x)
+
+        if nobs >= self.window and nobs > 1:
+            if consecutive >= nobs:
+                result = 0.0
+            else:
+                result = ssqdm_x / (nobs - 1)
+                if result < 0:
+                    result = 0.0
+        else:
+            result = math.nan
+
+        return result, (nobs, mean_x, ssqdm_x, compensation_add, compensation_remove,
+                        consecutive, prev_value)
+
+    def update(self, value: float) -> float:
+        result, state = self._step(value)
+        (self._nobs, self._mean, self._ssqdm, self._compensation_add,
+         self._compensation_remove, self._consecutive, self._prev_value) = state
+        if len(self._values) == self.window:
+            self._values.popleft()
+        self._values.append(value)
+        return result
+
+    def peek(self, value: float) -> float:
+        return self._step(value)[0]
+
+
+class IncrementalSMA:
+    """
+    SMA incremental con buffer circular.
+    Reproduce ``prices.rolling(window=period).mean()`` de pandas
+    """
+
+    __slots__ = ('period', '_mean', 'value')
+
+    def __init__(self, period: int = 20):
+        """
+        Inicializa la SMA incremental
+
+        Args:
+            period: Período para el cálculo (default: 20)
+        """
+        self.period = period
+        self._mean = _RollingMean(period)
+        self.value = math.nan
+
+    def reset(self):
+        """Reinicia el estado interno"""
+        self._mean.reset()
+        self.value = math.nan
+
+    def update(self, price: float) -> float:
+        """
+        Incorpora una vela cerrada
+
+        Args:
+            price: Valor de la vela
+
+        Returns:
+            Valor actual de la SMA
+        """
+        self.value = self._mean.update(price)
+        return self.value
+
+    def peek(self, price: float) -> float:
+        """
+        Calcula la SMA con un valor provisional sin modificar el estado
+
+        Args:
+            price: Valor de la vela en curso
+
+        Returns:
+            Valor de la SMA si la vela cerrara en ese valor
+        """
+        return self._mean.peek(price)
+
+
+class IncrementalRSI:
+    """
+    RSI incremental con sumas móviles de ganancias y pérdidas.
+    Reproduce ``TradingIndicators.compute_rsi`` (medias simples, no Wilder)
+    """
+
+    __slots__ = ('period', '_gain', '_loss', '_prev_price', 'value')
+
+    def __init__(self, period: int = 14):
+        """
+        Inicializa el RSI incremental
+
+        Args:
+            period: Período para el cálculo (default: 14)
+        """
+        self.period = period
+        self._gain = _RollingMean(period)
+        self._loss = _RollingMean(period)
+        self.reset()
+
+    def reset(self):
+        """Reinicia el estado interno"""
+        self._gain.reset()
+        self._loss.reset()
+        self._prev_price = None
+        self.value = math.nan
+
+    def _deltas(self, price: float) -> Tuple[float, float]:
+        if self._prev_price is None:
+            return math.nan, math.nan
+        delta = price - self._prev_price
+        # Mismo signo que clip(lower=0) y -clip(upper=0) en pandas (incluido -0.0)
+        if delta != delta:
+            return math.nan, math.nan
+        return max(delta, 0.0), -min(delta, 0.0)
+
+    @staticmethod
+    def _rsi(gain: float, loss: float) -> float:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rs = np.float64(gain) / np.float64(loss)
+            return float(100 - (100 / (1 + rs)))
+
+    def update(self, price: float) -> float:
+        """
+        Incorpora una vela cerrada
+
+        Args:
+            price: Precio de cierre
+
+        Returns:
+            Valor actual del RSI
+        """
+        gain, loss = self._deltas(price)
+        self.value = self._rsi(self._gain.update(gain), self._loss.update(loss))
+        self._prev_price = price
+        return self.value
+
+    def peek(self, price: float) -> float:
+        """
+        Calcula el RSI con un precio provisional sin modificar el estado
+
+        Args:
+            price: Precio de la vela en curso
+
+        Returns:
+            Valor del RSI si la vela cerrara en ese precio
+        """
+        gain, loss = self._deltas(price)
+        return self._rsi(self._gain.peek(gain), self._loss.peek(loss))
+
+
+class IncrementalBollingerBands:
+    """
+    Bandas de Bollinger incrementales (media y varianza móviles).
+    Reproduce ``TradingIndicators.compute_bollinger_bands``
+    """
+
+    __slots__ = ('period', 'std_dev', '_mean', '_var', 'value')
+
+    def __init__(self, period: int = 20, std_dev: int = 2):
+        """
+        Inicializa las Bandas de Bollinger incrementales
+
+        Args:
+            period: Período para el cálculo (default: 20)
+            std_dev: Desviación estándar (default: 2)
+        """
+        self.period = period
+        self.std_dev = std_dev
+        self._mean = _RollingMean(period)
+        self._var = _RollingVariance(period)
+        self.value = (math.nan, math.nan, math.nan)
+
+    def reset(self):
+        """Reinicia el estado interno"""
+        self._mean.reset()
+        self._var.reset()
+        self.value = (math.nan, math.nan, math.nan)
+
+    def _bands(self, sma: float, variance: float) -> Tuple[float, float, float]:
+        std = math.sqrt(variance) if variance >= 0 else math.nan
+        return sma + (std * self.std_dev), sma, sma - (std * self.std_dev)
+
+    def update(self, price: float) -> Tuple[float, float, float]:
+        """
+        Incorpora una vela cerrada
+
+        Args:
+            price: Precio de cierre
+
+        Returns:
+            Tuple con (banda_superior, banda_media, banda_inferior)
+        """
+        self.value = self._bands(self._mean.update(price), self._var.update(price))
+        return self.value
+
+    def peek(self, price: float) -> Tuple[float, float, float]:
+        """
+        Calcula las bandas con un precio provisional sin modificar el estado
+
+        Args:
+            price: Precio de la vela en curso
+
+        Returns:
+            Tuple con (banda_superior, banda_media, banda_inferior)
+        """
+        return self._bands(self._mean.peek(price), self._var.peek(price))
+
+
+class IncrementalMACD:
+    """
+    MACD incremental construido sobre EMAs incrementales.
+    Reproduce ``TradingIndicators.compute_macd``
+    """
+
+    __slots__ = ('_fast', '_slow', '_signal', 'value')
+
+    def __init__(self, fast: int = 12, slow: int = 26, signal: int = 9):
+        """
+        Inicializa el MACD incremental
+
+        Args:
+            fast: EMA rápida (default: 12)
+            slow: EMA lenta (default: 26)
+            signal: EMA de señal (default: 9)
+        """
+        self._fast = IncrementalEMA(fast)
+        self._slow = IncrementalEMA(slow)
+        self._signal = IncrementalEMA(signal)
+        self.value = (math.nan, math.nan, math.nan)
+
+    def reset(self):
+        """Reinicia el estado interno"""
+        self._fast.reset()
+        self._slow.reset()
+        self._signal.reset()
+        self.value = (math.nan, math.nan, math.nan)
+
+    def update(self, price: float) -> Tuple[float, float, float]:
+        """
+        Incorpora una vela cerrada
+
+        Args:
+            price: Precio de cierre
+
+        Returns:
+            Tuple con (macd_line, signal_line, histogram)
+        """
+        macd_line = self._fast.update(price) - self._slow.update(price)
+        signal_line = self._signal.update(macd_line)
+        self.value = (macd_line, signal_line, macd_line - signal_line)
+        return self.value
+
+    def peek(self, price: float) -> Tuple[float, float, float]:
+        """
+        Calcula el MACD con un precio provisional sin modificar el estado
+
+        Args:
+            price: Precio de la vela en curso
+
+        Returns:
+            Tuple con (macd_line, signal_line, histogram)
+        """
+        macd_line = self._fast.peek(price) - self._slow.peek(price)
+        signal_line = self._signal.peek(macd_line)
+        return macd_line, signal_line, macd_line - signal_line
+
+
+class IncrementalIndicatorEngine:
+    """
+    Motor de indicadores con estado: incorpora cada vela cerrada una sola vez
+    y evalúa la vela en curso sin recalcular toda la ventana
+    """
+
+    def __init__(self):
+        """
+        Inicializa el motor sin indicadores registrados
+        """
+        self._indicators: Dict[str, Tuple[object, str]] = {}
+        self.last_timestamp = None
+        self.latest: Dict[str, IndicatorValue] = {}
+
+    def add_indicator(self, name: str, indicator, column: str = 'close') -> 'IncrementalIndicatorEngine':
+        """
+        Registra un indicador incremental
+
+        Args:
+            name: Nombre con el que se expondrá el valor
+            indicator: Instancia de un indicador incremental
+            column: Columna de la vela que alimenta el indicador
+
+        Returns:
+            El propio motor (para encadenar llamadas)
+        """
+        self._indicators[name] = (indicator, column)
+        return self
+
+    def reset(self):
+        """
+        Reinicia el estado de todos los indicadores
+        """
+        for indicator, _ in self._indicators.values():
+            indicator.reset()
+        self.last_timestamp = None
+        self.latest = {}
+
+    def update(self, candle: Dict[str, float], timestamp=None) -> Dict[str, IndicatorValue]:
+        """
+        Incorpora una vela cerrada a todos los indicadores
+
+        Args:
+            candle: Dict (o fila) con los valores de la vela
+            timestamp: Marca temporal de la vela (opcional)
+
+        Returns:
+            Dict con el valor de cada indicador
+        """
+        self.latest = {
+            name: indicator.update(float(candle[column]))
+            for name, (indicator, column) in self._indicators.items()
+        }
+        if timestamp is not None:
+            self.last_timestamp = timestamp
+        return self.latest
+
+    def peek(self, candle: Dict[str, float]) -> Dict[str, IndicatorValue]:
+        """
+        Evalúa una vela aún abierta sin modificar el estado
+
+        Args:
+            candle: Dict (o fila) con los valores de la vela en curso
+
+        Returns:
+            Dict con el valor de cada indicador
+        """
+        return {
+            name: indicator.peek(float(candle[column]))
+            for name, (indicator, column) in self._indicators.items()
+        }
+
+    def sync(self, data: pd.DataFrame, last_closed: bool = False) -> Dict[str, IndicatorValue]:
+        """
+        Sincroniza el motor con una ventana de velas, incorporando solo las
+        velas cerradas que aún no se han procesado
+
+        Si la ventana no solapa con lo ya procesado (hueco en los datos)
+        el motor se reinicia y se vuelve a sembrar con la ventana completa.
+
+        Args:
+            data: DataFrame u OHLCV con 'timestamp' y las columnas usadas
+            last_closed: True si la última vela también está cerrada
+
+        Returns:
+            Dict con el valor de cada indicador en la última vela
+        """
+        if data.empty:
+            return {}
+
+        timestamps = np.asarray(data['timestamp'])
+        columns = {column for _, column in self._indicators.values()}
+        arrays = {column: np.asarray(data[column], dtype=float) for column in columns}
+
+        closed_end = len(data) if last_closed else len(data) - 1
+        start = 0
+        if self.last_timestamp is not None:
+            if timestamps[0] > self.last_timestamp or self.last_timestamp > timestamps[-1]:
+                logger.warning("Hueco en los datos de indicadores, reiniciando estado")
+                self.reset()
+            else:
+                start = int(np.searchsorted(timestamps, self.last_timestamp, side='right'))
+
+        for i in range(start, closed_end):
+            self.update({column: values[i] for column, values in arrays.items()}, timestamps[i])
+
+        if last_closed:
+            return dict(self.latest)
+
+        current = {column: values[-1] for column, values in arrays.items()}
+        return self.peek(current)
+
+    def get(self, name: str, default: Optional[IndicatorValue] = None) -> Optional[IndicatorValue]:
+        """
+        Obtiene el último valor confirmado de un indicador
+
+        Args:
+            name: Nombre del indicador
+            default: Valor por defecto
+
+        Returns:
+            Valor del indicador o default
+        """
+        return self.latest.get(name, default)
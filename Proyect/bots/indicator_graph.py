@@ -0,0 +1,335 @@
+import math
+import logging
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from incremental_indicators import (IndicatorValue, IncrementalEMA, IncrementalRSI, IncrementalSMA,
+                                    _RollingVariance)
+
+logger = logging.getLogger(__name__)
+
+NodeKey = Tuple
+
+
+def _bands(std_dev: float) -> Callable[[float, float], Tuple[float, float, float]]:
+    def combine(sma: float, variance: float) -> Tuple[float, float, float]:
+        std = math.sqrt(variance) if variance >= 0 else math.nan
+        return sma + (std * std_dev), sma, sma - (std * std_dev)
+    return combine
+
+
+def _macd(macd_line: float, signal_line: float) -> Tuple[float, float, float]:
+    return macd_line, signal_line, macd_line - signal_line
+
+
+class _Node:
+    """Nodo del grafo: una columna de la vela, un indicador con estado o una combinación"""
+
+    __slots__ = ('key', 'inputs', 'indicator', 'combine', 'consumers')
+
+    def __init__(self, key: NodeKey, inputs: List[NodeKey], indicator=None,
+                 combine: Optional[Callable] = None):
+        self.key = key
+        self.inputs = inputs
+        self.indicator = indicator
+        self.combine = combine
+        self.consumers = 0
+
+
+class _SeriesGraph:
+    """
+    Nodos de un par (símbolo, intervalo) en orden topológico, con el
+    estado de la última vela cerrada procesada y la caché de la vela en curso
+    """
+
+    def __init__(self):
+        self.nodes: Dict[NodeKey, _Node] = {}
+        self.order: List[_Node] = []
+        self.columns: List[str] = []
+        self.last_timestamp = None
+        self.latest: Dict[NodeKey, IndicatorValue] = {}
+        self.lock = threading.RLock()
+        self._peek_key = None
+        self._peeked: Dict[NodeKey, IndicatorValue] = {}
+        self.stale = False
+
+        # Estadísticas
+        self.updates = 0
+        self.peeks = 0
+        self.hits = 0
+
+    def node(self, spec: Tuple, column: str = 'close') -> NodeKey:
+        """Obtiene (creando si no existe, con sus dependencias) el nodo de una especificación"""
+        kind, params = spec[0], tuple(spec[1:])
+        source = ('column', column)
+        if source not in self.nodes:
+            self._add(_Node(source, []))
+            self.columns.append(column)
+
+        if kind == 'column':
+            return source
+        if kind in ('ema', 'sma', 'rsi', 'variance'):
+            key = (kind,) + params + (source,)
+            if key not in self.nodes:
+                indicator = {'ema': IncrementalEMA, 'sma': IncrementalSMA,
+                             'rsi': IncrementalRSI, 'variance': _RollingVariance}[kind](*params)
+                self._add(_Node(key, [source], indicator=indicator))
+            return key
+        if kind == 'bollinger':
+            period, std_dev = (params + (2,))[:2]
+            key = ('bollinger', period, std_dev, source)
+            if key not in self.nodes:
+                inputs = [self.node(('sma', period), column), self.node(('variance', period), column)]
+                self._add(_Node(key, inputs, combine=_bands(std_dev)))
+            return key
+        if kind == 'macd':
+            fast, slow, signal = (params + (12, 26, 9)[len(params):])[:3]
+            key = ('macd', fast, slow, signal, source)
+            if key not in self.nodes:
+                line = ('macd_line', fast, slow, source)
+                if line not in self.nodes:
+                    self._add(_Node(line, [self.node(('ema', fast), column), self.node(('ema', slow), column)],
+                                    combine=lambda a, b: a - b))
+                signal_key = ('ema', signal, line)
+                if signal_key not in self.nodes:
+                    self._add(_Node(signal_key, [line], indicator=IncrementalEMA(signal)))
+                self._add(_Node(key, [line, signal_key], combine=_macd))
+            return key
+        raise ValueError(f"Indicador no soportado: {kind}")
+
+    def _add(self, node: _Node):
+        # Las dependencias se crean antes: el orden de inserción es topológico
+        self.nodes[node.key] = node
+        self.order.append(node)
+        if node.indicator is not None and self.last_timestamp is not None:
+            # Nodo nuevo sobre una serie ya procesada: se resiembra todo en la próxima vela
+            self.stale = True
+
+    def reset(self):
+        for node in self.order:
+            if node.indicator is not None:
+                node.indicator.reset()
+        self.last_timestamp = None
+        self.latest = {}
+        self._peek_key = None
+        self.stale = False
+
+    def _evaluate(self, candle: Dict[str, float], commit: bool) -> Dict[NodeKey, IndicatorValue]:
+        values = {}
+        for node in self.order:
+            if node.indicator is not None:
+                value = values[node.inputs[0]]
+                values[node.key] = node.indicator.update(value) if commit else node.indicator.peek(value)
+            elif node.combine is not None:
+                values[node.key] = node.combine(*[values[key] for key in node.inputs])
+            else:
+                values[node.key] = float(candle[node.key[1]])
+        return values
+
+    def sync(self, data: pd.DataFrame, last_closed: bool = False) -> Dict[NodeKey, IndicatorValue]:
+        """
+        Incorpora las velas cerradas aún no procesadas y evalúa la última
+
+        Mismo contrato que IncrementalIndicatorEngine.sync; la evaluación de
+        la vela en curso se cachea hasta que cambia o cierra.
+        """
+        if data.empty:
+            return {}
+
+        timestamps = np.asarray(data['timestamp'])
+        arrays = {column: np.asarray(data[column], dtype=float) for column in self.columns}
+
+        closed_end = len(data) if last_closed else len(data) - 1
+        start = 0
+        if self.stale:
+            self.reset()
+        elif self.last_timestamp is not None:
+            if timestamps[0] > self.last_timestamp or self.last_timestamp > timestamps[-1]:
+                logger.warning("Hueco en los datos de indicadores, reiniciando estado")
+                self.reset()
+            else:
+                start = int(np.searchsorted(timestamps, self.last_timestamp, side='right'))
+
+        for i in range(start, closed_end):
+            self.latest = self._evaluate({column: values[i] for column, values in arrays.items()}, commit=True)
+            self.last_timestamp = timestamps[i]
+            self.updates += 1
+
+        if last_closed or start > closed_end:
+            # La última vela ya está cerrada (o la cerró otro consumidor con una ventana más reciente)
+            return self.latest
+
+        current = {column: values[-1] for column, values in arrays.items()}
+        peek_key = (timestamps[-1], tuple(current.values()))
+        if peek_key == self._peek_key:
+            self.hits += 1
+            return self._peeked
+        self._peeked = self._evaluate(current, commit=False)
+        self._peek_key = peek_key
+        self.peeks += 1
+        return self._peeked
+
+
+class IndicatorSubscription:
+    """
+    Indicadores que un consumidor (bot, estrategia) declara sobre un par.
+
+    Expone la misma interfaz que IncrementalIndicatorEngine (add_indicator,
+    sync, reset, get), pero cada nombre apunta a un nodo compartido del
+    grafo: los indicadores idénticos de distintos consumidores se calculan
+    una sola vez
+    """
+
+    def __init__(self, graph: 'IndicatorGraph', symbol: str, interval: str):
+        """
+        Inicializa la suscripción
+
+        Args:
+            graph: Grafo de indicadores
+            symbol: Par de trading
+            interval: Intervalo de las velas
+        """
+        self.graph = graph
+        self.symbol = symbol
+        self.interval = interval
+        self._series = graph.series(symbol, interval)
+        self._names: Dict[str, NodeKey] = {}
+        self.latest: Dict[str, IndicatorValue] = {}
+
+    def add_indicator(self, name: str, spec: Tuple, column: str = 'close') -> 'IndicatorSubscription':
+        """
+        Declara un indicador
+
+        Args:
+            name: Nombre con el que se expondrá el valor
+            spec: Especificación: ('ema', 20), ('sma', 20), ('rsi', 14),
+                  ('bollinger', 20, 2), ('macd', 12, 26, 9) o ('column',)
+            column: Columna de la vela que alimenta el indicador
+
+        Returns:
+            La propia suscripción (para encadenar llamadas)
+        """
+        with self._series.lock:
+            key = self._series.node(tuple(spec), column)
+            previous = self._names.get(name)
+            if previous != key:
+                if previous is not None:
+                    self._series.nodes[previous].consumers -= 1
+                self._series.nodes[key].consumers += 1
+                self._names[name] = key
+        return self
+
+    def reset(self):
+        """
+        Reinicia el estado de los indicadores del par
+        """
+        with self._series.lock:
+            self._series.reset()
+        self.latest = {}
+
+    def sync(self, data: pd.DataFrame, last_closed: bool = False) -> Dict[str, IndicatorValue]:
+        """
+        Sincroniza el par con una ventana de velas y devuelve los indicadores
+        declarados en la última vela
+
+        Args:
+            data: DataFrame u OHLCV con 'timestamp' y las columnas usadas
+            last_closed: True si la última vela también está cerrada
+
+        Returns:
+            Dict con el valor de cada indicador en la última vela
+        """
+        with self._series.lock:
+            values = self._series.sync(data, last_closed)
+            if not values:
+                return {}
+            self.latest = {name: self._series.latest.get(key) for name, key in self._names.items()}
+            return {name: values[key] for name, key in self._names.items()}
+
+    def get(self, name: str, default: Optional[IndicatorValue] = None) -> Optional[IndicatorValue]:
+        """
+        Obtiene el último valor confirmado de un indicador
+
+        Args:
+            name: Nombre del indicador
+            default: Valor por defecto
+
+        Returns:
+            Valor del indicador o default
+        """
+        value = self.latest.get(name)
+        return default if value is None else value
+
+
+class IndicatorGraph:
+    """
+    Grafo declarativo de indicadores compartido por el proceso.
+
+    Los consumidores declaran los indicadores que necesitan sobre un par
+    (símbolo, intervalo); los nodos idénticos se deduplican (una sola
+    EMA(20) del cierre de BTCUSDT 5m para todos) y los compuestos se
+    descomponen en nodos compartidos (el MACD reutiliza las EMAs, las
+    Bandas de Bollinger la SMA). Cada vela cerrada se evalúa una sola vez
+    en orden topológico y la vela en curso se cachea hasta que cambia
+    """
+
+    def __init__(self):
+        """
+        Inicializa el grafo vacío
+        """
+        self._series: Dict[Tuple[str, str], _SeriesGraph] = {}
+        self._lock = threading.Lock()
+
+    def series(self, symbol: str, interval: str) -> _SeriesGraph:
+        key = (symbol.upper(), interval)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _SeriesGraph()
+            return series
+
+    def subscribe(self, symbol: str, interval: str) -> IndicatorSubscription:
+        """
+        Crea la suscripción de un consumidor a un par
+
+        Args:
+            symbol: Par de trading
+            interval: Intervalo de las velas
+
+        Returns:
+            Suscripción en la que declarar los indicadores
+        """
+        return IndicatorSubscription(self, symbol, interval)
+
+    def get_statistics(self) -> Dict:
+        """
+        Obtiene estadísticas del grafo
+
+        Returns:
+            Dict con estadísticas (declaraciones = uso de nodos por los consumidores)
+        """
+        series = list(self._series.values())
+        return {
+            'series': len(series),
+            'nodes': sum(len(s.nodes) for s in series),
+            'declarations': sum(n.consumers for s in series for n in s.order),
+            'updates': sum(s.updates for s in series),
+            'peeks': sum(s.peeks for s in series),
+            'hits': sum(s.hits for s in series)
+        }
+
+
+_shared_graph = IndicatorGraph()
+
+
+def get_indicator_graph() -> IndicatorGraph:
+    """
+    Obtiene el grafo de indicadores compartido por el proceso
+
+    Returns:
+        Instancia compartida de IndicatorGraph
+    """
+    return _shared_graph
@@ -0,0 +1,123 @@
+from itertools import chain
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+OHLCV_FIELDS = ('open', 'high', 'low', 'close', 'volume')
+
+
+class OHLCV:
+    """
+    Contenedor ligero de velas: un array NumPy por columna.
+
+    Se indexa como el DataFrame de klines_to_dataframe (data['close'],
+    len(data), data.empty) pero cada columna es un ndarray, por lo que
+    las estrategias leen valores sin pasar por pandas
+    """
+
+    __slots__ = ('timestamp', 'open', 'high', 'low', 'close', 'volume')
+
+    def __init__(self, timestamp: np.ndarray, open: np.ndarray, high: np.ndarray,
+                 low: np.ndarray, close: np.ndarray, volume: np.ndarray):
+        self.timestamp = timestamp
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+
+    @classmethod
+    def from_klines(cls, klines: List[List]) -> 'OHLCV':
+        """
+        Decodifica velas en formato REST/WebSocket leyendo solo los campos usados
+
+        Args:
+            klines: Lista de velas (12 campos cada una, precios como str o float)
+
+        Returns:
+            Contenedor OHLCV
+        """
+        n = len(klines)
+        timestamp = np.fromiter((row[0] for row in klines), dtype=np.int64, count=n)
+        values = np.fromiter(
+            map(float, chain.from_iterable(row[1:6] for row in klines)), dtype=np.float64, count=5 * n
+        )
+        # Una fila contigua por columna
+        columns = values.reshape(n, 5).T.copy()
+        return cls(timestamp.view('datetime64[ms]'), *columns)
+
+    @classmethod
+    def from_dataframe(cls, data: pd.DataFrame) -> 'OHLCV':
+        """
+        Construye el contenedor desde un DataFrame con timestamp y OHLCV
+
+        Args:
+            data: DataFrame de velas
+
+        Returns:
+            Contenedor OHLCV
+        """
+        timestamp = data['timestamp'].to_numpy().astype('datetime64[ms]')
+        return cls(timestamp, *(data[field].to_numpy(dtype=float) for field in OHLCV_FIELDS))
+
+    @classmethod
+    def empty_frame(cls) -> 'OHLCV':
+        """
+        Contenedor sin velas (equivalente a pd.DataFrame())
+        """
+        return cls.from_klines([])
+
+    @property
+    def empty(self) -> bool:
+        return len(self.timestamp) == 0
+
+    def __len__(self) -> int:
+        return len(self.timestamp)
+
+    def __contains__(self, column: str) -> bool:
+        return column in self.__slots__
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            if key not in self.__slots__:
+                raise KeyError(key)
+            return getattr(self, key)
+        # Corte de filas: devuelve vistas, sin copiar
+        return OHLCV(*(getattr(self, column)[key] for column in self.__slots__))
+
+    def tail(self, n: int) -> 'OHLCV':
+        """
+        Obtiene las últimas n velas
+
+        Args:
+            n: Número de velas
+
+        Returns:
+            Contenedor con las últimas velas (vistas)
+        """
+        return self[-n:] if n > 0 else self[:0]
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """
+        Convierte el contenedor a DataFrame (timestamp y OHLCV)
+
+        Returns:
+            DataFrame de velas
+        """
+        data = pd.DataFrame({field: getattr(self, field) for field in OHLCV_FIELDS})
+        data.insert(0, 'timestamp', pd.to_datetime(self.timestamp))
+        return data
+
+
+def parse_klines(klines: Optional[List[List]]) -> OHLCV:
+    """
+    Decodifica velas del exchange directamente a arrays NumPy
+
+    Args:
+        klines: Lista de velas en formato REST (o None)
+
+    Returns:
+        Contenedor OHLCV
+    """
+    return OHLCV.from_klines(klines or [])
@@ -0,0 +1,329 @@
+import math
+import time
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from exchange_client import ExchangeClientPool, get_client_pool
+from leader_feed import order_to_trade
+
+logger = logging.getLogger(__name__)
+
+
+def _trade_timestamp(trade: Dict) -> float:
+    return trade['time'].timestamp() if hasattr(trade['time'], 'timestamp') else float(trade['time'])
+
+
+class _Bucket:
+    """
+    Estadísticas de las operaciones de un intervalo de tiempo.
+
+    Además de sumas guarda el máximo y mínimo del P&L acumulado y el
+    drawdown interno, de modo que los buckets se combinan en orden sin
+    recorrer las operaciones
+    """
+
+    __slots__ = ('trades', 'closed', 'wins', 'pnl', 'returns', 'returns_sq',
+                 'peak', 'trough', 'drawdown')
+
+    def __init__(self):
+        self.trades = 0
+        self.closed = 0
+        self.wins = 0
+        self.pnl = 0.0
+        self.returns = 0.0
+        self.returns_sq = 0.0
+        self.peak = 0.0        # Máximo del P&L acumulado desde el inicio del bucket
+        self.trough = 0.0      # Mínimo del P&L acumulado desde el inicio del bucket
+        self.drawdown = 0.0    # Máxima caída dentro del bucket
+
+    def add(self, pnl: Optional[float], ret: Optional[float]):
+        self.trades += 1
+        if pnl is None:
+            return
+        self.closed += 1
+        self.wins += pnl > 0
+        self.pnl += pnl
+        self.returns += ret
+        self.returns_sq += ret * ret
+        self.peak = max(self.peak, self.pnl)
+        self.trough = min(self.trough, self.pnl)
+        self.drawdown = max(self.drawdown, self.peak - self.pnl)
+
+
+class _LeaderStats:
+    """Inventario por símbolo y buckets temporales de un líder"""
+
+    def __init__(self):
+        self.buckets: Dict[int, _Bucket] = {}
+        self.inventory: Dict[str, List[float]] = {}   # símbolo -> [cantidad, coste medio]
+        self.seen: Dict[Tuple[str, int], int] = {}    # (símbolo, order_id) -> bucket
+        self.loaded_at = 0.0
+        self.loading = False
+        self.pending: List[Dict] = []                 # Operaciones recibidas mientras se carga el histórico
+        self.cached: Optional[Dict] = None
+        self.cached_at = 0.0
+        self.dirty = True
+
+
+class LeaderAnalytics:
+    """
+    Estadísticas móviles de rendimiento por líder.
+
+    Cada operación detectada actualiza en O(1) el bucket temporal que le
+    corresponde (win rate, P&L, retornos para Sharpe y drawdown); el
+    resultado de la ventana se cachea con un TTL y se recalcula solo
+    combinando buckets. El histórico de la ventana se descarga una única
+    vez por líder
+    """
+
+    def __init__(self, client_pool: Optional[ExchangeClientPool] = None,
+                 window: float = 7 * 86400.0, bucket_seconds: float = 3600.0,
+                 ttl: float = 300.0, symbols: Optional[List[str]] = None):
+        """
+        Inicializa las estadísticas
+
+        Args:
+            client_pool: Pool de clientes para las credenciales de los líderes
+            window: Segundos de la ventana móvil (default: 1 semana)
+            bucket_seconds: Segundos por bucket
+            ttl: Segundos de validez de las estadísticas calculadas
+            symbols: Símbolos descargados al cargar el histórico de un líder
+        """
+        self.client_pool = client_pool or get_client_pool()
+        self.window = window
+        self.bucket_seconds = bucket_seconds
+        self.ttl = ttl
+        self.symbols = [s.upper() for s in (symbols or ['BTCUSDT', 'ETHUSDT'])]
+
+        self._leaders: Dict[str, _LeaderStats] = {}
+        self._lock = threading.RLock()
+
+        # Estadísticas
+        self.loads = 0
+        self.updates = 0
+        self.recomputes = 0
+        self.hits = 0
+
+    def _stats(self, leader_id: str) -> _LeaderStats:
+        stats = self._leaders.get(leader_id)
+        if stats is None:
+            stats = self._leaders[leader_id] = _LeaderStats()
+        return stats
+
+    def _bucket_key(self, timestamp: float) -> int:
+        return int(timestamp // self.bucket_seconds)
+
+    def add_trade(self, leader_id: str, trade: Dict) -> bool:
+        """
+        Incorpora una operación de un líder
+
+        Las compras aumentan el inventario del símbolo a coste medio; las
+        ventas realizan P&L contra ese coste. Si el histórico del líder se
+        está descargando, la operación se aplica al terminar, en su orden
+
+        Args:
+            leader_id: ID del líder
+            trade: Operación (symbol, side, quantity, price, time, order_id)
+
+        Returns:
+            True si la operación era nueva
+        """
+        with self._lock:
+            stats = self._stats(leader_id)
+            if stats.loading:
+                stats.pending.append(trade)
+                return (trade['symbol'], trade['order_id']) not in stats.seen
+            return self._apply(stats, trade)
+
+    def _apply(self, stats: _LeaderStats, trade: Dict) -> bool:
+        key = self._bucket_key(_trade_timestamp(trade))
+        seen_key = (trade['symbol'], trade['order_id'])
+        with self._lock:
+            if seen_key in stats.seen:
+                return False
+
+            quantity, price = float(trade['quantity']), float(trade['price'])
+            inventory = stats.inventory.setdefault(trade['symbol'], [0.0, 0.0])
+            pnl = ret = None
+            if trade['side'].upper() == 'BUY':
+                total = inventory[0] + quantity
+                if total > 0:
+                    inventory[1] = (inventory[0] * inventory[1] + quantity * price) / total
+                inventory[0] = total
+            elif inventory[0] > 0 and inventory[1] > 0:
+                closed = min(quantity, inventory[0])
+                pnl = (price - inventory[1]) * closed
+                ret = price / inventory[1] - 1
+                inventory[0] -= closed
+
+            if key >= self._bucket_key(time.time() - self.window):
+                stats.buckets.setdefault(key, _Bucket()).add(pnl, ret)
+            stats.seen[seen_key] = key
+            stats.dirty = True
+            self.updates += 1
+            return True
+
+    def load(self, leader: Dict, symbols: Optional[List[str]] = None) -> int:
+        """
+        Descarga una sola vez el histórico de la ventana de un líder
+
+        Args:
+            leader: Configuración del líder (id, api_key, api_secret, symbols opcional)
+            symbols: Símbolos a descargar (default: leader['symbols'] o los configurados)
+
+        Returns:
+            Número de operaciones incorporadas
+        """
+        with self._lock:
+            stats = self._stats(leader['id'])
+            stats.loaded_at = time.time()
+            stats.loading = True
+
+        trades = []
+        try:
+            if leader.get('api_key') and leader.get('api_secret'):
+                trades = self._fetch_history(leader, symbols)
+        finally:
+            with self._lock:
+                # Las operaciones en vivo recibidas durante la descarga se aplican después del histórico
+                trades.extend(stats.pending)
+                trades.sort(key=_trade_timestamp)
+                added = sum(self._apply(stats, trade) for trade in trades)
+                stats.pending = []
+                stats.loading = False
+        self.loads += 1
+        return added
+
+    def _fetch_history(self, leader: Dict, symbols: Optional[List[str]]) -> List[Dict]:
+        client = self.client_pool.get_client(leader['api_key'], leader['api_secret'])
+        start_ms = int((time.time() - self.window) * 1000)
+
+        trades = []
+        for symbol in symbols or leader.get('symbols') or self.symbols:
+            try:
+                cursor = None
+                while True:
+                    if cursor is None:
+                        orders = client.get_all_orders(symbol=symbol, startTime=start_ms, limit=1000)
+                    else:
+                        orders = client.get_all_orders(symbol=symbol, orderId=cursor + 1, limit=1000)
+                    trades.extend(order_to_trade(o) for o in orders
+                                  if o['status'] == 'FILLED' and float(o['executedQty']) > 0)
+                    if len(orders) < 1000:
+                        break
+                    cursor = max(o['orderId'] for o in orders)
+            except Exception as e:
+                logger.error(f"Error cargando histórico del líder {leader.get('name', leader['id'])} en {symbol}: {e}")
+        return trades
+
+    def ensure_loaded(self, leader: Dict):
+        """
+        Descarga el histórico del líder si aún no se ha cargado
+
+        Args:
+            leader: Configuración del líder
+        """
+        with self._lock:
+            stats = self._leaders.get(leader['id'])
+            needs_load = stats is None or not stats.loaded_at
+        if needs_load:
+            self.load(leader)
+
+    def _expire(self, stats: _LeaderStats, now: float):
+        oldest = self._bucket_key(now - self.window)
+        expired = [key for key in stats.buckets if key < oldest]
+        for key in expired:
+            del stats.buckets[key]
+        if expired:
+            stats.seen = {order_id: key for order_id, key in stats.seen.items() if key >= oldest}
+            stats.dirty = True
+
+    def _compute(self, stats: _LeaderStats) -> Dict:
+        trades = closed = wins = 0
+        pnl = returns = returns_sq = 0.0
+        peak = drawdown = 0.0
+        for key in sorted(stats.buckets):
+            bucket = stats.buckets[key]
+            trades += bucket.trades
+            closed += bucket.closed
+            wins += bucket.wins
+            returns += bucket.returns
+            returns_sq += bucket.returns_sq
+            # Combinación en orden: caída desde el máximo previo hasta el mínimo del bucket
+            drawdown = max(drawdown, bucket.drawdown, peak - (pnl + bucket.trough))
+            peak = max(peak, pnl + bucket.peak)
+            pnl += bucket.pnl
+
+        mean = returns / closed if closed else 0.0
+        variance = returns_sq / closed - mean * mean if closed else 0.0
+        std = math.sqrt(variance) if variance > 0 else 0.0
+
+        # Mismo criterio que calculate_leader_performance
+        win_rate = wins / trades if trades else 0.0
+        avg_pnl = pnl / trades if trades else 0.0
+        score = (win_rate * 0.7) + (min(avg_pnl / 100, 1.0) * 0.3) if trades else 0.0
+
+        return {
+            'trades': trades,
+            'closed_trades': closed,
+            'win_rate': win_rate,
+            'realized_win_rate': wins / closed if closed else 0.0,
+            'total_pnl': pnl,
+            'avg_pnl': avg_pnl,
+            'max_drawdown': drawdown,
+            'sharpe': mean / std if std > 0 else 0.0,
+            'score': max(0.0, min(1.0, score))
+        }
+
+    def get_statistics(self, leader: Dict) -> Dict:
+        """
+        Obtiene las estadísticas de la ventana de un líder
+
+        Args:
+            leader: Configuración del líder
+
+        Returns:
+            Dict con trades, win rate, P&L, drawdown, Sharpe y score
+        """
+        now = time.time()
+        self.ensure_loaded(leader)
+
+        with self._lock:
+            stats = self._stats(leader['id'])
+            if stats.cached is not None and not stats.dirty and now - stats.cached_at < self.ttl:
+                self.hits += 1
+                return stats.cached
+            self._expire(stats, now)
+            stats.cached = self._compute(stats)
+            stats.cached_at = now
+            stats.dirty = False
+            self.recomputes += 1
+            return stats.cached
+
+    def get_score(self, leader: Dict) -> float:
+        """
+        Obtiene el score de rendimiento (0-1) de un líder
+
+        Args:
+            leader: Configuración del líder
+
+        Returns:
+            Score de rendimiento
+        """
+        return self.get_statistics(leader)['score']
+
+    def get_cache_statistics(self) -> Dict:
+        """
+        Obtiene estadísticas de uso de la caché
+
+        Returns:
+            Dict con estadísticas
+        """
+        return {
+            'leaders': len(self._leaders),
+            'loads': self.loads,
+            'updates': self.updates,
+            'recomputes': self.recomputes,
+            'hits': self.hits
+        }
@@ -0,0 +1,391 @@
+import time
+import queue
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from exchange_client import ExchangeClientPool, get_client_pool
+from user_data_stream import BINANCE_USER_STREAM_URL, OrderLedger, UserDataStream
+
+logger = logging.getLogger(__name__)
+
+FINAL_ORDER_STATUSES = ('FILLED', 'CANCELED', 'REJECTED', 'EXPIRED', 'EXPIRED_IN_MATCH')
+
+
+def order_to_trade(order: Dict) -> Dict:
+    """
+    Convierte una orden ejecutada de Binance en una operación de líder
+
+    Args:
+        order: Orden de get_all_orders / get_order
+
+    Returns:
+        Dict con symbol, side, quantity, price (precio medio), time y order_id
+    """
+    quantity = float(order['executedQty'])
+    quote = float(order.get('cummulativeQuoteQty', 0.0) or 0.0)
+    # Las órdenes de mercado tienen price '0': se usa el precio medio ejecutado
+    price = quote / quantity if quote > 0 and quantity > 0 else float(order.get('price', 0.0))
+    return {
+        'symbol': order['symbol'],
+        'side': order['side'],
+        'quantity': quantity,
+        'price': price,
+        'time': datetime.fromtimestamp(order.get('updateTime', order['time']) / 1000),
+        'order_id': order['orderId']
+    }
+
+
+class _Cursor:
+    """Posición de lectura de un líder en un símbolo"""
+
+    __slots__ = ('last_id', 'seen', 'open_ids', 'interval', 'next_poll')
+
+    def __init__(self, last_id: Optional[int], interval: float, open_ids: Iterable[int] = ()):
+        self.last_id = last_id      # Última orden ya leída (None = sin arrancar)
+        self.seen = set()           # Órdenes emitidas por encima del cursor
+        self.open_ids = set(open_ids)   # Órdenes leídas aún abiertas: se revisan una a una
+        self.interval = interval
+        self.next_poll = 0.0
+
+
+class LeaderFeed:
+    """
+    Feed incremental de operaciones de los líderes.
+
+    Mantiene por líder y símbolo un cursor de orderId y solo pide órdenes
+    posteriores (get_all_orders con symbol y orderId); los pares sin
+    actividad se consultan con intervalo creciente, de modo que el coste
+    en API depende de la actividad. Las operaciones nuevas se deduplican y
+    se publican en una cola para el motor de copias. Opcionalmente se
+    suscribe al user data stream del líder para detectarlas al instante
+    """
+
+    def __init__(self, client_pool: Optional[ExchangeClientPool] = None,
+                 symbols: Optional[List[str]] = None,
+                 min_interval: float = 5.0, max_interval: float = 60.0,
+                 lookback: float = 3600.0, page_size: int = 100,
+                 state_store=None, use_user_stream: bool = False,
+                 stream_url: str = BINANCE_USER_STREAM_URL):
+        """
+        Inicializa el feed
+
+        Args:
+            client_pool: Pool de clientes para las credenciales de los líderes
+            symbols: Símbolos vigilados por defecto para cada líder
+            min_interval: Segundos entre consultas de un par con actividad
+            max_interval: Segundos máximos entre consultas de un par sin actividad
+            lookback: Segundos de histórico emitidos al arrancar un cursor nuevo
+            page_size: Órdenes por petición
+            state_store: StateStore donde persistir los cursores (opcional)
+            use_user_stream: Suscribirse al user data stream de cada líder
+            stream_url: URL base del user data stream
+        """
+        self.client_pool = client_pool or get_client_pool()
+        self.symbols = [s.upper() for s in (symbols or ['BTCUSDT', 'ETHUSDT'])]
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.lookback = lookback
+        self.page_size = page_size
+        self.state_store = state_store
+        self.use_user_stream = use_user_stream
+        self.stream_url = stream_url
+
+        self.trades: 'queue.Queue[Tuple[Dict, Dict]]' = queue.Queue()
+        self._leaders: Dict[str, Dict] = {}
+        self._cursors: Dict[Tuple[str, str], _Cursor] = {}
+        self._streams: Dict[str, UserDataStream] = {}
+        self._lock = threading.RLock()
+        self._thread = None
+        self._stop = threading.Event()
+        self.is_running = False
+
+        # Estadísticas
+        self.requests = 0
+        self.emitted = 0
+        self.duplicates = 0
+        self.stream_events = 0
+
+    def add_leader(self, leader: Dict, symbols: Optional[List[str]] = None):
+        """
+        Registra un líder a vigilar
+
+        Args:
+            leader: Configuración del líder (id, api_key, api_secret, symbols opcional)
+            symbols: Símbolos vigilados (default: leader['symbols'] o los del feed)
+        """
+        if not leader.get('api_key') or not leader.get('api_secret'):
+            logger.warning(f"Líder {leader.get('name', leader['id'])} sin credenciales: no se vigila")
+            return
+        with self._lock:
+            self._leaders[leader['id']] = leader
+            for symbol in symbols or leader.get('symbols') or self.symbols:
+                self._add_cursor(leader['id'], symbol.upper())
+
+    def _add_cursor(self, leader_id: str, symbol: str) -> _Cursor:
+        key = (leader_id, symbol)
+        cursor = self._cursors.get(key)
+        if cursor is None:
+            stored = self.state_store.get(self._state_key(key)) if self.state_store is not None else None
+            cursor = self._cursors[key] = _Cursor(stored['last_id'] if stored else None, self.min_interval,
+                                                  stored.get('open', ()) if stored else ())
+        return cursor
+
+    @staticmethod
+    def _state_key(key: Tuple[str, str]) -> str:
+        return f"leader_feed:{key[0]}:{key[1]}"
+
+    def _client(self, leader: Dict):
+        return self.client_pool.get_client(leader['api_key'], leader['api_secret'])
+
+    def _emit(self, leader: Dict, cursor: _Cursor, order: Dict) -> bool:
+        order_id = order['orderId']
+        if order_id in cursor.open_ids:
+            # Orden que se leyó abierta y ya ha terminado: se emite una sola vez
+            cursor.open_ids.discard(order_id)
+        elif order_id in cursor.seen or (cursor.last_id is not None and order_id <= cursor.last_id):
+            self.duplicates += 1
+            return False
+        cursor.seen.add(order_id)
+        self.trades.put((leader, order_to_trade(order)))
+        self.emitted += 1
+        return True
+
+    @staticmethod
+    def _is_copyable(order: Dict) -> bool:
+        return (order['status'] in ('FILLED', 'CANCELED', 'EXPIRED')
+                and float(order.get('executedQty', 0.0) or 0.0) > 0)
+
+    def _check_open(self, leader: Dict, symbol: str, cursor: _Cursor, client) -> int:
+        """Revisa las órdenes que seguían abiertas y emite las que ya se ejecutaron"""
+        emitted = 0
+        still_open = len(cursor.open_ids)
+        for order_id in sorted(cursor.open_ids):
+            try:
+                order = client.get_order(symbol=symbol, orderId=order_id)
+            except Exception as e:
+                logger.error(f"Error revisando la orden abierta {order_id} del líder {leader['id']}: {e}")
+                continue
+            self.requests += 1
+            if order['status'] not in FINAL_ORDER_STATUSES:
+                continue
+            with self._lock:
+                if self._is_copyable(order):
+                    emitted += self._emit(leader, cursor, order)
+                else:
+                    cursor.open_ids.discard(order_id)
+        if len(cursor.open_ids) != still_open:
+            with self._lock:
+                self._save(leader['id'], symbol, cursor)
+        return emitted
+
+    def poll_key(self, leader_id: str, symbol: str) -> int:
+        """
+        Consulta las órdenes nuevas de un líder en un símbolo
+
+        Args:
+            leader_id: ID del líder
+            symbol: Par de trading
+
+        Returns:
+            Número de operaciones nuevas publicadas
+        """
+        leader = self._leaders[leader_id]
+        with self._lock:
+            cursor = self._add_cursor(leader_id, symbol)
+        client = self._client(leader)
+        emitted = self._check_open(leader, symbol, cursor, client) if cursor.open_ids else 0
+
+        if cursor.last_id is None:
+            # Cursor nuevo: solo el histórico reciente
+            start_ms = int((time.time() - self.lookback) * 1000)
+            orders = client.get_all_orders(symbol=symbol, startTime=start_ms, limit=self.page_size)
+        else:
+            orders = client.get_all_orders(symbol=symbol, orderId=cursor.last_id + 1, limit=self.page_size)
+        self.requests += 1
+
+        previous = cursor.last_id
+        last_read = cursor.last_id
+        with self._lock:
+            for order in sorted(orders, key=lambda o: o['orderId']):
+                if last_read is None or order['orderId'] > last_read:
+                    last_read = order['orderId']
+                if order['status'] not in FINAL_ORDER_STATUSES:
+                    # El cursor sigue avanzando: la orden abierta se revisa aparte
+                    if order['orderId'] not in cursor.seen:
+                        cursor.open_ids.add(order['orderId'])
+                    continue
+                if self._is_copyable(order):
+                    emitted += self._emit(leader, cursor, order)
+
+            if last_read is None and not orders:
+                # Sin actividad en la ventana: se arranca desde la orden más reciente
+                recent = client.get_all_orders(symbol=symbol, limit=1)
+                self.requests += 1
+                last_read = recent[-1]['orderId'] if recent else 0
+            self._advance(leader_id, symbol, cursor, last_read)
+
+            # Página completa: quedan más órdenes, siempre que el cursor haya avanzado
+            more = len(orders) >= self.page_size and cursor.last_id != previous
+            if emitted or more:
+                cursor.interval = self.min_interval
+            else:
+                cursor.interval = min(cursor.interval * 2, self.max_interval)
+            cursor.next_poll = time.time() + (0 if more else cursor.interval)
+        return emitted
+
+    def _advance(self, leader_id: str, symbol: str, cursor: _Cursor, last_id: Optional[int]):
+        if last_id is None or (cursor.last_id is not None and last_id <= cursor.last_id):
+            return
+        cursor.last_id = last_id
+        cursor.seen = {order_id for order_id in cursor.seen if order_id > last_id}
+        self._save(leader_id, symbol, cursor)
+
+    def _save(self, leader_id: str, symbol: str, cursor: _Cursor):
+        if self.state_store is not None and cursor.last_id is not None:
+            self.state_store.put(self._state_key((leader_id, symbol)),
+                                 {'last_id': cursor.last_id, 'open': sorted(cursor.open_ids)})
+
+    def poll(self, force: bool = False) -> int:
+        """
+        Consulta los pares cuyo intervalo ha vencido
+
+        Args:
+            force: Consultar todos los pares aunque no haya vencido su intervalo
+
+        Returns:
+            Número de operaciones nuevas publicadas
+        """
+        now = time.time()
+        with self._lock:
+            due = [key for key, cursor in self._cursors.items()
+                   if force or cursor.next_poll <= now]
+        emitted = 0
+        for leader_id, symbol in due:
+            try:
+                emitted += self.poll_key(leader_id, symbol)
+            except Exception as e:
+                logger.error(f"Error consultando órdenes del líder {leader_id} en {symbol}: {e}")
+                with self._lock:
+                    cursor = self._cursors[(leader_id, symbol)]
+                    cursor.next_poll = time.time() + cursor.interval
+        return emitted
+
+    def handle_event(self, leader_id: str, event: Dict):
+        """
+        Aplica un executionReport del user data stream de un líder
+
+        Args:
+            leader_id: ID del líder
+            event: Evento ya decodificado
+        """
+        if event.get('e') != 'executionReport' or event.get('X') != 'FILLED':
+            return
+        leader = self._leaders.get(leader_id)
+        if leader is None:
+            return
+        self.stream_events += 1
+        order = {
+            'symbol': event['s'], 'side': event['S'], 'orderId': event['i'], 'status': 'FILLED',
+            'executedQty': event['z'], 'cummulativeQuoteQty': event.get('Z', '0'),
+            'price': event.get('p', '0'), 'time': event.get('O', event['E']), 'updateTime': event['E']
+        }
+        with self._lock:
+            # Un símbolo nuevo del líder pasa a vigilarse también por REST
+            cursor = self._add_cursor(leader_id, event['s'])
+            if cursor.last_id is None:
+                cursor.last_id = event['i'] - 1
+            was_open = event['i'] in cursor.open_ids
+            self._emit(leader, cursor, order)
+            if was_open:
+                self._save(leader_id, event['s'], cursor)
+
+    def get(self, timeout: Optional[float] = None) -> Optional[Tuple[Dict, Dict]]:
+        """
+        Obtiene la siguiente operación de un líder
+
+        Args:
+            timeout: Segundos máximos de espera (None = sin espera)
+
+        Returns:
+            Tupla (líder, operación) o None si no hay
+        """
+        try:
+            if timeout is None:
+                return self.trades.get_nowait()
+            return self.trades.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def drain(self) -> List[Tuple[Dict, Dict]]:
+        """
+        Obtiene todas las operaciones pendientes
+
+        Returns:
+            Lista de tuplas (líder, operación)
+        """
+        items = []
+        while True:
+            item = self.get()
+            if item is None:
+                return items
+            items.append(item)
+
+    def _start_streams(self):
+        for leader_id, leader in self._leaders.items():
+            if leader_id in self._streams:
+                continue
+            stream = UserDataStream(self._client(leader), OrderLedger(), url=self.stream_url)
+            stream.add_listener(lambda event, leader_id=leader_id: self.handle_event(leader_id, event))
+            stream.start()
+            self._streams[leader_id] = stream
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.poll()
+            with self._lock:
+                next_poll = min((c.next_poll for c in self._cursors.values()), default=time.time() + 1)
+            self._stop.wait(min(max(0.1, next_poll - time.time()), self.min_interval))
+
+    def start(self):
+        """
+        Inicia la consulta periódica (y los user data streams si se usan)
+        """
+        if self.is_running:
+            return
+        self.is_running = True
+        self._stop.clear()
+        if self.use_user_stream:
+            self._start_streams()
+        self._thread = threading.Thread(target=self._run, name='leader-feed', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Detiene el feed
+        """
+        self.is_running = False
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        for stream in self._streams.values():
+            stream.stop()
+        self._streams.clear()
+
+    def get_statistics(self) -> Dict:
+        """
+        Obtiene estadísticas del feed
+
+        Returns:
+            Dict con estadísticas
+        """
+        return {
+            'leaders': len(self._leaders),
+            'cursors': len(self._cursors),
+            'requests': self.requests,
+            'emitted': self.emitted,
+            'duplicates': self.duplicates,
+            'stream_events': self.stream_events,
+            'pending': self.trades.qsize()
+        }
@@ -0,0 +1,235 @@
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+INTERVAL_SECONDS = {
+    '1m': 60, '3m': 180, '5m': 300, '15m': 900, '30m': 1800,
+    '1h': 3600, '2h': 7200, '4h': 14400, '6h': 21600, '8h': 28800, '12h': 43200,
+    '1d': 86400, '3d': 259200, '1w': 604800, '1M': 2592000
+}
+
+
+def interval_to_seconds(interval: str) -> int:
+    """
+    Convierte un intervalo de Binance ('1m', '4h', ...) a segundos
+
+    Args:
+        interval: Intervalo de velas
+
+    Returns:
+        Duración en segundos
+    """
+    if interval not in INTERVAL_SECONDS:
+        raise ValueError(f"Intervalo no soportado: {interval}")
+    return INTERVAL_SECONDS[interval]
+
+
+class _InFlight:
+    """Petición en curso compartida por todos los que piden la misma clave"""
+
+    __slots__ = ('event', 'result', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class MarketDataCache:
+    """
+    Caché de datos de mercado compartida por todos los bots del proceso.
+
+    Las velas se indexan por (símbolo, intervalo, límite) y caducan al cierre
+    de la vela en curso (o tras max_age segundos si ocurre antes), con
+    expulsión LRU. Las peticiones concurrentes idénticas se agrupan en una
+    única llamada al exchange
+    """
+
+    def __init__(self, max_entries: int = 256, max_age: float = 10.0, price_ttl: float = 1.0):
+        """
+        Inicializa la caché
+
+        Args:
+            max_entries: Número máximo de entradas de velas (LRU)
+            max_age: Antigüedad máxima en segundos de unas velas cacheadas
+            price_ttl: Validez en segundos de un precio cacheado
+        """
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.price_ttl = price_ttl
+
+        self._klines: 'OrderedDict[Tuple[str, str, int], Tuple[float, List[List]]]' = OrderedDict()
+        self._prices: Dict[str, Tuple[float, float]] = {}
+        self._in_flight: Dict[Tuple, _InFlight] = {}
+        self._lock = threading.Lock()
+
+        # Estadísticas
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def _coalesce(self, key: Tuple, fetch: Callable):
+        """
+        Ejecuta fetch una sola vez para todas las peticiones concurrentes de key
+        """
+        with self._lock:
+            in_flight = self._in_flight.get(key)
+            owner = in_flight is None
+            if owner:
+                in_flight = _InFlight()
+                self._in_flight[key] = in_flight
+            else:
+                self.coalesced += 1
+
+        if not owner:
+            in_flight.event.wait()
+            if in_flight.error is not None:
+                raise in_flight.error
+            return in_flight.result
+
+        try:
+            in_flight.result = fetch()
+            return in_flight.result
+        except Exception as e:
+            in_flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            in_flight.event.set()
+
+    def _lookup_klines(self, symbol: str, interval: str, limit: int, now: float) -> Optional[List[List]]:
+        # Una entrada con más velas también sirve para un límite menor
+        best = None
+        for key, (expires_at, klines) in self._klines.items():
+            if key[0] != symbol or key[1] != interval or key[2] < limit:
+                continue
+            if expires_at <= now:
+                continue
+            if best is None or key[2] < best[2]:
+                best = key
+        if best is None:
+            return None
+        self._klines.move_to_end(best)
+        klines = self._klines[best][1]
+        return klines[-limit:] if limit < len(klines) else klines
+
+    def _expiry(self, interval: str, klines: List[List], now: float) -> float:
+        expires_at = now + self.max_age
+        if klines and interval in INTERVAL_SECONDS:
+            next_close = (klines[-1][0] / 1000.0) + INTERVAL_SECONDS[interval]
+            expires_at = min(expires_at, max(next_close, now))
+        return expires_at
+
+    def get_klines(self, client, symbol: str, interval: str, limit: int) -> List[List]:
+        """
+        Obtiene velas leyendo a través de la caché
+
+        Args:
+            client: Cliente de Binance usado si hay que ir al exchange
+            symbol: Par de trading
+            interval: Intervalo de las velas
+            limit: Número de velas
+
+        Returns:
+            Lista de velas en formato REST (no debe modificarse)
+        """
+        symbol = symbol.upper()
+        with self._lock:
+            klines = self._lookup_klines(symbol, interval, limit, time.time())
+            if klines is not None:
+                self.hits += 1
+                return klines
+            self.misses += 1
+
+        key = ('klines', symbol, interval, limit)
+
+        def fetch():
+            klines = client.get_klines(symbol=symbol, interval=interval, limit=limit)
+            now = time.time()
+            with self._lock:
+                self._klines[(symbol, interval, limit)] = (self._expiry(interval, klines, now), klines)
+                self._klines.move_to_end((symbol, interval, limit))
+                while len(self._klines) > self.max_entries:
+                    self._klines.popitem(last=False)
+            return klines
+
+        return self._coalesce(key, fetch)
+
+    def get_price(self, client, symbol: str) -> float:
+        """
+        Obtiene el precio actual leyendo a través de la caché
+
+        Args:
+            client: Cliente de Binance usado si hay que ir al exchange
+            symbol: Par de trading
+
+        Returns:
+            Precio actual
+        """
+        symbol = symbol.upper()
+        with self._lock:
+            cached = self._prices.get(symbol)
+            if cached is not None and cached[1] > time.time():
+                self.hits += 1
+                return cached[0]
+            self.misses += 1
+
+        def fetch():
+            ticker = client.get_symbol_ticker(symbol=symbol)
+            price = float(ticker['price'])
+            with self._lock:
+                self._prices[symbol] = (price, time.time() + self.price_ttl)
+            return price
+
+        return self._coalesce(('price', symbol), fetch)
+
+    def invalidate(self, symbol: Optional[str] = None):
+        """
+        Elimina entradas de la caché
+
+        Args:
+            symbol: Par a invalidar (None = toda la caché)
+        """
+        with self._lock:
+            if symbol is None:
+                self._klines.clear()
+                self._prices.clear()
+                return
+            symbol = symbol.upper()
+            for key in [k for k in self._klines if k[0] == symbol]:
+                del self._klines[key]
+            self._prices.pop(symbol, None)
+
+    def get_statistics(self) -> Dict:
+        """
+        Obtiene estadísticas de la caché
+
+        Returns:
+            Dict con estadísticas
+        """
+        total = self.hits + self.misses
+        return {
+            'entries': len(self._klines),
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'hit_rate': (self.hits / total * 100) if total > 0 else 0
+        }
+
+
+_shared_cache = MarketDataCache()
+
+
+def get_shared_cache() -> MarketDataCache:
+    """
+    Obtiene la caché de datos de mercado compartida por el proceso
+
+    Returns:
+        Instancia compartida de MarketDataCache
+    """
+    return _shared_cache
@@ -0,0 +1,646 @@
+import json
+import time
+import base64
+import hashlib
+import logging
+import threading
+import socketserver
+from collections import deque
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+import websocket
+
+from kline_parser import OHLCV, parse_klines
+
+logger = logging.getLogger(__name__)
+
+BINANCE_STREAM_URL = 'wss://stream.binance.com:9443/stream'
+
+KLINE_COLUMNS = [
+    'timestamp', 'open', 'high', 'low', 'close', 'volume',
+    'close_time', 'quote_asset_volume', 'number_of_trades',
+    'taker_buy_base_asset_volume', 'taker_buy_quote_asset_volume', 'ignore'
+]
+
+
+def klines_to_dataframe(klines: List[List]) -> pd.DataFrame:
+    """
+    Convierte velas en formato REST de Binance al DataFrame usado por los bots
+
+    Args:
+        klines: Lista de velas (12 campos cada una)
+
+    Returns:
+        DataFrame con datos OHLCV
+    """
+    data = pd.DataFrame(klines, columns=KLINE_COLUMNS)
+
+    numeric_columns = ['open', 'high', 'low', 'close', 'volume']
+    for col in numeric_columns:
+        data[col] = pd.to_numeric(data[col], errors='coerce')
+
+    data['timestamp'] = pd.to_datetime(data['timestamp'], unit='ms')
+
+    return data
+
+
+def kline_event_to_row(kline: Dict) -> List:
+    """
+    Convierte el campo 'k' de un evento kline del WebSocket al formato REST
+
+    Args:
+        kline: Dict 'k' del evento
+
+    Returns:
+        Lista con los 12 campos de la vela
+    """
+    return [
+        kline['t'], kline['o'], kline['h'], kline['l'], kline['c'], kline['v'],
+        kline['T'], kline['q'], kline['n'], kline['V'], kline['Q'], kline.get('B', '0')
+    ]
+
+
+class CandleBuffer:
+    """
+    Buffer circular de velas para un par (símbolo, intervalo).
+    La última vela puede estar abierta y se actualiza en sitio
+    """
+
+    def __init__(self, maxlen: int = 500):
+        """
+        Inicializa el buffer
+
+        Args:
+            maxlen: Número máximo de velas retenidas
+        """
+        self.maxlen = maxlen
+        self._candles = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+        self.last_update = 0.0
+        self.last_closed = False
+
+    def seed(self, klines: List[List]):
+        """
+        Rellena el buffer con velas obtenidas por REST, conservando las
+        velas más recientes ya recibidas por el stream
+
+        Args:
+            klines: Lista de velas en formato REST
+        """
+        with self._lock:
+            streamed = {row[0]: row for row in self._candles}
+            merged = {row[0]: list(row) for row in klines}
+            merged.update(streamed)
+            self._candles.clear()
+            self._candles.extend(merged[key] for key in sorted(merged))
+            self.last_update = time.time()
+
+    def upsert(self, row: List, closed: bool = False):
+        """
+        Inserta una vela nueva o actualiza la vela en curso
+
+        Args:
+            row: Vela en formato REST
+            closed: True si la vela está cerrada
+        """
+        with self._lock:
+            if self._candles and self._candles[-1][0] == row[0]:
+                self._candles[-1] = row
+            elif not self._candles or self._candles[-1][0] < row[0]:
+                self._candles.append(row)
+            else:
+                # Vela antigua fuera de orden: se ignora
+                return
+            self.last_update = time.time()
+            self.last_closed = closed
+
+    def get_klines(self, limit: int) -> List[List]:
+        """
+        Obtiene las últimas velas del buffer
+
+        Args:
+            limit: Número de velas a obtener
+
+        Returns:
+            Lista de velas en formato REST
+        """
+        with self._lock:
+            if limit >= len(self._candles):
+                return list(self._candles)
+            return list(self._candles)[-limit:]
+
+    def last_price(self) -> Optional[float]:
+        """
+        Obtiene el último precio de cierre recibido
+
+        Returns:
+            Precio o None si el buffer está vacío
+        """
+        with self._lock:
+            if not self._candles:
+                return None
+            return float(self._candles[-1][4])
+
+    def __len__(self) -> int:
+        return len(self._candles)
+
+
+class KlineStream:
+    """
+    Suscripción a streams de velas (y ticker) de Binance por WebSocket.
+    Mantiene un buffer en memoria por símbolo/intervalo desde el que se
+    sirven los bots sin hacer peticiones REST en cada ciclo
+    """
+
+    def __init__(self, url: str = BINANCE_STREAM_URL, maxlen: int = 500,
+                 stale_after: float = 90.0, include_ticker: bool = True,
+                 candle_store=None, include_trades: bool = False, include_book_ticker: bool = False):
+        """
+        Inicializa el stream
+
+        Args:
+            url: URL base del stream combinado
+            maxlen: Velas retenidas por símbolo/intervalo
+            stale_after: Segundos sin datos tras los que el buffer se considera obsoleto
+            include_ticker: Suscribirse también a <symbol>@miniTicker
+            candle_store: CandleStore desde el que sembrar los buffers (opcional)
+            include_trades: Suscribirse también a <symbol>@aggTrade (precio en cada operación)
+            include_book_ticker: Suscribirse también a <symbol>@bookTicker (mid en cada cambio del mejor nivel)
+        """
+        self.url = url
+        self.maxlen = maxlen
+        self.stale_after = stale_after
+        self.include_ticker = include_ticker
+        self.candle_store = candle_store
+        self.include_trades = include_trades
+        self.include_book_ticker = include_book_ticker
+
+        self._buffers: Dict[Tuple[str, str], CandleBuffer] = {}
+        self._clients: Dict[Tuple[str, str], object] = {}
+        self._prices: Dict[str, Tuple[float, float]] = {}
+        self._price_listeners: List[Callable[[str, float], None]] = []
+        self._lock = threading.Lock()
+
+        self._ws = None
+        self._thread = None
+        self._connected = threading.Event()
+        self.is_running = False
+        self._request_id = 0
+
+    def add_price_listener(self, callback: Callable[[str, float], None]):
+        """
+        Registra una función llamada con (símbolo, precio) en cada precio recibido
+
+        Args:
+            callback: Función a llamar
+        """
+        self._price_listeners.append(callback)
+
+    def _set_price(self, symbol: str, price: float):
+        self._prices[symbol] = (price, time.time())
+        for callback in self._price_listeners:
+            try:
+                callback(symbol, price)
+            except Exception as e:
+                logger.error(f"Error en listener de precios: {e}")
+
+    def _symbol_streams(self, symbol: str, interval: str) -> List[str]:
+        streams = [f"{symbol.lower()}@kline_{interval}"]
+        if self.include_ticker:
+            streams.append(f"{symbol.lower()}@miniTicker")
+        if self.include_trades:
+            streams.append(f"{symbol.lower()}@aggTrade")
+        if self.include_book_ticker:
+            streams.append(f"{symbol.lower()}@bookTicker")
+        return streams
+
+    def _streams(self) -> List[str]:
+        streams = []
+        for symbol, interval in self._buffers:
+            streams.extend(self._symbol_streams(symbol, interval))
+        return sorted(set(streams))
+
+    def _new_buffer(self, key: Tuple[str, str]) -> CandleBuffer:
+        return CandleBuffer(self.maxlen)
+
+    def subscribe(self, symbol: str, interval: str, client=None) -> CandleBuffer:
+        """
+        Se suscribe a las velas de un símbolo/intervalo
+
+        Args:
+            symbol: Par de trading
+            interval: Intervalo de las velas
+            client: Cliente REST para sembrar el histórico inicial (opcional)
+
+        Returns:
+            Buffer asociado
+        """
+        key = (symbol.upper(), interval)
+        with self._lock:
+            is_new = key not in self._buffers
+            if is_new:
+                self._buffers[key] = self._new_buffer(key)
+            if client is not None:
+                self._clients[key] = client
+            buffer = self._buffers[key]
+
+        if client is not None:
+            self._seed(key)
+
+        if is_new and self._connected.is_set():
+            self._send({'method': 'SUBSCRIBE', 'params': self._symbol_streams(symbol, interval)})
+
+        return buffer
+
+    def _seed(self, key: Tuple[str, str], limit: Optional[int] = None):
+        client = self._clients.get(key)
+        if client is None:
+            return
+        limit = limit or self.maxlen
+        try:
+            if self.candle_store is not None:
+                # Histórico desde disco: solo se descarga la cola que falta
+                klines = self.candle_store.get_klines(client, key[0], key[1], limit)
+            else:
+                klines = client.get_klines(symbol=key[0], interval=key[1], limit=limit)
+            self._buffers[key].seed(klines)
+            logger.info(f"Buffer de velas sembrado: {key[0]} {key[1]} ({len(klines)} velas)")
+        except Exception as e:
+            logger.error(f"Error sembrando velas de {key[0]} {key[1]}: {e}")
+
+    def _send(self, payload: Dict):
+        try:
+            self._request_id += 1
+            payload['id'] = self._request_id
+            self._ws.send(json.dumps(payload))
+        except Exception as e:
+            logger.error(f"Error enviando mensaje al stream: {e}")
+
+    def handle_message(self, message: str):
+        """
+        Procesa un mensaje del stream (combinado o directo)
+
+        Args:
+            message: Mensaje JSON recibido
+        """
+        try:
+            payload = json.loads(message)
+            event = payload.get('data', payload)
+            event_type = event.get('e')
+
+            if event_type == 'kline':
+                self._handle_kline(event['k'])
+
+            elif event_type == '24hrMiniTicker':
+                self._set_price(event['s'], float(event['c']))
+
+            elif event_type == 'aggTrade':
+                self._set_price(event['s'], float(event['p']))
+
+            elif event_type is None and 'b' in event and 'a' in event and 's' in event:
+                # bookTicker no lleva tipo de evento: mejor bid/ask
+                self._set_price(event['s'], (float(event['b']) + float(event['a'])) / 2)
+
+        except Exception as e:
+            logger.error(f"Error procesando mensaje del stream: {e}")
+
+    def _handle_kline(self, kline: Dict):
+        buffer = self._buffers.get((kline['s'], kline['i']))
+        if buffer is not None:
+            buffer.upsert(kline_event_to_row(kline), closed=kline.get('x', False))
+            self._set_price(kline['s'], float(kline['c']))
+
+    def _missing(self, key: Tuple[str, str]) -> int:
+        """Velas que faltan en un buffer desde su última vela (0 si está al día)"""
+        klines = self._buffers[key].get_klines(1)
+        if not klines:
+            return self.maxlen
+        open_time, close_time = klines[-1][0], klines[-1][6]
+        now_ms = time.time() * 1000
+        if close_time >= now_ms:
+            # La vela en curso ya está en el buffer: el stream la completa
+            return 0
+        interval_ms = close_time - open_time + 1
+        return min(self.maxlen, int((now_ms - open_time) // interval_ms) + 1)
+
+    def _on_open(self, ws):
+        self._connected.set()
+        logger.info("Stream de velas conectado")
+        # Rellenar solo los huecos producidos durante la desconexión (los
+        # buffers recién sembrados por subscribe() no se vuelven a pedir)
+        for key in list(self._buffers):
+            missing = self._missing(key)
+            if missing:
+                self._seed(key, missing)
+
+    def _on_message(self, ws, message):
+        self.handle_message(message)
+
+    def _on_error(self, ws, error):
+        logger.error(f"Error en stream de velas: {error}")
+
+    def _on_close(self, ws, status_code, reason):
+        self._connected.clear()
+        logger.warning(f"Stream de velas cerrado: {status_code} {reason}")
+
+    def _run(self):
+        backoff = 1.0
+        while self.is_running:
+            url = f"{self.url}?streams={'/'.join(self._streams())}"
+            self._ws = websocket.WebSocketApp(
+                url,
+                on_open=self._on_open,
+                on_message=self._on_message,
+                on_error=self._on_error,
+                on_close=self._on_close
+            )
+            started = time.time()
+            self._ws.run_forever(ping_interval=180, ping_timeout=10)
+
+            if not self.is_running:
+                break
+            # Reconexión con espera exponencial
+            if time.time() - started > 60:
+                backoff = 1.0
+            logger.info(f"Reconectando stream de velas en {backoff:.0f}s...")
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 60.0)
+
+    def start(self):
+        """
+        Inicia el stream en un hilo en segundo plano
+        """
+        if self.is_running:
+            return
+        self.is_running = True
+        self._thread = threading.Thread(target=self._run, name='kline-stream', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Detiene el stream
+        """
+        self.is_running = False
+        if self._ws is not None:
+            self._ws.close()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self._connected.clear()
+
+    def wait_connected(self, timeout: float = 10.0) -> bool:
+        """
+        Espera a que el stream esté conectado
+
+        Args:
+            timeout: Tiempo máximo de espera en segundos
+
+        Returns:
+            True si está conectado
+        """
+        return self._connected.wait(timeout)
+
+    def is_fresh(self, symbol: str, interval: str) -> bool:
+        """
+        Indica si el buffer de un símbolo/intervalo está al día
+
+        Args:
+            symbol: Par de trading
+            interval: Intervalo de las velas
+
+        Returns:
+            True si el buffer recibió datos recientemente
+        """
+        buffer = self._buffers.get((symbol.upper(), interval))
+        if buffer is None or len(buffer) == 0:
+            return False
+        return time.time() - buffer.last_update <= self.stale_after
+
+    def get_klines(self, symbol: str, interval: str, limit: int) -> List[List]:
+        """
+        Obtiene velas desde el buffer en memoria
+
+        Args:
+            symbol: Par de trading
+            interval: Intervalo de las velas
+            limit: Número de velas
+
+        Returns:
+            Lista de velas en formato REST (vacía si no hay suscripción)
+        """
+        buffer = self._buffers.get((symbol.upper(), interval))
+        if buffer is None:
+            return []
+        return buffer.get_klines(limit)
+
+    def get_market_data(self, symbol: str, interval: str, limit: int) -> Optional[pd.DataFrame]:
+        """
+        Obtiene un DataFrame de velas desde el buffer si está al día y
+        contiene suficientes velas
+
+        Args:
+            symbol: Par de trading
+            interval: Intervalo de las velas
+            limit: Número de velas
+
+        Returns:
+            DataFrame con datos OHLCV o None si hay que recurrir a REST
+        """
+        if not self.is_fresh(symbol, interval):
+            return None
+        klines = self.get_klines(symbol, interval, limit)
+        if len(klines) < limit:
+            return None
+        return klines_to_dataframe(klines)
+
+    def get_ohlcv(self, symbol: str, interval: str, limit: int) -> Optional[OHLCV]:
+        """
+        Igual que get_market_data, pero decodificado a arrays (sin DataFrame)
+
+        Args:
+            symbol: Par de trading
+            interval: Intervalo de las velas
+            limit: Número de velas
+
+        Returns:
+            Contenedor OHLCV o None si hay que recurrir a REST
+        """
+        if not self.is_fresh(symbol, interval):
+            return None
+        klines = self.get_klines(symbol, interval, limit)
+        if len(klines) < limit:
+            return None
+        return parse_klines(klines)
+
+    def get_last_price(self, symbol: str) -> Optional[float]:
+        """
+        Obtiene el último precio recibido por el stream
+
+        Args:
+            symbol: Par de trading
+
+        Returns:
+            Precio o None si no hay un precio reciente
+        """
+        price = self._prices.get(symbol.upper())
+        if price is None or time.time() - price[1] > self.stale_after:
+            return None
+        return price[0]
+
+
+class _ReplayHandler(socketserver.BaseRequestHandler):
+    """Handler WebSocket mínimo (RFC 6455) que reproduce mensajes grabados"""
+
+    GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+    def handle(self):
+        if self._handshake():
+            self._serve()
+
+    def _handshake(self) -> bool:
+        request = b''
+        while b'\r\n\r\n' not in request:
+            chunk = self.request.recv(4096)
+            if not chunk:
+                return False
+            request += chunk
+
+        headers = {}
+        for line in request.decode('latin-1').split('\r\n')[1:]:
+            if ':' in line:
+                name, value = line.split(':', 1)
+                headers[name.strip().lower()] = value.strip()
+
+        accept = base64.b64encode(
+            hashlib.sha1((headers.get('sec-websocket-key', '') + self.GUID).encode()).digest()
+        ).decode()
+        self.request.sendall((
+            'HTTP/1.1 101 Switching Protocols\r\n'
+            'Upgrade: websocket\r\n'
+            'Connection: Upgrade\r\n'
+            f'Sec-WebSocket-Accept: {accept}\r\n\r\n'
+        ).encode())
+        return True
+
+    def _serve(self):
+        server = self.server.replay
+        try:
+            for message in server.messages:
+                if server.stopped.is_set():
+                    break
+                self._send_text(message)
+                if server.delay:
+                    time.sleep(server.delay)
+            server.finished.set()
+            # Mantener la conexión abierta hasta que el servidor se detenga
+            server.stopped.wait()
+            self.request.sendall(b'\x88\x00')
+        except (BrokenPipeError, ConnectionResetError, OSError):
+            pass
+
+    def _send_text(self, message: str):
+        payload = message.encode()
+        length = len(payload)
+        if length < 126:
+            header = bytes([0x81, length])
+        elif length < 65536:
+            header = bytes([0x81, 126]) + length.to_bytes(2, 'big')
+        else:
+            header = bytes([0x81, 127]) + length.to_bytes(8, 'big')
+        self.request.sendall(header + payload)
+
+
+class _ThreadingServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class ReplayKlineServer:
+    """
+    Servidor WebSocket local que reproduce eventos de velas grabados.
+    Sustituye al stream de Binance en pruebas y backtests sin red
+    """
+
+    def __init__(self, messages: Iterable, host: str = '127.0.0.1', port: int = 0,
+                 delay: float = 0.0):
+        """
+        Inicializa el servidor de reproducción
+
+        Args:
+            messages: Eventos a reproducir (dicts o cadenas JSON)
+            host: Host de escucha
+            port: Puerto (0 = puerto libre)
+            delay: Pausa en segundos entre mensajes
+        """
+        self.messages = [m if isinstance(m, str) else json.dumps(m) for m in messages]
+        self.delay = delay
+        self.stopped = threading.Event()
+        self.finished = threading.Event()
+        self._server = _ThreadingServer((host, port), _ReplayHandler)
+        self._server.replay = self
+        self._thread = None
+
+    @classmethod
+    def from_file(cls, path: str, **kwargs) -> 'ReplayKlineServer':
+        """
+        Crea el servidor a partir de un fichero JSONL con un evento por línea
+
+        Args:
+            path: Ruta del fichero
+
+        Returns:
+            Servidor de reproducción
+        """
+        with open(path) as f:
+            return cls([line.strip() for line in f if line.strip()], **kwargs)
+
+    @staticmethod
+    def kline_event(symbol: str, interval: str, row: List, closed: bool = True) -> Dict:
+        """
+        Construye un evento kline combinado a partir de una vela REST
+
+        Args:
+            symbol: Par de trading
+            interval: Intervalo
+            row: Vela en formato REST
+            closed: Si la vela está cerrada
+
+        Returns:
+            Evento con el formato del stream combinado de Binance
+        """
+        return {
+            'stream': f"{symbol.lower()}@kline_{interval}",
+            'data': {
+                'e': 'kline', 'E': row[6], 's': symbol.upper(),
+                'k': {
+                    't': row[0], 'T': row[6], 's': symbol.upper(), 'i': interval,
+                    'o': str(row[1]), 'h': str(row[2]), 'l': str(row[3]), 'c': str(row[4]),
+                    'v': str(row[5]), 'q': str(row[7]), 'n': row[8], 'V': str(row[9]),
+                    'Q': str(row[10]), 'B': str(row[11]), 'x': closed
+                }
+            }
+        }
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"ws://{host}:{port}/stream"
+
+    def start(self) -> 'ReplayKlineServer':
+        """
+        Inicia el servidor en un hilo en segundo plano
+
+        Returns:
+            El propio servidor
+        """
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Detiene el servidor
+        """
+        self.stopped.set()
+        self._server.shutdown()
+        self._server.server_close()
@@ -0,0 +1,375 @@
+import os
+import math
+import logging
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from backtesting import VectorizedBacktester, STRATEGY_DEFAULTS, load_ohlcv, _timestamps_ms
+
+logger = logging.getLogger(__name__)
+
+# Un parámetro es una lista de valores discretos o un rango (min, max)
+ParamSpec = Union[Sequence, Tuple[float, float]]
+
+# Espacios de búsqueda por defecto (parámetros fijados hoy en el __init__ de cada bot)
+DEFAULT_SEARCH_SPACES: Dict[str, Dict[str, ParamSpec]] = {
+    'rsi_ema': {
+        'rsi_period': [7, 10, 14, 21],
+        'ema_period': [10, 20, 50],
+        'rsi_oversold': (20, 40),
+        'rsi_overbought': (60, 80),
+        'volume_threshold': (0.8, 2.0),
+        'take_profit': (0.01, 0.08),
+        'stop_loss': (0.005, 0.05)
+    },
+    'momentum': {
+        'momentum_period': [7, 10, 14, 21],
+        'trend_period': [20, 30, 50],
+        'volume_threshold': (1.0, 2.5),
+        'min_trend_strength': (0.002, 0.04),
+        'take_profit': (0.01, 0.10),
+        'stop_loss': (0.005, 0.06)
+    },
+    'scalping': {
+        'spread_threshold': (0.0001, 0.002),
+        'min_profit_threshold': (0.0001, 0.002),
+        'max_loss_threshold': (0.0003, 0.005)
+    }
+}
+
+RESULT_COLUMNS = ['total_return', 'win_rate', 'max_drawdown', 'avg_return', 'total_trades']
+
+# Métricas de pérdida: cuanto menor, mejor
+MINIMIZE_OBJECTIVES = {'max_drawdown'}
+
+# Estado de cada proceso trabajador (se inicializa una sola vez por proceso)
+_worker_backtester: Optional[VectorizedBacktester] = None
+_worker_shm: Optional[shared_memory.SharedMemory] = None
+
+
+def _init_worker(shm_name: str, shape: Tuple[int, int], commission: float, warmup: int):
+    """
+    Conecta el proceso trabajador a las velas en memoria compartida (sin copia)
+    """
+    global _worker_backtester, _worker_shm
+    _worker_shm = shared_memory.SharedMemory(name=shm_name)
+    arrays = np.ndarray(shape, dtype=np.float64, buffer=_worker_shm.buf)
+    _worker_backtester = VectorizedBacktester.from_arrays(
+        arrays[0], arrays[1], arrays[2], arrays[3], arrays[4], arrays[5],
+        commission=commission, warmup=warmup
+    )
+
+
+def _evaluate(task: Tuple[str, Dict]) -> Dict:
+    """
+    Evalúa una combinación de parámetros en el proceso trabajador
+    """
+    strategy, params = task
+    try:
+        result = _worker_backtester.run(strategy, **params)
+        return {**params, **{k: result[k] for k in RESULT_COLUMNS}}
+    except Exception as e:
+        return {**params, 'error': str(e)}
+
+
+def grid_candidates(space: Dict[str, ParamSpec], steps: int = 5) -> List[Dict]:
+    """
+    Genera todas las combinaciones de una rejilla
+
+    Los rangos (min, max) se discretizan en `steps` valores equiespaciados.
+
+    Args:
+        space: Espacio de búsqueda
+        steps: Puntos por cada rango continuo
+
+    Returns:
+        Lista de combinaciones
+    """
+    axes = []
+    for spec in space.values():
+        if isinstance(spec, tuple) and len(spec) == 2:
+            low, high = spec
+            values = np.linspace(low, high, steps)
+            if isinstance(low, int) and isinstance(high, int):
+                values = sorted(set(int(round(v)) for v in values))
+            else:
+                values = [float(v) for v in values]
+            axes.append(values)
+        else:
+            axes.append(list(spec))
+    names = list(space)
+    return [dict(zip(names, combo)) for combo in itertools.product(*axes)]
+
+
+def _sample(spec: ParamSpec, rng: np.random.Generator):
+    if isinstance(spec, tuple) and len(spec) == 2:
+        low, high = spec
+        if isinstance(low, int) and isinstance(high, int):
+            return int(rng.integers(low, high + 1))
+        return float(rng.uniform(low, high))
+    return spec[int(rng.integers(len(spec)))]
+
+
+def random_candidates(space: Dict[str, ParamSpec], n_trials: int, seed: Optional[int] = None) -> List[Dict]:
+    """
+    Genera combinaciones aleatorias del espacio de búsqueda
+
+    Args:
+        space: Espacio de búsqueda
+        n_trials: Número de combinaciones
+        seed: Semilla (opcional)
+
+    Returns:
+        Lista de combinaciones
+    """
+    rng = np.random.default_rng(seed)
+    return [{name: _sample(spec, rng) for name, spec in space.items()} for _ in range(n_trials)]
+
+
+class _ParzenProposer:
+    """
+    Propuesta bayesiana tipo TPE: modela con estimadores de Parzen las
+    combinaciones buenas (l) y malas (g) y propone las que maximizan l/g
+    """
+
+    def __init__(self, space: Dict[str, ParamSpec], gamma: float = 0.25,
+                 n_candidates: int = 64, seed: Optional[int] = None):
+        self.space = space
+        self.gamma = gamma
+        self.n_candidates = n_candidates
+        self.rng = np.random.default_rng(seed)
+
+    def _encode(self, params: Dict) -> np.ndarray:
+        # Cada parámetro se normaliza a [0, 1]
+        encoded = []
+        for name, spec in self.space.items():
+            value = params[name]
+            if isinstance(spec, tuple) and len(spec) == 2:
+                low, high = spec
+                encoded.append((value - low) / (high - low) if high > low else 0.0)
+            else:
+                options = list(spec)
+                encoded.append(options.index(value) / max(len(options) - 1, 1))
+        return np.asarray(encoded)
+
+    def _decode(self, vector: np.ndarray) -> Dict:
+        params = {}
+        for x, (name, spec) in zip(np.clip(vector, 0.0, 1.0), self.space.items()):
+            if isinstance(spec, tuple) and len(spec) == 2:
+                low, high = spec
+                value = low + x * (high - low)
+                params[name] = int(round(value)) if isinstance(low, int) and isinstance(high, int) else float(value)
+            else:
+                options = list(spec)
+                params[name] = options[int(round(x * (len(options) - 1)))]
+        return params
+
+    @staticmethod
+    def _log_density(points: np.ndarray, centers: np.ndarray, bandwidth: float) -> np.ndarray:
+        diff = (points[:, None, :] - centers[None, :, :]) / bandwidth
+        log_kernels = -0.5 * np.sum(diff ** 2, axis=2)
+        peak = log_kernels.max(axis=1, keepdims=True)
+        return (peak + np.log(np.exp(log_kernels - peak).mean(axis=1, keepdims=True)))[:, 0]
+
+    def propose(self, history: List[Tuple[Dict, float]], batch_size: int) -> List[Dict]:
+        """
+        Propone nuevas combinaciones a partir del historial (params, score)
+        """
+        encoded = np.array([self._encode(p) for p, _ in history])
+        scores = np.array([s for _, s in history])
+        order = np.argsort(-scores)
+        n_good = max(1, int(math.ceil(self.gamma * len(history))))
+        good, bad = encoded[order[:n_good]], encoded[order[n_good:]]
+        if len(bad) == 0:
+            bad = encoded
+
+        dims = encoded.shape[1]
+        bandwidth = max(0.05, len(history) ** (-1.0 / (dims + 4)) * 0.5)
+
+        # Candidatos muestreados alrededor de las combinaciones buenas
+        picks = good[self.rng.integers(len(good), size=self.n_candidates * batch_size)]
+        candidates = np.clip(picks + self.rng.normal(0, bandwidth, picks.shape), 0.0, 1.0)
+
+        ratio = self._log_density(candidates, good, bandwidth) - self._log_density(candidates, bad, bandwidth)
+        proposals, seen = [], set()
+        for idx in np.argsort(-ratio):
+            params = self._decode(candidates[idx])
+            key = tuple(sorted(params.items()))
+            if key in seen:
+                continue
+            seen.add(key)
+            proposals.append(params)
+            if len(proposals) == batch_size:
+                break
+        return proposals
+
+
+class ParameterSweep:
+    """
+    Barrido paralelo de parámetros de estrategia sobre todos los núcleos.
+
+    Las velas se publican una sola vez en memoria compartida y cada proceso
+    trabajador las mapea sin copiarlas, de modo que cada tarea solo envía
+    el diccionario de parámetros
+    """
+
+    def __init__(self, data: pd.DataFrame, commission: float = 0.001, warmup: int = 100,
+                 max_workers: Optional[int] = None):
+        """
+        Inicializa el barrido
+
+        Args:
+            data: DataFrame con velas históricas (ver load_ohlcv)
+            commission: Comisión por lado (fracción)
+            warmup: Velas iniciales sin operaciones
+            max_workers: Número de procesos (default: núcleos disponibles)
+        """
+        self.commission = commission
+        self.warmup = warmup
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._arrays = np.vstack([
+            _timestamps_ms(data) / 1000.0,
+            data['open'].to_numpy(dtype=float),
+            data['high'].to_numpy(dtype=float),
+            data['low'].to_numpy(dtype=float),
+            data['close'].to_numpy(dtype=float),
+            data['volume'].to_numpy(dtype=float)
+        ])
+
+    def _evaluate_all(self, executor: ProcessPoolExecutor, strategy: str,
+                      candidates: List[Dict]) -> List[Dict]:
+        chunksize = max(1, len(candidates) // (self.max_workers * 4))
+        tasks = [(strategy, params) for params in candidates]
+        return list(executor.map(_evaluate, tasks, chunksize=chunksize))
+
+    def run(self, strategy: str, space: Optional[Dict[str, ParamSpec]] = None,
+            method: str = 'grid', n_trials: int = 100, steps: int = 5,
+            seed: Optional[int] = None, objective: str = 'total_return',
+            minimize: Optional[bool] = None) -> pd.DataFrame:
+        """
+        Ejecuta el barrido
+
+        Args:
+            strategy: 'rsi_ema', 'momentum' o 'scalping'
+            space: Espacio de búsqueda (default: DEFAULT_SEARCH_SPACES)
+            method: 'grid', 'random' o 'bayesian'
+            n_trials: Combinaciones a evaluar (random/bayesian)
+            steps: Puntos por rango continuo (grid)
+            seed: Semilla (opcional)
+            objective: Métrica usada para el ranking
+            minimize: True si objective es mejor cuanto menor (default: según MINIMIZE_OBJECTIVES)
+
+        Returns:
+            DataFrame ordenado de mejor a peor según objective
+        """
+        if strategy not in STRATEGY_DEFAULTS:
+            raise ValueError(f"Estrategia desconocida: {strategy}")
+        space = space or DEFAULT_SEARCH_SPACES[strategy]
+        if minimize is None:
+            minimize = objective in MINIMIZE_OBJECTIVES
+
+        shm = shared_memory.SharedMemory(create=True, size=self._arrays.nbytes)
+        try:
+            shared = np.ndarray(self._arrays.shape, dtype=np.float64, buffer=shm.buf)
+            shared[:] = self._arrays
+
+            with ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                initializer=_init_worker,
+                initargs=(shm.name, self._arrays.shape, self.commission, self.warmup)
+            ) as executor:
+                if method == 'grid':
+                    results = self._evaluate_all(executor, strategy, grid_candidates(space, steps))
+                elif method == 'random':
+                    results = self._evaluate_all(executor, strategy, random_candidates(space, n_trials, seed))
+                elif method == 'bayesian':
+                    results = self._run_bayesian(executor, strategy, space, n_trials, seed,
+                                                  objective, minimize)
+                else:
+                    raise ValueError(f"Método de búsqueda desconocido: {method}")
+        finally:
+            shm.close()
+            shm.unlink()
+
+        ranked = pd.DataFrame(results)
+        if ranked.empty or objective not in ranked:
+            return ranked
+        ranked = ranked.sort_values(objective, ascending=minimize, na_position='last').reset_index(drop=True)
+        ranked.insert(0, 'rank', np.arange(1, len(ranked) + 1))
+        return ranked
+
+    def _run_bayesian(self, executor: ProcessPoolExecutor, strategy: str, space: Dict[str, ParamSpec],
+                      n_trials: int, seed: Optional[int], objective: str,
+                      minimize: bool = False) -> List[Dict]:
+        n_initial = min(n_trials, max(self.max_workers, 10))
+        results = self._evaluate_all(executor, strategy, random_candidates(space, n_initial, seed))
+        proposer = _ParzenProposer(space, seed=seed)
+
+        # El proposer maximiza: las métricas de pérdida se invierten
+        sign = -1.0 if minimize else 1.0
+        while len(results) < n_trials:
+            history = [
+                ({name: r[name] for name in space}, sign * r[objective] if objective in r else -np.inf)
+                for r in results if 'error' not in r
+            ]
+            if not history:
+                break
+            batch = min(self.max_workers, n_trials - len(results))
+            results.extend(self._evaluate_all(executor, strategy, proposer.propose(history, batch)))
+            logger.info(f"Barrido bayesiano: {len(results)}/{n_trials} combinaciones evaluadas")
+
+        return results
+
+
+def write_results(results: pd.DataFrame, path: str):
+    """
+    Guarda los resultados ordenados en CSV, JSON o Parquet según la extensión
+
+    Args:
+        results: DataFrame devuelto por ParameterSweep.run
+        path: Ruta de salida
+    """
+    if path.endswith('.json'):
+        results.to_json(path, orient='records', indent=2)
+    elif path.endswith('.parquet'):
+        results.to_parquet(path, index=False)
+    else:
+        results.to_csv(path, index=False)
+    logger.info(f"Resultados del barrido guardados en {path}")
+
+
+def main():
+    """
+    Función principal para lanzar un barrido desde la línea de comandos
+    """
+    parser = argparse.ArgumentParser(description='Barrido paralelo de parámetros de estrategia')
+    parser.add_argument('data', help='Fichero CSV/Parquet con velas OHLCV')
+    parser.add_argument('--strategy', default='rsi_ema', choices=list(STRATEGY_DEFAULTS))
+    parser.add_argument('--method', default='random', choices=['grid', 'random', 'bayesian'])
+    parser.add_argument('--trials', type=int, default=200)
+    parser.add_argument('--steps', type=int, default=4)
+    parser.add_argument('--objective', default='total_return', choices=RESULT_COLUMNS)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--commission', type=float, default=0.001)
+    parser.add_argument('--output', default='sweep_results.csv')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    try:
+        sweep = ParameterSweep(load_ohlcv(args.data), commission=args.commission, max_workers=args.workers)
+        results = sweep.run(args.strategy, method=args.method, n_trials=args.trials, steps=args.steps,
+                            objective=args.objective)
+        write_results(results, args.output)
+        logger.info(f"Mejores parámetros:\n{results.head(10).to_string(index=False)}")
+    except Exception as e:
+        logger.error(f"Error en main: {e}")
+
+
+if __name__ == "__main__":
+    main()
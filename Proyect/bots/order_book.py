@@ -0,0 +1,591 @@
+import json
+import time
+import bisect
+import logging
+import threading
+from collections import deque
+from typing import Callable, Dict, Iterable, List, Optional
+
+import websocket
+
+from market_stream import BINANCE_STREAM_URL, ReplayKlineServer
+
+logger = logging.getLogger(__name__)
+
+
+class LocalOrderBook:
+    """
+    Réplica local del libro de órdenes (L2) de un símbolo.
+
+    Se siembra con una instantánea REST y se mantiene con los eventos del
+    stream de profundidad diferencial aplicados en secuencia (U/u de
+    Binance). Los precios de cada lado se guardan ordenados, y las métricas
+    (mejor bid/ask, spread, mid ponderado por profundidad e imbalance) se
+    recalculan sobre los primeros niveles tras cada evento, de modo que
+    leerlas es O(1)
+    """
+
+    def __init__(self, symbol: str, levels: int = 10):
+        """
+        Inicializa el libro vacío (sin sincronizar)
+
+        Args:
+            symbol: Par de trading
+            levels: Niveles de cada lado usados para la profundidad y el imbalance
+        """
+        self.symbol = symbol.upper()
+        self.levels = levels
+        self.bids: Dict[float, float] = {}
+        self.asks: Dict[float, float] = {}
+        self._bid_prices: List[float] = []     # Ascendente: el mejor bid al final
+        self._ask_prices: List[float] = []     # Ascendente: el mejor ask al principio
+        self.last_update_id: Optional[int] = None
+        self.synced = False                    # True tras aplicar el primer evento posterior a la instantánea
+        self.updated_at = 0.0
+        self.state: Optional[Dict] = None
+
+    def reset(self):
+        """
+        Vacía el libro (queda pendiente de una nueva instantánea)
+        """
+        self.bids, self.asks = {}, {}
+        self._bid_prices, self._ask_prices = [], []
+        self.last_update_id = None
+        self.synced = False
+        self.state = None
+
+    def load_snapshot(self, snapshot: Dict):
+        """
+        Carga una instantánea REST (GET /api/v3/depth)
+
+        Args:
+            snapshot: Dict con lastUpdateId, bids y asks
+        """
+        self.reset()
+        for price, quantity in snapshot['bids']:
+            self._set(self.bids, self._bid_prices, float(price), float(quantity))
+        for price, quantity in snapshot['asks']:
+            self._set(self.asks, self._ask_prices, float(price), float(quantity))
+        self.last_update_id = int(snapshot['lastUpdateId'])
+        self._refresh()
+
+    @staticmethod
+    def _set(side: Dict[float, float], prices: List[float], price: float, quantity: float):
+        if quantity == 0:
+            if side.pop(price, None) is not None:
+                del prices[bisect.bisect_left(prices, price)]
+        else:
+            if price not in side:
+                bisect.insort(prices, price)
+            side[price] = quantity
+
+    def apply(self, event: Dict) -> Optional[bool]:
+        """
+        Aplica un evento depthUpdate respetando la secuencia
+
+        Args:
+            event: Evento con U (primer id), u (último id), b y a
+
+        Returns:
+            True si se aplicó, None si era anterior a la instantánea (descartado)
+            y False si hay un hueco en la secuencia (hay que resincronizar)
+        """
+        first_id, final_id = int(event['U']), int(event['u'])
+        if final_id <= self.last_update_id:
+            return None
+        expected = self.last_update_id + 1
+        # El primer evento debe contener lastUpdateId + 1; los siguientes, empezar justo ahí
+        if first_id > expected or (self.synced and first_id != expected):
+            return False
+
+        for price, quantity in event['b']:
+            self._set(self.bids, self._bid_prices, float(price), float(quantity))
+        for price, quantity in event['a']:
+            self._set(self.asks, self._ask_prices, float(price), float(quantity))
+        self.last_update_id = final_id
+        self.synced = True
+        self._refresh()
+        return True
+
+    def _refresh(self):
+        self.updated_at = time.time()
+        if not self._bid_prices or not self._ask_prices:
+            self.state = None
+            return
+
+        best_bid, best_ask = self._bid_prices[-1], self._ask_prices[0]
+        bid_depth = sum(self.bids[p] for p in self._bid_prices[-self.levels:])
+        ask_depth = sum(self.asks[p] for p in self._ask_prices[:self.levels])
+        mid = (best_bid + best_ask) / 2
+        depth = bid_depth + ask_depth
+
+        # Se sustituye el diccionario completo: los lectores nunca ven un estado a medias
+        self.state = {
+            'symbol': self.symbol,
+            'best_bid': best_bid,
+            'best_ask': best_ask,
+            'bid_qty': self.bids[best_bid],
+            'ask_qty': self.asks[best_ask],
+            'spread': best_ask - best_bid,
+            'spread_pct': (best_ask - best_bid) / mid,
+            'mid': mid,
+            # Más profundidad en el bid acerca el precio justo al ask (y al revés)
+            'weighted_mid': (best_bid * ask_depth + best_ask * bid_depth) / depth if depth else mid,
+            'bid_depth': bid_depth,
+            'ask_depth': ask_depth,
+            'imbalance': (bid_depth - ask_depth) / depth if depth else 0.0,
+            'update_id': self.last_update_id,
+            'time': self.updated_at
+        }
+
+    def top(self, levels: Optional[int] = None) -> Dict[str, List[List[float]]]:
+        """
+        Obtiene los mejores niveles de cada lado
+
+        Args:
+            levels: Número de niveles (default: los configurados)
+
+        Returns:
+            Dict con bids (de mayor a menor) y asks (de menor a mayor) como [precio, cantidad]
+        """
+        levels = levels or self.levels
+        return {
+            'bids': [[p, self.bids[p]] for p in reversed(self._bid_prices[-levels:])],
+            'asks': [[p, self.asks[p]] for p in self._ask_prices[:levels]]
+        }
+
+    def __len__(self) -> int:
+        return len(self.bids) + len(self.asks)
+
+
+class OrderBookStream:
+    """
+    Libros L2 locales mantenidos con el stream de profundidad diferencial
+    de Binance (<symbol>@depth@100ms).
+
+    Sigue el procedimiento del exchange: los eventos se acumulan hasta
+    tener la instantánea REST, se descartan los anteriores a ella y se
+    aplican en secuencia. Un hueco en los ids (mensajes perdidos,
+    reconexión) marca el libro como no sincronizado y fuerza una nueva
+    instantánea. Cada instantánea se pide desde un hilo propio, de modo
+    que una resincronización no detiene el resto de libros del stream. Las
+    métricas de cada libro se leen en O(1) y los suscriptores reciben cada
+    actualización sin esperar a la siguiente vela
+    """
+
+    def __init__(self, url: str = BINANCE_STREAM_URL, depth: int = 1000, levels: int = 10,
+                 speed: str = '100ms', stale_after: float = 5.0, resync_interval: float = 1.0,
+                 max_buffer: int = 1000, background: bool = True):
+        """
+        Inicializa el stream
+
+        Args:
+            url: URL base del stream combinado
+            depth: Niveles pedidos en la instantánea REST
+            levels: Niveles de cada lado usados en las métricas
+            speed: Frecuencia del stream de profundidad ('100ms' o '1000ms')
+            stale_after: Segundos sin eventos tras los que un libro se considera obsoleto
+            resync_interval: Segundos mínimos entre instantáneas de un mismo símbolo
+            max_buffer: Eventos retenidos por símbolo mientras se espera la instantánea
+            background: Pedir las instantáneas en hilos propios (False: en el hilo del
+                        stream, p. ej. para reproducciones deterministas)
+        """
+        self.url = url
+        self.depth = depth
+        self.levels = levels
+        self.speed = speed
+        self.stale_after = stale_after
+        self.resync_interval = resync_interval
+        self.max_buffer = max_buffer
+        self.background = background
+
+        self._books: Dict[str, LocalOrderBook] = {}
+        self._clients: Dict[str, object] = {}
+        self._pending: Dict[str, deque] = {}
+        self._snapshot_time: Dict[str, float] = {}
+        self._requested = set()                 # Símbolos con una instantánea pedida
+        self._listeners: List[Callable[[str, Dict], None]] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+        self._ws = None
+        self._thread = None
+        self._connected = threading.Event()
+        self.is_running = False
+        self._request_id = 0
+
+        # Estadísticas
+        self.events = 0
+        self.dropped = 0
+        self.gaps = 0
+        self.snapshots = 0
+
+    def add_listener(self, callback: Callable[[str, Dict], None]):
+        """
+        Registra una función llamada con (símbolo, métricas) tras cada actualización del libro
+
+        Args:
+            callback: Función a llamar
+        """
+        self._listeners.append(callback)
+
+    def _stream_name(self, symbol: str) -> str:
+        return f"{symbol.lower()}@depth@{self.speed}"
+
+    def subscribe(self, symbol: str, client) -> LocalOrderBook:
+        """
+        Se suscribe al libro de un símbolo
+
+        Args:
+            symbol: Par de trading
+            client: Cliente REST para las instantáneas (get_order_book)
+
+        Returns:
+            Libro local asociado
+        """
+        symbol = symbol.upper()
+        with self._lock:
+            is_new = symbol not in self._books
+            if is_new:
+                self._books[symbol] = LocalOrderBook(symbol, self.levels)
+                self._pending[symbol] = deque(maxlen=self.max_buffer)
+            self._clients[symbol] = client
+            book = self._books[symbol]
+
+        if is_new and self._connected.is_set():
+            self._send({'method': 'SUBSCRIBE', 'params': [self._stream_name(symbol)]})
+        return book
+
+    def _send(self, payload: Dict):
+        try:
+            self._request_id += 1
+            payload['id'] = self._request_id
+            self._ws.send(json.dumps(payload))
+        except Exception as e:
+            logger.error(f"Error enviando mensaje al stream de profundidad: {e}")
+
+    def _notify(self, symbol: str, state: Dict):
+        for callback in self._listeners:
+            try:
+                callback(symbol, state)
+            except Exception as e:
+                logger.error(f"Error en listener del libro: {e}")
+
+    def _request_snapshot(self, symbol: str):
+        with self._lock:
+            if symbol in self._requested:
+                return
+            self._requested.add(symbol)
+        if self.background:
+            threading.Thread(target=self._resync, args=(symbol,), name=f"depth-snapshot-{symbol}",
+                             daemon=True).start()
+        else:
+            self._resync(symbol)
+
+    def _resync(self, symbol: str):
+        """Carga la instantánea y aplica los eventos acumulados desde entonces"""
+        try:
+            wait = self.resync_interval - (time.time() - self._snapshot_time.get(symbol, 0.0))
+            if wait > 0:
+                if not self.background:
+                    # Sin hilo propio no se espera: se reintenta con el siguiente evento
+                    return
+                if self._stop.wait(wait):
+                    return
+            self._snapshot_time[symbol] = time.time()
+            try:
+                snapshot = self._clients[symbol].get_order_book(symbol=symbol, limit=self.depth)
+            except Exception as e:
+                logger.error(f"Error obteniendo la instantánea del libro de {symbol}: {e}")
+                return
+
+            with self._lock:
+                book, pending = self._books[symbol], self._pending[symbol]
+                book.load_snapshot(snapshot)
+                self.snapshots += 1
+                while pending:
+                    if book.apply(pending[0]) is False:
+                        # La instantánea es anterior al primer evento retenido: se pedirá otra
+                        book.reset()
+                        break
+                    pending.popleft()
+                state = book.state if book.synced else None
+            if book.last_update_id is not None:
+                logger.info(f"Libro de {symbol} sembrado: lastUpdateId {book.last_update_id} ({len(book)} niveles)")
+            if state is not None:
+                self._notify(symbol, state)
+        finally:
+            with self._lock:
+                self._requested.discard(symbol)
+
+    def _handle_depth(self, event: Dict):
+        symbol = event['s']
+        book = self._books.get(symbol)
+        if book is None:
+            return
+
+        with self._lock:
+            self.events += 1
+            pending = self._pending[symbol]
+            if book.last_update_id is None:
+                # Sin instantánea: acumular y sincronizar en cuanto llegue
+                if len(pending) == self.max_buffer:
+                    self.dropped += 1
+                pending.append(event)
+                needs_snapshot, state = True, None
+            else:
+                applied = book.apply(event)
+                needs_snapshot = applied is False
+                if needs_snapshot:
+                    self.gaps += 1
+                    logger.warning(f"Hueco en el libro de {symbol} ({book.last_update_id} -> {event['U']}), "
+                                   f"resincronizando")
+                    book.reset()
+                    pending.append(event)
+                state = book.state if applied and book.synced else None
+
+        if needs_snapshot:
+            self._request_snapshot(symbol)
+        elif state is not None:
+            self._notify(symbol, state)
+
+    def handle_message(self, message: str):
+        """
+        Procesa un mensaje del stream (combinado o directo)
+
+        Args:
+            message: Mensaje JSON recibido
+        """
+        try:
+            payload = json.loads(message)
+            event = payload.get('data', payload)
+            if event.get('e') == 'depthUpdate':
+                self._handle_depth(event)
+        except Exception as e:
+            logger.error(f"Error procesando mensaje de profundidad: {e}")
+
+    def _on_open(self, ws):
+        self._connected.set()
+        logger.info("Stream de profundidad conectado")
+        # Los eventos perdidos durante la desconexión obligan a partir de una instantánea nueva
+        with self._lock:
+            for symbol, book in self._books.items():
+                book.reset()
+                self._pending[symbol].clear()
+
+    def _on_message(self, ws, message):
+        self.handle_message(message)
+
+    def _on_error(self, ws, error):
+        logger.error(f"Error en stream de profundidad: {error}")
+
+    def _on_close(self, ws, status_code, reason):
+        self._connected.clear()
+        logger.warning(f"Stream de profundidad cerrado: {status_code} {reason}")
+
+    def _run(self):
+        backoff = 1.0
+        while self.is_running:
+            streams = '/'.join(sorted(self._stream_name(symbol) for symbol in self._books))
+            self._ws = websocket.WebSocketApp(
+                f"{self.url}?streams={streams}",
+                on_open=self._on_open,
+                on_message=self._on_message,
+                on_error=self._on_error,
+                on_close=self._on_close
+            )
+            started = time.time()
+            self._ws.run_forever(ping_interval=180, ping_timeout=10)
+
+            if not self.is_running:
+                break
+            # Reconexión con espera exponencial
+            if time.time() - started > 60:
+                backoff = 1.0
+            logger.info(f"Reconectando stream de profundidad en {backoff:.0f}s...")
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 60.0)
+
+    def start(self):
+        """
+        Inicia el stream en un hilo en segundo plano
+        """
+        if self.is_running:
+            return
+        self.is_running = True
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='depth-stream', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Detiene el stream
+        """
+        self.is_running = False
+        self._stop.set()
+        if self._ws is not None:
+            self._ws.close()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self._connected.clear()
+
+    def wait_connected(self, timeout: float = 10.0) -> bool:
+        """
+        Espera a que el stream esté conectado
+
+        Args:
+            timeout: Tiempo máximo de espera en segundos
+
+        Returns:
+            True si está conectado
+        """
+        return self._connected.wait(timeout)
+
+    def get_book(self, symbol: str) -> Optional[LocalOrderBook]:
+        """
+        Obtiene el libro local de un símbolo
+
+        Args:
+            symbol: Par de trading
+
+        Returns:
+            Libro o None si no hay suscripción
+        """
+        return self._books.get(symbol.upper())
+
+    def get_state(self, symbol: str) -> Optional[Dict]:
+        """
+        Obtiene las métricas del libro de un símbolo si está sincronizado y al día
+
+        Args:
+            symbol: Par de trading
+
+        Returns:
+            Dict con best_bid, best_ask, spread, spread_pct, mid, weighted_mid,
+            bid_depth, ask_depth e imbalance, o None si el libro no es fiable
+        """
+        book = self._books.get(symbol.upper())
+        if book is None or not book.synced:
+            return None
+        state = book.state
+        if state is None or time.time() - state['time'] > self.stale_after:
+            return None
+        return state
+
+    def get_statistics(self) -> Dict:
+        """
+        Obtiene estadísticas del stream
+
+        Returns:
+            Dict con estadísticas
+        """
+        return {
+            'books': len(self._books),
+            'synced': sum(1 for book in self._books.values() if book.synced),
+            'events': self.events,
+            'dropped': self.dropped,
+            'gaps': self.gaps,
+            'snapshots': self.snapshots
+        }
+
+    @staticmethod
+    def depth_event(symbol: str, first_update_id: int, final_update_id: int,
+                    bids: Iterable, asks: Iterable, stream_speed: str = '100ms') -> Dict:
+        """
+        Construye un evento depthUpdate combinado
+
+        Args:
+            symbol: Par de trading
+            first_update_id: Primer id de actualización del evento (U)
+            final_update_id: Último id de actualización del evento (u)
+            bids: Niveles [precio, cantidad] del bid (cantidad 0 = eliminar)
+            asks: Niveles [precio, cantidad] del ask (cantidad 0 = eliminar)
+            stream_speed: Frecuencia del stream
+
+        Returns:
+            Evento con el formato del stream combinado de Binance
+        """
+        return {
+            'stream': f"{symbol.lower()}@depth@{stream_speed}",
+            'data': {
+                'e': 'depthUpdate', 'E': int(time.time() * 1000), 's': symbol.upper(),
+                'U': first_update_id, 'u': final_update_id,
+                'b': [[str(p), str(q)] for p, q in bids],
+                'a': [[str(p), str(q)] for p, q in asks]
+            }
+        }
+
+
+class OrderBookRecording:
+    """
+    Grabación de un libro (instantánea REST + eventos de profundidad) que
+    sustituye al exchange en pruebas sin red: responde a get_order_book
+    como un cliente y reproduce los eventos con un ReplayKlineServer
+    """
+
+    def __init__(self, snapshots: Dict[str, Dict], events: Iterable):
+        """
+        Inicializa la grabación
+
+        Args:
+            snapshots: Instantánea por símbolo (lastUpdateId, bids, asks)
+            events: Eventos depthUpdate (dicts o cadenas JSON)
+        """
+        self.snapshots = {symbol.upper(): snapshot for symbol, snapshot in snapshots.items()}
+        self.events = [e if isinstance(e, str) else json.dumps(e) for e in events]
+        self.requests = 0
+
+    @classmethod
+    def from_file(cls, path: str) -> 'OrderBookRecording':
+        """
+        Crea la grabación a partir de un fichero JSONL: las líneas con
+        lastUpdateId (y symbol) son instantáneas, el resto eventos
+
+        Args:
+            path: Ruta del fichero
+
+        Returns:
+            Grabación
+        """
+        snapshots, events = {}, []
+        with open(path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if 'lastUpdateId' in record:
+                    snapshots[record['symbol']] = record
+                else:
+                    events.append(line.strip())
+        return cls(snapshots, events)
+
+    def get_order_book(self, symbol: str, limit: int = 100, **kwargs) -> Dict:
+        """
+        Devuelve la instantánea grabada (misma firma que el cliente de Binance)
+        """
+        self.requests += 1
+        snapshot = self.snapshots[symbol.upper()]
+        return {'lastUpdateId': snapshot['lastUpdateId'],
+                'bids': snapshot['bids'][:limit], 'asks': snapshot['asks'][:limit]}
+
+    def server(self, **kwargs) -> ReplayKlineServer:
+        """
+        Crea el servidor WebSocket que reproduce los eventos grabados
+
+        Returns:
+            Servidor de reproducción (sin iniciar)
+        """
+        return ReplayKlineServer(self.events, **kwargs)
+
+    def replay(self, stream: OrderBookStream):
+        """
+        Aplica los eventos grabados directamente sobre un stream, sin sockets
+
+        Con background=False en el stream las instantáneas se cargan en el
+        mismo hilo y el resultado es determinista.
+
+        Args:
+            stream: Stream cuyos libros se suscribieron con esta grabación como cliente
+        """
+        for message in self.events:
+            stream.handle_message(message)
@@ -0,0 +1,354 @@
+import time
+import logging
+import threading
+from typing import Dict, Optional
+
+from exchange_info import ExchangeInfoRegistry, get_exchange_info_registry
+
+logger = logging.getLogger(__name__)
+
+
+class PortfolioRiskManager:
+    """
+    Vista de riesgo de toda la cartera compartida por los bots del proceso.
+
+    Mantiene balances, posiciones abiertas de todos los bots y copias,
+    exposición por activo y por grupo de activos correlacionados. Los
+    balances se cargan una vez por REST y después se actualizan con los
+    eventos del user data stream (o con los fills propios si no hay
+    stream). El tamaño de una operación se reserva de forma atómica, de
+    modo que dos bots concurrentes no pueden comprometer el mismo capital
+    """
+
+    def __init__(self, quote_asset: str = 'USDT',
+                 max_total_exposure: float = 1.0,
+                 max_asset_exposure: float = 0.5,
+                 max_bucket_exposure: float = 0.5,
+                 buckets: Optional[Dict[str, str]] = None,
+                 resync_interval: float = 300.0,
+                 exchange_info: Optional[ExchangeInfoRegistry] = None):
+        """
+        Inicializa el gestor de riesgo de cartera
+
+        Args:
+            quote_asset: Activo en el que se mide el capital
+            max_total_exposure: Exposición total máxima (fracción del capital)
+            max_asset_exposure: Exposición máxima por activo (fracción del capital)
+            max_bucket_exposure: Exposición máxima por grupo correlacionado (fracción del capital)
+            buckets: Dict activo -> grupo correlacionado (default: cada activo es su propio grupo)
+            resync_interval: Segundos tras los que se recargan balances por REST si no llegan eventos
+            exchange_info: Registro de símbolos para resolver el activo base
+        """
+        self.quote_asset = quote_asset
+        self.max_total_exposure = max_total_exposure
+        self.max_asset_exposure = max_asset_exposure
+        self.max_bucket_exposure = max_bucket_exposure
+        self.buckets = dict(buckets or {})
+        self.resync_interval = resync_interval
+        self.exchange_info = exchange_info or get_exchange_info_registry()
+
+        self._lock = threading.RLock()
+        self._load_lock = threading.Lock()
+        self._free: Dict[str, float] = {}
+        self._locked: Dict[str, float] = {}
+
+        # Reservas pendientes (orden aún no confirmada) y posiciones abiertas
+        self._reservations: Dict[object, Dict] = {}
+        self._positions: Dict[object, Dict] = {}
+        self._exposure_by_asset: Dict[str, float] = {}
+        self._exposure_by_bucket: Dict[str, float] = {}
+        self._reserved_by_asset: Dict[str, float] = {}
+        self._reserved_by_bucket: Dict[str, float] = {}
+        self._reserved_total = 0.0
+        self._exposure_total = 0.0
+        self._net_position_value = 0.0
+
+        self.last_load = 0.0
+        self.last_event = 0.0
+
+        # Estadísticas
+        self.loads = 0
+        self.events = 0
+        self.reservations = 0
+        self.rejections = 0
+
+    def _base_asset(self, symbol: str) -> str:
+        filters = self.exchange_info.get(symbol)
+        if filters is not None and filters.base_asset:
+            return filters.base_asset
+        if symbol.endswith(self.quote_asset):
+            return symbol[:-len(self.quote_asset)]
+        return symbol
+
+    def _bucket(self, asset: str) -> str:
+        return self.buckets.get(asset, asset)
+
+    def load(self, client) -> int:
+        """
+        Carga todos los balances en una sola petición
+
+        Args:
+            client: Cliente de Binance
+
+        Returns:
+            Número de activos con saldo
+        """
+        account = client.get_account()
+        free, locked = {}, {}
+        for balance in account.get('balances', []):
+            f, l = float(balance['free']), float(balance['locked'])
+            if f > 0 or l > 0:
+                free[balance['asset']] = f
+                locked[balance['asset']] = l
+        with self._lock:
+            self._free = free
+            self._locked = locked
+            self.last_load = time.time()
+            self.loads += 1
+        return len(free)
+
+    def _ensure_loaded(self, client):
+        if client is None:
+            return
+        now = time.time()
+        if self.last_load and (now - max(self.last_load, self.last_event) < self.resync_interval):
+            return
+        # Un solo hilo recarga; el resto reutiliza el resultado
+        with self._load_lock:
+            if self.last_load and time.time() - max(self.last_load, self.last_event) < self.resync_interval:
+                return
+            try:
+                self.load(client)
+            except Exception as e:
+                logger.error(f"Error cargando balances: {e}")
+
+    def handle_event(self, event: Dict):
+        """
+        Aplica un evento del user data stream
+
+        Soporta outboundAccountPosition (saldos absolutos) y balanceUpdate
+        (depósitos/retiradas).
+
+        Args:
+            event: Evento ya decodificado
+        """
+        event_type = event.get('e')
+        with self._lock:
+            if event_type == 'outboundAccountPosition':
+                for balance in event.get('B', []):
+                    self._free[balance['a']] = float(balance['f'])
+                    self._locked[balance['a']] = float(balance['l'])
+            elif event_type == 'balanceUpdate':
+                asset = event['a']
+                self._free[asset] = self._free.get(asset, 0.0) + float(event['d'])
+            else:
+                return
+            self.last_event = time.time()
+            self.events += 1
+
+    def get_balance(self, asset: Optional[str] = None, client=None) -> float:
+        """
+        Obtiene el saldo total (libre + bloqueado) de un activo sin llamada REST
+
+        Args:
+            asset: Activo (default: activo de cotización)
+            client: Cliente para la carga inicial o la resincronización (opcional)
+
+        Returns:
+            Saldo del activo
+        """
+        self._ensure_loaded(client)
+        asset = asset or self.quote_asset
+        with self._lock:
+            return self._free.get(asset, 0.0) + self._locked.get(asset, 0.0)
+
+    def get_balances(self, client=None) -> Dict[str, float]:
+        """
+        Obtiene todos los saldos (mismo formato que get_account_balance de los bots)
+
+        Args:
+            client: Cliente para la carga inicial o la resincronización (opcional)
+
+        Returns:
+            Dict activo -> saldo total
+        """
+        self._ensure_loaded(client)
+        with self._lock:
+            return {asset: self._free.get(asset, 0.0) + self._locked.get(asset, 0.0)
+                    for asset in set(self._free) | set(self._locked)}
+
+    def _equity(self) -> float:
+        quote = self._free.get(self.quote_asset, 0.0) + self._locked.get(self.quote_asset, 0.0)
+        # Las compras se valoran como activo; las ventas, como pasivo
+        return quote + self._net_position_value
+
+    def reserve(self, position_id, symbol: str, notional: float, client=None) -> float:
+        """
+        Reserva capital para una operación respetando los límites de cartera
+
+        El importe se recorta a lo que permitan el capital libre y los
+        límites por activo, por grupo y total. La reserva queda pendiente
+        hasta confirm() o release().
+
+        Args:
+            position_id: Identificador de la posición (bot/copia)
+            symbol: Par de trading
+            notional: Importe deseado en el activo de cotización
+            client: Cliente para la carga inicial o la resincronización (opcional)
+
+        Returns:
+            Importe aprobado (0 si no hay margen)
+        """
+        self._ensure_loaded(client)
+        asset = self._base_asset(symbol)
+        bucket = self._bucket(asset)
+
+        with self._lock:
+            self._release(position_id)
+            equity = self._equity()
+            reserved_asset = self._reserved_by_asset.get(asset, 0.0)
+            reserved_bucket = self._reserved_by_bucket.get(bucket, 0.0)
+
+            headroom = min(
+                notional,
+                self._free.get(self.quote_asset, 0.0) - self._reserved_total,
+                equity * self.max_total_exposure - self._exposure_total - self._reserved_total,
+                equity * self.max_asset_exposure - self._exposure_by_asset.get(asset, 0.0) - reserved_asset,
+                equity * self.max_bucket_exposure - self._exposure_by_bucket.get(bucket, 0.0) - reserved_bucket
+            )
+            if headroom <= 0:
+                self.rejections += 1
+                return 0.0
+
+            self._reservations[position_id] = {
+                'symbol': symbol, 'asset': asset, 'bucket': bucket, 'notional': headroom
+            }
+            self._add_reserved(asset, bucket, headroom)
+            self.reservations += 1
+            return headroom
+
+    def _add_reserved(self, asset: str, bucket: str, notional: float):
+        self._reserved_by_asset[asset] = self._reserved_by_asset.get(asset, 0.0) + notional
+        self._reserved_by_bucket[bucket] = self._reserved_by_bucket.get(bucket, 0.0) + notional
+        self._reserved_total += notional
+
+    def _release(self, position_id) -> Optional[Dict]:
+        reservation = self._reservations.pop(position_id, None)
+        if reservation is not None:
+            self._add_reserved(reservation['asset'], reservation['bucket'], -reservation['notional'])
+        return reservation
+
+    def release(self, position_id):
+        """
+        Libera una reserva no ejecutada (orden rechazada o cancelada)
+
+        Args:
+            position_id: Identificador de la posición
+        """
+        with self._lock:
+            self._release(position_id)
+
+    def _add_exposure(self, asset: str, bucket: str, notional: float):
+        self._exposure_by_asset[asset] = self._exposure_by_asset.get(asset, 0.0) + notional
+        self._exposure_by_bucket[bucket] = self._exposure_by_bucket.get(bucket, 0.0) + notional
+        self._exposure_total += notional
+
+    def confirm(self, position_id, symbol: str, side: str, notional: float, adjust_balance: bool = True):
+        """
+        Convierte una reserva en posición abierta tras ejecutarse la orden
+
+        Args:
+            position_id: Identificador de la posición
+            symbol: Par de trading
+            side: 'buy' o 'sell'
+            notional: Importe ejecutado
+            adjust_balance: Descontar el importe del saldo local (False al restaurar
+                posiciones tras un reinicio, cuyo coste ya refleja el saldo cargado)
+        """
+        asset = self._base_asset(symbol)
+        bucket = self._bucket(asset)
+        side = side.lower()
+        with self._lock:
+            self._release(position_id)
+            self._close(position_id)
+            self._positions[position_id] = {
+                'symbol': symbol, 'asset': asset, 'bucket': bucket, 'side': side, 'notional': notional
+            }
+            self._add_exposure(asset, bucket, notional)
+            self._net_position_value += notional if side == 'buy' else -notional
+            # Ajuste local hasta que llegue el saldo real por el stream
+            if adjust_balance:
+                delta = -notional if side == 'buy' else notional
+                self._free[self.quote_asset] = self._free.get(self.quote_asset, 0.0) + delta
+
+    def _close(self, position_id, exit_notional: Optional[float] = None) -> Optional[Dict]:
+        position = self._positions.pop(position_id, None)
+        if position is None:
+            return None
+        self._add_exposure(position['asset'], position['bucket'], -position['notional'])
+        self._net_position_value -= position['notional'] if position['side'] == 'buy' else -position['notional']
+        if exit_notional is not None:
+            delta = exit_notional if position['side'] == 'buy' else -exit_notional
+            self._free[self.quote_asset] = self._free.get(self.quote_asset, 0.0) + delta
+        return position
+
+    def close(self, position_id, exit_notional: Optional[float] = None) -> bool:
+        """
+        Elimina una posición cerrada de la exposición
+
+        Args:
+            position_id: Identificador de la posición
+            exit_notional: Importe de salida (ajusta el saldo local)
+
+        Returns:
+            True si la posición estaba registrada
+        """
+        with self._lock:
+            return self._close(position_id, exit_notional) is not None
+
+    def get_exposure(self) -> Dict:
+        """
+        Obtiene la exposición actual de la cartera
+
+        Returns:
+            Dict con exposición total, por activo y por grupo
+        """
+        with self._lock:
+            equity = self._equity()
+            return {
+                'equity': equity,
+                'total': self._exposure_total,
+                'reserved': self._reserved_total,
+                'by_asset': dict(self._exposure_by_asset),
+                'by_bucket': dict(self._exposure_by_bucket),
+                'utilization': (self._exposure_total + self._reserved_total) / equity if equity > 0 else 0.0
+            }
+
+    def get_statistics(self) -> Dict:
+        """
+        Obtiene estadísticas del gestor
+
+        Returns:
+            Dict con estadísticas
+        """
+        return {
+            'positions': len(self._positions),
+            'pending_reservations': len(self._reservations),
+            'loads': self.loads,
+            'events': self.events,
+            'reservations': self.reservations,
+            'rejections': self.rejections
+        }
+
+
+_shared_manager = PortfolioRiskManager()
+
+
+def get_portfolio_risk() -> PortfolioRiskManager:
+    """
+    Obtiene el gestor de riesgo de cartera compartido por el proceso
+
+    Returns:
+        Instancia compartida de PortfolioRiskManager
+    """
+    return _shared_manager
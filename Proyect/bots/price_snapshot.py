@@ -0,0 +1,286 @@
+import json
+import time
+import logging
+import threading
+from typing import Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+import websocket
+
+from market_stream import BINANCE_STREAM_URL
+
+logger = logging.getLogger(__name__)
+
+
+class PriceSnapshot:
+    """
+    Foto inmutable de precios de todo el mercado: índice símbolo -> posición
+    y un array de precios. Leer N posiciones no hace ninguna petición
+    """
+
+    __slots__ = ('index', 'prices', 'timestamp')
+
+    def __init__(self, index: Dict[str, int], prices: np.ndarray, timestamp: float):
+        self.index = index
+        self.prices = prices
+        self.timestamp = timestamp
+
+    def get(self, symbol: str) -> Optional[float]:
+        """
+        Obtiene el precio de un símbolo
+
+        Args:
+            symbol: Par de trading
+
+        Returns:
+            Precio o None si el símbolo no está en la foto
+        """
+        idx = self.index.get(symbol.upper())
+        if idx is None or idx >= len(self.prices) or np.isnan(self.prices[idx]):
+            return None
+        return float(self.prices[idx])
+
+    def get_many(self, symbols: Iterable[str]) -> np.ndarray:
+        """
+        Obtiene los precios de varios símbolos de una vez
+
+        Args:
+            symbols: Pares de trading
+
+        Returns:
+            Array de precios (NaN para símbolos desconocidos)
+        """
+        positions = np.array([self.index.get(s.upper(), -1) for s in symbols], dtype=np.int64)
+        valid = (positions >= 0) & (positions < len(self.prices))
+        result = np.full(len(positions), np.nan)
+        result[valid] = self.prices[positions[valid]]
+        return result
+
+    def age(self) -> float:
+        """
+        Segundos transcurridos desde que se tomó la foto
+        """
+        return time.time() - self.timestamp
+
+    def __contains__(self, symbol: str) -> bool:
+        return self.get(symbol) is not None
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+
+class PriceSnapshotService:
+    """
+    Servicio de precios de todo el mercado compartido por el proceso.
+
+    Descarga todos los tickers en una sola petición (como mucho una vez
+    cada ttl segundos) o, si se arranca el stream, los mantiene al día con
+    !miniTicker@arr. Los monitores de posiciones leen de la foto en lugar
+    de pedir un ticker por posición
+    """
+
+    def __init__(self, ttl: float = 1.0, url: str = BINANCE_STREAM_URL, stale_after: float = 10.0):
+        """
+        Inicializa el servicio
+
+        Args:
+            ttl: Validez en segundos de una descarga REST
+            url: URL base del stream combinado
+            stale_after: Segundos sin mensajes tras los que el stream se ignora
+        """
+        self.ttl = ttl
+        self.url = url
+        self.stale_after = stale_after
+
+        self._index: Dict[str, int] = {}
+        self._prices = np.full(0, np.nan)
+        self._listeners: List[Callable[[str, float], None]] = []
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self.last_refresh = 0.0
+        self.last_stream_update = 0.0
+
+        self._ws = None
+        self._thread = None
+        self.is_streaming = False
+
+        # Estadísticas
+        self.refreshes = 0
+        self.hits = 0
+
+    def _store(self, symbol: str, price: float):
+        idx = self._index.get(symbol)
+        if idx is None:
+            idx = self._index[symbol] = len(self._index)
+            if idx >= len(self._prices):
+                grown = np.full(max(64, len(self._prices) * 2), np.nan)
+                grown[:len(self._prices)] = self._prices
+                self._prices = grown
+        self._prices[idx] = price
+
+    def add_price_listener(self, callback: Callable[[str, float], None]):
+        """
+        Registra una función llamada con (símbolo, precio) en cada precio del stream
+
+        Args:
+            callback: Función a llamar
+        """
+        self._listeners.append(callback)
+
+    def refresh(self, client) -> int:
+        """
+        Descarga todos los tickers en una sola petición
+
+        Args:
+            client: Cliente de Binance
+
+        Returns:
+            Número de símbolos actualizados
+        """
+        tickers = client.get_all_tickers()
+        with self._lock:
+            for ticker in tickers:
+                self._store(ticker['symbol'], float(ticker['price']))
+            self.last_refresh = time.time()
+            self.refreshes += 1
+        return len(tickers)
+
+    def _stream_fresh(self) -> bool:
+        return self.is_streaming and time.time() - self.last_stream_update <= self.stale_after
+
+    def get_snapshot(self, client=None) -> PriceSnapshot:
+        """
+        Obtiene una foto de precios, refrescándola si ha caducado
+
+        Args:
+            client: Cliente de Binance para el refresco por REST (opcional)
+
+        Returns:
+            Foto de precios
+        """
+        if client is not None and not self._stream_fresh() and time.time() - self.last_refresh >= self.ttl:
+            # Un solo hilo refresca; el resto espera y reutiliza el resultado
+            with self._refresh_lock:
+                if time.time() - self.last_refresh >= self.ttl:
+                    self.refresh(client)
+        else:
+            self.hits += 1
+
+        with self._lock:
+            timestamp = self.last_stream_update if self._stream_fresh() else self.last_refresh
+            return PriceSnapshot(self._index, self._prices[:len(self._index)].copy(), timestamp)
+
+    def get_price(self, client, symbol: str) -> float:
+        """
+        Obtiene el precio de un símbolo desde la foto
+
+        Args:
+            client: Cliente de Binance
+            symbol: Par de trading
+
+        Returns:
+            Precio actual
+        """
+        price = self.get_snapshot(client).get(symbol)
+        if price is None:
+            # Símbolo ausente de la foto: se pide directamente
+            price = float(client.get_symbol_ticker(symbol=symbol.upper())['price'])
+        return price
+
+    def handle_message(self, message: str):
+        """
+        Procesa un mensaje de !miniTicker@arr o de <symbol>@bookTicker
+
+        Args:
+            message: Mensaje JSON recibido
+        """
+        try:
+            payload = json.loads(message)
+            events = payload.get('data', payload) if isinstance(payload, dict) else payload
+            if isinstance(events, dict):
+                events = [events]
+
+            updates = []
+            for event in events:
+                if 'c' in event:
+                    updates.append((event['s'], float(event['c'])))
+                elif 'b' in event and 'a' in event:
+                    updates.append((event['s'], (float(event['b']) + float(event['a'])) / 2))
+
+            with self._lock:
+                for symbol, price in updates:
+                    self._store(symbol, price)
+                self.last_stream_update = time.time()
+
+            for callback in self._listeners:
+                for symbol, price in updates:
+                    callback(symbol, price)
+
+        except Exception as e:
+            logger.error(f"Error procesando mensaje de precios: {e}")
+
+    def _run(self):
+        backoff = 1.0
+        while self.is_streaming:
+            self._ws = websocket.WebSocketApp(
+                f"{self.url}?streams=!miniTicker@arr",
+                on_message=lambda ws, message: self.handle_message(message),
+                on_error=lambda ws, error: logger.error(f"Error en el stream de precios: {error}")
+            )
+            started = time.time()
+            self._ws.run_forever(ping_interval=180, ping_timeout=10)
+
+            if not self.is_streaming:
+                break
+            if time.time() - started > 60:
+                backoff = 1.0
+            logger.info(f"Reconectando stream de precios en {backoff:.0f}s...")
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 60.0)
+
+    def start_stream(self):
+        """
+        Mantiene la foto al día con el stream de tickers de todo el mercado
+        """
+        if self.is_streaming:
+            return
+        self.is_streaming = True
+        self._thread = threading.Thread(target=self._run, name='price-stream', daemon=True)
+        self._thread.start()
+
+    def stop_stream(self):
+        """
+        Detiene el stream de precios
+        """
+        self.is_streaming = False
+        if self._ws is not None:
+            self._ws.close()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def get_statistics(self) -> Dict:
+        """
+        Obtiene estadísticas del servicio
+
+        Returns:
+            Dict con estadísticas
+        """
+        return {
+            'symbols': len(self._index),
+            'refreshes': self.refreshes,
+            'hits': self.hits,
+            'streaming': self._stream_fresh()
+        }
+
+
+_shared_service = PriceSnapshotService()
+
+
+def get_price_snapshot() -> PriceSnapshotService:
+    """
+    Obtiene el servicio de precios compartido por el proceso
+
+    Returns:
+        Instancia compartida de PriceSnapshotService
+    """
+    return _shared_service
@@ -2,8 +2,9 @@ import os
 import time
 import schedule
 import logging
+import threading
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
 import pandas as pd
 import numpy as np
 from binance.client import Client
@@ -11,6 +12,20 @@ from binance.exceptions import BinanceAPIException
 from dotenv import load_dotenv
 
 from utils import SignalGenerator, RiskManager, TradeLogger, TradingIndicators
+from indicator_graph import IndicatorGraph, get_indicator_graph
+from market_stream import KlineStream
+from kline_parser import OHLCV, parse_klines
+from market_cache import MarketDataCache, get_shared_cache
+from exchange_info import ExchangeInfoRegistry, get_exchange_info_registry
+from exchange_client import get_client_pool
+from price_snapshot import PriceSnapshotService, get_price_snapshot
+from trigger_engine import TriggerEngine, get_trigger_engine
+from candle_store import CandleStore
+from candle_aggregator import AggregatedKlineStream
+from portfolio_risk import PortfolioRiskManager, get_portfolio_risk
+from user_data_stream import OrderLedger, UserDataStream, get_order_ledger
+from trade_journal import TradeJournal, get_trade_journal
+from state_store import StateStore, get_state_store, new_client_order_id, reconcile_position
 
 # Cargar variables de entorno
 load_dotenv()
@@ -33,7 +48,19 @@ class RSIEMABot:
     """
     
     def __init__(self, api_key: str = None, api_secret: str = None, 
-                 symbol: str = 'BTCUSDT', interval: str = '15m'):
+                 symbol: str = 'BTCUSDT', interval: str = '15m',
+                 market_stream: Optional[KlineStream] = None,
+                 market_cache: Optional[MarketDataCache] = None,
+                 exchange_info: Optional[ExchangeInfoRegistry] = None,
+                 client: Optional[Client] = None,
+                 price_snapshot: Optional[PriceSnapshotService] = None,
+                 trigger_engine: Optional[TriggerEngine] = None,
+                 candle_store: Optional[CandleStore] = None,
+                 portfolio_risk: Optional[PortfolioRiskManager] = None,
+                 order_ledger: Optional[OrderLedger] = None,
+                 trade_journal: Optional[TradeJournal] = None,
+                 state_store: Optional[StateStore] = None,
+                 indicator_graph: Optional[IndicatorGraph] = None):
         """
         Inicializa el bot RSI/EMA
         
@@ -42,6 +69,18 @@ class RSIEMABot:
             api_secret: API secret de Binance
             symbol: Par de trading (default: BTCUSDT)
             interval: Intervalo de tiempo (default: 15m)
+            market_stream: Stream de velas compartido (opcional, si no se usa REST)
+            market_cache: Caché de datos de mercado (default: caché compartida del proceso)
+            exchange_info: Registro de filtros del exchange (default: registro compartido)
+            client: Cliente ya construido (opcional, p. ej. simulado en backtests)
+            price_snapshot: Servicio de precios de todo el mercado (default: servicio compartido)
+            trigger_engine: Motor de SL/TP por eventos (default: motor compartido)
+            candle_store: Histórico local de velas en disco (opcional)
+            portfolio_risk: Gestor de riesgo de cartera (default: gestor compartido)
+            order_ledger: Registro de ejecuciones reales (default: registro compartido)
+            trade_journal: Diario persistente de operaciones (default: diario compartido)
+            state_store: Estado de posiciones a prueba de caídas (default: almacén compartido)
+            indicator_graph: Grafo de indicadores (default: grafo compartido)
         """
         self.api_key = api_key or os.getenv('BINANCE_API_KEY')
         self.api_secret = api_secret or os.getenv('BINANCE_API_SECRET')
@@ -50,12 +89,50 @@ class RSIEMABot:
         
         # Configurar cliente de Binance
         try:
-            self.client = Client(self.api_key, self.api_secret)
+            self.client = client or get_client_pool().get_client(self.api_key, self.api_secret)
             logger.info(f"Bot RSI/EMA inicializado para {symbol}")
         except Exception as e:
             logger.error(f"Error inicializando cliente Binance: {e}")
             raise
         
+        # Reloj inyectable (un backtest lo sustituye por un reloj simulado)
+        self.clock: Callable[[], datetime] = datetime.now
+        
+        # Stream de velas en memoria (evita peticiones REST en cada ciclo)
+        self.market_stream = market_stream
+        if self.market_stream is not None:
+            self.market_stream.subscribe(self.symbol, self.interval, client=self.client)
+        
+        # Caché compartida: N estrategias sobre el mismo par hacen una sola petición
+        self.market_cache = market_cache or get_shared_cache()
+        
+        # Histórico en disco: al arrancar solo se descarga la cola que falta
+        self.candle_store = candle_store
+        
+        # Filtros de símbolos cargados en bloque una sola vez
+        self.exchange_info = exchange_info or get_exchange_info_registry()
+        
+        # Precios de todo el mercado en una sola petición
+        self.price_snapshot = price_snapshot or get_price_snapshot()
+        
+        # Niveles de salida evaluados en cada precio recibido
+        self.trigger_engine = trigger_engine or get_trigger_engine()
+        self.position_lock = threading.RLock()
+        
+        # Balances y exposición de toda la cartera (sin get_account por decisión)
+        self.portfolio_risk = portfolio_risk or get_portfolio_risk()
+        self.risk_id = (id(self), self.symbol)
+        
+        # Precios de ejecución y comisiones reales (respuesta REST o stream de usuario)
+        self.order_ledger = order_ledger or get_order_ledger()
+        
+        # Ejecuciones y operaciones cerradas persistidas sin bloquear el ciclo
+        self.trade_journal = trade_journal or get_trade_journal()
+        
+        # Posiciones abiertas persistidas (instantánea + write-ahead log)
+        self.state_store = state_store or get_state_store()
+        self.state_key = f"rsi_ema:{self.symbol}"
+        
         # Parámetros de la estrategia
         self.rsi_period = 14  # Período para RSI
         self.ema_period = 20  # Período para EMA
@@ -63,6 +140,16 @@ class RSIEMABot:
         self.rsi_overbought = 70  # Nivel de sobrecompra
         self.volume_threshold = 1.2  # Multiplicador de volumen promedio
         self.max_position_time = 7200  # 2 horas máximo
+        self.take_profit = 0.04  # 4% take profit
+        self.stop_loss = 0.025  # 2.5% stop loss
+        
+        # Indicadores declarados en el grafo compartido: cada vela cerrada se procesa
+        # una sola vez y los nodos idénticos de otros bots se reutilizan
+        self.indicator_graph = indicator_graph or get_indicator_graph()
+        self.indicator_engine = self.indicator_graph.subscribe(self.symbol, self.interval)
+        self.indicator_engine.add_indicator('rsi', ('rsi', self.rsi_period))
+        self.indicator_engine.add_indicator('ema', ('ema', self.ema_period))
+        self.indicator_engine.add_indicator('volume_sma', ('sma', 20), column='volume')
         
         # Estado del bot
         self.active_positions = {}
@@ -74,7 +161,7 @@ class RSIEMABot:
         self.winning_trades = 0
         self.total_profit = 0.0
         
-    def get_market_data(self, limit: int = 200) -> pd.DataFrame:
+    def get_market_data(self, limit: int = 200) -> OHLCV:
         """
         Obtiene datos de mercado del exchange
         
@@ -82,36 +169,34 @@ class RSIEMABot:
             limit: Número de velas a obtener
             
         Returns:
-            DataFrame con datos OHLCV
+            Velas OHLCV
         """
         try:
-            klines = self.client.get_klines(
-                symbol=self.symbol,
-                interval=self.interval,
-                limit=limit
-            )
-            
-            data = pd.DataFrame(klines, columns=[
-                'timestamp', 'open', 'high', 'low', 'close', 'volume',
-                'close_time', 'quote_asset_volume', 'number_of_trades',
-                'taker_buy_base_asset_volume', 'taker_buy_quote_asset_volume', 'ignore'
-            ])
-            
-            # Convertir tipos de datos
-            numeric_columns = ['open', 'high', 'low', 'close', 'volume']
-            for col in numeric_columns:
-                data[col] = pd.to_numeric(data[col], errors='coerce')
-            
-            data['timestamp'] = pd.to_datetime(data['timestamp'], unit='ms')
+            # Servir desde el stream si el buffer está al día
+            if self.market_stream is not None:
+                data = self.market_stream.get_ohlcv(self.symbol, self.interval, limit)
+                if data is not None:
+                    return data
+            
+            if self.candle_store is not None:
+                klines = self.candle_store.get_klines(self.client, self.symbol, self.interval, limit)
+            else:
+                klines = self.market_cache.get_klines(
+                    self.client,
+                    self.symbol,
+                    self.interval,
+                    limit
+                )
             
-            return data
+            # Se decodifican solo los campos usados, sin pasar por pandas
+            return parse_klines(klines)
             
         except BinanceAPIException as e:
             logger.error(f"Error obteniendo datos de mercado: {e}")
-            return pd.DataFrame()
+            return OHLCV.empty_frame()
         except Exception as e:
             logger.error(f"Error inesperado obteniendo datos: {e}")
-            return pd.DataFrame()
+            return OHLCV.empty_frame()
     
     def get_current_price(self) -> Optional[float]:
         """
@@ -121,8 +206,12 @@ class RSIEMABot:
             Precio actual o None si hay error
         """
         try:
-            ticker = self.client.get_symbol_ticker(symbol=self.symbol)
-            return float(ticker['price'])
+            if self.market_stream is not None:
+                price = self.market_stream.get_last_price(self.symbol)
+                if price is not None:
+                    return price
+            
+            return self.price_snapshot.get_price(self.client, self.symbol)
         except Exception as e:
             logger.error(f"Error obteniendo precio actual: {e}")
             return None
@@ -147,18 +236,18 @@ class RSIEMABot:
             logger.error(f"Error obteniendo balance: {e}")
             return {}
     
-    def calculate_indicators(self, data: pd.DataFrame) -> Tuple[pd.Series, pd.Series]:
+    def calculate_indicators(self, data: OHLCV) -> Tuple[pd.Series, pd.Series]:
         """
         Calcula los indicadores RSI y EMA
         
         Args:
-            data: DataFrame con datos de mercado
+            data: Velas OHLCV
             
         Returns:
             Tuple con (rsi, ema)
         """
         try:
-            close_prices = data['close']
+            close_prices = pd.Series(data['close'])
             
             # Calcular RSI
             rsi = TradingIndicators.compute_rsi(close_prices, self.rsi_period)
@@ -172,12 +261,29 @@ class RSIEMABot:
             logger.error(f"Error calculando indicadores: {e}")
             return pd.Series([np.nan] * len(data)), pd.Series([np.nan] * len(data))
     
-    def calculate_volume_ratio(self, data: pd.DataFrame) -> float:
+    def calculate_latest_indicators(self, data: OHLCV) -> Dict[str, float]:
+        """
+        Calcula los indicadores de la última vela de forma incremental
+        
+        Args:
+            data: Velas OHLCV
+            
+        Returns:
+            Dict con 'rsi', 'ema' y 'volume_sma' de la última vela
+        """
+        try:
+            return self.indicator_engine.sync(data)
+        except Exception as e:
+            logger.error(f"Error calculando indicadores incrementales: {e}")
+            self.indicator_engine.reset()
+            return {}
+    
+    def calculate_volume_ratio(self, data: OHLCV) -> float:
         """
         Calcula la ratio de volumen actual vs promedio
         
         Args:
-            data: DataFrame con datos de mercado
+            data: Velas OHLCV
             
         Returns:
             Ratio de volumen
@@ -186,8 +292,8 @@ class RSIEMABot:
             if len(data) < 20:
                 return 1.0
             
-            current_volume = data['volume'].iloc[-1]
-            avg_volume = data['volume'].rolling(window=20).mean().iloc[-1]
+            current_volume = data['volume'][-1]
+            avg_volume = self.calculate_latest_indicators(data).get('volume_sma', np.nan)
             
             return current_volume / avg_volume if avg_volume > 0 else 1.0
             
@@ -195,12 +301,12 @@ class RSIEMABot:
             logger.error(f"Error calculando ratio de volumen: {e}")
             return 1.0
     
-    def should_open_position(self, data: pd.DataFrame) -> Tuple[bool, str]:
+    def should_open_position(self, data: OHLCV) -> Tuple[bool, str]:
         """
         Determina si se debe abrir una posición basada en RSI y EMA
         
         Args:
-            data: DataFrame con datos de mercado
+            data: Velas OHLCV
             
         Returns:
             Tuple (debe_abrir, dirección)
@@ -210,16 +316,16 @@ class RSIEMABot:
             if self.symbol in self.active_positions:
                 return False, 'hold'
             
-            # Calcular indicadores
-            rsi, ema = self.calculate_indicators(data)
-            volume_ratio = self.calculate_volume_ratio(data)
-            
             if len(data) < max(self.rsi_period, self.ema_period):
                 return False, 'hold'
             
-            current_price = data['close'].iloc[-1]
-            current_rsi = rsi.iloc[-1]
-            current_ema = ema.iloc[-1]
+            # Calcular indicadores (solo se procesan las velas nuevas)
+            indicators = self.calculate_latest_indicators(data)
+            volume_ratio = self.calculate_volume_ratio(data)
+            
+            current_price = data['close'][-1]
+            current_rsi = indicators.get('rsi', np.nan)
+            current_ema = indicators.get('ema', np.nan)
             
             # Verificar condiciones para compra
             if (current_price > current_ema and  # Precio por encima de EMA
@@ -262,28 +368,28 @@ class RSIEMABot:
                 pnl_percentage = (entry_price - current_price) / entry_price
             
             # Verificar tiempo máximo de posición
-            time_in_position = (datetime.now() - entry_time).total_seconds()
+            time_in_position = (self.clock() - entry_time).total_seconds()
             if time_in_position > self.max_position_time:
                 logger.info(f"Cerrando posición por tiempo máximo: {self.symbol}")
                 return True
             
-            # Verificar take profit (4%)
-            if pnl_percentage >= 0.04:
+            # Verificar take profit
+            if pnl_percentage >= self.take_profit:
                 logger.info(f"Cerrando posición por take profit: {self.symbol}")
                 return True
             
-            # Verificar stop loss (2.5%)
-            if pnl_percentage <= -0.025:
+            # Verificar stop loss
+            if pnl_percentage <= -self.stop_loss:
                 logger.info(f"Cerrando posición por stop loss: {self.symbol}")
                 return True
             
             # Verificar reversión de indicadores
             data = self.get_market_data(limit=50)
             if not data.empty:
-                rsi, ema = self.calculate_indicators(data)
-                current_rsi = rsi.iloc[-1]
-                current_ema = ema.iloc[-1]
-                current_price = data['close'].iloc[-1]
+                indicators = self.calculate_latest_indicators(data)
+                current_rsi = indicators.get('rsi', np.nan)
+                current_ema = indicators.get('ema', np.nan)
+                current_price = data['close'][-1]
                 
                 # Si el precio cruza la EMA en dirección opuesta
                 if (side == 'buy' and current_price < current_ema) or \
@@ -315,30 +421,59 @@ class RSIEMABot:
         Returns:
             True si la operación fue exitosa
         """
+        order_sent = False
         try:
+            # Intención registrada antes de enviar la orden: tras una caída se concilia con el exchange
+            client_order_id = new_client_order_id('rsi_ema')
+            self.state_store.put(self.state_key, {
+                'status': 'pending', 'side': side, 'quantity': quantity, 'entry_price': price,
+                'client_order_id': client_order_id, 'entry_time': self.clock()
+            })
+            
             # Crear orden de mercado
+            order_sent = True
             if side == 'buy':
                 order = self.client.order_market_buy(
                     symbol=self.symbol,
-                    quantity=quantity
+                    quantity=quantity,
+                    newClientOrderId=client_order_id
                 )
             else:
                 order = self.client.order_market_sell(
                     symbol=self.symbol,
-                    quantity=quantity
+                    quantity=quantity,
+                    newClientOrderId=client_order_id
                 )
             
+            # Precio medio y cantidad realmente ejecutados
+            fill = self.order_ledger.resolve_fill(order)
+            if fill['avg_price']:
+                price = fill['avg_price']
+                quantity = fill['executed_qty']
+            
             # Registrar posición
             position = {
                 'order_id': order['orderId'],
                 'side': side,
                 'quantity': quantity,
                 'entry_price': price,
-                'entry_time': datetime.now(),
+                'entry_commission': fill['commission_quote'],
+                'entry_time': self.clock(),
                 'status': 'open'
             }
             
             self.active_positions[self.symbol] = position
+            self.state_store.put(self.state_key, position)
+            self.portfolio_risk.confirm(self.risk_id, self.symbol, side, quantity * price)
+            
+            # Registrar niveles de salida en el motor de disparos
+            self.trigger_engine.add_position(
+                (self.symbol, order['orderId']), self.symbol, side, price,
+                stop_loss_percentage=self.stop_loss,
+                take_profit_percentage=self.take_profit,
+                max_duration=self.max_position_time,
+                callback=self.on_trigger
+            )
             
             # Log de la operación
             TradeLogger.log_trade(
@@ -346,18 +481,27 @@ class RSIEMABot:
                 side=side,
                 quantity=quantity,
                 price=price,
-                strategy='rsi_ema'
+                strategy='rsi_ema',
+                journal=self.trade_journal,
+                source='rsi_ema'
             )
             
             logger.info(f"Posición abierta: {side} {quantity} {self.symbol} @ {price}")
             return True
             
         except BinanceAPIException as e:
+            # Orden rechazada por el exchange: no hay posición que conservar
             logger.error(f"Error de API al abrir posición: {e}")
+            self.state_store.delete(self.state_key)
             return False
         except Exception as e:
             logger.error(f"Error inesperado al abrir posición: {e}")
-            return False
+            if not order_sent:
+                self.state_store.delete(self.state_key)
+            elif self.symbol not in self.active_positions:
+                # La orden pudo llegar al exchange: se concilia ya por su client_order_id
+                self.restore_positions(validate_balance=False)
+            return self.symbol in self.active_positions
     
     def close_position(self, position: Dict, current_price: float) -> bool:
         """
@@ -386,12 +530,15 @@ class RSIEMABot:
                     quantity=quantity
                 )
             
-            # Calcular P&L
+            # Calcular P&L con la ejecución real y las comisiones de entrada y salida
+            fill = self.order_ledger.resolve_fill(order)
+            exit_price = fill['avg_price'] or current_price
+            commission = position.get('entry_commission', 0.0) + fill['commission_quote']
             entry_price = position['entry_price']
             if position['side'] == 'buy':
-                pnl = (current_price - entry_price) * quantity
+                pnl = (exit_price - entry_price) * quantity - commission
             else:
-                pnl = (entry_price - current_price) * quantity
+                pnl = (entry_price - exit_price) * quantity - commission
             
             # Actualizar estadísticas
             self.total_trades += 1
@@ -405,28 +552,35 @@ class RSIEMABot:
                 'side': position['side'],
                 'quantity': quantity,
                 'entry_price': entry_price,
-                'exit_price': current_price,
+                'exit_price': exit_price,
+                'commission': commission,
                 'pnl': pnl,
                 'entry_time': position['entry_time'],
-                'exit_time': datetime.now(),
+                'exit_time': self.clock(),
                 'strategy': 'rsi_ema'
             }
             self.trade_history.append(trade)
+            self.trade_journal.record('trade', trade, source='rsi_ema')
             
             # Log de la operación
             TradeLogger.log_trade(
                 symbol=self.symbol,
                 side=side,
                 quantity=quantity,
-                price=current_price,
-                strategy='rsi_ema'
+                price=exit_price,
+                strategy='rsi_ema',
+                journal=self.trade_journal,
+                source='rsi_ema'
             )
             
-            logger.info(f"Posición cerrada: {side} {quantity} {self.symbol} @ {current_price}, P&L: {pnl:.8f}")
+            logger.info(f"Posición cerrada: {side} {quantity} {self.symbol} @ {exit_price}, P&L: {pnl:.8f}")
             
             # Eliminar posición activa
+            self.trigger_engine.remove_position((self.symbol, position['order_id']))
+            self.portfolio_risk.close(self.risk_id, quantity * exit_price)
             if self.symbol in self.active_positions:
                 del self.active_positions[self.symbol]
+            self.state_store.delete(self.state_key)
             
             return True
             
@@ -455,9 +609,10 @@ class RSIEMABot:
             
             # Verificar posiciones activas
             if self.symbol in self.active_positions:
-                position = self.active_positions[self.symbol]
-                if self.should_close_position(position, current_price):
-                    self.close_position(position, current_price)
+                with self.position_lock:
+                    position = self.active_positions.get(self.symbol)
+                    if position is not None and self.should_close_position(position, current_price):
+                        self.close_position(position, current_price)
                 return
             
             # Evaluar apertura de nueva posición
@@ -465,8 +620,7 @@ class RSIEMABot:
             
             if should_open:
                 # Calcular tamaño de posición
-                balances = self.get_account_balance()
-                usdt_balance = balances.get('USDT', 0.0)
+                usdt_balance = self.portfolio_risk.get_balance('USDT', client=self.client)
                 
                 if usdt_balance > 25:  # Mínimo $25 USDT
                     position_size = RiskManager.calculate_position_size(
@@ -475,14 +629,23 @@ class RSIEMABot:
                         stop_loss_percentage=0.025  # 2.5% stop loss
                     )
                     
+                    # Reserva atómica: dos bots no pueden comprometer el mismo capital
+                    position_size = self.portfolio_risk.reserve(
+                        self.risk_id, self.symbol, position_size, client=self.client
+                    )
+                    
                     # Convertir a cantidad del símbolo
                     quantity = position_size / current_price
                     
                     # Redondear según las reglas del exchange
                     quantity = self.round_quantity(quantity)
                     
-                    if quantity > 0:
-                        self.open_position(direction, quantity, current_price)
+                    opened = False
+                    if quantity > 0 and self.validate_order(quantity, current_price):
+                        opened = self.open_position(direction, quantity, current_price)
+                    
+                    if not opened:
+                        self.portfolio_risk.release(self.risk_id)
             
         except Exception as e:
             logger.error(f"Error ejecutando estrategia: {e}")
@@ -498,25 +661,108 @@ class RSIEMABot:
             Cantidad redondeada
         """
         try:
-            # Obtener información del símbolo
-            symbol_info = self.client.get_symbol_info(self.symbol)
-            step_size = None
+            # Filtros desde el registro local de exchangeInfo (sin llamada REST)
+            return self.exchange_info.round_quantity(self.symbol, quantity, client=self.client)
             
-            for filter in symbol_info['filters']:
-                if filter['filterType'] == 'LOT_SIZE':
-                    step_size = float(filter['stepSize'])
-                    break
+        except Exception as e:
+            logger.error(f"Error redondeando cantidad: {e}")
+            return quantity
+    
+    def validate_order(self, quantity: float, price: float) -> bool:
+        """
+        Valida la orden localmente contra los filtros del exchange
+        (minQty, maxQty, minNotional) antes de enviarla
+        
+        Args:
+            quantity: Cantidad redondeada
+            price: Precio de referencia
             
-            if step_size:
-                # Redondear al step size más cercano
-                precision = len(str(step_size).split('.')[-1].rstrip('0'))
-                return round(quantity, precision)
+        Returns:
+            True si la orden cumple los filtros
+        """
+        valid, reason = self.exchange_info.check_order(self.symbol, quantity, price, client=self.client)
+        if not valid:
+            logger.warning(f"Orden descartada por filtros del exchange: {reason}")
+        return valid
+    
+    def on_trigger(self, event: Dict) -> Optional[bool]:
+        """
+        Cierra la posición cuando el motor de disparos detecta que el precio
+        ha cruzado el stop loss, el take profit o el tiempo máximo
+        
+        Args:
+            event: Evento del motor de disparos
             
-            return quantity
+        Returns:
+            False si el cierre falló (el motor rearma los niveles)
+        """
+        with self.position_lock:
+            position = self.active_positions.get(self.symbol)
+            if position is None or (self.symbol, position['order_id']) != event['position_id']:
+                return
             
+            current_price = event['price'] or self.get_current_price()
+            if current_price:
+                logger.info(f"Cerrando posición por {event['reason']} (disparo): {self.symbol} @ {current_price}")
+                return self.close_position(position, current_price)
+            return False
+    
+    def restore_history(self):
+        """
+        Recupera el historial y las estadísticas desde el diario de operaciones
+        """
+        self.trade_history = self.trade_journal.load_trades(source='rsi_ema', symbol=self.symbol)
+        self.total_trades = len(self.trade_history)
+        self.winning_trades = sum(1 for trade in self.trade_history if trade['pnl'] > 0)
+        self.total_profit = sum(trade['pnl'] for trade in self.trade_history)
+        if self.trade_history:
+            logger.info(f"Historial recuperado: {self.total_trades} operaciones, P&L: {self.total_profit:.8f}")
+    
+    def restore_positions(self, validate_balance: bool = True):
+        """
+        Recupera la posición abierta tras un reinicio y la concilia con el exchange
+        
+        Args:
+            validate_balance: Comprobar la cantidad contra el saldo del activo base
+                (False para una orden recién enviada, aún ausente del saldo en caché)
+        """
+        stored = self.state_store.get(self.state_key)
+        if stored is None:
+            return
+        
+        try:
+            base_balance = None
+            filters = self.exchange_info.get(self.symbol, client=self.client)
+            if validate_balance and filters is not None and filters.base_asset:
+                base_balance = self.portfolio_risk.get_balance(filters.base_asset, client=self.client)
+            
+            position = reconcile_position(self.client, self.symbol, stored, base_balance)
         except Exception as e:
-            logger.error(f"Error redondeando cantidad: {e}")
-            return quantity
+            # Estado desconocido: el registro se conserva para el próximo intento
+            logger.error(f"No se pudo conciliar la posición guardada de {self.symbol}: {e}")
+            return
+        if position is None:
+            logger.warning(f"Posición guardada de {self.symbol} descartada tras conciliar con el exchange")
+            self.state_store.delete(self.state_key)
+            return
+        
+        with self.position_lock:
+            self.active_positions[self.symbol] = position
+            self.state_store.put(self.state_key, position)
+            self.portfolio_risk.confirm(self.risk_id, self.symbol, position['side'],
+                                        position['quantity'] * position['entry_price'], adjust_balance=False)
+            
+            # El tiempo máximo se cuenta desde la entrada original
+            elapsed = (self.clock() - position['entry_time']).total_seconds()
+            self.trigger_engine.add_position(
+                (self.symbol, position['order_id']), self.symbol, position['side'], position['entry_price'],
+                stop_loss_percentage=self.stop_loss,
+                take_profit_percentage=self.take_profit,
+                max_duration=max(0.0, self.max_position_time - elapsed),
+                callback=self.on_trigger
+            )
+        
+        logger.info(f"Posición restaurada: {position['side']} {position['quantity']} {self.symbol} @ {position['entry_price']}")
     
     def get_statistics(self) -> Dict:
         """
@@ -543,6 +789,8 @@ class RSIEMABot:
         """
         logger.info("Iniciando bot RSI/EMA...")
         self.is_running = True
+        self.restore_history()
+        self.restore_positions()
         
         # Programar ejecución cada 15 minutos
         schedule.every(15).minutes.do(self.execute_strategy)
@@ -584,9 +832,31 @@ def main():
             logger.error("API_KEY y API_SECRET deben estar configurados")
             return
         
+        # Stream de velas compartido: un único stream 1m del que se agregan los demás intervalos
+        candle_store = CandleStore()
+        market_stream = AggregatedKlineStream(candle_store=candle_store)
+        
         # Crear y ejecutar bot
-        bot = RSIEMABot(symbol='BTCUSDT', interval='15m')
-        bot.start()
+        bot = RSIEMABot(symbol='BTCUSDT', interval='15m', market_stream=market_stream,
+                        candle_store=candle_store,
+                        # Ficheros de estado propios: cada bot corre en su propio proceso
+                        state_store=StateStore(name='rsi_ema'))
+        bot.exchange_info.start_background_refresh(bot.client)
+        bot.trigger_engine.attach(market_stream)
+        bot.trigger_engine.start()
+        market_stream.start()
+        
+        # Ejecuciones y saldos por el stream de usuario (sin sondear get_account)
+        user_stream = UserDataStream(bot.client, bot.order_ledger)
+        user_stream.add_listener(bot.portfolio_risk.handle_event)
+        user_stream.start()
+        try:
+            bot.start()
+        finally:
+            user_stream.stop()
+            market_stream.stop()
+            bot.trade_journal.stop()
+            bot.state_store.close()
         
     except Exception as e:
         logger.error(f"Error en main: {e}")
@@ -2,8 +2,9 @@ import os
 import time
 import schedule
 import logging
+import threading
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional
 import pandas as pd
 import numpy as np
 from binance.client import Client
@@ -11,6 +12,22 @@ from binance.exceptions import BinanceAPIException
 from dotenv import load_dotenv
 
 from utils import SignalGenerator, RiskManager, TradeLogger
+from indicator_graph import IndicatorGraph, get_indicator_graph
+from market_stream import KlineStream
+from order_book import OrderBookStream
+from tick_evaluator import TickEvaluator
+from kline_parser import OHLCV, parse_klines
+from market_cache import MarketDataCache, get_shared_cache
+from exchange_info import ExchangeInfoRegistry, get_exchange_info_registry
+from exchange_client import get_client_pool
+from price_snapshot import PriceSnapshotService, get_price_snapshot
+from trigger_engine import TriggerEngine, get_trigger_engine
+from candle_store import CandleStore
+from candle_aggregator import AggregatedKlineStream
+from portfolio_risk import PortfolioRiskManager, get_portfolio_risk
+from user_data_stream import OrderLedger, UserDataStream, get_order_ledger
+from trade_journal import TradeJournal, get_trade_journal
+from state_store import StateStore, get_state_store, new_client_order_id, reconcile_position
 
 # Cargar variables de entorno
 load_dotenv()
@@ -33,7 +50,21 @@ class ScalpingBot:
     """
     
     def __init__(self, api_key: str = None, api_secret: str = None, 
-                 symbol: str = 'BTCUSDT', interval: str = '1m'):
+                 symbol: str = 'BTCUSDT', interval: str = '1m',
+                 market_stream: Optional[KlineStream] = None,
+                 market_cache: Optional[MarketDataCache] = None,
+                 exchange_info: Optional[ExchangeInfoRegistry] = None,
+                 client: Optional[Client] = None,
+                 price_snapshot: Optional[PriceSnapshotService] = None,
+                 trigger_engine: Optional[TriggerEngine] = None,
+                 candle_store: Optional[CandleStore] = None,
+                 portfolio_risk: Optional[PortfolioRiskManager] = None,
+                 order_ledger: Optional[OrderLedger] = None,
+                 trade_journal: Optional[TradeJournal] = None,
+                 state_store: Optional[StateStore] = None,
+                 indicator_graph: Optional[IndicatorGraph] = None,
+                 order_book: Optional[OrderBookStream] = None,
+                 tick_driven: bool = False):
         """
         Inicializa el bot de scalping
         
@@ -42,6 +73,20 @@ class ScalpingBot:
             api_secret: API secret de Binance
             symbol: Par de trading (default: BTCUSDT)
             interval: Intervalo de tiempo (default: 1m)
+            market_stream: Stream de velas compartido (opcional, si no se usa REST)
+            market_cache: Caché de datos de mercado (default: caché compartida del proceso)
+            exchange_info: Registro de filtros del exchange (default: registro compartido)
+            client: Cliente ya construido (opcional, p. ej. simulado en backtests)
+            price_snapshot: Servicio de precios de todo el mercado (default: servicio compartido)
+            trigger_engine: Motor de SL/TP por eventos (default: motor compartido)
+            candle_store: Histórico local de velas en disco (opcional)
+            portfolio_risk: Gestor de riesgo de cartera (default: gestor compartido)
+            order_ledger: Registro de ejecuciones reales (default: registro compartido)
+            trade_journal: Diario persistente de operaciones (default: diario compartido)
+            state_store: Estado de posiciones a prueba de caídas (default: almacén compartido)
+            indicator_graph: Grafo de indicadores (default: grafo compartido)
+            order_book: Stream de libros L2 locales (opcional, decisiones sobre el libro en vivo)
+            tick_driven: Evaluar entrada y salida en cada tick de precio en lugar de cada minuto
         """
         self.api_key = api_key or os.getenv('BINANCE_API_KEY')
         self.api_secret = api_secret or os.getenv('BINANCE_API_SECRET')
@@ -50,17 +95,74 @@ class ScalpingBot:
         
         # Configurar cliente de Binance
         try:
-            self.client = Client(self.api_key, self.api_secret)
+            self.client = client or get_client_pool().get_client(self.api_key, self.api_secret)
             logger.info(f"Bot de scalping inicializado para {symbol}")
         except Exception as e:
             logger.error(f"Error inicializando cliente Binance: {e}")
             raise
         
+        # Reloj inyectable (un backtest lo sustituye por un reloj simulado)
+        self.clock: Callable[[], datetime] = datetime.now
+        
+        # Stream de velas en memoria (evita peticiones REST en cada ciclo)
+        self.market_stream = market_stream
+        if self.market_stream is not None:
+            self.market_stream.subscribe(self.symbol, self.interval, client=self.client)
+        
+        # Libro L2 local: spread real, mid ponderado e imbalance sin esperar a la vela
+        self.order_book = order_book
+        if self.order_book is not None:
+            self.order_book.subscribe(self.symbol, self.client)
+        
+        # Caché compartida: N estrategias sobre el mismo par hacen una sola petición
+        self.market_cache = market_cache or get_shared_cache()
+        
+        # Histórico en disco: al arrancar solo se descarga la cola que falta
+        self.candle_store = candle_store
+        
+        # Filtros de símbolos cargados en bloque una sola vez
+        self.exchange_info = exchange_info or get_exchange_info_registry()
+        
+        # Precios de todo el mercado en una sola petición
+        self.price_snapshot = price_snapshot or get_price_snapshot()
+        
+        # Niveles de salida evaluados en cada precio recibido
+        self.trigger_engine = trigger_engine or get_trigger_engine()
+        self.position_lock = threading.RLock()
+        
+        # Balances y exposición de toda la cartera (sin get_account por decisión)
+        self.portfolio_risk = portfolio_risk or get_portfolio_risk()
+        self.risk_id = (id(self), self.symbol)
+        
+        # Precios de ejecución y comisiones reales (respuesta REST o stream de usuario)
+        self.order_ledger = order_ledger or get_order_ledger()
+        
+        # Ejecuciones y operaciones cerradas persistidas sin bloquear el ciclo
+        self.trade_journal = trade_journal or get_trade_journal()
+        
+        # Posiciones abiertas persistidas (instantánea + write-ahead log)
+        self.state_store = state_store or get_state_store()
+        self.state_key = f"scalping:{self.symbol}"
+        
+        # Modo dirigido por ticks: una evaluación por movimiento de precio, agrupando ráfagas
+        self.tick_driven = tick_driven
+        self.tick_evaluator = TickEvaluator(self.evaluate_tick, symbols=[self.symbol],
+                                            exchange_info=self.exchange_info, client=self.client,
+                                            name=f"scalping-ticks-{self.symbol}")
+        
         # Parámetros de scalping
         self.spread_threshold = 0.0005  # 0.05% mínimo spread
         self.max_position_time = 300  # 5 minutos máximo
         self.min_profit_threshold = 0.0003  # 0.03% mínimo profit
         self.max_loss_threshold = 0.001  # 0.1% máximo loss
+        self.max_book_spread = 0.0005  # 0.05% máximo spread bid/ask real
+        self.max_book_imbalance = 0.6  # Imbalance del libro en contra que veta la entrada
+        
+        # Indicadores declarados en el grafo compartido: cada vela cerrada se procesa
+        # una sola vez y los nodos idénticos de otros bots se reutilizan
+        self.indicator_graph = indicator_graph or get_indicator_graph()
+        self.indicator_engine = self.indicator_graph.subscribe(self.symbol, self.interval)
+        self.indicator_engine.add_indicator('volume_sma', ('sma', 20), column='volume')
         
         # Estado del bot
         self.active_positions = {}
@@ -72,7 +174,7 @@ class ScalpingBot:
         self.winning_trades = 0
         self.total_profit = 0.0
         
-    def get_market_data(self, limit: int = 100) -> pd.DataFrame:
+    def get_market_data(self, limit: int = 100) -> OHLCV:
         """
         Obtiene datos de mercado del exchange
         
@@ -80,36 +182,34 @@ class ScalpingBot:
             limit: Número de velas a obtener
             
         Returns:
-            DataFrame con datos OHLCV
+            Velas OHLCV
         """
         try:
-            klines = self.client.get_klines(
-                symbol=self.symbol,
-                interval=self.interval,
-                limit=limit
-            )
-            
-            data = pd.DataFrame(klines, columns=[
-                'timestamp', 'open', 'high', 'low', 'close', 'volume',
-                'close_time', 'quote_asset_volume', 'number_of_trades',
-                'taker_buy_base_asset_volume', 'taker_buy_quote_asset_volume', 'ignore'
-            ])
-            
-            # Convertir tipos de datos
-            numeric_columns = ['open', 'high', 'low', 'close', 'volume']
-            for col in numeric_columns:
-                data[col] = pd.to_numeric(data[col], errors='coerce')
-            
-            data['timestamp'] = pd.to_datetime(data['timestamp'], unit='ms')
+            # Servir desde el stream si el buffer está al día
+            if self.market_stream is not None:
+                data = self.market_stream.get_ohlcv(self.symbol, self.interval, limit)
+                if data is not None:
+                    return data
+            
+            if self.candle_store is not None:
+                klines = self.candle_store.get_klines(self.client, self.symbol, self.interval, limit)
+            else:
+                klines = self.market_cache.get_klines(
+                    self.client,
+                    self.symbol,
+                    self.interval,
+                    limit
+                )
             
-            return data
+            # Se decodifican solo los campos usados, sin pasar por pandas
+            return parse_klines(klines)
             
         except BinanceAPIException as e:
             logger.error(f"Error obteniendo datos de mercado: {e}")
-            return pd.DataFrame()
+            return OHLCV.empty_frame()
         except Exception as e:
             logger.error(f"Error inesperado obteniendo datos: {e}")
-            return pd.DataFrame()
+            return OHLCV.empty_frame()
     
     def get_current_price(self) -> Optional[float]:
         """
@@ -119,8 +219,16 @@ class ScalpingBot:
             Precio actual o None si hay error
         """
         try:
-            ticker = self.client.get_symbol_ticker(symbol=self.symbol)
-            return float(ticker['price'])
+            book = self.get_book_state()
+            if book is not None:
+                return book['mid']
+            
+            if self.market_stream is not None:
+                price = self.market_stream.get_last_price(self.symbol)
+                if price is not None:
+                    return price
+            
+            return self.price_snapshot.get_price(self.client, self.symbol)
         except Exception as e:
             logger.error(f"Error obteniendo precio actual: {e}")
             return None
@@ -145,22 +253,39 @@ class ScalpingBot:
             logger.error(f"Error obteniendo balance: {e}")
             return {}
     
-    def calculate_spread(self, data: pd.DataFrame) -> float:
+    def get_book_state(self) -> Optional[Dict]:
+        """
+        Obtiene las métricas del libro L2 local
+        
+        Returns:
+            Dict con best_bid, best_ask, spread_pct, mid, weighted_mid e imbalance,
+            o None si no hay libro o no está sincronizado y al día
+        """
+        if self.order_book is None:
+            return None
+        return self.order_book.get_state(self.symbol)
+    
+    def calculate_spread(self, data: OHLCV) -> float:
         """
-        Calcula el spread actual
+        Calcula la variación del precio respecto al cierre anterior (no es
+        el spread bid/ask: ese lo da el libro, ver get_book_state)
+        
+        Con libro en vivo el precio actual es el mid ponderado por
+        profundidad; sin él, el último cierre de las velas.
         
         Args:
-            data: DataFrame con datos de mercado
+            data: Velas OHLCV
             
         Returns:
-            Spread calculado
+            Variación relativa del precio
         """
         try:
             if len(data) < 2:
                 return 0.0
             
-            current_price = data['close'].iloc[-1]
-            prev_price = data['close'].iloc[-2]
+            book = self.get_book_state()
+            current_price = book['weighted_mid'] if book is not None else data['close'][-1]
+            prev_price = data['close'][-2]
             
             spread = abs(current_price - prev_price) / prev_price
             return spread
@@ -169,12 +294,12 @@ class ScalpingBot:
             logger.error(f"Error calculando spread: {e}")
             return 0.0
     
-    def should_open_position(self, data: pd.DataFrame) -> bool:
+    def should_open_position(self, data: OHLCV) -> bool:
         """
         Determina si se debe abrir una posición
         
         Args:
-            data: DataFrame con datos de mercado
+            data: Velas OHLCV
             
         Returns:
             True si se debe abrir posición
@@ -191,17 +316,22 @@ class ScalpingBot:
             if spread < self.spread_threshold:
                 return False
             
+            # Con libro en vivo, el coste real de cruzar el spread debe ser pequeño
+            book = self.get_book_state()
+            if book is not None and book['spread_pct'] > self.max_book_spread:
+                return False
+            
             # Verificar volumen (debe ser suficiente)
-            current_volume = data['volume'].iloc[-1]
-            avg_volume = data['volume'].rolling(window=20).mean().iloc[-1]
+            current_volume = data['volume'][-1]
+            avg_volume = self.indicator_engine.sync(data).get('volume_sma', np.nan)
             
             if current_volume < avg_volume * 0.5:
                 return False
             
             # Verificar volatilidad
-            high = data['high'].iloc[-1]
-            low = data['low'].iloc[-1]
-            close = data['close'].iloc[-1]
+            high = data['high'][-1]
+            low = data['low'][-1]
+            close = data['close'][-1]
             
             volatility = (high - low) / close
             
@@ -214,6 +344,40 @@ class ScalpingBot:
             logger.error(f"Error evaluando apertura de posición: {e}")
             return False
     
+    def generate_signal(self, data: OHLCV) -> str:
+        """
+        Genera la señal de scalping: a la contra de la variación del precio
+        
+        Con libro en vivo se usa el mid ponderado por profundidad y se
+        descarta la entrada si el imbalance del libro empuja en contra.
+        
+        Args:
+            data: Velas OHLCV
+            
+        Returns:
+            'buy', 'sell', o 'hold'
+        """
+        book = self.get_book_state()
+        if book is None:
+            return SignalGenerator.scalping_signal(data, self.spread_threshold)
+        
+        try:
+            if len(data) < 2 or self.calculate_spread(data) <= self.spread_threshold:
+                return 'hold'
+            
+            signal = 'sell' if book['weighted_mid'] > data['close'][-2] else 'buy'
+            
+            # Imbalance > 0: más profundidad en el bid (presión compradora)
+            if signal == 'sell' and book['imbalance'] >= self.max_book_imbalance:
+                return 'hold'
+            if signal == 'buy' and book['imbalance'] <= -self.max_book_imbalance:
+                return 'hold'
+            return signal
+            
+        except Exception as e:
+            logger.error(f"Error generando señal con el libro: {e}")
+            return 'hold'
+    
     def should_close_position(self, position: Dict, current_price: float) -> bool:
         """
         Determina si se debe cerrar una posición
@@ -237,7 +401,7 @@ class ScalpingBot:
                 pnl_percentage = (entry_price - current_price) / entry_price
             
             # Verificar tiempo máximo de posición
-            time_in_position = (datetime.now() - entry_time).total_seconds()
+            time_in_position = (self.clock() - entry_time).total_seconds()
             if time_in_position > self.max_position_time:
                 logger.info(f"Cerrando posición por tiempo máximo: {self.symbol}")
                 return True
@@ -270,30 +434,59 @@ class ScalpingBot:
         Returns:
             True si la operación fue exitosa
         """
+        order_sent = False
         try:
+            # Intención registrada antes de enviar la orden: tras una caída se concilia con el exchange
+            client_order_id = new_client_order_id('scalping')
+            self.state_store.put(self.state_key, {
+                'status': 'pending', 'side': side, 'quantity': quantity, 'entry_price': price,
+                'client_order_id': client_order_id, 'entry_time': self.clock()
+            })
+            
             # Crear orden de mercado
+            order_sent = True
             if side == 'buy':
                 order = self.client.order_market_buy(
                     symbol=self.symbol,
-                    quantity=quantity
+                    quantity=quantity,
+                    newClientOrderId=client_order_id
                 )
             else:
                 order = self.client.order_market_sell(
                     symbol=self.symbol,
-                    quantity=quantity
+                    quantity=quantity,
+                    newClientOrderId=client_order_id
                 )
             
+            # Precio medio y cantidad realmente ejecutados
+            fill = self.order_ledger.resolve_fill(order)
+            if fill['avg_price']:
+                price = fill['avg_price']
+                quantity = fill['executed_qty']
+            
             # Registrar posición
             position = {
                 'order_id': order['orderId'],
                 'side': side,
                 'quantity': quantity,
                 'entry_price': price,
-                'entry_time': datetime.now(),
+                'entry_commission': fill['commission_quote'],
+                'entry_time': self.clock(),
                 'status': 'open'
             }
             
             self.active_positions[self.symbol] = position
+            self.state_store.put(self.state_key, position)
+            self.portfolio_risk.confirm(self.risk_id, self.symbol, side, quantity * price)
+            
+            # Registrar niveles de salida en el motor de disparos
+            self.trigger_engine.add_position(
+                (self.symbol, order['orderId']), self.symbol, side, price,
+                stop_loss_percentage=self.max_loss_threshold,
+                take_profit_percentage=self.min_profit_threshold,
+                max_duration=self.max_position_time,
+                callback=self.on_trigger
+            )
             
             # Log de la operación
             TradeLogger.log_trade(
@@ -301,18 +494,27 @@ class ScalpingBot:
                 side=side,
                 quantity=quantity,
                 price=price,
-                strategy='scalping'
+                strategy='scalping',
+                journal=self.trade_journal,
+                source='scalping'
             )
             
             logger.info(f"Posición abierta: {side} {quantity} {self.symbol} @ {price}")
             return True
             
         except BinanceAPIException as e:
+            # Orden rechazada por el exchange: no hay posición que conservar
             logger.error(f"Error de API al abrir posición: {e}")
+            self.state_store.delete(self.state_key)
             return False
         except Exception as e:
             logger.error(f"Error inesperado al abrir posición: {e}")
-            return False
+            if not order_sent:
+                self.state_store.delete(self.state_key)
+            elif self.symbol not in self.active_positions:
+                # La orden pudo llegar al exchange: se concilia ya por su client_order_id
+                self.restore_positions(validate_balance=False)
+            return self.symbol in self.active_positions
     
     def close_position(self, position: Dict, current_price: float) -> bool:
         """
@@ -341,12 +543,15 @@ class ScalpingBot:
                     quantity=quantity
                 )
             
-            # Calcular P&L
+            # Calcular P&L con la ejecución real y las comisiones de entrada y salida
+            fill = self.order_ledger.resolve_fill(order)
+            exit_price = fill['avg_price'] or current_price
+            commission = position.get('entry_commission', 0.0) + fill['commission_quote']
             entry_price = position['entry_price']
             if position['side'] == 'buy':
-                pnl = (current_price - entry_price) * quantity
+                pnl = (exit_price - entry_price) * quantity - commission
             else:
-                pnl = (entry_price - current_price) * quantity
+                pnl = (entry_price - exit_price) * quantity - commission
             
             # Actualizar estadísticas
             self.total_trades += 1
@@ -360,28 +565,35 @@ class ScalpingBot:
                 'side': position['side'],
                 'quantity': quantity,
                 'entry_price': entry_price,
-                'exit_price': current_price,
+                'exit_price': exit_price,
+                'commission': commission,
                 'pnl': pnl,
                 'entry_time': position['entry_time'],
-                'exit_time': datetime.now(),
+                'exit_time': self.clock(),
                 'strategy': 'scalping'
             }
             self.trade_history.append(trade)
+            self.trade_journal.record('trade', trade, source='scalping')
             
             # Log de la operación
             TradeLogger.log_trade(
                 symbol=self.symbol,
                 side=side,
                 quantity=quantity,
-                price=current_price,
-                strategy='scalping'
+                price=exit_price,
+                strategy='scalping',
+                journal=self.trade_journal,
+                source='scalping'
             )
             
-            logger.info(f"Posición cerrada: {side} {quantity} {self.symbol} @ {current_price}, P&L: {pnl:.8f}")
+            logger.info(f"Posición cerrada: {side} {quantity} {self.symbol} @ {exit_price}, P&L: {pnl:.8f}")
             
             # Eliminar posición activa
+            self.trigger_engine.remove_position((self.symbol, position['order_id']))
+            self.portfolio_risk.close(self.risk_id, quantity * exit_price)
             if self.symbol in self.active_positions:
                 del self.active_positions[self.symbol]
+            self.state_store.delete(self.state_key)
             
             return True
             
@@ -410,16 +622,16 @@ class ScalpingBot:
             
             # Verificar posiciones activas
             if self.symbol in self.active_positions:
-                position = self.active_positions[self.symbol]
-                if self.should_close_position(position, current_price):
-                    self.close_position(position, current_price)
+                with self.position_lock:
+                    position = self.active_positions.get(self.symbol)
+                    if position is not None and self.should_close_position(position, current_price):
+                        self.close_position(position, current_price)
                 return
             
             # Evaluar apertura de nueva posición
             if self.should_open_position(data):
                 # Calcular tamaño de posición
-                balances = self.get_account_balance()
-                usdt_balance = balances.get('USDT', 0.0)
+                usdt_balance = self.portfolio_risk.get_balance('USDT', client=self.client)
                 
                 if usdt_balance > 10:  # Mínimo $10 USDT
                     position_size = RiskManager.calculate_position_size(
@@ -428,18 +640,27 @@ class ScalpingBot:
                         stop_loss_percentage=0.005  # 0.5% stop loss
                     )
                     
+                    # Reserva atómica: dos bots no pueden comprometer el mismo capital
+                    position_size = self.portfolio_risk.reserve(
+                        self.risk_id, self.symbol, position_size, client=self.client
+                    )
+                    
                     # Convertir a cantidad del símbolo
                     quantity = position_size / current_price
                     
                     # Redondear según las reglas del exchange
                     quantity = self.round_quantity(quantity)
                     
-                    if quantity > 0:
+                    opened = False
+                    if quantity > 0 and self.validate_order(quantity, current_price):
                         # Determinar dirección basada en momentum
-                        signal = SignalGenerator.scalping_signal(data, self.spread_threshold)
+                        signal = self.generate_signal(data)
                         
                         if signal in ['buy', 'sell']:
-                            self.open_position(signal, quantity, current_price)
+                            opened = self.open_position(signal, quantity, current_price)
+                    
+                    if not opened:
+                        self.portfolio_risk.release(self.risk_id)
             
         except Exception as e:
             logger.error(f"Error ejecutando estrategia: {e}")
@@ -455,25 +676,108 @@ class ScalpingBot:
             Cantidad redondeada
         """
         try:
-            # Obtener información del símbolo
-            symbol_info = self.client.get_symbol_info(self.symbol)
-            step_size = None
+            # Filtros desde el registro local de exchangeInfo (sin llamada REST)
+            return self.exchange_info.round_quantity(self.symbol, quantity, client=self.client)
             
-            for filter in symbol_info['filters']:
-                if filter['filterType'] == 'LOT_SIZE':
-                    step_size = float(filter['stepSize'])
-                    break
+        except Exception as e:
+            logger.error(f"Error redondeando cantidad: {e}")
+            return quantity
+    
+    def validate_order(self, quantity: float, price: float) -> bool:
+        """
+        Valida la orden localmente contra los filtros del exchange
+        (minQty, maxQty, minNotional) antes de enviarla
+        
+        Args:
+            quantity: Cantidad redondeada
+            price: Precio de referencia
             
-            if step_size:
-                # Redondear al step size más cercano
-                precision = len(str(step_size).split('.')[-1].rstrip('0'))
-                return round(quantity, precision)
+        Returns:
+            True si la orden cumple los filtros
+        """
+        valid, reason = self.exchange_info.check_order(self.symbol, quantity, price, client=self.client)
+        if not valid:
+            logger.warning(f"Orden descartada por filtros del exchange: {reason}")
+        return valid
+    
+    def on_trigger(self, event: Dict) -> Optional[bool]:
+        """
+        Cierra la posición cuando el motor de disparos detecta que el precio
+        ha cruzado el stop loss, el take profit o el tiempo máximo
+        
+        Args:
+            event: Evento del motor de disparos
             
-            return quantity
+        Returns:
+            False si el cierre falló (el motor rearma los niveles)
+        """
+        with self.position_lock:
+            position = self.active_positions.get(self.symbol)
+            if position is None or (self.symbol, position['order_id']) != event['position_id']:
+                return
             
+            current_price = event['price'] or self.get_current_price()
+            if current_price:
+                logger.info(f"Cerrando posición por {event['reason']} (disparo): {self.symbol} @ {current_price}")
+                return self.close_position(position, current_price)
+            return False
+    
+    def restore_history(self):
+        """
+        Recupera el historial y las estadísticas desde el diario de operaciones
+        """
+        self.trade_history = self.trade_journal.load_trades(source='scalping', symbol=self.symbol)
+        self.total_trades = len(self.trade_history)
+        self.winning_trades = sum(1 for trade in self.trade_history if trade['pnl'] > 0)
+        self.total_profit = sum(trade['pnl'] for trade in self.trade_history)
+        if self.trade_history:
+            logger.info(f"Historial recuperado: {self.total_trades} operaciones, P&L: {self.total_profit:.8f}")
+    
+    def restore_positions(self, validate_balance: bool = True):
+        """
+        Recupera la posición abierta tras un reinicio y la concilia con el exchange
+        
+        Args:
+            validate_balance: Comprobar la cantidad contra el saldo del activo base
+                (False para una orden recién enviada, aún ausente del saldo en caché)
+        """
+        stored = self.state_store.get(self.state_key)
+        if stored is None:
+            return
+        
+        try:
+            base_balance = None
+            filters = self.exchange_info.get(self.symbol, client=self.client)
+            if validate_balance and filters is not None and filters.base_asset:
+                base_balance = self.portfolio_risk.get_balance(filters.base_asset, client=self.client)
+            
+            position = reconcile_position(self.client, self.symbol, stored, base_balance)
         except Exception as e:
-            logger.error(f"Error redondeando cantidad: {e}")
-            return quantity
+            # Estado desconocido: el registro se conserva para el próximo intento
+            logger.error(f"No se pudo conciliar la posición guardada de {self.symbol}: {e}")
+            return
+        if position is None:
+            logger.warning(f"Posición guardada de {self.symbol} descartada tras conciliar con el exchange")
+            self.state_store.delete(self.state_key)
+            return
+        
+        with self.position_lock:
+            self.active_positions[self.symbol] = position
+            self.state_store.put(self.state_key, position)
+            self.portfolio_risk.confirm(self.risk_id, self.symbol, position['side'],
+                                        position['quantity'] * position['entry_price'], adjust_balance=False)
+            
+            # El tiempo máximo se cuenta desde la entrada original
+            elapsed = (self.clock() - position['entry_time']).total_seconds()
+            self.trigger_engine.add_position(
+                (self.symbol, position['order_id']), self.symbol, position['side'], position['entry_price'],
+                stop_loss_percentage=self.max_loss_threshold,
+                take_profit_percentage=self.min_profit_threshold,
+                max_duration=max(0.0, self.max_position_time - elapsed),
+                callback=self.on_trigger
+            )
+        
+        logger.info(f"Posición restaurada: {position['side']} {position['quantity']} {self.symbol} @ {position['entry_price']}")
     
     def get_statistics(self) -> Dict:
         """
@@ -494,15 +798,40 @@ class ScalpingBot:
             'is_running': self.is_running
         }
     
+    def evaluate_tick(self, symbol: str, price: Optional[float]):
+        """
+        Evalúa entrada y salida tras un tick de precio (llamado por el
+        evaluador de ticks, nunca en paralelo consigo mismo)
+        
+        Args:
+            symbol: Par de trading
+            price: Precio que disparó la evaluación
+        """
+        self.execute_strategy()
+    
     def start(self):
         """
         Inicia el bot de scalping
         """
         logger.info("Iniciando bot de scalping...")
         self.is_running = True
+        self.restore_history()
+        self.restore_positions()
         
-        # Programar ejecución cada minuto
-        schedule.every(1).minutes.do(self.execute_strategy)
+        if self.tick_driven and (self.order_book is not None or self.market_stream is not None):
+            # Cada tick (libro L2, aggTrade, bookTicker) dispara una evaluación; el latido de
+            # cada minuto pasa por el mismo evaluador, así que nunca se solapa con un tick
+            if self.order_book is not None:
+                self.tick_evaluator.attach_book(self.order_book)
+            if self.market_stream is not None:
+                self.tick_evaluator.attach(self.market_stream)
+            self.tick_evaluator.start()
+            schedule.every(1).minutes.do(self.tick_evaluator.request, self.symbol)
+        else:
+            if self.tick_driven:
+                logger.warning("Modo por ticks sin stream de precios: se evalúa cada minuto")
+            # Programar ejecución cada minuto
+            schedule.every(1).minutes.do(self.execute_strategy)
         
         try:
             while self.is_running:
@@ -521,6 +850,7 @@ class ScalpingBot:
         """
         logger.info("Deteniendo bot de scalping...")
         self.is_running = False
+        self.tick_evaluator.stop()
         
         # Cerrar posiciones activas
         for symbol, position in self.active_positions.items():
@@ -541,9 +871,34 @@ def main():
             logger.error("API_KEY y API_SECRET deben estar configurados")
             return
         
+        # Stream de velas compartido: un único stream 1m del que se agregan los demás intervalos
+        candle_store = CandleStore()
+        market_stream = AggregatedKlineStream(candle_store=candle_store, include_trades=True)
+        order_book = OrderBookStream()
+        
         # Crear y ejecutar bot
-        bot = ScalpingBot(symbol='BTCUSDT', interval='1m')
-        bot.start()
+        bot = ScalpingBot(symbol='BTCUSDT', interval='1m', market_stream=market_stream,
+                          candle_store=candle_store, order_book=order_book, tick_driven=True,
+                          # Ficheros de estado propios: cada bot corre en su propio proceso
+                          state_store=StateStore(name='scalping'))
+        bot.exchange_info.start_background_refresh(bot.client)
+        bot.trigger_engine.attach(market_stream)
+        bot.trigger_engine.start()
+        market_stream.start()
+        order_book.start()
+        
+        # Ejecuciones y saldos por el stream de usuario (sin sondear get_account)
+        user_stream = UserDataStream(bot.client, bot.order_ledger)
+        user_stream.add_listener(bot.portfolio_risk.handle_event)
+        user_stream.start()
+        try:
+            bot.start()
+        finally:
+            user_stream.stop()
+            market_stream.stop()
+            order_book.stop()
+            bot.trade_journal.stop()
+            bot.state_store.close()
         
     except Exception as e:
         logger.error(f"Error en main: {e}")
@@ -0,0 +1,296 @@
+import time
+import logging
+import threading
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from batch_indicators import BatchIndicators, stack_series
+from exchange_info import ExchangeInfoRegistry, get_exchange_info_registry
+from market_cache import interval_to_seconds
+from market_stream import KlineStream
+
+logger = logging.getLogger(__name__)
+
+SIGNAL_FAMILIES = ('rsi_ema', 'momentum', 'scalping')
+
+
+class SignalScanner:
+    """
+    Escáner de señales sobre todo el universo de pares.
+
+    Con el ticker de 24h de todos los pares (una sola petición) descarta
+    los pares poco líquidos; solo los restantes se suscriben al stream de
+    velas. En cada cierre de vela evalúa las tres familias de
+    SignalGenerator (RSI/EMA, momentum y scalping) para todos los pares en
+    una pasada vectorizada, ordena los candidatos por fuerza de la señal y
+    publica el top-K de cada familia a los suscriptores
+    """
+
+    def __init__(self, client, stream: Optional[KlineStream] = None,
+                 exchange_info: Optional[ExchangeInfoRegistry] = None,
+                 interval: str = '1m', quote_asset: str = 'USDT',
+                 min_quote_volume: float = 1_000_000.0, max_symbols: int = 300,
+                 candles: int = 100, top_k: int = 10, universe_refresh: float = 900.0,
+                 settle: float = 2.0, rsi_period: int = 14, ema_period: int = 20,
+                 momentum_period: int = 14, spread_threshold: float = 0.001):
+        """
+        Inicializa el escáner
+
+        Args:
+            client: Cliente de Binance (ticker de 24h e histórico inicial)
+            stream: Stream de velas (default: stream propio sin miniTicker)
+            exchange_info: Registro de filtros del exchange (default: registro compartido)
+            interval: Intervalo de las velas evaluadas
+            quote_asset: Activo de cotización de los pares escaneados
+            min_quote_volume: Volumen mínimo en 24h (activo de cotización) de un par
+            max_symbols: Máximo de pares escaneados (los de mayor volumen)
+            candles: Velas cerradas evaluadas por par
+            top_k: Candidatos publicados por familia
+            universe_refresh: Segundos entre refrescos del universo líquido
+            settle: Segundos tras el cierre de vela antes de escanear
+            rsi_period: Período del RSI (señal RSI/EMA)
+            ema_period: Período de la EMA (señal RSI/EMA)
+            momentum_period: Período del momentum
+            spread_threshold: Umbral de variación de la señal de scalping
+        """
+        self.client = client
+        self._owns_stream = stream is None
+        self.stream = stream or KlineStream(maxlen=candles + 2, include_ticker=False)
+        self.exchange_info = exchange_info or get_exchange_info_registry()
+        self.interval = interval
+        self.quote_asset = quote_asset
+        self.min_quote_volume = min_quote_volume
+        self.max_symbols = max_symbols
+        self.candles = candles
+        self.top_k = top_k
+        self.universe_refresh = universe_refresh
+        self.settle = settle
+        self.rsi_period = rsi_period
+        self.ema_period = ema_period
+        self.momentum_period = momentum_period
+        self.spread_threshold = spread_threshold
+
+        self.universe: List[str] = []
+        self.top: Dict[str, List[Dict]] = {family: [] for family in SIGNAL_FAMILIES}
+        self._subscribed = set()
+        self._listeners: List[Callable[[Dict[str, List[Dict]]], None]] = []
+        self._universe_time = 0.0
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self.is_running = False
+
+        # Estadísticas
+        self.scans = 0
+        self.last_scan_time = 0.0
+        self.last_scan_ms = 0.0
+        self.scanned_symbols = 0
+        self.skipped_symbols = 0
+
+    def add_listener(self, callback: Callable[[Dict[str, List[Dict]]], None]):
+        """
+        Registra una función llamada con el top-K por familia tras cada escaneo
+
+        Args:
+            callback: Función a llamar
+        """
+        self._listeners.append(callback)
+
+    def refresh_universe(self) -> List[str]:
+        """
+        Recalcula los pares líquidos con el ticker de 24h de todos los pares
+        y suscribe al stream los nuevos
+
+        Returns:
+            Pares escaneados, de mayor a menor volumen
+        """
+        try:
+            tradable = set(self.exchange_info.symbols(self.quote_asset, self.client))
+            tickers = self.client.get_ticker()
+        except Exception as e:
+            logger.error(f"Error obteniendo el ticker de 24h: {e}")
+            return self.universe
+
+        liquid = []
+        for ticker in tickers:
+            quote_volume = float(ticker.get('quoteVolume', 0.0) or 0.0)
+            if ticker['symbol'] in tradable and quote_volume >= self.min_quote_volume:
+                liquid.append((quote_volume, ticker['symbol']))
+        liquid.sort(reverse=True)
+        universe = [symbol for _, symbol in liquid[:self.max_symbols]]
+        self.skipped_symbols = len(tradable) - len(universe)
+
+        for symbol in universe:
+            if symbol not in self._subscribed:
+                # Los pares que dejan de ser líquidos siguen suscritos pero no se escanean
+                self.stream.subscribe(symbol, self.interval, self.client)
+                self._subscribed.add(symbol)
+
+        self.universe = universe
+        self._universe_time = time.time()
+        logger.info(f"Universo del escáner: {len(universe)} pares líquidos de {len(tradable)}")
+        return universe
+
+    def _closes(self, symbols: List[str], now_ms: float) -> Dict[str, List[float]]:
+        series = {}
+        for symbol in symbols:
+            rows = self.stream.get_klines(symbol, self.interval, self.candles + 1)
+            # Solo velas cerradas: la vela en curso no participa
+            closes = [float(row[4]) for row in rows if row[6] < now_ms]
+            if closes:
+                series[symbol] = closes[-self.candles:]
+        return series
+
+    def evaluate(self, series: Dict[str, List[float]]) -> Dict[str, List[Dict]]:
+        """
+        Evalúa las tres familias de señales sobre los cierres de muchos pares
+
+        Cada familia aplica exactamente la regla de SignalGenerator sobre la
+        última vela de cada par; la fuerza mide cuánto se supera el umbral.
+
+        Args:
+            series: Cierres por símbolo (de la vela más antigua a la más reciente)
+
+        Returns:
+            Dict familia -> candidatos ordenados por fuerza (symbol, signal, strength, price)
+        """
+        ranked = {family: [] for family in SIGNAL_FAMILIES}
+        if not series:
+            return ranked
+
+        symbols, closes = stack_series(series, max(self.candles, self.momentum_period + 2))
+        lengths = np.array([len(series[symbol]) for symbol in symbols])
+        price = closes[:, -1]
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # RSI/EMA: precio sobre la EMA y RSI en sobreventa (o al revés)
+            ema = BatchIndicators.compute_ema(closes, self.ema_period)[:, -1]
+            rsi = BatchIndicators.compute_rsi(closes, self.rsi_period)[:, -1]
+            enough = lengths >= max(self.rsi_period, self.ema_period)
+            buy = enough & (price > ema) & (rsi < 30)
+            sell = enough & (price < ema) & (rsi > 70)
+            strength = np.where(buy, (30 - rsi) / 30, (rsi - 70) / 30)
+            ranked['rsi_ema'] = self._rank(symbols, buy, sell, strength, price)
+
+            # Momentum positivo y creciente (o negativo y decreciente)
+            period = self.momentum_period
+            momentum = price - closes[:, -1 - period]
+            previous = closes[:, -2] - closes[:, -2 - period]
+            enough = lengths >= period
+            buy = enough & (momentum > 0) & (momentum > previous)
+            sell = enough & (momentum < 0) & (momentum < previous)
+            strength = np.abs(momentum) / closes[:, -1 - period]
+            ranked['momentum'] = self._rank(symbols, buy, sell, strength, price)
+
+            # Scalping: variación de la última vela por encima del umbral, a la contra
+            last = closes[:, -2]
+            spread = np.abs(price - last) / last
+            moved = (lengths >= 2) & (spread > self.spread_threshold)
+            ranked['scalping'] = self._rank(symbols, moved & (price < last), moved & (price > last), spread, price)
+        return ranked
+
+    def _rank(self, symbols: List[str], buy: np.ndarray, sell: np.ndarray,
+              strength: np.ndarray, price: np.ndarray) -> List[Dict]:
+        candidates = np.flatnonzero(buy | sell)
+        order = candidates[np.argsort(-strength[candidates], kind='stable')]
+        return [{'symbol': symbols[i], 'signal': 'buy' if buy[i] else 'sell',
+                 'strength': float(strength[i]), 'price': float(price[i])}
+                for i in order]
+
+    def scan(self) -> Dict[str, List[Dict]]:
+        """
+        Escanea el universo líquido y publica el top-K de cada familia
+
+        Returns:
+            Dict familia -> top-K de candidatos
+        """
+        if not self.universe or time.time() - self._universe_time >= self.universe_refresh:
+            self.refresh_universe()
+
+        started = time.perf_counter()
+        series = self._closes(list(self.universe), time.time() * 1000)
+        ranked = self.evaluate(series)
+        top = {family: candidates[:self.top_k] for family, candidates in ranked.items()}
+
+        with self._lock:
+            self.top = top
+            self.scans += 1
+            self.scanned_symbols = len(series)
+            self.last_scan_time = time.time()
+            self.last_scan_ms = (time.perf_counter() - started) * 1000
+
+        for callback in self._listeners:
+            try:
+                callback(top)
+            except Exception as e:
+                logger.error(f"Error en listener del escáner: {e}")
+        return top
+
+    def get_top(self, family: str, side: Optional[str] = None, limit: Optional[int] = None) -> List[Dict]:
+        """
+        Obtiene los mejores candidatos del último escaneo
+
+        Args:
+            family: Familia de señal ('rsi_ema', 'momentum' o 'scalping')
+            side: 'buy' o 'sell' para filtrar por sentido (opcional)
+            limit: Número máximo de candidatos (default: top_k)
+
+        Returns:
+            Lista de candidatos ordenados por fuerza
+        """
+        candidates = [c for c in self.top.get(family, []) if side is None or c['signal'] == side]
+        return candidates[:limit or self.top_k]
+
+    def _run(self):
+        period = interval_to_seconds(self.interval)
+        while not self._stop.is_set():
+            # Despertar justo después del cierre de la siguiente vela
+            next_close = (time.time() // period + 1) * period + self.settle
+            if self._stop.wait(max(0.0, next_close - time.time())):
+                break
+            try:
+                self.scan()
+            except Exception as e:
+                logger.error(f"Error en el escaneo de señales: {e}")
+
+    def start(self):
+        """
+        Inicia el stream de velas y el escaneo en cada cierre de vela
+        """
+        if self.is_running:
+            return
+        self.is_running = True
+        self._stop.clear()
+        self.refresh_universe()
+        self.stream.start()
+        self._thread = threading.Thread(target=self._run, name='signal-scanner', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Detiene el escaneo (y el stream de velas si es propio)
+        """
+        self.is_running = False
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        if self._owns_stream:
+            self.stream.stop()
+
+    def get_statistics(self) -> Dict:
+        """
+        Obtiene estadísticas del escáner
+
+        Returns:
+            Dict con estadísticas
+        """
+        return {
+            'universe': len(self.universe),
+            'subscribed': len(self._subscribed),
+            'skipped_symbols': self.skipped_symbols,
+            'scanned_symbols': self.scanned_symbols,
+            'scans': self.scans,
+            'last_scan_ms': self.last_scan_ms,
+            'candidates': {family: len(candidates) for family, candidates in self.top.items()}
+        }
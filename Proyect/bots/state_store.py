@@ -0,0 +1,364 @@
+import os
+import json
+import time
+import logging
+import threading
+import uuid
+from datetime import datetime
+from typing import Dict, Optional
+
+from binance.exceptions import BinanceAPIException
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo entre procesos
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class _StateEncoder(json.JSONEncoder):
+    """Serializa datetime conservando el tipo al recargar"""
+
+    def default(self, obj):
+        if isinstance(obj, datetime):
+            return {'__dt__': obj.isoformat()}
+        if hasattr(obj, 'item'):
+            # Escalares de numpy
+            return obj.item()
+        return str(obj)
+
+
+def _decode(obj: Dict):
+    if '__dt__' in obj and len(obj) == 1:
+        return datetime.fromisoformat(obj['__dt__'])
+    return obj
+
+
+class StateStore:
+    """
+    Persistencia del estado de posiciones a prueba de caídas.
+
+    Cada mutación se añade a un write-ahead log (una línea JSON) antes de
+    devolver el control; periódicamente el estado completo se compacta en
+    una instantánea escrita de forma atómica y el log se vacía. Al arrancar
+    se carga la instantánea y se aplican las entradas del log posteriores,
+    sin consultar el exchange.
+
+    La compactación escribe solo el estado en memoria de este proceso, así
+    que cada proceso necesita sus propios ficheros (un name por bot): el
+    almacén toma un bloqueo exclusivo y rechaza ficheros en uso por otro
+    proceso
+    """
+
+    def __init__(self, path: Optional[str] = None, name: str = 'positions',
+                 snapshot_every: int = 500, snapshot_interval: float = 60.0, fsync: bool = True,
+                 durable: bool = True):
+        """
+        Inicializa el almacén
+
+        Args:
+            path: Directorio de estado (default: env STATE_DIR o data/state)
+            name: Nombre base de los ficheros (uno distinto por proceso)
+            snapshot_every: Mutaciones tras las que se compacta el log
+            snapshot_interval: Segundos tras los que se compacta el log
+            fsync: Forzar cada entrada del log a disco
+            durable: Persistir en disco (False: solo memoria, p. ej. backtests)
+        """
+        self.path = path or os.getenv('STATE_DIR', os.path.join('data', 'state'))
+        self.name = name
+        self.snapshot_every = snapshot_every
+        self.snapshot_interval = snapshot_interval
+        self.fsync = fsync
+        self.durable = durable
+
+        self.snapshot_path = os.path.join(self.path, f"{name}.snapshot.json")
+        self.wal_path = os.path.join(self.path, f"{name}.wal")
+        self.lock_path = os.path.join(self.path, f"{name}.lock")
+
+        self._lock = threading.RLock()
+        self._state: Dict[str, Dict] = {}
+        self._wal = None
+        self._file_lock = None
+        self._sequence = 0
+        self._pending = 0
+        self._last_snapshot = time.time()
+        self._loaded = False
+
+        # Estadísticas
+        self.mutations = 0
+        self.snapshots = 0
+        self.replayed = 0
+
+    def _acquire_file_lock(self):
+        if fcntl is None or self._file_lock is not None:
+            return
+        lock = open(self.lock_path, 'a')
+        try:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock.close()
+            raise RuntimeError(f"El almacén de estado {self.wal_path} está en uso por otro proceso: "
+                               f"cada bot necesita su propio StateStore(name=...)")
+        self._file_lock = lock
+
+    def _release_file_lock(self):
+        if self._file_lock is not None:
+            self._file_lock.close()
+            self._file_lock = None
+
+    def _ensure_loaded(self):
+        if not self._loaded:
+            self.load()
+
+    def load(self) -> int:
+        """
+        Carga la instantánea y aplica el log pendiente
+
+        Returns:
+            Número de entradas del estado
+        """
+        with self._lock:
+            if not self.durable:
+                self._loaded = True
+                return len(self._state)
+            os.makedirs(self.path, exist_ok=True)
+            # Otro proceso compactando sobre los mismos ficheros borraría este estado
+            self._acquire_file_lock()
+            state, sequence = {}, 0
+            if os.path.exists(self.snapshot_path):
+                with open(self.snapshot_path, encoding='utf-8') as f:
+                    snapshot = json.load(f, object_hook=_decode)
+                state, sequence = snapshot['state'], snapshot['sequence']
+
+            replayed = 0
+            if os.path.exists(self.wal_path):
+                with open(self.wal_path, encoding='utf-8') as f:
+                    for line in f:
+                        try:
+                            entry = json.loads(line, object_hook=_decode)
+                        except ValueError:
+                            # Última línea incompleta de una escritura interrumpida
+                            break
+                        if entry['seq'] <= sequence:
+                            continue
+                        if entry['op'] == 'put':
+                            state[entry['key']] = entry['value']
+                        else:
+                            state.pop(entry['key'], None)
+                        sequence = entry['seq']
+                        replayed += 1
+
+            self._state = state
+            self._sequence = sequence
+            self._pending = replayed
+            self.replayed = replayed
+            if self._wal is None:
+                self._wal = open(self.wal_path, 'a', encoding='utf-8')
+            self._loaded = True
+            if replayed:
+                # Compactar lo reaplicado para que el próximo arranque sea inmediato
+                self.snapshot()
+            return len(state)
+
+    def _append(self, entry: Dict):
+        if self._wal is None:
+            return
+        self._wal.write(json.dumps(entry, cls=_StateEncoder) + '\n')
+        self._wal.flush()
+        if self.fsync:
+            os.fsync(self._wal.fileno())
+
+    def put(self, key: str, value: Dict):
+        """
+        Registra el estado de una posición
+
+        Args:
+            key: Identificador de la posición
+            value: Estado serializable (admite datetime)
+        """
+        with self._lock:
+            self._ensure_loaded()
+            self._sequence += 1
+            self._append({'seq': self._sequence, 'op': 'put', 'key': key, 'value': value})
+            self._state[key] = value
+            self._mutated()
+
+    def delete(self, key: str):
+        """
+        Elimina el estado de una posición
+
+        Args:
+            key: Identificador de la posición
+        """
+        with self._lock:
+            self._ensure_loaded()
+            if key not in self._state:
+                return
+            self._sequence += 1
+            self._append({'seq': self._sequence, 'op': 'del', 'key': key})
+            del self._state[key]
+            self._mutated()
+
+    def _mutated(self):
+        self.mutations += 1
+        self._pending += 1
+        if (self._pending >= self.snapshot_every
+                or time.time() - self._last_snapshot >= self.snapshot_interval):
+            self.snapshot()
+
+    def snapshot(self):
+        """
+        Compacta el estado en una instantánea atómica y vacía el log
+        """
+        with self._lock:
+            self._ensure_loaded()
+            if not self.durable:
+                return
+            tmp_path = f"{self.snapshot_path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'sequence': self._sequence, 'time': time.time(), 'state': self._state},
+                          f, cls=_StateEncoder)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.snapshot_path)
+
+            # Si se cae aquí, las entradas del log con seq <= sequence se ignoran al cargar
+            self._wal.truncate(0)
+            self._wal.seek(0)
+            self._pending = 0
+            self._last_snapshot = time.time()
+            self.snapshots += 1
+
+    def get(self, key: str) -> Optional[Dict]:
+        """
+        Obtiene el estado de una posición
+
+        Args:
+            key: Identificador de la posición
+
+        Returns:
+            Estado o None si no existe
+        """
+        with self._lock:
+            self._ensure_loaded()
+            return self._state.get(key)
+
+    def items(self, prefix: str = '') -> Dict[str, Dict]:
+        """
+        Obtiene las posiciones cuyo identificador empieza por un prefijo
+
+        Args:
+            prefix: Prefijo del identificador (se elimina de las claves devueltas)
+
+        Returns:
+            Dict identificador -> estado
+        """
+        with self._lock:
+            self._ensure_loaded()
+            return {key[len(prefix):]: value for key, value in self._state.items() if key.startswith(prefix)}
+
+    def close(self):
+        """
+        Compacta el estado y cierra el log
+        """
+        with self._lock:
+            if self._wal is None:
+                return
+            self.snapshot()
+            self._wal.close()
+            self._wal = None
+            self._release_file_lock()
+            self._loaded = False
+
+    def get_statistics(self) -> Dict:
+        """
+        Obtiene estadísticas del almacén
+
+        Returns:
+            Dict con estadísticas
+        """
+        return {
+            'entries': len(self._state),
+            'sequence': self._sequence,
+            'mutations': self.mutations,
+            'snapshots': self.snapshots,
+            'replayed': self.replayed,
+            'pending_wal': self._pending
+        }
+
+
+def new_client_order_id(prefix: str) -> str:
+    """
+    Genera un newClientOrderId único para localizar la orden tras una caída
+
+    Args:
+        prefix: Prefijo identificativo del bot
+
+    Returns:
+        Identificador (máximo 36 caracteres, formato admitido por Binance)
+    """
+    return f"{prefix[:3]}-{uuid.uuid4().hex}"
+
+
+def reconcile_position(client, symbol: str, position: Dict, base_balance: Optional[float] = None,
+                       price_field: str = 'entry_price', tolerance: float = 0.01) -> Optional[Dict]:
+    """
+    Concilia una posición recuperada del disco con el exchange
+
+    Las intenciones pendientes (orden enviada sin confirmar) se resuelven
+    con una consulta por newClientOrderId; las compras abiertas se validan
+    contra el saldo del activo base. No recorre el histórico de órdenes.
+
+    Args:
+        client: Cliente de Binance
+        symbol: Par de trading
+        position: Estado recuperado
+        base_balance: Saldo total del activo base (None = no validar)
+        price_field: Campo con el precio de entrada
+        tolerance: Fracción de la cantidad que puede faltar (comisiones en el activo base)
+
+    Returns:
+        Posición conciliada o None si ya no existe en el exchange
+
+    Raises:
+        Exception: Si la orden pendiente no pudo consultarse (el estado sigue siendo desconocido)
+    """
+    position = dict(position)
+    if position.get('status') == 'pending':
+        try:
+            order = client.get_order(symbol=symbol, origClientOrderId=position['client_order_id'])
+        except BinanceAPIException as e:
+            if e.code != -2013:
+                raise
+            logger.warning(f"Orden pendiente {position.get('client_order_id')} no encontrada en {symbol}: {e}")
+            return None
+        executed = float(order.get('executedQty', 0.0) or 0.0)
+        if executed <= 0:
+            return None
+        quote = float(order.get('cummulativeQuoteQty', 0.0) or 0.0)
+        position['order_id'] = order['orderId']
+        position['quantity'] = executed
+        if quote > 0:
+            position[price_field] = quote / executed
+        position['status'] = 'open'
+
+    side = str(position.get('side', '')).lower()
+    if side == 'buy' and base_balance is not None and base_balance < position['quantity'] * (1 - tolerance):
+        logger.warning(f"Posición {symbol} sin saldo en el exchange (cerrada fuera del bot): "
+                       f"{base_balance} < {position['quantity']}")
+        return None
+    return position
+
+
+_shared_store = StateStore()
+
+
+def get_state_store() -> StateStore:
+    """
+    Obtiene el almacén de estado compartido por el proceso
+
+    Returns:
+        Instancia compartida de StateStore
+    """
+    return _shared_store
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Los módulos de los bots se importan por nombre desde Proyect/bots
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
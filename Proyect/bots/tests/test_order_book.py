@@ -0,0 +1,144 @@
+import json
+import threading
+import time
+
+import pytest
+
+from order_book import OrderBookRecording, OrderBookStream
+
+SNAPSHOT = {
+    'lastUpdateId': 100,
+    'bids': [['99.0', '1.0'], ['98.0', '2.0']],
+    'asks': [['101.0', '1.0'], ['102.0', '2.0']]
+}
+
+
+def _event(first_id: int, final_id: int, bids=(), asks=()) -> dict:
+    return OrderBookStream.depth_event('BTCUSDT', first_id, final_id, bids, asks)
+
+
+class _SnapshotClient:
+    """Cliente que devuelve instantáneas sucesivas (la última se repite)"""
+
+    def __init__(self, *snapshots, block: threading.Event = None):
+        self.snapshots = list(snapshots)
+        self.block = block
+        self.requests = 0
+
+    def get_order_book(self, symbol, limit=100):
+        if self.block is not None:
+            self.block.wait(5)
+        self.requests += 1
+        return self.snapshots[min(self.requests, len(self.snapshots)) - 1]
+
+
+def _wait_for(predicate, timeout: float = 5.0) -> bool:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return predicate()
+
+
+def test_snapshot_applies_buffered_events():
+    events = [
+        _event(90, 95, bids=[[97.0, 9.0]]),                      # anterior a la instantánea
+        _event(96, 102, bids=[[99.0, 3.0]]),                     # contiene lastUpdateId + 1
+        _event(103, 104, asks=[[101.0, 0.0], [100.5, 4.0]]),
+    ]
+    recording = OrderBookRecording({'BTCUSDT': SNAPSHOT}, events)
+    stream = OrderBookStream(levels=5, background=False)
+    states = []
+    stream.add_listener(lambda symbol, state: states.append(state))
+    stream.subscribe('BTCUSDT', recording)
+
+    recording.replay(stream)
+
+    book = stream.get_book('BTCUSDT')
+    assert recording.requests == 1
+    assert book.synced and book.last_update_id == 104
+    assert book.bids == {99.0: 3.0, 98.0: 2.0}
+    assert book.asks == {100.5: 4.0, 102.0: 2.0}
+    state = stream.get_state('BTCUSDT')
+    assert state['best_bid'] == 99.0 and state['best_ask'] == 100.5
+    assert state['imbalance'] == pytest.approx((5.0 - 6.0) / 11.0)
+    assert states[-1]['update_id'] == 104
+
+
+def test_stale_event_dropped():
+    recording = OrderBookRecording({'BTCUSDT': SNAPSHOT}, [_event(101, 105, bids=[[99.0, 3.0]])])
+    stream = OrderBookStream(background=False)
+    states = []
+    stream.add_listener(lambda symbol, state: states.append(state))
+    stream.subscribe('BTCUSDT', recording)
+    recording.replay(stream)
+    notified = len(states)
+
+    # Evento ya incluido en el libro (u <= lastUpdateId): no cambia nada ni notifica
+    stream.handle_message(json.dumps(_event(104, 105, bids=[[99.0, 50.0]])))
+
+    book = stream.get_book('BTCUSDT')
+    assert book.bids[99.0] == 3.0 and book.last_update_id == 105
+    assert len(states) == notified
+    assert stream.get_statistics()['gaps'] == 0
+
+
+def test_gap_triggers_resync():
+    newer = {'lastUpdateId': 200, 'bids': [['95.0', '1.0']], 'asks': [['105.0', '1.0']]}
+    client = _SnapshotClient(SNAPSHOT, newer)
+    stream = OrderBookStream(resync_interval=0, background=False)
+    stream.subscribe('BTCUSDT', client)
+
+    stream.handle_message(json.dumps(_event(101, 110)))
+    assert stream.get_book('BTCUSDT').synced
+
+    # Faltan los ids 111-195: el libro se descarta y se pide otra instantánea
+    stream.handle_message(json.dumps(_event(196, 201, asks=[[104.0, 2.0]])))
+
+    book = stream.get_book('BTCUSDT')
+    assert stream.get_statistics()['gaps'] == 1
+    assert client.requests == 2
+    assert book.synced and book.last_update_id == 201
+    assert book.bids == {95.0: 1.0}
+    assert book.asks == {104.0: 2.0, 105.0: 1.0}
+
+
+def test_snapshot_does_not_block_other_books():
+    release = threading.Event()
+    slow = _SnapshotClient(SNAPSHOT, block=release)
+    fast = _SnapshotClient(dict(SNAPSHOT, lastUpdateId=10))
+    stream = OrderBookStream(background=True)
+    stream.subscribe('BTCUSDT', slow)
+    stream.subscribe('ETHUSDT', fast)
+    try:
+        stream.handle_message(json.dumps(_event(101, 101)))
+        # La instantánea de BTCUSDT sigue en curso: ETHUSDT se sincroniza igualmente
+        eth = OrderBookStream.depth_event('ETHUSDT', 11, 11, [[99.5, 1.0]], [])
+        stream.handle_message(json.dumps(eth))
+        assert _wait_for(lambda: stream.get_book('ETHUSDT').synced)
+        assert not stream.get_book('BTCUSDT').synced
+
+        stream.handle_message(json.dumps(_event(102, 102, bids=[[99.0, 7.0]])))
+        release.set()
+        assert _wait_for(lambda: stream.get_book('BTCUSDT').synced)
+        assert stream.get_book('BTCUSDT').last_update_id == 102
+        assert stream.get_book('BTCUSDT').bids[99.0] == 7.0
+        assert slow.requests == 1
+    finally:
+        release.set()
+        stream.stop()
+
+
+def test_recording_from_file(tmp_path):
+    path = tmp_path / 'book.jsonl'
+    lines = [dict(SNAPSHOT, symbol='BTCUSDT'), _event(101, 103, bids=[[98.0, 0.0]])]
+    path.write_text('\n'.join(json.dumps(line) for line in lines) + '\n')
+
+    recording = OrderBookRecording.from_file(str(path))
+    stream = OrderBookStream(background=False)
+    stream.subscribe('BTCUSDT', recording)
+    recording.replay(stream)
+
+    assert stream.get_book('BTCUSDT').bids == {99.0: 1.0}
+    assert stream.get_state('BTCUSDT')['update_id'] == 103
@@ -0,0 +1,158 @@
+import os
+import sys
+import json
+import subprocess
+from datetime import datetime
+
+import pytest
+
+from state_store import StateStore, fcntl
+
+BOTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _crash(store: StateStore):
+    """Simula la muerte del proceso: el SO cierra los ficheros, sin compactar"""
+    store._wal.close()
+    store._wal = None
+    store._release_file_lock()
+
+
+class _InterruptedLog:
+    """Log cuyo vaciado no llega a ocurrir (caída justo después de la instantánea)"""
+
+    def truncate(self, size):
+        pass
+
+    def seek(self, offset):
+        pass
+
+
+def _wal_lines(store: StateStore) -> list:
+    with open(store.wal_path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+def test_killed_process_state_is_replayed_from_wal(tmp_path):
+    path = str(tmp_path)
+    code = f"""
+import os, sys
+from datetime import datetime
+sys.path.insert(0, {BOTS_DIR!r})
+from state_store import StateStore
+store = StateStore(path={path!r})
+for i in range(20):
+    store.put(f"copy:{{i}}", {{'status': 'open', 'quantity': i, 'date': datetime(2024, 1, 1, 12, i)}})
+for i in range(0, 20, 2):
+    store.delete(f"copy:{{i}}")
+store.put('copy:1', {{'status': 'pending', 'client_order_id': 'cop-1', 'date': datetime(2024, 1, 2)}})
+os._exit(1)
+"""
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, timeout=60)
+    assert result.returncode == 1, result.stderr
+
+    store = StateStore(path=path)
+    try:
+        state = store.items('copy:')
+        assert sorted(state, key=int) == [str(i) for i in range(1, 20, 2)]
+        assert state['1'] == {'status': 'pending', 'client_order_id': 'cop-1', 'date': datetime(2024, 1, 2)}
+        assert state['3']['date'] == datetime(2024, 1, 1, 12, 3)
+        assert store.replayed == 31
+        # Lo reaplicado se compacta: el log queda vacío
+        assert os.path.getsize(store.wal_path) == 0
+    finally:
+        store.close()
+
+    store = StateStore(path=path)
+    try:
+        assert len(store.items('copy:')) == 10
+        assert store.get_statistics()['replayed'] == 0
+    finally:
+        store.close()
+
+
+def test_truncated_last_wal_line_is_ignored(tmp_path):
+    store = StateStore(path=str(tmp_path))
+    store.put('a', {'quantity': 1})
+    store.put('b', {'quantity': 2})
+    _crash(store)
+    with open(store.wal_path, 'a', encoding='utf-8') as f:
+        f.write('{"seq": 3, "op": "put", "key": "c", "val')
+
+    store = StateStore(path=str(tmp_path))
+    try:
+        assert store.items() == {'a': {'quantity': 1}, 'b': {'quantity': 2}}
+        assert store.replayed == 2
+        # La siguiente mutación continúa la secuencia sin reutilizar la entrada rota
+        store.put('c', {'quantity': 3})
+        assert _wal_lines(store)[-1]['seq'] == 3
+    finally:
+        store.close()
+
+
+def test_wal_entries_covered_by_snapshot_are_skipped(tmp_path):
+    store = StateStore(path=str(tmp_path))
+    store.put('a', {'quantity': 1})
+    store.put('b', {'quantity': 2})
+    store.delete('a')
+    # Caída entre la instantánea y el vaciado del log: el log conserva seq 1..3
+    wal = store._wal
+    store._wal = _InterruptedLog()
+    store.snapshot()
+    store._wal = wal
+    store.put('b', {'quantity': 5})
+    store.put('c', {'quantity': 6})
+    assert [entry['seq'] for entry in _wal_lines(store)] == [1, 2, 3, 4, 5]
+    _crash(store)
+
+    store = StateStore(path=str(tmp_path))
+    try:
+        assert store.items() == {'b': {'quantity': 5}, 'c': {'quantity': 6}}
+        assert store.replayed == 2
+        assert store.get_statistics()['sequence'] == 5
+    finally:
+        store.close()
+
+
+def test_stale_wal_entry_does_not_override_snapshot(tmp_path):
+    os.makedirs(tmp_path, exist_ok=True)
+    with open(tmp_path / 'positions.snapshot.json', 'w', encoding='utf-8') as f:
+        json.dump({'sequence': 7, 'time': 0.0, 'state': {'a': {'quantity': 2}}}, f)
+    with open(tmp_path / 'positions.wal', 'w', encoding='utf-8') as f:
+        f.write(json.dumps({'seq': 6, 'op': 'del', 'key': 'a'}) + '\n')
+        f.write(json.dumps({'seq': 7, 'op': 'put', 'key': 'b', 'value': {'quantity': 1}}) + '\n')
+        f.write(json.dumps({'seq': 8, 'op': 'put', 'key': 'c', 'value': {'quantity': 3}}) + '\n')
+
+    store = StateStore(path=str(tmp_path))
+    try:
+        assert store.items() == {'a': {'quantity': 2}, 'c': {'quantity': 3}}
+        assert store.replayed == 1
+    finally:
+        store.close()
+
+
+def test_close_compacts_into_snapshot(tmp_path):
+    store = StateStore(path=str(tmp_path), snapshot_every=3)
+    for i in range(7):
+        store.put(f"k{i}", {'i': i})
+    assert store.snapshots == 2
+    store.close()
+    assert os.path.getsize(store.wal_path) == 0
+
+    store = StateStore(path=str(tmp_path))
+    try:
+        assert len(store.items()) == 7
+        assert store.replayed == 0
+    finally:
+        store.close()
+
+
+@pytest.mark.skipif(fcntl is None, reason='sin bloqueo de ficheros')
+def test_files_in_use_are_rejected(tmp_path):
+    store = StateStore(path=str(tmp_path))
+    store.put('a', {'quantity': 1})
+    try:
+        with pytest.raises(RuntimeError):
+            StateStore(path=str(tmp_path)).load()
+    finally:
+        store.close()
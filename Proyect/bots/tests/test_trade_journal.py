@@ -0,0 +1,129 @@
+import os
+import sys
+import json
+import glob
+import subprocess
+
+import pytest
+
+from trade_journal import TradeJournal, fcntl
+
+BOTS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _crash_after_recording(path: str, committed: int, spooled: int):
+    """Proceso que confirma `committed` operaciones, registra `spooled` más y muere sin stop()"""
+    code = f"""
+import os, sys
+sys.path.insert(0, {BOTS_DIR!r})
+from trade_journal import TradeJournal
+journal = TradeJournal(path={path!r}, flush_interval=30.0)
+journal.start()
+for i in range({committed}):
+    journal.record('trade', {{'symbol': 'BTCUSDT', 'pnl': 1.0, 'i': i}}, source='momentum')
+assert journal.flush()
+for i in range({committed}, {committed + spooled}):
+    journal.record('trade', {{'symbol': 'BTCUSDT', 'pnl': 1.0, 'i': i}}, source='momentum')
+os._exit(1)
+"""
+    result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, timeout=60)
+    assert result.returncode == 1, result.stderr
+
+
+def _spool_record(i: int) -> str:
+    return json.dumps({
+        'journal_id': f"dead-{i}", 'kind': 'trade', 'source': 'scalping', 'created': 0.0,
+        'data': {'symbol': 'ETHUSDT', 'pnl': 0.5, 'i': i}
+    }) + '\n'
+
+
+def test_crash_without_stop_loses_nothing_and_duplicates_nothing(tmp_path):
+    path = str(tmp_path / 'trades.db')
+    # Las confirmadas siguen en el spool (no hubo compactación): no deben duplicarse
+    _crash_after_recording(path, committed=50, spooled=30)
+    assert len(glob.glob(path + '.*spool')) == 1
+
+    journal = TradeJournal(path=path)
+    try:
+        trades = journal.load_trades(source='momentum')
+        assert sorted(t['i'] for t in trades) == list(range(80))
+        # El spool del proceso muerto se ha recuperado y borrado
+        assert glob.glob(path + '.*spool') == [journal.spool_path]
+    finally:
+        journal.stop()
+
+    # Una segunda recuperación no vuelve a insertar nada
+    journal = TradeJournal(path=path)
+    try:
+        assert len(journal.load_trades(source='momentum')) == 80
+    finally:
+        journal.stop()
+
+
+def test_torn_last_spool_line_is_dropped(tmp_path):
+    path = str(tmp_path / 'trades.db')
+    with open(f"{path}.999999.spool", 'w', encoding='utf-8') as f:
+        f.write(_spool_record(0) + _spool_record(1) + _spool_record(2)[:25])
+
+    journal = TradeJournal(path=path)
+    try:
+        assert [t['i'] for t in journal.load_trades(source='scalping')] == [0, 1]
+        assert not os.path.exists(f"{path}.999999.spool")
+    finally:
+        journal.stop()
+
+
+@pytest.mark.skipif(fcntl is None, reason='sin bloqueo de ficheros')
+def test_spool_of_live_process_is_not_recovered(tmp_path):
+    path = str(tmp_path / 'trades.db')
+    live = f"{path}.999998.spool"
+    with open(live, 'w', encoding='utf-8') as f:
+        f.write(_spool_record(0))
+        f.flush()
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+        journal = TradeJournal(path=path)
+        try:
+            assert journal.load_trades(source='scalping') == []
+            assert os.path.exists(live)
+        finally:
+            journal.stop()
+
+    # Terminado el proceso (bloqueo liberado), el siguiente arranque lo recupera
+    journal = TradeJournal(path=path)
+    try:
+        assert [t['i'] for t in journal.load_trades(source='scalping')] == [0]
+    finally:
+        journal.stop()
+
+
+def test_overflowed_records_are_recovered_from_spool(tmp_path):
+    path = str(tmp_path / 'trades.db')
+    journal = TradeJournal(path=path, max_queue=10)
+    journal.start()
+    for i in range(500):
+        journal.record('trade', {'symbol': 'BTCUSDT', 'pnl': 1.0, 'i': i}, source='rsi_ema')
+    assert journal.dropped > 0
+    journal.stop()
+
+    journal = TradeJournal(path=path)
+    try:
+        assert sorted(t['i'] for t in journal.load_trades(source='rsi_ema')) == list(range(500))
+    finally:
+        journal.stop()
+
+
+def test_stop_removes_own_spool_when_everything_is_committed(tmp_path):
+    path = str(tmp_path / 'trades.db')
+    journal = TradeJournal(path=path)
+    journal.start()
+    journal.record('fill', {'symbol': 'BTCUSDT', 'quantity': 0.1, 'price': 50000.0}, source='scalping')
+    assert journal.flush()
+    journal.stop()
+
+    assert glob.glob(path + '.*spool') == []
+    journal = TradeJournal(path=path)
+    try:
+        assert len(journal.load_trades(kind='fill')) == 1
+    finally:
+        journal.stop()
@@ -0,0 +1,159 @@
+import time
+import threading
+
+import pytest
+
+from exchange_client import ExchangeClientPool, MockExchangeServer
+from user_data_stream import FakeUserDataServer, OrderLedger, UserDataStream
+
+
+class _ListenKeyClient:
+    """Cliente mínimo para el ciclo de vida del listenKey"""
+
+    def __init__(self):
+        self.closed = []
+
+    def stream_get_listen_key(self):
+        return 'test-key'
+
+    def stream_keepalive(self, listenKey):
+        pass
+
+    def stream_close(self, listenKey):
+        self.closed.append(listenKey)
+
+
+def _wait_for(predicate, timeout: float = 5.0) -> bool:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return predicate()
+
+
+def _rest_order(order_id: int, quantity: float, price: float, commission: float,
+                commission_asset: str, side: str = 'BUY') -> dict:
+    return {
+        'symbol': 'BTCUSDT', 'orderId': order_id, 'side': side, 'status': 'FILLED',
+        'executedQty': str(quantity), 'cummulativeQuoteQty': str(quantity * price),
+        'fills': [{'price': str(price), 'qty': str(quantity), 'commission': str(commission),
+                   'commissionAsset': commission_asset, 'tradeId': order_id * 10}]
+    }
+
+
+@pytest.fixture
+def user_stream():
+    server = FakeUserDataServer().start()
+    ledger = OrderLedger()
+    client = _ListenKeyClient()
+    stream = UserDataStream(client, ledger, url=server.url)
+    stream.start()
+    assert stream.wait_connected(5)
+    assert server.connected.wait(5)
+    yield server, stream, ledger
+    # El servidor cierra primero la conexión: el cliente no espera la respuesta a su cierre
+    server.stop()
+    stream.stop()
+    assert client.closed == ['test-key']
+
+
+def test_rest_fill_then_execution_report_counted_once(user_stream):
+    server, stream, ledger = user_stream
+
+    summary = ledger.record_order(_rest_order(1, 0.5, 50000.0, 0.0005, 'BTC'))
+    assert ledger.get_statistics()['trades'] == 1
+
+    server.push(FakeUserDataServer.execution_report(1, 'BTCUSDT', 'BUY', 0.5, 50000.0, 0.0005, 'BTC',
+                                                    trade_id=10))
+    assert _wait_for(lambda: ledger.get_statistics()['events'] == 1)
+
+    fill = ledger.get_fill(1)
+    assert ledger.get_statistics()['trades'] == 1
+    assert fill['commission'] == {'BTC': pytest.approx(0.0005)}
+    assert fill['executed_qty'] == summary['executed_qty'] == pytest.approx(0.5)
+    assert fill['avg_price'] == pytest.approx(50000.0)
+
+
+def test_execution_report_then_rest_fill_counted_once(user_stream):
+    server, stream, ledger = user_stream
+
+    server.push(FakeUserDataServer.execution_report(2, 'BTCUSDT', 'SELL', 0.2, 40000.0, 8.0, 'USDT',
+                                                    trade_id=20))
+    assert _wait_for(lambda: ledger.get_fill(2) is not None)
+    ledger.record_order(_rest_order(2, 0.2, 40000.0, 8.0, 'USDT', side='SELL'))
+
+    fill = ledger.get_fill(2)
+    assert ledger.get_statistics()['trades'] == 1
+    assert fill['status'] == 'FILLED'
+    assert fill['commission_quote'] == pytest.approx(8.0)
+
+
+def test_commission_converted_to_quote_asset():
+    ledger = OrderLedger()
+
+    # Comisión en el activo base: se convierte al precio medio de la orden
+    base = ledger.record_order(_rest_order(3, 0.1, 30000.0, 0.0001, 'BTC'))
+    assert base['commission_quote'] == pytest.approx(0.0001 * 30000.0)
+
+    # Comisión en el activo de cotización: se suma tal cual
+    quote = ledger.record_order(_rest_order(4, 0.1, 30000.0, 3.0, 'USDT', side='SELL'))
+    assert quote['commission_quote'] == pytest.approx(3.0)
+
+    # Otros activos (BNB) no se convierten
+    bnb = ledger.record_order(_rest_order(5, 0.1, 30000.0, 0.01, 'BNB'))
+    assert bnb['commission'] == {'BNB': pytest.approx(0.01)}
+    assert bnb['commission_quote'] == 0.0
+
+
+def test_resolve_fill_waits_for_execution_report(user_stream):
+    server, stream, ledger = user_stream
+    ack = {'symbol': 'BTCUSDT', 'orderId': 6, 'side': 'BUY', 'status': 'NEW', 'executedQty': '0'}
+
+    def push_later():
+        time.sleep(0.2)
+        server.push(FakeUserDataServer.execution_report(6, 'BTCUSDT', 'BUY', 0.3, 20000.0, 0.0003, 'BTC'))
+
+    threading.Thread(target=push_later, daemon=True).start()
+    summary = ledger.resolve_fill(ack, timeout=5.0)
+
+    assert summary['status'] == 'FILLED'
+    assert summary['avg_price'] == pytest.approx(20000.0)
+    assert summary['commission_quote'] == pytest.approx(0.0003 * 20000.0)
+
+
+def test_account_position_updates_balances(user_stream):
+    server, stream, ledger = user_stream
+    events = []
+    stream.add_listener(events.append)
+
+    server.push(FakeUserDataServer.account_position({'USDT': 950.0, 'BTC': 0.01}))
+    assert _wait_for(lambda: ledger.get_balance('USDT') is not None)
+
+    assert ledger.get_balance('USDT') == pytest.approx(950.0)
+    assert ledger.get_balance('BTC') == pytest.approx(0.01)
+    assert events[-1]['e'] == 'outboundAccountPosition'
+
+
+def test_mock_exchange_order_reported_once():
+    server = FakeUserDataServer().start()
+    exchange = MockExchangeServer(user_stream=server).start()
+    ledger = OrderLedger()
+    client = ExchangeClientPool(base_url=exchange.url).get_client('key', 'secret')
+    stream = UserDataStream(client, ledger, url=server.url)
+    try:
+        stream.start()
+        assert stream.wait_connected(5) and server.connected.wait(5)
+
+        order = client.order_market_buy(symbol='BTCUSDT', quantity=0.01)
+        ledger.record_order(order)
+        assert _wait_for(lambda: ledger.get_statistics()['events'] == 1)
+
+        fill = ledger.get_fill(order['orderId'])
+        assert ledger.get_statistics()['trades'] == 1
+        assert fill['commission'] == {'BTC': pytest.approx(0.01 * exchange.commission_rate)}
+        assert fill['commission_quote'] == pytest.approx(0.01 * exchange.commission_rate * 50000.0)
+    finally:
+        server.stop()
+        stream.stop()
+        exchange.stop()
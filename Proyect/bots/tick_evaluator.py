@@ -0,0 +1,214 @@
+import time
+import logging
+import threading
+from typing import Callable, Dict, Iterable, Optional
+
+from exchange_info import ExchangeInfoRegistry, get_exchange_info_registry
+
+logger = logging.getLogger(__name__)
+
+
+class TickEvaluator:
+    """
+    Evaluación de una estrategia dirigida por ticks de precio.
+
+    Recibe cada precio de los streams (aggTrade, bookTicker, libro L2) y
+    ejecuta la evaluación en un hilo propio, sin bloquear el hilo del
+    stream. Las ráfagas se agrupan: mientras una evaluación está en curso
+    solo se conserva el último precio de cada símbolo, de modo que nunca hay
+    más de una evaluación en vuelo por símbolo. Los ticks que no mueven el
+    precio al menos un tickSize desde la última evaluación se descartan
+    """
+
+    def __init__(self, evaluate: Callable[[str, float], None], symbols: Optional[Iterable[str]] = None,
+                 exchange_info: Optional[ExchangeInfoRegistry] = None, client=None,
+                 min_ticks: int = 1, name: str = 'tick-evaluator'):
+        """
+        Inicializa el evaluador
+
+        Args:
+            evaluate: Función llamada con (símbolo, precio) en cada evaluación
+            symbols: Símbolos evaluados (default: todos los recibidos)
+            exchange_info: Registro de filtros para el tickSize (default: registro compartido)
+            client: Cliente para cargar los filtros si aún no están
+            min_ticks: Movimiento mínimo, en tickSize, que justifica una nueva evaluación
+            name: Nombre del hilo
+        """
+        self.evaluate = evaluate
+        self.symbols = {s.upper() for s in symbols} if symbols else None
+        self.exchange_info = exchange_info or get_exchange_info_registry()
+        self.client = client
+        self.min_ticks = min_ticks
+        self.name = name
+
+        self._pending: Dict[str, tuple] = {}        # símbolo -> (precio, instante de llegada)
+        self._evaluated: Dict[str, float] = {}      # símbolo -> último precio evaluado (o en vuelo)
+        self._tick_sizes: Dict[str, float] = {}
+        self._sources = set()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stop = threading.Event()
+
+        # Estadísticas
+        self.ticks = 0
+        self.evaluations = 0
+        self.coalesced = 0
+        self.skipped = 0
+        self.errors = 0
+        self.last_latency = 0.0
+        self.max_latency = 0.0
+        self._total_latency = 0.0
+
+    def _resolve_tick_size(self, symbol: str) -> float:
+        # Puede consultar exchangeInfo por REST: nunca desde el hilo del stream
+        tick = self._tick_sizes.get(symbol)
+        if tick is None:
+            try:
+                filters = self.exchange_info.get(symbol, self.client)
+                tick = float(filters.tick_size) if filters is not None else 0.0
+            except Exception as e:
+                logger.error(f"Error obteniendo el tickSize de {symbol}: {e}")
+                tick = 0.0
+            self._tick_sizes[symbol] = tick
+        return tick
+
+    def on_price(self, symbol: str, price: float):
+        """
+        Recibe un precio (listener de KlineStream o PriceSnapshotService)
+
+        Args:
+            symbol: Par de trading
+            price: Último precio
+        """
+        symbol = symbol.upper()
+        if self.symbols is not None and symbol not in self.symbols:
+            return
+        # Símbolo aún sin tickSize (se resuelve en el hilo de evaluación): no se filtra
+        tick = self._tick_sizes.get(symbol, 0.0) * self.min_ticks
+        with self._cond:
+            self.ticks += 1
+            evaluated = self._evaluated.get(symbol)
+            if evaluated is not None and (price == evaluated or abs(price - evaluated) < tick):
+                self.skipped += 1
+                return
+            if symbol in self._pending:
+                # Ya hay una evaluación esperando: solo cuenta el precio más reciente
+                self.coalesced += 1
+                self._pending[symbol] = (price, self._pending[symbol][1])
+            else:
+                self._pending[symbol] = (price, time.perf_counter())
+            self._cond.notify()
+
+    def on_book(self, symbol: str, state: Dict):
+        """
+        Recibe una actualización del libro L2 (listener de OrderBookStream)
+
+        Args:
+            symbol: Par de trading
+            state: Métricas del libro
+        """
+        self.on_price(symbol, state['mid'])
+
+    def request(self, symbol: str, price: Optional[float] = None):
+        """
+        Pide una evaluación aunque el precio no se haya movido (p. ej. un
+        latido periódico); se agrupa con los ticks pendientes
+
+        Args:
+            symbol: Par de trading
+            price: Precio de referencia (default: el último recibido)
+        """
+        symbol = symbol.upper()
+        with self._cond:
+            if symbol not in self._pending:
+                self._pending[symbol] = (price if price is not None else self._evaluated.get(symbol),
+                                         time.perf_counter())
+                self._cond.notify()
+
+    def attach(self, source):
+        """
+        Conecta el evaluador a una fuente de precios (KlineStream o PriceSnapshotService)
+
+        Args:
+            source: Fuente con add_price_listener
+        """
+        if id(source) not in self._sources:
+            self._sources.add(id(source))
+            source.add_price_listener(self.on_price)
+
+    def attach_book(self, order_book):
+        """
+        Conecta el evaluador a las actualizaciones de un OrderBookStream
+
+        Args:
+            order_book: Stream de libros L2
+        """
+        if id(order_book) not in self._sources:
+            self._sources.add(id(order_book))
+            order_book.add_listener(self.on_book)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending and not self._stop.is_set():
+                    self._cond.wait()
+                if self._stop.is_set():
+                    break
+                symbol = next(iter(self._pending))
+                price, received = self._pending.pop(symbol)
+                if price is not None:
+                    self._evaluated[symbol] = price
+
+            latency = time.perf_counter() - received
+            if symbol not in self._tick_sizes:
+                self._resolve_tick_size(symbol)
+            try:
+                self.evaluate(symbol, price)
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Error evaluando tick de {symbol}: {e}")
+
+            with self._cond:
+                self.evaluations += 1
+                self.last_latency = latency
+                self.max_latency = max(self.max_latency, latency)
+                self._total_latency += latency
+
+    def start(self):
+        """
+        Carga el tickSize de los símbolos evaluados e inicia el hilo de evaluación
+        """
+        for symbol in self.symbols or ():
+            self._resolve_tick_size(symbol)
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """
+        Detiene el hilo de evaluación (la evaluación en curso termina)
+        """
+        with self._cond:
+            self._stop.set()
+            self._cond.notify_all()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+
+    def get_statistics(self) -> Dict:
+        """
+        Obtiene estadísticas del evaluador
+
+        Returns:
+            Dict con estadísticas (latencias en segundos desde la llegada del tick)
+        """
+        return {
+            'ticks': self.ticks,
+            'evaluations': self.evaluations,
+            'coalesced': self.coalesced,
+            'skipped': self.skipped,
+            'errors': self.errors,
+            'avg_latency': self._total_latency / self.evaluations if self.evaluations else 0.0,
+            'max_latency': self.max_latency,
+            'last_latency': self.last_latency
+        }
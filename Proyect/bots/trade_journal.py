@@ -0,0 +1,637 @@
+import os
+import abc
+import glob
+import json
+import time
+import queue
+import sqlite3
+import logging
+import threading
+import itertools
+from typing import Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo entre procesos
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_COLUMNS = ('journal_id', 'kind', 'source', 'symbol', 'side', 'quantity', 'price', 'pnl',
+                   'strategy', 'timestamp', 'payload')
+
+
+def _to_row(record: Dict) -> tuple:
+    data = record['data']
+    return (
+        record['journal_id'], record['kind'], record['source'], data.get('symbol'), data.get('side'),
+        data.get('quantity'), data.get('price', data.get('exit_price')), data.get('pnl'),
+        data.get('strategy'), str(data.get('exit_time') or data.get('timestamp') or ''),
+        json.dumps(data, default=str)
+    )
+
+
+class JournalSink(abc.ABC):
+    """
+    Destino de escritura del diario de operaciones.
+
+    Las implementaciones deben ser idempotentes por journal_id: la
+    recuperación tras un fallo puede volver a escribir registros ya
+    guardados
+    """
+
+    def open(self):
+        pass
+
+    @abc.abstractmethod
+    def write_batch(self, records: List[Dict]):
+        """
+        Escribe un lote de registros en una sola transacción
+
+        Args:
+            records: Registros del diario
+        """
+
+    @abc.abstractmethod
+    def query(self, source: Optional[str] = None, symbol: Optional[str] = None,
+              kind: Optional[str] = None, limit: Optional[int] = None) -> List[Dict]:
+        """
+        Lee registros confirmados
+
+        Args:
+            source: Filtrar por bot o componente
+            symbol: Filtrar por par de trading
+            kind: Tipo de registro
+            limit: Devolver solo los últimos N
+
+        Returns:
+            Lista con los datos de cada registro en orden de escritura
+        """
+
+    def close(self):
+        pass
+
+
+class MemorySink(JournalSink):
+    """Destino en memoria (backtests y pruebas)"""
+
+    def __init__(self):
+        self.records: Dict[str, Dict] = {}
+
+    def write_batch(self, records: List[Dict]):
+        for record in records:
+            self.records.setdefault(record['journal_id'], record)
+
+    def query(self, source=None, symbol=None, kind=None, limit=None) -> List[Dict]:
+        rows = [r['data'] for r in self.records.values()
+                if (source is None or r['source'] == source)
+                and (symbol is None or r['data'].get('symbol') == symbol)
+                and (kind is None or r['kind'] == kind)]
+        return rows[-limit:] if limit else rows
+
+
+class SQLiteSink(JournalSink):
+    """
+    Destino SQLite local en modo WAL; cada lote se escribe en una sola
+    transacción (group commit)
+    """
+
+    def __init__(self, path: str):
+        """
+        Inicializa el destino
+
+        Args:
+            path: Ruta del fichero de base de datos (':memory:' para pruebas)
+        """
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def open(self):
+        if self._conn is not None:
+            return
+        if self.path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS trades ('
+            'journal_id TEXT PRIMARY KEY, kind TEXT, source TEXT, symbol TEXT, side TEXT, '
+            'quantity REAL, price REAL, pnl REAL, strategy TEXT, timestamp TEXT, payload TEXT)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS trades_source ON trades (source, symbol, kind)')
+        self._conn.commit()
+
+    def write_batch(self, records: List[Dict]):
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(
+                    f"INSERT OR IGNORE INTO trades ({', '.join(JOURNAL_COLUMNS)}) "
+                    f"VALUES ({', '.join('?' * len(JOURNAL_COLUMNS))})",
+                    [_to_row(r) for r in records]
+                )
+
+    def query(self, source=None, symbol=None, kind=None, limit=None) -> List[Dict]:
+        conditions, params = [], []
+        for column, value in (('source', source), ('symbol', symbol), ('kind', kind)):
+            if value is not None:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        sql = 'SELECT payload FROM trades'
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += ' ORDER BY rowid'
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        rows = [json.loads(r[0]) for r in rows]
+        return rows[-limit:] if limit else rows
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class PostgresSink(JournalSink):
+    """Destino PostgreSQL (requiere psycopg2)"""
+
+    def __init__(self, dsn: str, table: str = 'trades'):
+        """
+        Inicializa el destino
+
+        Args:
+            dsn: Cadena de conexión de PostgreSQL
+            table: Tabla destino
+        """
+        self.dsn = dsn
+        self.table = table
+        self._conn = None
+
+    def open(self):
+        if self._conn is not None:
+            return
+        import psycopg2
+        self._conn = psycopg2.connect(self.dsn)
+        with self._conn, self._conn.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TABLE IF NOT EXISTS {self.table} ('
+                'journal_id TEXT PRIMARY KEY, kind TEXT, source TEXT, symbol TEXT, side TEXT, '
+                'quantity DOUBLE PRECISION, price DOUBLE PRECISION, pnl DOUBLE PRECISION, '
+                'strategy TEXT, timestamp TEXT, payload JSONB, id BIGSERIAL)'
+            )
+
+    def write_batch(self, records: List[Dict]):
+        from psycopg2.extras import execute_values
+        with self._conn, self._conn.cursor() as cursor:
+            execute_values(
+                cursor,
+                f"INSERT INTO {self.table} ({', '.join(JOURNAL_COLUMNS)}) VALUES %s "
+                "ON CONFLICT (journal_id) DO NOTHING",
+                [_to_row(r) for r in records],
+                page_size=len(records)
+            )
+
+    def query(self, source=None, symbol=None, kind=None, limit=None) -> List[Dict]:
+        conditions, params = [], []
+        for column, value in (('source', source), ('symbol', symbol), ('kind', kind)):
+            if value is not None:
+                conditions.append(f"{column} = %s")
+                params.append(value)
+        sql = f'SELECT payload FROM {self.table}'
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += ' ORDER BY id'
+        with self._conn, self._conn.cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = [r[0] for r in cursor.fetchall()]
+        return rows[-limit:] if limit else rows
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+class MongoSink(JournalSink):
+    """Destino MongoDB (requiere pymongo); journal_id se usa como _id"""
+
+    def __init__(self, url: str, database: str = 'trade-bionic', collection: str = 'trades'):
+        """
+        Inicializa el destino
+
+        Args:
+            url: URL de conexión de MongoDB
+            database: Base de datos
+            collection: Colección destino
+        """
+        self.url = url
+        self.database = database
+        self.collection_name = collection
+        self._client = None
+        self._collection = None
+
+    def open(self):
+        if self._client is not None:
+            return
+        from pymongo import ASCENDING, MongoClient
+        self._client = MongoClient(self.url)
+        self._collection = self._client[self.database][self.collection_name]
+        self._collection.create_index([('source', ASCENDING), ('symbol', ASCENDING), ('kind', ASCENDING)])
+
+    def write_batch(self, records: List[Dict]):
+        from pymongo.errors import BulkWriteError
+        documents = [{'_id': r['journal_id'], 'kind': r['kind'], 'source': r['source'],
+                      'symbol': r['data'].get('symbol'), 'created': r['created'],
+                      'data': json.loads(json.dumps(r['data'], default=str))} for r in records]
+        try:
+            self._collection.insert_many(documents, ordered=False)
+        except BulkWriteError as e:
+            # Los duplicados (código 11000) son registros ya guardados antes de un fallo
+            errors = [err for err in e.details.get('writeErrors', []) if err.get('code') != 11000]
+            if errors:
+                raise
+
+    def query(self, source=None, symbol=None, kind=None, limit=None) -> List[Dict]:
+        criteria = {k: v for k, v in (('source', source), ('symbol', symbol), ('kind', kind)) if v is not None}
+        rows = [doc['data'] for doc in self._collection.find(criteria).sort('created', 1)]
+        return rows[-limit:] if limit else rows
+
+    def close(self):
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+
+class TradeJournal:
+    """
+    Diario de operaciones duradero con escritura diferida.
+
+    record() solo serializa el registro en un fichero de spool (append) y
+    lo encola; un hilo escritor agrupa los registros en lotes y los
+    confirma en el destino con una transacción por lote. Tras una caída,
+    recover() reescribe el spool pendiente (las escrituras son idempotentes
+    por journal_id).
+
+    Cada proceso escribe en su propio spool ({path}.{pid}.spool, bloqueado
+    mientras está abierto): al arrancar se recuperan también los spools
+    que dejaron otros procesos ya terminados, sin tocar los de procesos vivos
+    """
+
+    def __init__(self, sink: Optional[JournalSink] = None, path: Optional[str] = None,
+                 batch_size: int = 500, flush_interval: float = 0.2, max_queue: int = 100000,
+                 durable: bool = True, background: bool = True):
+        """
+        Inicializa el diario
+
+        Args:
+            sink: Destino de escritura (default: SQLite en path)
+            path: Ruta del fichero SQLite (default: env TRADE_JOURNAL_PATH o data/trades.db)
+            batch_size: Registros máximos por transacción
+            flush_interval: Segundos máximos que un registro espera en cola
+            max_queue: Registros en cola a partir de los cuales se descartan (quedan en el spool)
+            durable: Escribir cada registro en el spool antes de encolarlo
+            background: Escribir desde un hilo propio (False: escritura síncrona)
+        """
+        self.path = path or os.getenv('TRADE_JOURNAL_PATH', os.path.join('data', 'trades.db'))
+        self.sink = sink or SQLiteSink(self.path)
+        self.spool_path = f"{self.path}.{os.getpid()}.spool"
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.durable = durable
+        self.background = background
+
+        self._queue: 'queue.Queue[Dict]' = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._spool = None
+        self._sequence = itertools.count()
+        self._prefix = f"{os.getpid()}-{time.time_ns()}"
+        self._in_flight = 0
+        self._overflowed = False
+        self._opened = False
+        self._thread = None
+        self._stop = threading.Event()
+
+        # Estadísticas
+        self.recorded = 0
+        self.written = 0
+        self.batches = 0
+        self.dropped = 0
+        self.errors = 0
+
+    def _open(self):
+        with self._lock:
+            if self._opened:
+                return
+            self.sink.open()
+            if self.durable:
+                os.makedirs(os.path.dirname(os.path.abspath(self.spool_path)), exist_ok=True)
+                self._spool = self._open_spool()
+            self._opened = True
+        if self.durable:
+            self.recover()
+
+    def _open_spool(self):
+        attempt = 0
+        while True:
+            spool = open(self.spool_path, 'a', encoding='utf-8')
+            if fcntl is None:
+                return spool
+            try:
+                fcntl.flock(spool.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                # Otro diario del mismo proceso sobre la misma ruta: spool aparte
+                spool.close()
+                attempt += 1
+                self.spool_path = f"{self.path}.{os.getpid()}-{attempt}.spool"
+                continue
+            try:
+                if os.path.samestat(os.fstat(spool.fileno()), os.stat(self.spool_path)):
+                    return spool
+            except FileNotFoundError:
+                pass
+            # Otro proceso lo tomó por huérfano y lo borró antes del bloqueo: se vuelve a crear
+            spool.close()
+
+    @staticmethod
+    def _parse_spool(lines: List[str]) -> List[Dict]:
+        records = []
+        for line in lines:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                # Última línea incompleta de una escritura interrumpida
+                continue
+        return records
+
+    def _write_records(self, records: List[Dict]):
+        for i in range(0, len(records), self.batch_size):
+            self.sink.write_batch(records[i:i + self.batch_size])
+
+    def start(self):
+        """
+        Abre el destino, recupera el spool pendiente y arranca el hilo escritor
+        """
+        self._open()
+        if not self.background or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='trade-journal', daemon=True)
+        self._thread.start()
+
+    def record(self, kind: str, data: Dict, source: Optional[str] = None) -> Optional[str]:
+        """
+        Registra una operación sin bloquear el hilo de trading
+
+        Args:
+            kind: Tipo de registro ('fill' para órdenes, 'trade' para operaciones cerradas)
+            data: Datos de la operación
+            source: Bot o componente que la registra
+
+        Returns:
+            journal_id asignado o None si no se pudo registrar
+        """
+        try:
+            if not self._opened or (self.background and self._thread is None):
+                self.start()
+
+            record = {
+                'journal_id': f"{self._prefix}-{next(self._sequence)}",
+                'kind': kind,
+                'source': source or data.get('strategy'),
+                'created': time.time(),
+                'data': data
+            }
+            self.recorded += 1
+
+            if not self.background:
+                self.sink.write_batch([record])
+                self.written += 1
+                return record['journal_id']
+
+            with self._lock:
+                if self._spool is not None:
+                    self._spool.write(json.dumps(record, default=str) + '\n')
+                    self._spool.flush()
+                try:
+                    self._queue.put_nowait(record)
+                except queue.Full:
+                    # El registro sigue en el spool y se recupera cuando la cola se vacía
+                    self.dropped += 1
+                    self._overflowed = True
+            return record['journal_id']
+
+        except Exception as e:
+            logger.error(f"Error registrando operación en el diario: {e}")
+            return None
+
+    def _run(self):
+        while not self._stop.is_set() or not self._queue.empty():
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                self._compact()
+                continue
+
+            batch = [first]
+            deadline = time.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - time.time())))
+                except queue.Empty:
+                    break
+            self._write(batch)
+
+    def _write(self, batch: List[Dict]):
+        with self._lock:
+            self._in_flight += len(batch)
+        try:
+            for attempt in range(3):
+                try:
+                    self.sink.write_batch(batch)
+                    self.written += len(batch)
+                    self.batches += 1
+                    break
+                except Exception as e:
+                    self.errors += 1
+                    logger.error(f"Error escribiendo lote del diario (intento {attempt + 1}): {e}")
+                    time.sleep(0.5 * (attempt + 1))
+            else:
+                # Se conserva en el spool; recover() lo reintentará
+                self._overflowed = True
+        finally:
+            with self._lock:
+                self._in_flight -= len(batch)
+
+    def _compact(self):
+        """Vacía el spool cuando todo lo registrado está confirmado"""
+        if self._spool is None:
+            return
+        if self._overflowed and self._queue.empty():
+            self._overflowed = False
+            self._recover_spool()
+            return
+        with self._lock:
+            if self._queue.empty() and self._in_flight == 0 and not self._overflowed and self._spool.tell() > 0:
+                self._spool.truncate(0)
+                self._spool.seek(0)
+
+    def recover(self) -> int:
+        """
+        Reescribe en el destino los registros del spool propio y de los
+        spools de procesos terminados (tras una caída)
+
+        Returns:
+            Número de registros recuperados
+        """
+        return self._recover_spool() + self._recover_orphans()
+
+    def _recover_orphans(self) -> int:
+        if fcntl is None:
+            # Sin bloqueo no se distingue un proceso vivo de uno caído
+            return 0
+        own = os.path.abspath(self.spool_path)
+        recovered = 0
+        for path in glob.glob(glob.escape(self.path) + '.*spool'):
+            if os.path.abspath(path) == own:
+                continue
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    try:
+                        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except OSError:
+                        # Spool de un proceso vivo
+                        continue
+                    records = self._parse_spool(f.readlines())
+                    self._write_records(records)
+                    os.remove(path)
+                if records:
+                    logger.info(f"Diario de operaciones: {len(records)} registros recuperados de {path}")
+                recovered += len(records)
+            except FileNotFoundError:
+                # Lo recuperó otro proceso a la vez
+                continue
+            except Exception as e:
+                logger.error(f"Error recuperando el spool {path}: {e}")
+        return recovered
+
+    def _recover_spool(self) -> int:
+        if not os.path.exists(self.spool_path):
+            return 0
+        try:
+            with self._lock:
+                if self._spool is not None:
+                    self._spool.flush()
+                with open(self.spool_path, encoding='utf-8') as f:
+                    lines = f.readlines()
+                size = sum(len(line.encode('utf-8')) for line in lines)
+
+            records = self._parse_spool(lines)
+            self._write_records(records)
+
+            with self._lock:
+                # Solo se vacía si no se ha registrado nada mientras se reescribía
+                if (self._spool is not None and self._spool.tell() == size
+                        and self._queue.empty() and self._in_flight == 0):
+                    self._spool.truncate(0)
+                    self._spool.seek(0)
+            if records:
+                logger.info(f"Diario de operaciones: {len(records)} registros recuperados del spool")
+            return len(records)
+        except Exception as e:
+            logger.error(f"Error recuperando el spool del diario: {e}")
+            self._overflowed = True
+            return 0
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """
+        Espera a que todos los registros encolados estén confirmados
+
+        Args:
+            timeout: Segundos máximos de espera
+
+        Returns:
+            True si la cola quedó vacía
+        """
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self._queue.empty() and self._in_flight == 0:
+                return True
+            time.sleep(0.01)
+        return False
+
+    def load_trades(self, source: Optional[str] = None, symbol: Optional[str] = None,
+                    kind: str = 'trade', limit: Optional[int] = None) -> List[Dict]:
+        """
+        Lee operaciones confirmadas del destino
+
+        Args:
+            source: Filtrar por bot o componente
+            symbol: Filtrar por par de trading
+            kind: Tipo de registro
+            limit: Devolver solo las últimas N
+
+        Returns:
+            Lista de operaciones en orden de registro
+        """
+        try:
+            self._open()
+            self.flush()
+            return self.sink.query(source=source, symbol=symbol, kind=kind, limit=limit)
+        except Exception as e:
+            logger.error(f"Error leyendo el diario de operaciones: {e}")
+            return []
+
+    def stop(self, timeout: float = 10.0):
+        """
+        Escribe los registros pendientes y cierra el destino
+
+        Args:
+            timeout: Segundos máximos de espera al hilo escritor
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+        with self._lock:
+            if self._spool is not None:
+                if self._queue.empty() and self._in_flight == 0 and not self._overflowed:
+                    # Todo confirmado: el spool de este proceso ya no hace falta
+                    try:
+                        os.remove(self.spool_path)
+                    except FileNotFoundError:
+                        pass
+                self._spool.close()
+                self._spool = None
+            if self._opened:
+                self.sink.close()
+                self._opened = False
+
+    def get_statistics(self) -> Dict:
+        """
+        Obtiene estadísticas del diario
+
+        Returns:
+            Dict con estadísticas
+        """
+        return {
+            'recorded': self.recorded,
+            'written': self.written,
+            'batches': self.batches,
+            'pending': self._queue.qsize() + self._in_flight,
+            'dropped': self.dropped,
+            'errors': self.errors
+        }
+
+
+_shared_journal = TradeJournal()
+
+
+def get_trade_journal() -> TradeJournal:
+    """
+    Obtiene el diario de operaciones compartido por el proceso
+
+    Returns:
+        Instancia compartida de TradeJournal
+    """
+    return _shared_journal
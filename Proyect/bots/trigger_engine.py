@@ -0,0 +1,371 @@
+import time
+import heapq
+import logging
+import threading
+from bisect import bisect_left, bisect_right
+from typing import Callable, Dict, List, Optional, Tuple
+
+from utils import RiskManager
+
+logger = logging.getLogger(__name__)
+
+
+class _LevelBook:
+    """
+    Niveles de disparo de un símbolo ordenados por precio.
+
+    'upper' se dispara cuando el precio sube hasta el nivel (TP de largos,
+    SL de cortos) y 'lower' cuando baja hasta él (SL de largos, TP de
+    cortos). Cada actualización localiza los disparados con bisect
+    """
+
+    __slots__ = ('upper_levels', 'upper_ids', 'lower_levels', 'lower_ids')
+
+    def __init__(self):
+        self.upper_levels: List[float] = []
+        self.upper_ids: List[Tuple] = []
+        self.lower_levels: List[float] = []
+        self.lower_ids: List[Tuple] = []
+
+    @staticmethod
+    def _insert(levels: List[float], ids: List[Tuple], level: float, entry: Tuple):
+        idx = bisect_right(levels, level)
+        levels.insert(idx, level)
+        ids.insert(idx, entry)
+
+    @staticmethod
+    def _remove(levels: List[float], ids: List[Tuple], level: float, position_id) -> bool:
+        idx = bisect_left(levels, level)
+        while idx < len(levels) and levels[idx] == level:
+            if ids[idx][0] == position_id:
+                del levels[idx]
+                del ids[idx]
+                return True
+            idx += 1
+        return False
+
+    def add(self, position_id, level: float, reason: str, upper: bool):
+        if upper:
+            self._insert(self.upper_levels, self.upper_ids, level, (position_id, reason))
+        else:
+            self._insert(self.lower_levels, self.lower_ids, level, (position_id, reason))
+
+    def remove(self, position_id, level: float, upper: bool):
+        if upper:
+            self._remove(self.upper_levels, self.upper_ids, level, position_id)
+        else:
+            self._remove(self.lower_levels, self.lower_ids, level, position_id)
+
+    def pop_triggered(self, price: float) -> List[Tuple]:
+        triggered = []
+        # Niveles superiores alcanzados: prefijo con nivel <= precio
+        idx = bisect_right(self.upper_levels, price)
+        if idx:
+            triggered.extend(zip(self.upper_ids[:idx], self.upper_levels[:idx]))
+            del self.upper_levels[:idx]
+            del self.upper_ids[:idx]
+        # Niveles inferiores alcanzados: sufijo con nivel >= precio
+        idx = bisect_left(self.lower_levels, price)
+        if idx < len(self.lower_levels):
+            triggered.extend(zip(self.lower_ids[idx:], self.lower_levels[idx:]))
+            del self.lower_levels[idx:]
+            del self.lower_ids[idx:]
+        return triggered
+
+    def __len__(self) -> int:
+        return len(self.upper_levels) + len(self.lower_levels)
+
+
+class TriggerEngine:
+    """
+    Motor de stop-loss / take-profit / tiempo máximo dirigido por eventos.
+
+    Mantiene los niveles de todas las posiciones abiertas en libros
+    ordenados por símbolo y los tiempos máximos en un heap. Cada precio
+    recibido del stream se evalúa en O(log n), por lo que los cierres se
+    disparan en cuanto el precio cruza el nivel y no en el siguiente ciclo
+    del scheduler. Si el callback devuelve False (cierre fallido) o lanza
+    una excepción, los niveles se rearman tras retry_interval
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.time, retry_interval: float = 5.0):
+        """
+        Inicializa el motor
+
+        Args:
+            clock: Reloj en segundos (inyectable para simulación)
+            retry_interval: Segundos de espera antes de reintentar un cierre fallido
+        """
+        self.clock = clock
+        self.retry_interval = retry_interval
+        self._books: Dict[str, _LevelBook] = {}
+        self._positions: Dict[object, Dict] = {}
+        self._deadlines: List[Tuple[float, int, object]] = []
+        self._sequence = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+        # Estadísticas
+        self.price_updates = 0
+        self.triggers = 0
+        self.rearmed = 0
+
+    def add_position(self, position_id, symbol: str, side: str, entry_price: float,
+                     stop_loss_percentage: Optional[float] = None,
+                     take_profit_percentage: Optional[float] = None,
+                     max_duration: Optional[float] = None,
+                     callback: Optional[Callable[[Dict], Optional[bool]]] = None) -> Dict:
+        """
+        Registra los niveles de una posición abierta
+
+        Args:
+            position_id: Identificador único de la posición
+            symbol: Par de trading
+            side: 'buy' o 'sell'
+            entry_price: Precio de entrada
+            stop_loss_percentage: Stop loss en fracción (None = sin SL)
+            take_profit_percentage: Take profit en fracción (None = sin TP)
+            max_duration: Segundos máximos en posición (None = sin límite)
+            callback: Función llamada con el evento de disparo (False si el cierre falla)
+
+        Returns:
+            Dict con los niveles registrados
+        """
+        symbol = symbol.upper()
+        side = side.lower()
+        self.remove_position(position_id)
+
+        levels = {
+            'position_id': position_id,
+            'symbol': symbol,
+            'side': side,
+            'stop_loss': None,
+            'take_profit': None,
+            'deadline': None,
+            'callback': callback
+        }
+        if stop_loss_percentage is not None:
+            levels['stop_loss'] = RiskManager.calculate_stop_loss(entry_price, side, stop_loss_percentage)
+        if take_profit_percentage is not None:
+            levels['take_profit'] = RiskManager.calculate_take_profit(entry_price, side, take_profit_percentage)
+        if max_duration is not None:
+            levels['deadline'] = self.clock() + max_duration
+
+        with self._lock:
+            self._insert(levels)
+            if levels['deadline'] is not None:
+                self._push_deadline(levels)
+
+        return levels
+
+    def _insert(self, levels: Dict):
+        position_id, side = levels['position_id'], levels['side']
+        book = self._books.setdefault(levels['symbol'], _LevelBook())
+        if levels['stop_loss'] is not None:
+            book.add(position_id, levels['stop_loss'], 'stop_loss', upper=side == 'sell')
+        if levels['take_profit'] is not None:
+            book.add(position_id, levels['take_profit'], 'take_profit', upper=side == 'buy')
+        self._positions[position_id] = levels
+
+    def _push_deadline(self, levels: Dict):
+        self._sequence += 1
+        heapq.heappush(self._deadlines, (levels['deadline'], self._sequence, levels['position_id']))
+
+    def _rearm(self, levels: Dict, reason: str):
+        # Cierre fallido: los niveles vuelven al libro y se reintentan tras retry_interval
+        with self._lock:
+            if levels['position_id'] in self._positions:
+                return  # Registrada de nuevo durante el cierre
+            levels['retry_at'] = self.clock() + self.retry_interval
+            if reason == 'time':
+                levels['deadline'] = levels['retry_at']
+                self._push_deadline(levels)
+            self._insert(levels)
+            self.rearmed += 1
+
+    def _discard(self, position_id) -> Optional[Dict]:
+        levels = self._positions.pop(position_id, None)
+        if levels is None:
+            return None
+        book = self._books.get(levels['symbol'])
+        if book is not None:
+            if levels['stop_loss'] is not None:
+                book.remove(position_id, levels['stop_loss'], upper=levels['side'] == 'sell')
+            if levels['take_profit'] is not None:
+                book.remove(position_id, levels['take_profit'], upper=levels['side'] == 'buy')
+        # Los tiempos del heap se descartan de forma perezosa
+        return levels
+
+    def remove_position(self, position_id) -> bool:
+        """
+        Elimina los niveles de una posición (p. ej. cerrada por la estrategia)
+
+        Args:
+            position_id: Identificador de la posición
+
+        Returns:
+            True si la posición estaba registrada
+        """
+        with self._lock:
+            return self._discard(position_id) is not None
+
+    def _fire(self, events: List[Dict]):
+        for event in events:
+            self.triggers += 1
+            callback = event.pop('callback', None)
+            levels = event.pop('levels')
+            if callback is None:
+                continue
+            try:
+                closed = callback(event)
+            except Exception as e:
+                logger.error(f"Error ejecutando cierre de {event['position_id']}: {e}")
+                closed = False
+            if closed is False:
+                logger.warning(f"Cierre de {event['position_id']} fallido ({event['reason']}): "
+                               f"niveles rearmados, reintento en {self.retry_interval}s")
+                self._rearm(levels, event['reason'])
+
+    def on_price(self, symbol: str, price: float) -> List[Dict]:
+        """
+        Evalúa un precio recibido y dispara las posiciones que cruza
+
+        Args:
+            symbol: Par de trading
+            price: Último precio
+
+        Returns:
+            Lista de eventos disparados
+        """
+        symbol = symbol.upper()
+        events = []
+        with self._lock:
+            self.price_updates += 1
+            book = self._books.get(symbol)
+            if book is not None and len(book):
+                now = None
+                for (position_id, reason), level in book.pop_triggered(price):
+                    levels = self._discard(position_id)
+                    if levels is None:
+                        continue
+                    if 'retry_at' in levels:
+                        now = self.clock() if now is None else now
+                        if levels['retry_at'] > now:
+                            # Cierre fallido hace poco: se espera al reintento
+                            self._insert(levels)
+                            continue
+                    events.append({
+                        'position_id': position_id, 'symbol': symbol, 'reason': reason,
+                        'level': level, 'price': price, 'callback': levels['callback'], 'levels': levels
+                    })
+        events.extend(self._expired(price_by_symbol={symbol: price}))
+        self._fire(events)
+        return events
+
+    def _expired(self, price_by_symbol: Optional[Dict[str, float]] = None) -> List[Dict]:
+        now = self.clock()
+        events = []
+        with self._lock:
+            while self._deadlines and self._deadlines[0][0] <= now:
+                deadline, _, position_id = heapq.heappop(self._deadlines)
+                levels = self._positions.get(position_id)
+                if levels is None or levels['deadline'] != deadline:
+                    continue
+                self._discard(position_id)
+                events.append({
+                    'position_id': position_id, 'symbol': levels['symbol'], 'reason': 'time',
+                    'level': deadline, 'price': (price_by_symbol or {}).get(levels['symbol']),
+                    'callback': levels['callback'], 'levels': levels
+                })
+        return events
+
+    def check_time(self) -> List[Dict]:
+        """
+        Dispara las posiciones que han superado su tiempo máximo
+
+        Returns:
+            Lista de eventos disparados
+        """
+        events = self._expired()
+        self._fire(events)
+        return events
+
+    def attach(self, source):
+        """
+        Conecta el motor a una fuente de precios en streaming
+        (KlineStream o PriceSnapshotService)
+
+        Args:
+            source: Fuente con add_price_listener
+        """
+        source.add_price_listener(self.on_price)
+
+    def _timer_loop(self, interval: float):
+        while not self._stop.wait(interval):
+            try:
+                self.check_time()
+            except Exception as e:
+                logger.error(f"Error comprobando tiempos máximos: {e}")
+
+    def start(self, interval: float = 1.0):
+        """
+        Comprueba los tiempos máximos periódicamente en segundo plano
+
+        Args:
+            interval: Segundos entre comprobaciones
+        """
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._timer_loop, args=(interval,),
+                                            name='trigger-engine', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """
+        Detiene la comprobación periódica
+        """
+        self._stop.set()
+
+    def get_levels(self, position_id) -> Optional[Dict]:
+        """
+        Obtiene los niveles registrados de una posición
+
+        Args:
+            position_id: Identificador de la posición
+
+        Returns:
+            Dict con stop_loss, take_profit y deadline, o None
+        """
+        levels = self._positions.get(position_id)
+        if levels is None:
+            return None
+        return {k: v for k, v in levels.items() if k not in ('callback', 'retry_at')}
+
+    def get_statistics(self) -> Dict:
+        """
+        Obtiene estadísticas del motor
+
+        Returns:
+            Dict con estadísticas
+        """
+        return {
+            'positions': len(self._positions),
+            'symbols': sum(1 for book in self._books.values() if len(book)),
+            'price_updates': self.price_updates,
+            'triggers': self.triggers,
+            'rearmed': self.rearmed
+        }
+
+
+_shared_engine = TriggerEngine()
+
+
+def get_trigger_engine() -> TriggerEngine:
+    """
+    Obtiene el motor de disparos compartido por el proceso
+
+    Returns:
+        Instancia compartida de TriggerEngine
+    """
+    return _shared_engine
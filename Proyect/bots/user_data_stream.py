@@ -0,0 +1,576 @@
+import json
+import time
+import queue
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+import websocket
+
+from market_stream import _ReplayHandler, _ThreadingServer
+
+logger = logging.getLogger(__name__)
+
+BINANCE_USER_STREAM_URL = 'wss://stream.binance.com:9443/ws'
+
+FINAL_STATUSES = ('FILLED', 'CANCELED', 'REJECTED', 'EXPIRED', 'EXPIRED_IN_MATCH')
+
+
+class OrderLedger:
+    """
+    Registro en memoria de órdenes, ejecuciones y saldos.
+
+    Se alimenta de la respuesta REST de cada orden (fills de la respuesta
+    FULL) y de los eventos executionReport / outboundAccountPosition del
+    user data stream. Las ejecuciones se deduplican por tradeId, de modo
+    que ambas fuentes pueden llegar en cualquier orden
+    """
+
+    def __init__(self, max_orders: int = 10000):
+        """
+        Inicializa el registro
+
+        Args:
+            max_orders: Órdenes retenidas como máximo (las más antiguas se descartan)
+        """
+        self.max_orders = max_orders
+        self._orders: 'OrderedDict[int, Dict]' = OrderedDict()
+        self._balances: Dict[str, Dict[str, float]] = {}
+        self._cond = threading.Condition()
+        self.is_live = False
+
+        # Estadísticas
+        self.events = 0
+        self.trades = 0
+
+    def _entry(self, order_id: int, symbol: str, side: str) -> Dict:
+        entry = self._orders.get(order_id)
+        if entry is None:
+            entry = self._orders[order_id] = {
+                'order_id': order_id, 'symbol': symbol, 'side': side.lower(), 'status': 'NEW',
+                'executed_qty': 0.0, 'quote_qty': 0.0, 'commission': {}, 'trade_ids': set(),
+                'update_time': time.time()
+            }
+            while len(self._orders) > self.max_orders:
+                self._orders.popitem(last=False)
+        return entry
+
+    def _add_trade(self, entry: Dict, trade_id, commission: float, commission_asset: Optional[str]):
+        if trade_id in entry['trade_ids']:
+            return
+        entry['trade_ids'].add(trade_id)
+        if commission_asset:
+            entry['commission'][commission_asset] = entry['commission'].get(commission_asset, 0.0) + commission
+        self.trades += 1
+
+    def record_order(self, order: Dict) -> Dict:
+        """
+        Registra la respuesta REST de una orden
+
+        Args:
+            order: Respuesta de order_market_buy/sell
+
+        Returns:
+            Resumen de ejecución de la orden
+        """
+        with self._cond:
+            entry = self._entry(order['orderId'], order.get('symbol', ''), order.get('side', ''))
+            fills = order.get('fills') or []
+            for i, fill in enumerate(fills):
+                self._add_trade(entry, fill.get('tradeId', f"rest-{i}"),
+                                float(fill.get('commission', 0.0)), fill.get('commissionAsset'))
+
+            executed = float(order.get('executedQty', 0.0) or 0.0)
+            quote = float(order.get('cummulativeQuoteQty', 0.0) or 0.0)
+            if not quote and fills:
+                quote = sum(float(f['price']) * float(f['qty']) for f in fills)
+            if not quote and executed and float(order.get('price', 0.0) or 0.0):
+                quote = executed * float(order['price'])
+            entry['executed_qty'] = max(entry['executed_qty'], executed)
+            entry['quote_qty'] = max(entry['quote_qty'], quote)
+            if entry['status'] not in FINAL_STATUSES:
+                entry['status'] = order.get('status', entry['status'])
+            entry['update_time'] = time.time()
+            self._cond.notify_all()
+            return self._summary(entry)
+
+    def handle_event(self, event: Dict):
+        """
+        Aplica un evento del user data stream
+
+        Args:
+            event: Evento ya decodificado
+        """
+        event_type = event.get('e')
+        with self._cond:
+            if event_type == 'executionReport':
+                entry = self._entry(event['i'], event['s'], event['S'])
+                if event.get('x') == 'TRADE':
+                    self._add_trade(entry, event.get('t'), float(event.get('n') or 0.0), event.get('N'))
+                entry['executed_qty'] = max(entry['executed_qty'], float(event.get('z', 0.0)))
+                entry['quote_qty'] = max(entry['quote_qty'], float(event.get('Z', 0.0)))
+                entry['status'] = event.get('X', entry['status'])
+                entry['update_time'] = time.time()
+            elif event_type == 'outboundAccountPosition':
+                for balance in event.get('B', []):
+                    self._balances[balance['a']] = {'free': float(balance['f']), 'locked': float(balance['l'])}
+            else:
+                return
+            self.events += 1
+            self._cond.notify_all()
+
+    @staticmethod
+    def _summary(entry: Dict) -> Dict:
+        qty, quote = entry['executed_qty'], entry['quote_qty']
+        avg_price = quote / qty if qty > 0 else None
+
+        # Comisión expresada en el activo de cotización (BNB u otros activos no se convierten)
+        commission_quote = 0.0
+        for asset, amount in entry['commission'].items():
+            if entry['symbol'].endswith(asset):
+                commission_quote += amount
+            elif entry['symbol'].startswith(asset) and avg_price:
+                commission_quote += amount * avg_price
+
+        return {
+            'order_id': entry['order_id'],
+            'symbol': entry['symbol'],
+            'side': entry['side'],
+            'status': entry['status'],
+            'executed_qty': qty,
+            'quote_qty': quote,
+            'avg_price': avg_price,
+            'commission': dict(entry['commission']),
+            'commission_quote': commission_quote
+        }
+
+    def get_fill(self, order_id) -> Optional[Dict]:
+        """
+        Obtiene el resumen de ejecución de una orden
+
+        Args:
+            order_id: ID de la orden
+
+        Returns:
+            Resumen o None si la orden no está registrada
+        """
+        with self._cond:
+            entry = self._orders.get(order_id)
+            return self._summary(entry) if entry is not None else None
+
+    def wait_fill(self, order_id, timeout: float = 2.0) -> Optional[Dict]:
+        """
+        Espera a que una orden alcance un estado final
+
+        Args:
+            order_id: ID de la orden
+            timeout: Segundos máximos de espera
+
+        Returns:
+            Resumen (posiblemente parcial) o None si la orden no está registrada
+        """
+        deadline = time.time() + timeout
+        with self._cond:
+            while True:
+                entry = self._orders.get(order_id)
+                if entry is not None and entry['status'] in FINAL_STATUSES:
+                    break
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            return self._summary(entry) if entry is not None else None
+
+    def resolve_fill(self, order: Dict, timeout: float = 2.0) -> Dict:
+        """
+        Obtiene la ejecución real de una orden recién enviada
+
+        Usa los fills de la respuesta REST y, si la respuesta no los trae
+        y el stream está conectado, espera al executionReport.
+
+        Args:
+            order: Respuesta de order_market_buy/sell
+            timeout: Segundos máximos de espera al stream
+
+        Returns:
+            Resumen de ejecución (avg_price None si no hay datos de ejecución)
+        """
+        summary = self.record_order(order)
+        if (summary['avg_price'] is None or summary['status'] not in FINAL_STATUSES) and self.is_live:
+            summary = self.wait_fill(order['orderId'], timeout) or summary
+        return summary
+
+    def get_balance(self, asset: str) -> Optional[float]:
+        """
+        Obtiene el último saldo (libre + bloqueado) recibido por el stream
+
+        Args:
+            asset: Activo
+
+        Returns:
+            Saldo o None si no se ha recibido
+        """
+        balance = self._balances.get(asset)
+        if balance is None:
+            return None
+        return balance['free'] + balance['locked']
+
+    def get_statistics(self) -> Dict:
+        """
+        Obtiene estadísticas del registro
+
+        Returns:
+            Dict con estadísticas
+        """
+        return {
+            'orders': len(self._orders),
+            'trades': self.trades,
+            'events': self.events,
+            'is_live': self.is_live
+        }
+
+
+class UserDataStream:
+    """
+    Suscripción al user data stream de Binance (listenKey).
+
+    Alimenta el OrderLedger y los listeners registrados (p. ej.
+    PortfolioRiskManager.handle_event) con ejecuciones y saldos en tiempo
+    real, sin sondear get_account
+    """
+
+    def __init__(self, client, ledger: Optional[OrderLedger] = None,
+                 url: str = BINANCE_USER_STREAM_URL, keepalive_interval: float = 1800.0):
+        """
+        Inicializa el stream
+
+        Args:
+            client: Cliente de Binance (crea y renueva el listenKey)
+            ledger: Registro de órdenes (default: registro compartido)
+            url: URL base del stream
+            keepalive_interval: Segundos entre renovaciones del listenKey
+        """
+        self.client = client
+        self.ledger = ledger or get_order_ledger()
+        self.url = url
+        self.keepalive_interval = keepalive_interval
+
+        self.listen_key = None
+        self._listeners: List[Callable[[Dict], None]] = []
+        self._ws = None
+        self._thread = None
+        self._keepalive_thread = None
+        self._stop = threading.Event()
+        self._connected = threading.Event()
+        self.is_running = False
+
+        # Estadísticas
+        self.messages = 0
+        self.reconnects = 0
+
+    def add_listener(self, callback: Callable[[Dict], None]):
+        """
+        Registra una función llamada con cada evento decodificado
+
+        Args:
+            callback: Función a llamar
+        """
+        self._listeners.append(callback)
+
+    def handle_message(self, message: str):
+        """
+        Procesa un mensaje del stream
+
+        Args:
+            message: Mensaje JSON recibido
+        """
+        try:
+            payload = json.loads(message)
+            event = payload.get('data', payload)
+            self.messages += 1
+
+            if event.get('e') == 'listenKeyExpired':
+                logger.warning("listenKey caducado, reconectando stream de usuario")
+                self.listen_key = None
+                if self._ws is not None:
+                    self._ws.close()
+                return
+
+            self.ledger.handle_event(event)
+            for callback in self._listeners:
+                try:
+                    callback(event)
+                except Exception as e:
+                    logger.error(f"Error en listener del stream de usuario: {e}")
+
+        except Exception as e:
+            logger.error(f"Error procesando mensaje del stream de usuario: {e}")
+
+    def _on_open(self, ws):
+        self._connected.set()
+        self.ledger.is_live = True
+        logger.info("Stream de usuario conectado")
+
+    def _on_close(self, ws, status_code, reason):
+        self._connected.clear()
+        self.ledger.is_live = False
+
+    def _run(self):
+        backoff = 1.0
+        while self.is_running:
+            try:
+                if self.listen_key is None:
+                    self.listen_key = self.client.stream_get_listen_key()
+            except Exception as e:
+                logger.error(f"Error obteniendo listenKey: {e}")
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 60.0)
+                continue
+
+            self._ws = websocket.WebSocketApp(
+                f"{self.url}/{self.listen_key}",
+                on_open=self._on_open,
+                on_message=lambda ws, message: self.handle_message(message),
+                on_error=lambda ws, error: logger.error(f"Error en el stream de usuario: {error}"),
+                on_close=self._on_close
+            )
+            started = time.time()
+            self._ws.run_forever(ping_interval=180, ping_timeout=10)
+
+            if not self.is_running:
+                break
+            self.reconnects += 1
+            if time.time() - started > 60:
+                backoff = 1.0
+            logger.info(f"Reconectando stream de usuario en {backoff:.0f}s...")
+            self._stop.wait(backoff)
+            backoff = min(backoff * 2, 60.0)
+
+    def _keepalive_loop(self):
+        while not self._stop.wait(self.keepalive_interval):
+            if self.listen_key is None:
+                continue
+            try:
+                self.client.stream_keepalive(listenKey=self.listen_key)
+            except Exception as e:
+                logger.error(f"Error renovando listenKey: {e}")
+                # Se fuerza un listenKey nuevo en la siguiente reconexión
+                self.listen_key = None
+                if self._ws is not None:
+                    self._ws.close()
+
+    def start(self):
+        """
+        Crea el listenKey y conecta el stream en segundo plano
+        """
+        if self.is_running:
+            return
+        self.is_running = True
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='user-stream', daemon=True)
+        self._thread.start()
+        self._keepalive_thread = threading.Thread(target=self._keepalive_loop, name='user-stream-keepalive',
+                                                  daemon=True)
+        self._keepalive_thread.start()
+
+    def wait_connected(self, timeout: float = 10.0) -> bool:
+        """
+        Espera a que el stream esté conectado
+
+        Args:
+            timeout: Tiempo máximo de espera en segundos
+
+        Returns:
+            True si está conectado
+        """
+        return self._connected.wait(timeout)
+
+    def stop(self):
+        """
+        Detiene el stream y libera el listenKey
+        """
+        self.is_running = False
+        self._stop.set()
+        if self._ws is not None:
+            self._ws.close()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        if self.listen_key is not None:
+            try:
+                self.client.stream_close(listenKey=self.listen_key)
+            except Exception as e:
+                logger.error(f"Error cerrando listenKey: {e}")
+            self.listen_key = None
+        self.ledger.is_live = False
+
+    def get_statistics(self) -> Dict:
+        """
+        Obtiene estadísticas del stream
+
+        Returns:
+            Dict con estadísticas
+        """
+        return {
+            'connected': self._connected.is_set(),
+            'messages': self.messages,
+            'reconnects': self.reconnects,
+            'ledger': self.ledger.get_statistics()
+        }
+
+
+class _PushHandler(_ReplayHandler):
+    """Handler WebSocket que envía los eventos publicados con push()"""
+
+    def _serve(self):
+        server = self.server.push_server
+        messages = server._register()
+        try:
+            while not server.stopped.is_set():
+                try:
+                    message = messages.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                self._send_text(message)
+            self.request.sendall(b'\x88\x00')
+        except (BrokenPipeError, ConnectionResetError, OSError):
+            pass
+        finally:
+            server._unregister(messages)
+
+
+class FakeUserDataServer:
+    """
+    Servidor WebSocket local que imita el user data stream de Binance.
+
+    Los eventos publicados con push() se envían a todas las conexiones
+    abiertas. MockExchangeServer lo usa para emitir un executionReport por
+    cada orden recibida
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0):
+        """
+        Inicializa el servidor
+
+        Args:
+            host: Host de escucha
+            port: Puerto (0 = puerto libre)
+        """
+        self.stopped = threading.Event()
+        self.connected = threading.Event()
+        self.sent = 0
+        self._queues: List[queue.Queue] = []
+        self._lock = threading.Lock()
+        self._server = _ThreadingServer((host, port), _PushHandler)
+        self._server.push_server = self
+        self._thread = None
+
+    def _register(self) -> queue.Queue:
+        messages = queue.Queue()
+        with self._lock:
+            self._queues.append(messages)
+        self.connected.set()
+        return messages
+
+    def _unregister(self, messages: queue.Queue):
+        with self._lock:
+            if messages in self._queues:
+                self._queues.remove(messages)
+            if not self._queues:
+                self.connected.clear()
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"ws://{host}:{port}/ws"
+
+    def push(self, event):
+        """
+        Envía un evento a todas las conexiones abiertas
+
+        Args:
+            event: Evento (dict o cadena JSON)
+        """
+        message = event if isinstance(event, str) else json.dumps(event)
+        with self._lock:
+            for messages in self._queues:
+                messages.put(message)
+                self.sent += 1
+
+    @staticmethod
+    def execution_report(order_id: int, symbol: str, side: str, quantity: float, price: float,
+                         commission: float = 0.0, commission_asset: Optional[str] = None,
+                         trade_id: Optional[int] = None, status: str = 'FILLED') -> Dict:
+        """
+        Construye un executionReport de una ejecución completa
+
+        Args:
+            order_id: ID de la orden
+            symbol: Par de trading
+            side: 'BUY' o 'SELL'
+            quantity: Cantidad ejecutada
+            price: Precio de ejecución
+            commission: Comisión cobrada
+            commission_asset: Activo de la comisión
+            trade_id: ID de la ejecución (default: el de la orden)
+
+        Returns:
+            Evento con el formato de Binance
+        """
+        now_ms = int(time.time() * 1000)
+        return {
+            'e': 'executionReport', 'E': now_ms, 's': symbol, 'S': side.upper(), 'o': 'MARKET',
+            'q': str(quantity), 'x': 'TRADE', 'X': status, 'i': order_id,
+            'l': str(quantity), 'z': str(quantity), 'L': str(price), 'Z': str(quantity * price),
+            'n': str(commission), 'N': commission_asset, 'T': now_ms,
+            't': trade_id if trade_id is not None else order_id
+        }
+
+    @staticmethod
+    def account_position(balances: Dict[str, float]) -> Dict:
+        """
+        Construye un outboundAccountPosition
+
+        Args:
+            balances: Dict activo -> saldo libre
+
+        Returns:
+            Evento con el formato de Binance
+        """
+        now_ms = int(time.time() * 1000)
+        return {
+            'e': 'outboundAccountPosition', 'E': now_ms, 'u': now_ms,
+            'B': [{'a': asset, 'f': str(free), 'l': '0'} for asset, free in balances.items()]
+        }
+
+    def start(self) -> 'FakeUserDataServer':
+        """
+        Inicia el servidor en un hilo en segundo plano
+
+        Returns:
+            El propio servidor
+        """
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Detiene el servidor
+        """
+        self.stopped.set()
+        self._server.shutdown()
+        self._server.server_close()
+
+
+_shared_ledger = OrderLedger()
+
+
+def get_order_ledger() -> OrderLedger:
+    """
+    Obtiene el registro de órdenes compartido por el proceso
+
+    Returns:
+        Instancia compartida de OrderLedger
+    """
+    return _shared_ledger
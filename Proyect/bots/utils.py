@@ -8,6 +8,21 @@ import logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+
+def _as_series(prices) -> pd.Series:
+    """
+    Normaliza los precios a pd.Series (admite Series, arrays de OHLCV o listas)
+
+    Args:
+        prices: Serie, array o secuencia de precios
+
+    Returns:
+        Serie de precios
+    """
+    if isinstance(prices, pd.Series):
+        return prices
+    return pd.Series(np.asarray(prices, dtype=float))
+
 class TradingIndicators:
     """Clase para calcular indicadores técnicos de trading"""
     
@@ -17,13 +32,14 @@ class TradingIndicators:
         Calcula el RSI (Relative Strength Index)
         
         Args:
-            prices: Serie de precios
+            prices: Serie de precios (o array, p. ej. de OHLCV)
             period: Período para el cálculo (default: 14)
             
         Returns:
             Serie con valores RSI
         """
         try:
+            prices = _as_series(prices)
             deltas = prices.diff()
             gain = deltas.clip(lower=0).rolling(window=period).mean()
             loss = -deltas.clip(upper=0).rolling(window=period).mean()
@@ -40,13 +56,14 @@ class TradingIndicators:
         Calcula la EMA (Exponential Moving Average)
         
         Args:
-            prices: Serie de precios
+            prices: Serie de precios (o array, p. ej. de OHLCV)
             period: Período para el cálculo (default: 20)
             
         Returns:
             Serie con valores EMA
         """
         try:
+            prices = _as_series(prices)
             return prices.ewm(span=period).mean()
         except Exception as e:
             logger.error(f"Error calculando EMA: {e}")
@@ -58,13 +75,14 @@ class TradingIndicators:
         Calcula la SMA (Simple Moving Average)
         
         Args:
-            prices: Serie de precios
+            prices: Serie de precios (o array, p. ej. de OHLCV)
             period: Período para el cálculo (default: 20)
             
         Returns:
             Serie con valores SMA
         """
         try:
+            prices = _as_series(prices)
             return prices.rolling(window=period).mean()
         except Exception as e:
             logger.error(f"Error calculando SMA: {e}")
@@ -76,7 +94,7 @@ class TradingIndicators:
         Calcula las Bandas de Bollinger
         
         Args:
-            prices: Serie de precios
+            prices: Serie de precios (o array, p. ej. de OHLCV)
             period: Período para el cálculo (default: 20)
             std_dev: Desviación estándar (default: 2)
             
@@ -84,6 +102,7 @@ class TradingIndicators:
             Tuple con (banda_superior, banda_media, banda_inferior)
         """
         try:
+            prices = _as_series(prices)
             sma = prices.rolling(window=period).mean()
             std = prices.rolling(window=period).std()
             upper_band = sma + (std * std_dev)
@@ -99,7 +118,7 @@ class TradingIndicators:
         Calcula el MACD
         
         Args:
-            prices: Serie de precios
+            prices: Serie de precios (o array, p. ej. de OHLCV)
             fast: EMA rápida (default: 12)
             slow: EMA lenta (default: 26)
             signal: EMA de señal (default: 9)
@@ -108,6 +127,7 @@ class TradingIndicators:
             Tuple con (macd_line, signal_line, histogram)
         """
         try:
+            prices = _as_series(prices)
             ema_fast = prices.ewm(span=fast).mean()
             ema_slow = prices.ewm(span=slow).mean()
             macd_line = ema_fast - ema_slow
@@ -127,7 +147,7 @@ class SignalGenerator:
         Genera señal basada en RSI y EMA
         
         Args:
-            data: DataFrame con columnas ['close', 'high', 'low', 'volume']
+            data: DataFrame (u OHLCV) con columnas ['close', 'high', 'low', 'volume']
             rsi_period: Período para RSI
             ema_period: Período para EMA
             
@@ -138,7 +158,7 @@ class SignalGenerator:
             if len(data) < max(rsi_period, ema_period):
                 return 'hold'
             
-            close_prices = data['close']
+            close_prices = _as_series(data['close'])
             ema = TradingIndicators.compute_ema(close_prices, ema_period)
             rsi = TradingIndicators.compute_rsi(close_prices, rsi_period)
             
@@ -166,7 +186,7 @@ class SignalGenerator:
         Genera señal basada en momentum
         
         Args:
-            data: DataFrame con columnas ['close', 'high', 'low', 'volume']
+            data: DataFrame (u OHLCV) con columnas ['close', 'high', 'low', 'volume']
             period: Período para el cálculo
             
         Returns:
@@ -176,7 +196,7 @@ class SignalGenerator:
             if len(data) < period:
                 return 'hold'
             
-            close_prices = data['close']
+            close_prices = _as_series(data['close'])
             momentum = close_prices - close_prices.shift(period)
             
             latest = len(data) - 1
@@ -204,7 +224,7 @@ class SignalGenerator:
         Genera señal de scalping basada en spreads
         
         Args:
-            data: DataFrame con columnas ['close', 'high', 'low', 'volume']
+            data: DataFrame (u OHLCV) con columnas ['close', 'high', 'low', 'volume']
             spread_threshold: Umbral mínimo de spread
             
         Returns:
@@ -214,9 +234,9 @@ class SignalGenerator:
             if len(data) < 2:
                 return 'hold'
             
-            latest = len(data) - 1
-            current_price = data['close'].iloc[latest]
-            prev_price = data['close'].iloc[latest - 1]
+            close_prices = np.asarray(data['close'])
+            current_price = close_prices[-1]
+            prev_price = close_prices[-2]
             
             spread = abs(current_price - prev_price) / prev_price
             
@@ -310,7 +330,8 @@ class TradeLogger:
     
     @staticmethod
     def log_trade(symbol: str, side: str, quantity: float, price: float, 
-                  strategy: str, timestamp: str = None) -> Dict:
+                  strategy: str, timestamp: str = None, journal=None,
+                  source: Optional[str] = None) -> Dict:
         """
         Registra una operación de trading
         
@@ -321,6 +342,8 @@ class TradeLogger:
             price: Precio
             strategy: Estrategia utilizada
             timestamp: Timestamp (opcional)
+            journal: TradeJournal en el que persistir la ejecución (opcional)
+            source: Bot que registra la operación (opcional)
             
         Returns:
             Dict con información de la operación
@@ -339,4 +362,6 @@ class TradeLogger:
         }
         
         logger.info(f"Trade ejecutado: {trade}")
+        if journal is not None:
+            journal.record('fill', trade, source=source)
         return trade 
\ No newline at end of file